@@ -1,7 +1,7 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from django.contrib.auth.models import Group
-from .models import User, UserProfile, Library, Notification, DiscountCode, DiscountUsage
+from .models import User, UserProfile, Library, Notification, EmailOutbox, DiscountCode, DiscountUsage
 from .models.library_model import Book, BookImage, Category, Author
 
 
@@ -256,6 +256,28 @@ class NotificationAdmin(admin.ModelAdmin):
     mark_as_unread.short_description = "Mark selected notifications as unread"
 
 
+@admin.register(EmailOutbox)
+class EmailOutboxAdmin(admin.ModelAdmin):
+    """Custom admin for the email outbox."""
+    list_display = ('to_email', 'subject', 'status', 'attempts', 'next_attempt_at', 'sent_at')
+    list_filter = ('status', 'created_at')
+    search_fields = ('to_email', 'subject')
+    readonly_fields = ('created_at', 'sent_at', 'attempts', 'last_error')
+    
+    actions = ['retry_now']
+    
+    def retry_now(self, request, queryset):
+        """Action to reschedule selected emails for immediate delivery."""
+        from django.utils import timezone
+        count = queryset.exclude(status='sent').update(
+            status='pending',
+            attempts=0,
+            next_attempt_at=timezone.now()
+        )
+        self.message_user(request, f'{count} emails were rescheduled for delivery.')
+    retry_now.short_description = "Retry selected emails now"
+
+
 class DiscountUsageInline(admin.TabularInline):
     """
     Inline admin for DiscountUsage to show usage history in DiscountCode admin.
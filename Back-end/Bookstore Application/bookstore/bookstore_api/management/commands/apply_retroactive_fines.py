@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+
+from bookstore_api.services.return_fine_services import ReturnFineBatchService
+
+
+class Command(BaseCommand):
+    help = 'Create the missing late return fines of completed returns in bulk'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Compute and list the fines without writing them'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=None,
+            help='Number of returns to process per chunk (default: 1000)'
+        )
+
+    def handle(self, *args, **options):
+        result = ReturnFineBatchService.apply_fines(
+            batch_size=options['batch_size'],
+            dry_run=options['dry_run']
+        )
+
+        if options['dry_run']:
+            for row in result['preview']:
+                self.stdout.write(
+                    f"  return #{row['return_request_id']} (customer #{row['customer_id']}): "
+                    f"{row['hours_late']}h late, ${row['fine_amount']}"
+                )
+            self.stdout.write(
+                f"Would create {result['fines_created']} fines totalling ${result['total_amount']}"
+            )
+            return
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {result['fines_created']} fines totalling ${result['total_amount']}"
+        ))
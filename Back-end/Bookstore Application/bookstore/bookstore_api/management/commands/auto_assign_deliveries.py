@@ -0,0 +1,53 @@
+from django.core.management.base import BaseCommand
+
+from bookstore_api.services.delivery_assignment_services import DeliveryAssignmentService
+
+
+class Command(BaseCommand):
+    help = 'Assign pending delivery requests to online delivery managers by distance and load'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Compute the assignments without saving them'
+        )
+        parser.add_argument(
+            '--max-load',
+            type=int,
+            default=None,
+            help='Maximum open tasks per delivery manager (default: DELIVERY_AUTO_ASSIGN_MAX_LOAD or 3)'
+        )
+        parser.add_argument(
+            '--max-distance-km',
+            type=float,
+            default=None,
+            help='Do not assign couriers further away than this'
+        )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=None,
+            help='Maximum number of pending requests to process in this run'
+        )
+
+    def handle(self, *args, **options):
+        result = DeliveryAssignmentService.auto_assign_pending(
+            dry_run=options['dry_run'],
+            max_load=options['max_load'],
+            max_distance_km=options['max_distance_km'],
+            limit=options['limit'],
+        )
+
+        for assignment in result['assignments']:
+            distance = assignment['distance_km']
+            self.stdout.write(
+                f"Request {assignment['delivery_request_id']} -> manager {assignment['delivery_manager_id']}"
+                + (f" ({distance} km)" if distance is not None else '')
+            )
+
+        prefix = '[dry run] ' if result['dry_run'] else ''
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix}Assigned {result['assigned']} of {result['pending']} pending requests "
+            f"across {result['couriers']} online couriers ({result['unassigned']} left unassigned)"
+        ))
@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from bookstore_api.models import DeliveryProfile, User
+
+
+class Command(BaseCommand):
+    help = 'Create the missing delivery profiles of delivery administrators and fix empty statuses'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Report what would change without saving anything'
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            missing_user_ids = list(
+                User.objects.filter(
+                    user_type='delivery_admin',
+                    delivery_profile__isnull=True
+                ).values_list('id', flat=True)
+            )
+            empty_status = DeliveryProfile.objects.filter(delivery_status__isnull=True)
+
+            if options['dry_run']:
+                self.stdout.write(self.style.SUCCESS(
+                    f"[dry run] {len(missing_user_ids)} profile(s) to create, "
+                    f"{empty_status.count()} empty status(es) to fix"
+                ))
+                return
+
+            DeliveryProfile.objects.bulk_create(
+                [
+                    DeliveryProfile(user_id=user_id, delivery_status='offline', is_tracking_active=False)
+                    for user_id in missing_user_ids
+                ],
+                batch_size=500,
+                ignore_conflicts=True,
+            )
+            fixed = empty_status.update(delivery_status='offline')
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {len(missing_user_ids)} delivery profile(s), fixed {fixed} empty status(es)"
+        ))
@@ -0,0 +1,37 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from bookstore_api.services.idempotency_services import IdempotencyService
+
+
+class Command(BaseCommand):
+    help = 'Delete idempotency keys whose TTL has passed'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Number of keys to delete per statement'
+        )
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Keep cleaning up instead of exiting after one pass'
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=3600.0,
+            help='Seconds to wait between passes (with --loop)'
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            deleted = IdempotencyService.cleanup_expired(batch_size=options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} expired idempotency keys"))
+
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
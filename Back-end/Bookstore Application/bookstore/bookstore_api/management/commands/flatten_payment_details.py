@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from bookstore_api.models import Payment
+
+
+class Command(BaseCommand):
+    help = 'Copy card and cash on delivery details from the legacy payment subclass tables onto the payment rows'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Count the payments to copy without writing'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Legacy rows read per query (default: 1000)'
+        )
+
+    def handle(self, *args, **options):
+        copied = Payment.flatten_legacy_details(
+            dry_run=options['dry_run'],
+            batch_size=options['batch_size']
+        )
+        verb = 'Would copy' if options['dry_run'] else 'Copied'
+        for table, count in copied.items():
+            self.stdout.write(f"{verb} details of {count} payments from {table}")
+        if not options['dry_run']:
+            self.stdout.write(self.style.SUCCESS('Payment details flattened'))
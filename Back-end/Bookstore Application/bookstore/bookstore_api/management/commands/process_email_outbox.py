@@ -0,0 +1,66 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from bookstore_api.services.notification_services import EmailOutboxService
+
+
+class Command(BaseCommand):
+    help = (
+        'Deliver queued emails from the email outbox. '
+        'Use the locmem or filebased EMAIL_BACKEND for local testing.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=None,
+            help='Number of emails to send per batch (default: EMAIL_OUTBOX_BATCH_SIZE or 50)'
+        )
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Keep polling the outbox instead of exiting once it is drained'
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=5.0,
+            help='Seconds to wait between polls when the outbox is empty (with --loop)'
+        )
+        parser.add_argument(
+            '--cleanup-days',
+            type=int,
+            default=None,
+            help='Also delete sent emails older than this many days'
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options['batch_size']
+        total_sent = 0
+        total_failed = 0
+
+        while True:
+            result = EmailOutboxService.process_outbox(batch_size=batch_size)
+            total_sent += result['sent']
+            total_failed += result['failed']
+
+            if result['claimed']:
+                self.stdout.write(
+                    f"Processed {result['claimed']} emails: "
+                    f"{result['sent']} sent, {result['failed']} failed"
+                )
+                continue
+
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+
+        if options['cleanup_days'] is not None:
+            deleted = EmailOutboxService.cleanup_sent_emails(days=options['cleanup_days'])
+            self.stdout.write(f'Deleted {deleted} sent emails')
+
+        self.stdout.write(
+            self.style.SUCCESS(f'Outbox drained: {total_sent} sent, {total_failed} failed')
+        )
@@ -0,0 +1,39 @@
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from bookstore_api.services.delivery_metrics_services import DeliveryMetricsService
+
+
+class Command(BaseCommand):
+    help = 'Recompute the daily delivery performance rollups from the delivery event log'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--start',
+            type=str,
+            default=None,
+            help='First day to rebuild (YYYY-MM-DD, default: 30 days ago)'
+        )
+        parser.add_argument(
+            '--end',
+            type=str,
+            default=None,
+            help='Last day to rebuild (YYYY-MM-DD, default: today)'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            end_date = date.fromisoformat(options['end']) if options['end'] else timezone.localdate()
+            start_date = date.fromisoformat(options['start']) if options['start'] else end_date - timedelta(days=30)
+        except ValueError as e:
+            raise CommandError(f'Invalid date: {e}')
+
+        if start_date > end_date:
+            raise CommandError('--start must not be after --end')
+
+        written = DeliveryMetricsService.rebuild_rollups(start_date, end_date)
+        self.stdout.write(self.style.SUCCESS(
+            f'Rebuilt {written} delivery rollup(s) for {start_date} - {end_date}'
+        ))
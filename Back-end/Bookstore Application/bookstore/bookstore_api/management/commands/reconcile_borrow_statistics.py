@@ -0,0 +1,39 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from bookstore_api.models import BookBorrowStatistics, BorrowStatistics
+
+
+class Command(BaseCommand):
+    help = 'Recount per-book and daily borrowing statistics to repair counter drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Report drifted books without writing (daily rows are left untouched)'
+        )
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=1,
+            help='Number of days, ending today, whose daily statistics are recounted'
+        )
+
+    def handle(self, *args, **options):
+        drifted = BookBorrowStatistics.rebuild(dry_run=options['dry_run'])
+        if options['dry_run']:
+            self.stdout.write(f"{len(drifted)} books have drifted borrowing statistics")
+            for book_id in drifted[:50]:
+                self.stdout.write(f"  book #{book_id}")
+            return
+
+        today = timezone.now().date()
+        for offset in range(max(options['days'], 0)):
+            BorrowStatistics.rebuild_for_date(today - timedelta(days=offset))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Repaired statistics of {len(drifted)} books and recounted {options['days']} daily rows"
+        ))
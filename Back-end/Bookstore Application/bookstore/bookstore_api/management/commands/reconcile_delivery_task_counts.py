@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from bookstore_api.models import DeliveryProfile
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the stored active task counter of delivery profiles from the delivery requests'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Report the profiles whose counter is wrong without fixing them'
+        )
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Recount every profile instead of only the mismatched ones'
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            mismatched = list(DeliveryProfile.get_mismatched_task_counts().select_for_update())
+
+            for profile_id, user_id, stored, expected in mismatched:
+                self.stdout.write(
+                    f"Profile {profile_id} (user {user_id}): stored {stored}, expected {expected}"
+                )
+
+            if options['dry_run']:
+                self.stdout.write(self.style.SUCCESS(
+                    f"[dry run] {len(mismatched)} delivery profile(s) have a wrong active task count"
+                ))
+                return
+
+            if options['all']:
+                updated = DeliveryProfile.rebuild_active_task_counts()
+            elif mismatched:
+                updated = DeliveryProfile.rebuild_active_task_counts(
+                    profile_ids=[row[0] for row in mismatched]
+                )
+            else:
+                updated = 0
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Recounted {updated} delivery profile(s), fixed {len(mismatched)} mismatched counter(s)"
+        ))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from bookstore_api.models import DiscountRedemptionCounter
+
+
+class Command(BaseCommand):
+    help = 'Recount discount redemption counters and global redemption counts from the usage records'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Report drifted counters without writing'
+        )
+
+    def handle(self, *args, **options):
+        drifted = DiscountRedemptionCounter.rebuild(dry_run=options['dry_run'])
+        prefix = 'Found' if options['dry_run'] else 'Repaired'
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix} {drifted['counters']} customer counters, {drifted['discount_codes']} discount codes "
+            f"and {drifted['book_discounts']} book discounts with drifted redemption counts"
+        ))
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from bookstore_api.models import CustomerFineLedger
+
+
+class Command(BaseCommand):
+    help = 'Recount customer fine ledgers from the unpaid fines to repair balance drift'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Report drifted customers without writing'
+        )
+
+    def handle(self, *args, **options):
+        drifted = CustomerFineLedger.rebuild(dry_run=options['dry_run'])
+        if options['dry_run']:
+            self.stdout.write(f"{len(drifted)} customers have drifted fine ledgers")
+            for customer_id in drifted[:50]:
+                self.stdout.write(f"  customer #{customer_id}")
+            return
+
+        self.stdout.write(self.style.SUCCESS(f"Repaired fine ledgers of {len(drifted)} customers"))
@@ -0,0 +1,47 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from bookstore_api.services.borrowing_sweep_services import BorrowingSweepService
+
+
+class Command(BaseCommand):
+    help = 'Mark overdue loans as late and send return reminders that are due'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=None,
+            help='Number of loans to process per chunk (default: BORROW_SWEEP_BATCH_SIZE or 500)'
+        )
+        parser.add_argument(
+            '--full',
+            action='store_true',
+            help='Remind every loan in the reminder window again, even if already reminded'
+        )
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Keep sweeping instead of exiting after one pass'
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=300.0,
+            help='Seconds to wait between passes (with --loop)'
+        )
+
+    def handle(self, *args, **options):
+        full = options['full']
+        while True:
+            result = BorrowingSweepService.run_all(batch_size=options['batch_size'], full=full)
+            self.stdout.write(self.style.SUCCESS(
+                f"Marked {result['overdue']} loans as late and sent {result['reminders']} return reminders"
+            ))
+
+            if not options['loop']:
+                break
+            # Only the first pass re-sends reminders
+            full = False
+            time.sleep(options['interval'])
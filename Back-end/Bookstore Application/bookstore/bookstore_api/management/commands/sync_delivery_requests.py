@@ -0,0 +1,39 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from bookstore_api.services.delivery_sync_services import DeliveryRequestSyncService
+
+
+class Command(BaseCommand):
+    help = 'Create the missing delivery requests of return and borrow requests'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=None,
+            help='Number of source requests to process per chunk (default: 500)'
+        )
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Keep syncing instead of exiting after one pass'
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=60.0,
+            help='Seconds to wait between passes (with --loop)'
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            result = DeliveryRequestSyncService.sync_all(batch_size=options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(
+                f"Created {result['return']} return and {result['borrow']} borrow delivery requests"
+            ))
+
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
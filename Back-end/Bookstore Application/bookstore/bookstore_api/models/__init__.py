@@ -1,41 +1,42 @@
 from .user_model import User, UserProfile
 from .library_model import Book, Author, Library, BookImage, Category, BookEvaluation, Favorite, Like, ReviewReply        
 from .cart_model import Cart, CartItem
-from .payment_model import Payment, CreditCardPayment, CashOnDeliveryPayment
+from .payment_model import Payment, CreditCardPayment, CashOnDeliveryPayment, IdempotencyKey
 from .order_model import Order, OrderItem, DeliveryActivity, OrderNote, Delivery
-from .delivery_model import DeliveryRequest
-from .notification_model import Notification, NotificationType
+from .delivery_model import DeliveryRequest, LocationHistory, DeliveryRun, DeliveryRunStop
+from .notification_model import Notification, NotificationType, EmailOutbox
 from .borrowing_model import (
-    BorrowRequest, BorrowExtension, BorrowStatistics,
+    BorrowRequest, BorrowExtension, BorrowStatistics, BookBorrowStatistics, BorrowSweepCheckpoint,
     BorrowStatusChoices, ExtensionStatusChoices, FineStatusChoices
 )
-from .discount_model import DiscountCode, DiscountUsage, BookDiscount, BookDiscountUsage, AppliedDiscountCode
+from .discount_model import DiscountCode, DiscountUsage, BookDiscount, BookDiscountUsage, AppliedDiscountCode, DiscountRedemptionCounter
 from .complaint_model import Complaint, ComplaintResponse
 from .report_model import Report, ReportTemplate
 from .ad_model import Advertisement, AdvertisementStatusChoices
 from .user_preferences_model import UserNotificationPreferences, UserPrivacyPreferences, UserPreference
 from .help_support_model import FAQ, UserGuide, TroubleshootingGuide, SupportContact
 from .delivery_profile_model import DeliveryProfile
+from .delivery_metrics_model import DeliveryEvent, DeliveryDailyRollup
 from .return_model import (
     ReturnRequest, ReturnStatus, ReturnFine, 
-    ReturnFinePaymentMethod, ReturnFinePaymentStatus, FineReason
+    ReturnFinePaymentMethod, ReturnFinePaymentStatus, FineReason, FineRateTable, CustomerFineLedger
 )
 __all__ = [
     'User', 'UserProfile',  
     'Library', 'Book','BookImage', 'Category', 'Author',
     'Cart', 'CartItem',
-    'Payment', 'CreditCardPayment', 'CashOnDeliveryPayment',
-    'Order', 'OrderItem', 'DeliveryActivity', 'DeliveryRequest', 'OrderNote', 'Delivery',
-    'Notification', 'NotificationType', 'BookEvaluation', 'Favorite', 'Like', 'ReviewReply',
-    'BorrowRequest', 'BorrowExtension', 'BorrowFine', 'BorrowStatistics',
+    'Payment', 'CreditCardPayment', 'CashOnDeliveryPayment', 'IdempotencyKey',
+    'Order', 'OrderItem', 'DeliveryActivity', 'DeliveryRequest', 'LocationHistory', 'DeliveryRun', 'DeliveryRunStop', 'OrderNote', 'Delivery',
+    'Notification', 'NotificationType', 'EmailOutbox', 'BookEvaluation', 'Favorite', 'Like', 'ReviewReply',
+    'BorrowRequest', 'BorrowExtension', 'BorrowFine', 'BorrowStatistics', 'BookBorrowStatistics', 'BorrowSweepCheckpoint',
     'BorrowStatusChoices', 'ExtensionStatusChoices', 'FineStatusChoices',
-    'DiscountCode', 'DiscountUsage', 'BookDiscount', 'BookDiscountUsage', 'AppliedDiscountCode',
+    'DiscountCode', 'DiscountUsage', 'BookDiscount', 'BookDiscountUsage', 'AppliedDiscountCode', 'DiscountRedemptionCounter',
     'Complaint', 'ComplaintResponse',
     'Report', 'ReportTemplate',
     'Advertisement', 'AdvertisementStatusChoices',
     'UserNotificationPreferences', 'UserPrivacyPreferences', 'UserPreference',
     'FAQ', 'UserGuide', 'TroubleshootingGuide', 'SupportContact',
-    'DeliveryProfile',
+    'DeliveryProfile', 'DeliveryEvent', 'DeliveryDailyRollup',
     'ReturnRequest', 'ReturnStatus', 'ReturnFine',
-    'ReturnFinePaymentMethod', 'ReturnFinePaymentStatus', 'FineReason'
+    'ReturnFinePaymentMethod', 'ReturnFinePaymentStatus', 'FineReason', 'FineRateTable', 'CustomerFineLedger'
 ]
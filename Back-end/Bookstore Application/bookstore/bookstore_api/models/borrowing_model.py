@@ -1,4 +1,5 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Count, Max, Q
 from django.utils import timezone
 from datetime import timedelta
 from decimal import Decimal
@@ -120,6 +121,11 @@ class BorrowRequest(models.Model):
     # Return details
     actual_return_date = models.DateTimeField(null=True, blank=True)
     final_return_date = models.DateTimeField(null=True, blank=True)
+    reminded_return_date = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text="final_return_date the customer was last reminded of; a new return date is reminded again"
+    )
     
     # Fine information
     fine_amount = models.DecimalField(
@@ -166,22 +172,84 @@ class BorrowRequest(models.Model):
         verbose_name_plural = 'Borrow Requests'
         ordering = ['-created_at']
         indexes = [
+            # Kept next to the composite indexes below until EXPLAIN on a
+            # production-sized table shows no query still picks them
             models.Index(fields=['customer']),
             models.Index(fields=['book']),
             models.Index(fields=['status']),
             models.Index(fields=['request_date']),
             models.Index(fields=['expected_return_date']),
             models.Index(fields=['fine_status']),
+            # Overdue and return reminder sweeps: status IN (...) AND final_return_date range,
+            # read in (final_return_date, id) order (InnoDB appends the primary key)
+            models.Index(fields=['status', 'final_return_date']),
+            # Late book reports: status = late AND expected_return_date < now
+            models.Index(fields=['status', 'expected_return_date']),
+            # Admin queues: status filter ordered by request_date (pending, all borrowings)
+            models.Index(fields=['status', 'request_date']),
+            # Customer history and dashboard counts: customer, optional status, ordered by request_date
+            models.Index(fields=['customer', 'status', 'request_date']),
+            # Courier queues: delivery_person with status
+            models.Index(fields=['delivery_person', 'status']),
         ]
     
     def __str__(self):
         return f"{self.customer.get_full_name()} - {self.book.name} ({self.get_status_display()})"
     
+    # Fields whose changes are folded into the borrowing statistics
+    STATISTICS_FIELDS = ('status', 'delivery_date')
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        loaded = dict(zip(field_names, values))
+        instance._loaded_statistics_values = {
+            field: loaded[field] for field in cls.STATISTICS_FIELDS if field in loaded
+        }
+        return instance
+    
     def save(self, *args, **kwargs):
         """Override save to set expected return date if not set."""
         if not self.expected_return_date:
             self.expected_return_date = timezone.now() + timedelta(days=self.borrow_period_days)
+        created = self._state.adding
         super().save(*args, **kwargs)
+        self._sync_statistics(created)
+    
+    def _sync_statistics(self, created):
+        """
+        Apply the changes of this save to the per-book and daily statistics
+        as deltas instead of recounting them.
+        """
+        loaded = getattr(self, '_loaded_statistics_values', None)
+        if loaded is None and not created:
+            # Not loaded from the database, so the previous values are unknown
+            return
+        loaded = loaded or {}
+        current = {field: getattr(self, field) for field in self.STATISTICS_FIELDS}
+        previous = {
+            field: None if created else loaded.get(field, current[field])
+            for field in self.STATISTICS_FIELDS
+        }
+        self._loaded_statistics_values = current
+        
+        total, borrows = BookBorrowStatistics.status_deltas(previous['status'], current['status'])
+        last_borrowed = None
+        if current['delivery_date'] and current['delivery_date'] != previous['delivery_date']:
+            last_borrowed = current['delivery_date']
+        
+        if total or borrows or last_borrowed:
+            BookBorrowStatistics.apply_delta(
+                self.book_id,
+                total=total,
+                current=borrows,
+                last_borrowed=last_borrowed
+            )
+        
+        if created:
+            BorrowStatistics.increment('new_borrows')
+        if current['status'] == BorrowStatusChoices.RETURNED and previous['status'] != BorrowStatusChoices.RETURNED:
+            BorrowStatistics.increment('returns')
     
     def is_overdue(self):
         """Check if the borrow request is overdue."""
@@ -206,14 +274,13 @@ class BorrowRequest(models.Model):
     
     def calculate_fine(self):
         """Calculate fine amount for late return.
-        Fine is imposed after 1 hour at $0.10 per hour.
+        Priced per full hour late with the fine rate table in effect.
         Note: This method is for reference. Actual fine calculation is done in ReturnService."""
         if self.is_overdue():
             hours_overdue = self.get_hours_overdue()
             if hours_overdue > 0:
-                # Fine rate: $0.10 per hour overdue
-                fine_rate = 0.10
-                return hours_overdue * fine_rate
+                from ..services.fine_pricing_services import FinePricingEngine
+                return float(FinePricingEngine.quote(hours_late=hours_overdue)['late_fee'])
         return 0.00
     
     def set_deposit_amount(self, amount):
@@ -357,6 +424,7 @@ class BorrowExtension(models.Model):
         borrow.save()
         
         self.save()
+        BorrowStatistics.increment('extensions')
     
     def reject(self, rejected_by, reason):
         """Reject the extension request."""
@@ -401,12 +469,25 @@ class BorrowStatistics(models.Model):
         stats, created = cls.objects.get_or_create(date=today)
         return stats
     
+    @classmethod
+    def increment(cls, field, amount=1, day=None):
+        """
+        Add to one of the daily counters with a single UPDATE.
+        Called on each transition, so the day's row never needs a full recount.
+        """
+        day = day or timezone.now().date()
+        cls.objects.get_or_create(date=day)
+        cls.objects.filter(date=day).update(**{field: models.F(field) + amount})
+    
     @classmethod
     def update_today_stats(cls):
-        """Update statistics for today."""
-        stats = cls.get_or_create_today()
-        
-        today = timezone.now().date()
+        """Recount statistics for today (reconciliation of the incremental counters)."""
+        return cls.rebuild_for_date(timezone.now().date())
+    
+    @classmethod
+    def rebuild_for_date(cls, today):
+        """Recount the daily counters of one day from the source tables."""
+        stats, created = cls.objects.get_or_create(date=today)
         
         # Count new borrows today
         stats.new_borrows = BorrowRequest.objects.filter(
@@ -439,4 +520,185 @@ class BorrowStatistics(models.Model):
         ).count()
         
         stats.save()
-        return stats
\ No newline at end of file
+        return stats
+
+class BorrowSweepCheckpoint(models.Model):
+    """
+    Bookkeeping row of a scheduled borrowing sweep.
+    The row is locked while a chunk is processed, so overlapping runs of the
+    same sweep wait for each other instead of handling the same loans twice.
+    Which loans are due is decided by the loans themselves (status and
+    reminded_return_date), not by a position stored here.
+    """
+    
+    SWEEP_CHOICES = [
+        ('overdue', 'Overdue Loans'),
+        ('due_soon', 'Return Reminders'),
+    ]
+    
+    name = models.CharField(
+        max_length=30,
+        unique=True,
+        choices=SWEEP_CHOICES,
+        help_text="Sweep the checkpoint belongs to"
+    )
+    processed_count = models.PositiveIntegerField(
+        default=0,
+        help_text="Loans processed since the checkpoint was created or reset"
+    )
+    last_run_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text="When the sweep last processed a chunk"
+    )
+    
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        db_table = 'borrow_sweep_checkpoint'
+        verbose_name = 'Borrow Sweep Checkpoint'
+        verbose_name_plural = 'Borrow Sweep Checkpoints'
+    
+    def __str__(self):
+        return f"{self.get_name_display()} checkpoint ({self.processed_count} processed)"
+    
+    def reset(self):
+        """Reset the processed counter; the caller saves."""
+        self.processed_count = 0
+
+
+class BookBorrowStatistics(models.Model):
+    """
+    Per-book borrowing counters.
+    Maintained with deltas on every status or delivery date change of a
+    borrow request (see BorrowRequest.save); bulk updates that bypass save() are
+    caught by the reconcile_borrow_statistics command, which recounts them.
+    """
+    
+    # Borrow statuses counted in total_borrows and current_borrows
+    COUNTED_STATUSES = [BorrowStatusChoices.ACTIVE, BorrowStatusChoices.EXTENDED, BorrowStatusChoices.RETURNED]
+    CURRENT_STATUSES = [BorrowStatusChoices.ACTIVE, BorrowStatusChoices.EXTENDED]
+    
+    book = models.OneToOneField(
+        Book,
+        on_delete=models.CASCADE,
+        related_name='borrow_stats',
+        help_text="Book the counters belong to"
+    )
+    total_borrows = models.PositiveIntegerField(default=0, help_text="Active, extended and returned borrows")
+    current_borrows = models.PositiveIntegerField(default=0, help_text="Active and extended borrows")
+    last_borrowed = models.DateTimeField(null=True, blank=True, help_text="Latest delivery date")
+    
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        db_table = 'book_borrow_statistics'
+        verbose_name = 'Book Borrow Statistics'
+        verbose_name_plural = 'Book Borrow Statistics'
+        indexes = [
+            models.Index(fields=['total_borrows']),
+        ]
+    
+    def __str__(self):
+        return f"Borrow Statistics for book #{self.book_id}"
+    
+    @classmethod
+    def status_deltas(cls, old_status, new_status):
+        """(total_borrows, current_borrows) change of a status transition."""
+        return (
+            int(new_status in cls.COUNTED_STATUSES) - int(old_status in cls.COUNTED_STATUSES),
+            int(new_status in cls.CURRENT_STATUSES) - int(old_status in cls.CURRENT_STATUSES),
+        )
+    
+    @classmethod
+    def apply_delta(cls, book_id, total=0, current=0, last_borrowed=None):
+        """
+        Add deltas to a book's counters under a row lock.
+        Callers apply the deltas of changes already written, so a book without
+        a counter row is seeded by recounting its borrow requests (which
+        include the change) instead of starting from zero.
+        """
+        with transaction.atomic():
+            stats = cls.objects.select_for_update().filter(book_id=book_id).first()
+            if stats is None:
+                cls.rebuild(book_ids=[book_id])
+                return
+            stats.total_borrows = max(stats.total_borrows + total, 0)
+            stats.current_borrows = max(stats.current_borrows + current, 0)
+            if last_borrowed and (stats.last_borrowed is None or last_borrowed > stats.last_borrowed):
+                stats.last_borrowed = last_borrowed
+            stats.save()
+    
+    @classmethod
+    def apply_status_changes(cls, changes):
+        """
+        Apply the counter deltas of status changes made with a bulk update().
+        
+        Args:
+            changes: Iterable of (book_id, old_status, new_status)
+        """
+        deltas = {}
+        for book_id, old_status, new_status in changes:
+            total, current = cls.status_deltas(old_status, new_status)
+            book_total, book_current = deltas.get(book_id, (0, 0))
+            deltas[book_id] = (book_total + total, book_current + current)
+        
+        # Lock in book order so concurrent writers cannot deadlock
+        for book_id, (total, current) in sorted(deltas.items()):
+            if total or current:
+                cls.apply_delta(book_id, total=total, current=current)
+    
+    @classmethod
+    def rebuild(cls, book_ids=None, dry_run=False):
+        """
+        Recount the counters from the borrow requests with one grouped query
+        and write the rows that drifted.
+        
+        Args:
+            book_ids: Optional books to restrict the rebuild to
+            dry_run: Only report the drifted books
+        
+        Returns:
+            List of book IDs whose counters were missing or wrong
+        """
+        borrows = BorrowRequest.objects.all()
+        existing = cls.objects.all()
+        if book_ids is not None:
+            borrows = borrows.filter(book_id__in=book_ids)
+            existing = existing.filter(book_id__in=book_ids)
+        
+        expected = {
+            row['book_id']: row
+            for row in borrows.values('book_id').annotate(
+                total=Count('id', filter=Q(status__in=cls.COUNTED_STATUSES)),
+                current=Count('id', filter=Q(status__in=cls.CURRENT_STATUSES)),
+                latest_delivery=Max('delivery_date'),
+            ).order_by()
+        }
+        existing = {stats.book_id: stats for stats in existing}
+        
+        fields = ['total_borrows', 'current_borrows', 'last_borrowed']
+        to_create = []
+        to_update = []
+        for book_id in sorted(set(expected) | set(existing)):
+            row = expected.get(book_id, {})
+            values = {
+                'total_borrows': row.get('total', 0),
+                'current_borrows': row.get('current', 0),
+                'last_borrowed': row.get('latest_delivery'),
+            }
+            
+            stats = existing.get(book_id)
+            if stats is None:
+                to_create.append(cls(book_id=book_id, **values))
+            elif any(getattr(stats, field) != value for field, value in values.items()):
+                for field, value in values.items():
+                    setattr(stats, field, value)
+                to_update.append(stats)
+        
+        if not dry_run:
+            with transaction.atomic():
+                cls.objects.bulk_create(to_create, batch_size=500, ignore_conflicts=True)
+                cls.objects.bulk_update(to_update, fields, batch_size=500)
+        
+        return [stats.book_id for stats in to_create + to_update]
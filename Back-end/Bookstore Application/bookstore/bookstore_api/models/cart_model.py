@@ -44,9 +44,23 @@ class Cart(models.Model):
         """Get the total number of items in the cart."""
         return sum(item.quantity for item in self.items.all())
     
+    def get_quote(self):
+        """
+        Price quote of the purchase items (see OrderPricingEngine), computed
+        once per instance.
+        """
+        if getattr(self, '_quote', None) is None:
+            from ..services.pricing_services import OrderPricingEngine
+            self._quote = OrderPricingEngine.quote_cart(self)
+        return self._quote
+    
+    def forget_quote(self):
+        """Drop the memoized quote after the items change."""
+        self._quote = None
+    
     def get_total_price(self):
-        """Calculate the total price of all items in the cart."""
-        return sum(item.get_total_price() for item in self.items.all())
+        """Calculate the total price of all items in the cart (book discounts applied)."""
+        return self.get_quote()['subtotal']
     
     def get_total_borrow_price(self):
         """Calculate the total borrow price of all items in the cart."""
@@ -59,13 +73,14 @@ class Cart(models.Model):
     def clear(self):
         """Remove all items from the cart."""
         self.items.all().delete()
+        self.forget_quote()
         self.save()
     
     def get_cart_summary(self):
         """Get a summary of the cart contents."""
         items = self.items.all()
         total_items = sum(item.quantity for item in items)
-        total_price = sum(item.get_total_price() for item in items)
+        total_price = self.get_total_price()
         total_borrow_price = sum(item.get_total_borrow_price() for item in items)
         
         return {
@@ -138,10 +153,23 @@ class CartItem(models.Model):
     def __str__(self):
         return f"{self.quantity}x {self.book.name} ({self.get_item_type_display()}) in {self.cart}"
     
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        if CartItem.cart.is_cached(self):
+            self.cart.forget_quote()
+    
+    def delete(self, *args, **kwargs):
+        if CartItem.cart.is_cached(self):
+            self.cart.forget_quote()
+        return super().delete(*args, **kwargs)
+    
     def get_total_price(self):
-        """Calculate the total price for this item (for purchase)."""
-        if self.item_type == 'purchase' and self.book.price:
-            return self.book.price * self.quantity
+        """Calculate the total price for this item (for purchase), from the cart's quote."""
+        if self.item_type != 'purchase':
+            return 0
+        for line in self.cart.get_quote()['items']:
+            if line['book_id'] == self.book_id:
+                return line['line_total']
         return 0
     
     def get_total_borrow_price(self):
@@ -221,7 +249,7 @@ class CartItem(models.Model):
         purchase_items = cls.objects.filter(cart=cart, item_type='purchase')
         borrow_items = cls.objects.filter(cart=cart, item_type='borrow')
         
-        purchase_total = sum(item.get_total_price() for item in purchase_items)
+        purchase_total = cart.get_total_price()
         borrow_total = sum(item.get_total_borrow_price() for item in borrow_items)
         
         return {
@@ -0,0 +1,166 @@
+from django.db import models
+from django.utils import timezone
+from .user_model import User
+
+
+# Upper bounds (seconds) of the duration histogram buckets; the last bucket is open-ended
+DURATION_BUCKETS = [
+    60, 120, 300, 600, 900, 1200, 1800, 2700, 3600, 5400,
+    7200, 10800, 14400, 21600, 43200, 86400, 172800, 345600,
+]
+
+
+class DeliveryEvent(models.Model):
+    """
+    Append-only log of delivery request state transitions.
+    Each event stores the time spent in the previous state, so SLA metrics
+    can be rolled up without re-reading the delivery requests.
+    """
+
+    EVENT_TYPE_CHOICES = [
+        ('assigned', 'Assigned'),
+        ('accepted', 'Accepted'),
+        ('started', 'Started'),
+        ('completed', 'Completed'),
+        ('rejected', 'Rejected'),
+    ]
+
+    # Duration metric measured by each event type
+    EVENT_METRICS = {
+        'assigned': 'assignment',
+        'accepted': 'acceptance',
+        'started': 'pickup',
+        'completed': 'transit',
+    }
+
+    delivery_request = models.ForeignKey(
+        'bookstore_api.DeliveryRequest',
+        on_delete=models.CASCADE,
+        related_name='events',
+        help_text="Delivery request the event belongs to"
+    )
+
+    delivery_manager = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='delivery_events',
+        limit_choices_to={'user_type': 'delivery_admin'},
+        help_text="Delivery manager handling the request at the time of the event"
+    )
+
+    event_type = models.CharField(
+        max_length=20,
+        choices=EVENT_TYPE_CHOICES,
+        help_text="State transition that happened"
+    )
+
+    delivery_type = models.CharField(
+        max_length=20,
+        help_text="Delivery type of the request: purchase, borrow, or return"
+    )
+
+    duration_seconds = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        help_text="Seconds spent in the previous state, when known"
+    )
+
+    occurred_at = models.DateTimeField(
+        default=timezone.now,
+        help_text="When the transition happened"
+    )
+
+    class Meta:
+        db_table = 'delivery_event'
+        verbose_name = 'Delivery Event'
+        verbose_name_plural = 'Delivery Events'
+        ordering = ['-occurred_at']
+        indexes = [
+            models.Index(fields=['occurred_at']),
+            models.Index(fields=['delivery_request', 'occurred_at']),
+            models.Index(fields=['delivery_manager', 'occurred_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.get_event_type_display()} - Delivery Request #{self.delivery_request_id}"
+
+    @property
+    def metric(self):
+        """Name of the duration metric this event measures, if any."""
+        return self.EVENT_METRICS.get(self.event_type)
+
+
+class DeliveryDailyRollup(models.Model):
+    """
+    Per-courier, per-day delivery performance aggregates.
+    Updated incrementally whenever delivery events are recorded.
+    Durations are kept as totals and histograms over DURATION_BUCKETS, which
+    can be merged across days and couriers to estimate p50/p95.
+    """
+
+    day = models.DateField(help_text="Day the events happened on")
+
+    delivery_manager = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='delivery_rollups',
+        limit_choices_to={'user_type': 'delivery_admin'},
+        help_text="Delivery manager the aggregates belong to"
+    )
+
+    assigned_count = models.PositiveIntegerField(default=0, help_text="Requests assigned")
+    accepted_count = models.PositiveIntegerField(default=0, help_text="Requests accepted")
+    started_count = models.PositiveIntegerField(default=0, help_text="Deliveries started")
+    completed_count = models.PositiveIntegerField(default=0, help_text="Deliveries completed")
+    rejected_count = models.PositiveIntegerField(default=0, help_text="Requests rejected")
+
+    duration_totals = models.JSONField(
+        default=dict,
+        help_text="Per metric: {'count': n, 'sum': seconds}"
+    )
+
+    duration_histograms = models.JSONField(
+        default=dict,
+        help_text="Per metric: list of counts per DURATION_BUCKETS bucket"
+    )
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'delivery_daily_rollup'
+        verbose_name = 'Delivery Daily Rollup'
+        verbose_name_plural = 'Delivery Daily Rollups'
+        ordering = ['-day']
+        unique_together = ['day', 'delivery_manager']
+        indexes = [
+            models.Index(fields=['day']),
+            models.Index(fields=['delivery_manager', 'day']),
+        ]
+
+    def __str__(self):
+        return f"Delivery rollup {self.day} - {self.delivery_manager_id}"
+
+    @staticmethod
+    def bucket_index(seconds):
+        """Index of the histogram bucket a duration falls into."""
+        for index, upper_bound in enumerate(DURATION_BUCKETS):
+            if seconds <= upper_bound:
+                return index
+        return len(DURATION_BUCKETS)
+
+    def add_event(self, event_type, duration_seconds=None, metric=None):
+        """Add one event to the in-memory aggregates; the caller saves."""
+        count_field = f'{event_type}_count'
+        setattr(self, count_field, getattr(self, count_field) + 1)
+
+        if metric is None or duration_seconds is None:
+            return
+
+        totals = self.duration_totals.setdefault(metric, {'count': 0, 'sum': 0})
+        totals['count'] += 1
+        totals['sum'] += duration_seconds
+
+        histogram = self.duration_histograms.setdefault(metric, [0] * (len(DURATION_BUCKETS) + 1))
+        histogram[self.bucket_index(duration_seconds)] += 1
@@ -1,5 +1,8 @@
+from datetime import timedelta
+
 from django.db import models
 from django.core.exceptions import ValidationError
+from django.utils import timezone
 from .user_model import User
 
 # Note: This file should also contain Order, OrderItem, DeliveryActivity, OrderNote, Delivery models
@@ -108,7 +111,7 @@ class DeliveryRequest(models.Model):
         decimal_places=7,
         null=True,
         blank=True,
-        help_text="Latitude coordinate for delivery location"
+        help_text="Last latitude reported by the delivery manager during the delivery"
     )
     
     longitude = models.DecimalField(
@@ -116,7 +119,24 @@ class DeliveryRequest(models.Model):
         decimal_places=7,
         null=True,
         blank=True,
-        help_text="Longitude coordinate for delivery location"
+        help_text="Last longitude reported by the delivery manager during the delivery"
+    )
+    
+    # Destination (geocoded from the delivery address by GeocodingService)
+    destination_latitude = models.DecimalField(
+        max_digits=10,
+        decimal_places=7,
+        null=True,
+        blank=True,
+        help_text="Latitude of the delivery address"
+    )
+    
+    destination_longitude = models.DecimalField(
+        max_digits=10,
+        decimal_places=7,
+        null=True,
+        blank=True,
+        help_text="Longitude of the delivery address"
     )
     
     # Delivery Address
@@ -214,6 +234,46 @@ class DeliveryRequest(models.Model):
         
         self.full_clean()
         super().save(*args, **kwargs)
+        self._sync_active_task_counts()
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        loaded = dict(zip(field_names, values))
+        instance._loaded_status = loaded.get('status')
+        instance._loaded_delivery_manager_id = loaded.get('delivery_manager_id')
+        return instance
+    
+    def _sync_active_task_counts(self):
+        """
+        Recount the stored active task counter of the delivery managers
+        affected by a status or manager change.
+        """
+        from .delivery_profile_model import DeliveryProfile
+        
+        old_status = getattr(self, '_loaded_status', None)
+        old_manager_id = getattr(self, '_loaded_delivery_manager_id', None)
+        self._loaded_status = self.status
+        self._loaded_delivery_manager_id = self.delivery_manager_id
+        
+        if old_status == self.status and old_manager_id == self.delivery_manager_id:
+            return
+        if (old_status not in DeliveryProfile.ACTIVE_TASK_STATUSES and
+                self.status not in DeliveryProfile.ACTIVE_TASK_STATUSES):
+            return
+        
+        DeliveryProfile.refresh_active_task_count(self.delivery_manager_id)
+        if old_manager_id and old_manager_id != self.delivery_manager_id:
+            DeliveryProfile.refresh_active_task_count(old_manager_id)
+    
+    def get_destination(self):
+        """
+        Get the destination as a tuple (latitude, longitude).
+        Returns None if the delivery address has not been geocoded.
+        """
+        if self.destination_latitude is not None and self.destination_longitude is not None:
+            return (float(self.destination_latitude), float(self.destination_longitude))
+        return None
     
     def get_related_entity(self):
         """Get the related entity based on delivery_type."""
@@ -225,3 +285,328 @@ class DeliveryRequest(models.Model):
             return self.return_request
         return None
 
+
+class LocationHistory(models.Model):
+    """
+    Append-only history of delivery manager GPS positions.
+    Rows are never updated; the latest position is the newest row per manager.
+    """
+    
+    TRACKING_TYPE_CHOICES = [
+        ('gps', 'GPS'),
+        ('network', 'Network'),
+        ('manual', 'Manual'),
+    ]
+    
+    delivery_manager = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='location_history',
+        limit_choices_to={'user_type': 'delivery_admin'},
+        help_text="Delivery manager who reported this position"
+    )
+    
+    delivery_assignment = models.ForeignKey(
+        DeliveryRequest,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='location_history',
+        help_text="Delivery request in progress when the position was recorded"
+    )
+    
+    latitude = models.DecimalField(
+        max_digits=10,
+        decimal_places=7,
+        help_text="Latitude coordinate"
+    )
+    
+    longitude = models.DecimalField(
+        max_digits=10,
+        decimal_places=7,
+        help_text="Longitude coordinate"
+    )
+    
+    address = models.TextField(
+        blank=True,
+        null=True,
+        help_text="Optional text address for the position"
+    )
+    
+    # Tracking metadata
+    tracking_type = models.CharField(
+        max_length=10,
+        choices=TRACKING_TYPE_CHOICES,
+        default='gps',
+        help_text="Source of the position fix"
+    )
+    
+    accuracy = models.FloatField(
+        null=True,
+        blank=True,
+        help_text="Horizontal accuracy in metres"
+    )
+    
+    speed = models.FloatField(
+        null=True,
+        blank=True,
+        help_text="Speed in metres per second"
+    )
+    
+    heading = models.FloatField(
+        null=True,
+        blank=True,
+        help_text="Heading in degrees from north"
+    )
+    
+    battery_level = models.PositiveSmallIntegerField(
+        null=True,
+        blank=True,
+        help_text="Device battery level in percent"
+    )
+    
+    network_type = models.CharField(
+        max_length=20,
+        blank=True,
+        null=True,
+        help_text="Device network type (wifi, 4g, ...)"
+    )
+    
+    # Timestamps
+    recorded_at = models.DateTimeField(
+        default=timezone.now,
+        help_text="When the device recorded the position"
+    )
+    
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        help_text="When the position was stored"
+    )
+    
+    class Meta:
+        db_table = 'location_history'
+        verbose_name = 'Location History'
+        verbose_name_plural = 'Location History'
+        ordering = ['-recorded_at']
+        indexes = [
+            models.Index(fields=['delivery_manager', 'recorded_at']),
+            models.Index(fields=['delivery_assignment', 'recorded_at']),
+        ]
+    
+    def __str__(self):
+        return f"{self.delivery_manager_id} @ ({self.latitude}, {self.longitude}) {self.recorded_at}"
+    
+    @classmethod
+    def record_batch(cls, delivery_manager, points, delivery_assignment=None):
+        """
+        Store many buffered positions for a delivery manager with one INSERT.
+        
+        Args:
+            delivery_manager: User instance (delivery_admin)
+            points: Iterable of dicts with latitude, longitude and optional
+                recorded_at, address, tracking_type, accuracy, speed, heading,
+                battery_level and network_type
+            delivery_assignment: Optional DeliveryRequest the points belong to
+        
+        Returns:
+            List of created LocationHistory instances
+        """
+        now = timezone.now()
+        entries = [
+            cls(
+                delivery_manager=delivery_manager,
+                delivery_assignment=delivery_assignment,
+                latitude=point['latitude'],
+                longitude=point['longitude'],
+                address=point.get('address'),
+                tracking_type=point.get('tracking_type') or 'gps',
+                accuracy=point.get('accuracy'),
+                speed=point.get('speed'),
+                heading=point.get('heading'),
+                battery_level=point.get('battery_level'),
+                network_type=point.get('network_type'),
+                recorded_at=point.get('recorded_at') or now,
+            )
+            for point in points
+        ]
+        return cls.objects.bulk_create(entries, batch_size=500)
+    
+    @classmethod
+    def get_latest_location(cls, delivery_manager):
+        """Get the most recent position for a delivery manager."""
+        return cls.objects.filter(
+            delivery_manager=delivery_manager
+        ).order_by('-recorded_at').first()
+    
+    @classmethod
+    def get_recent_locations(cls, delivery_manager, hours=24):
+        """Get positions recorded in the last `hours` hours, oldest first."""
+        since = timezone.now() - timedelta(hours=hours)
+        return cls.objects.filter(
+            delivery_manager=delivery_manager,
+            recorded_at__gte=since
+        ).order_by('recorded_at')
+    
+    @classmethod
+    def get_movement_summary(cls, delivery_manager, hours=24):
+        """
+        Summarize movement over the last `hours` hours.
+        Reads only coordinates and timestamps to keep long tracks cheap.
+        """
+        from ..utils import haversine_km
+        
+        points = list(
+            cls.get_recent_locations(delivery_manager, hours)
+            .values_list('latitude', 'longitude', 'recorded_at')
+        )
+        
+        total_distance_km = 0.0
+        for (lat1, lon1, _), (lat2, lon2, _) in zip(points, points[1:]):
+            total_distance_km += haversine_km(lat1, lon1, lat2, lon2)
+        
+        duration_seconds = 0
+        if len(points) > 1:
+            duration_seconds = (points[-1][2] - points[0][2]).total_seconds()
+        
+        average_speed_kmh = None
+        if duration_seconds > 0:
+            average_speed_kmh = round(total_distance_km / (duration_seconds / 3600), 2)
+        
+        return {
+            'hours': hours,
+            'total_points': len(points),
+            'total_distance_km': round(total_distance_km, 3),
+            'duration_seconds': int(duration_seconds),
+            'average_speed_kmh': average_speed_kmh,
+            'first_recorded_at': points[0][2] if points else None,
+            'last_recorded_at': points[-1][2] if points else None,
+        }
+
+
+class DeliveryRun(models.Model):
+    """
+    A multi-stop trip of one delivery manager.
+    Groups several purchase, borrow and return delivery requests that are
+    started together and completed stop by stop in route order.
+    """
+    
+    STATUS_CHOICES = [
+        ('planned', 'Planned'),
+        ('in_progress', 'In Progress'),
+        ('completed', 'Completed'),
+        ('cancelled', 'Cancelled'),
+    ]
+    
+    delivery_manager = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='delivery_runs',
+        limit_choices_to={'user_type': 'delivery_admin'},
+        help_text="Delivery manager driving the run"
+    )
+    
+    status = models.CharField(
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default='planned',
+        help_text="Current run status"
+    )
+    
+    start_latitude = models.DecimalField(
+        max_digits=10,
+        decimal_places=7,
+        null=True,
+        blank=True,
+        help_text="Latitude the route was planned from"
+    )
+    
+    start_longitude = models.DecimalField(
+        max_digits=10,
+        decimal_places=7,
+        null=True,
+        blank=True,
+        help_text="Longitude the route was planned from"
+    )
+    
+    planned_distance_km = models.FloatField(
+        null=True,
+        blank=True,
+        help_text="Length of the planned route over the stops with coordinates"
+    )
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True, help_text="When the run was started")
+    completed_at = models.DateTimeField(null=True, blank=True, help_text="When the last stop was completed")
+    
+    class Meta:
+        db_table = 'delivery_run'
+        verbose_name = 'Delivery Run'
+        verbose_name_plural = 'Delivery Runs'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['delivery_manager', 'status']),
+            models.Index(fields=['created_at']),
+        ]
+    
+    def __str__(self):
+        return f"Delivery Run #{self.id} - {self.get_status_display()}"
+    
+    def is_open(self):
+        """Check if the run is planned or in progress."""
+        return self.status in ['planned', 'in_progress']
+
+
+class DeliveryRunStop(models.Model):
+    """
+    One delivery request within a delivery run, in route order.
+    """
+    
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('completed', 'Completed'),
+        ('removed', 'Removed'),
+    ]
+    
+    run = models.ForeignKey(
+        DeliveryRun,
+        on_delete=models.CASCADE,
+        related_name='stops',
+        help_text="Run the stop belongs to"
+    )
+    
+    delivery_request = models.ForeignKey(
+        DeliveryRequest,
+        on_delete=models.CASCADE,
+        related_name='run_stops',
+        help_text="Delivery request served at this stop"
+    )
+    
+    sequence = models.PositiveIntegerField(help_text="Position of the stop in the route, starting at 1")
+    
+    status = models.CharField(
+        max_length=20,
+        choices=STATUS_CHOICES,
+        default='pending',
+        help_text="Stop status"
+    )
+    
+    distance_from_previous_km = models.FloatField(
+        null=True,
+        blank=True,
+        help_text="Planned distance from the previous stop or the start point"
+    )
+    
+    completed_at = models.DateTimeField(null=True, blank=True, help_text="When the stop was completed")
+    
+    class Meta:
+        db_table = 'delivery_run_stop'
+        verbose_name = 'Delivery Run Stop'
+        verbose_name_plural = 'Delivery Run Stops'
+        ordering = ['run', 'sequence']
+        unique_together = ['run', 'sequence']
+        indexes = [
+            models.Index(fields=['delivery_request', 'status']),
+        ]
+    
+    def __str__(self):
+        return f"Run #{self.run_id} stop {self.sequence} - Delivery Request #{self.delivery_request_id}"
@@ -1,4 +1,6 @@
 from django.db import models
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
 from django.contrib.auth import get_user_model
 from django.utils import timezone
 
@@ -17,6 +19,9 @@ class DeliveryProfile(models.Model):
         ('offline', 'Offline - Unavailable'),
     ]
     
+    # Delivery request statuses that keep a delivery manager busy
+    ACTIVE_TASK_STATUSES = ['accepted', 'in_delivery']
+    
     # One-to-one relationship with User
     user = models.OneToOneField(
         User,
@@ -76,6 +81,13 @@ class DeliveryProfile(models.Model):
         help_text="Last time location was updated via tracking"
     )
     
+    # Number of delivery requests in ACTIVE_TASK_STATUSES assigned to this manager.
+    # Recounted on every status transition; rebuild with reconcile_delivery_task_counts.
+    active_task_count = models.PositiveIntegerField(
+        default=0,
+        help_text="Number of accepted or in-delivery requests currently held by the delivery manager"
+    )
+    
     # Timestamps
     created_at = models.DateTimeField(
         auto_now_add=True,
@@ -95,6 +107,7 @@ class DeliveryProfile(models.Model):
             models.Index(fields=['user']),
             models.Index(fields=['delivery_status']),
             models.Index(fields=['is_tracking_active']),
+            models.Index(fields=['delivery_status', 'active_task_count']),
         ]
     
     def __str__(self):
@@ -139,6 +152,12 @@ class DeliveryProfile(models.Model):
         """
         return self.latitude is not None and self.longitude is not None
     
+    def has_active_tasks(self):
+        """
+        Check if the delivery manager is currently busy with a delivery.
+        """
+        return self.active_task_count > 0
+    
     def get_delivery_status_display(self):
         """
         Get the human-readable delivery status.
@@ -184,4 +203,57 @@ class DeliveryProfile(models.Model):
         return cls.objects.filter(
             delivery_status='online',
             is_tracking_active=True
-        ).select_related('user')
\ No newline at end of file
+        ).select_related('user')
+    
+    @staticmethod
+    def _active_task_count_subquery():
+        """
+        Correlated COUNT of active delivery requests for the profile's user.
+        """
+        from .delivery_model import DeliveryRequest
+        
+        active_requests = DeliveryRequest.objects.filter(
+            delivery_manager_id=OuterRef('user_id'),
+            status__in=DeliveryProfile.ACTIVE_TASK_STATUSES
+        ).order_by().values('delivery_manager_id').annotate(
+            total=Count('id')
+        ).values('total')
+        return Coalesce(Subquery(active_requests), 0)
+    
+    @classmethod
+    def refresh_active_task_count(cls, user_id):
+        """
+        Recount the active tasks of one delivery manager with a single UPDATE.
+        Runs inside the caller's transaction, so the counter commits together
+        with the status change that triggered it.
+        """
+        if user_id is None:
+            return 0
+        return cls.objects.filter(user_id=user_id).update(
+            active_task_count=cls._active_task_count_subquery()
+        )
+    
+    @classmethod
+    def get_mismatched_task_counts(cls):
+        """
+        Get profiles whose stored counter differs from the source tables.
+        
+        Returns:
+            QuerySet of (id, user_id, active_task_count, expected_task_count) tuples
+        """
+        return cls.objects.annotate(
+            expected_task_count=cls._active_task_count_subquery()
+        ).exclude(
+            active_task_count=F('expected_task_count')
+        ).values_list('id', 'user_id', 'active_task_count', 'expected_task_count')
+    
+    @classmethod
+    def rebuild_active_task_counts(cls, profile_ids=None):
+        """
+        Recount the active tasks of all (or the given) delivery profiles
+        with a single UPDATE.
+        """
+        profiles = cls.objects.all()
+        if profile_ids is not None:
+            profiles = profiles.filter(id__in=profile_ids)
+        return profiles.update(active_task_count=cls._active_task_count_subquery())
@@ -1,4 +1,5 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F, Q
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.core.exceptions import ValidationError
 from django.utils import timezone
@@ -21,16 +22,9 @@ class DiscountCodeManager(models.Manager):
         )
     
     def get_valid_code(self, code):
-        """Get a valid discount code by code string."""
-        now = timezone.now()
-        try:
-            return self.get(
-                code=code,
-                is_active=True,
-                expiration_date__gt=now
-            )
-        except DiscountCode.DoesNotExist:
-            return None
+        """Get a valid discount code by code string (from the active-discount snapshot)."""
+        from ..services.discount_snapshot_services import DiscountSnapshot
+        return DiscountSnapshot.get_discount_code(code)
     
     def cleanup_expired_codes(self):
         """Deactivate expired discount codes."""
@@ -67,6 +61,17 @@ class DiscountCode(models.Model):
         help_text="Maximum number of times each customer can use this code"
     )
     
+    max_redemptions = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        help_text="Maximum number of redemptions across all customers (no cap when empty)"
+    )
+    
+    redemption_count = models.PositiveIntegerField(
+        default=0,
+        help_text="Number of times this code has been redeemed"
+    )
+    
     expiration_date = models.DateTimeField(
         help_text="When this discount code expires"
     )
@@ -117,6 +122,17 @@ class DiscountCode(models.Model):
         if self.expiration_date and self.expiration_date <= timezone.now():
             raise ValidationError(_("Expiration date must be in the future."))
     
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        from ..services.discount_snapshot_services import DiscountSnapshot
+        DiscountSnapshot.invalidate()
+    
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        from ..services.discount_snapshot_services import DiscountSnapshot
+        DiscountSnapshot.invalidate()
+        return result
+    
     def is_expired(self):
         """Check if the discount code has expired."""
         return timezone.now() > self.expiration_date
@@ -125,22 +141,49 @@ class DiscountCode(models.Model):
         """Check if the discount code is valid (active and not expired)."""
         return self.is_active and not self.is_expired()
     
+    def is_exhausted(self):
+        """Check if the code has reached its global redemption cap."""
+        return self.max_redemptions is not None and self.redemption_count >= self.max_redemptions
+    
+    def get_usage_count_for_user(self, customer):
+        """Get the number of times a customer has redeemed this code."""
+        return DiscountRedemptionCounter.get_uses(customer, discount_code=self)
+    
     def can_be_used_by(self, customer):
         """Check if a customer can use this discount code."""
         if not self.is_valid():
             return False, "This discount code is not active or has expired."
         
-        # Check usage limit
-        usage_count = DiscountUsage.objects.filter(
-            discount_code=self,
-            customer=customer
-        ).count()
+        if self.is_exhausted():
+            return False, "This discount code has reached its maximum number of redemptions."
         
-        if usage_count >= self.usage_limit_per_customer:
+        # Check usage limit
+        if self.get_usage_count_for_user(customer) >= self.usage_limit_per_customer:
             return False, f"You have already used this discount code the maximum number of times ({self.usage_limit_per_customer})."
         
         return True, "Discount code can be used."
     
+    def redeem(self, customer):
+        """
+        Count one redemption of this code by a customer.
+        Both limits are enforced by conditional UPDATEs, so concurrent
+        checkouts cannot redeem past them; a refused redemption rolls back
+        its global increment.
+        
+        Raises:
+            ValidationError: If the code is exhausted or the customer's limit is reached
+        """
+        with transaction.atomic():
+            redeemed = DiscountCode.objects.filter(pk=self.pk).filter(
+                Q(max_redemptions__isnull=True) | Q(redemption_count__lt=F('max_redemptions'))
+            ).update(redemption_count=F('redemption_count') + 1)
+            if not redeemed:
+                raise ValidationError("This discount code has reached its maximum number of redemptions.")
+        
+            if not DiscountRedemptionCounter.increment(customer, self.usage_limit_per_customer, discount_code=self):
+                raise ValidationError(f"You have already used this discount code the maximum number of times ({self.usage_limit_per_customer}).")
+        self.redemption_count += 1
+    
     def get_discount_amount(self, order_total):
         """Calculate the discount amount for a given order total."""
         from decimal import Decimal
@@ -168,14 +211,16 @@ class DiscountCode(models.Model):
         if existing:
             raise ValidationError("This discount code has already been used for this order.")
         
-        usage = DiscountUsage(
-            discount_code=self,
-            customer=customer,
-            order=order,
-            discount_amount=self.get_discount_amount(order.total_amount)
-        )
-        usage.full_clean()  # Validate before saving
-        usage.save()
+        with transaction.atomic():
+            self.redeem(customer)
+            usage = DiscountUsage(
+                discount_code=self,
+                customer=customer,
+                order=order,
+                discount_amount=self.get_discount_amount(order.total_amount)
+            )
+            usage.full_clean()  # Validate before saving
+            usage.save()
         
         return usage
     
@@ -389,18 +434,9 @@ class BookDiscountManager(models.Manager):
         )
     
     def get_discount_for_book(self, book):
-        """Get active discount for a specific book."""
-        now = timezone.now()
-        today = now.date()
-        try:
-            return self.get(
-                book=book,
-                is_active=True,
-                start_date__date__lte=today,  # Use date comparison instead of datetime
-                end_date__gt=now
-            )
-        except BookDiscount.DoesNotExist:
-            return None
+        """Get active discount for a specific book (from the active-discount snapshot)."""
+        from ..services.discount_snapshot_services import DiscountSnapshot
+        return DiscountSnapshot.get_book_discount(getattr(book, 'pk', book))
     
     def cleanup_expired_discounts(self):
         """Deactivate expired book discounts."""
@@ -460,6 +496,17 @@ class BookDiscount(models.Model):
         help_text="Maximum number of times each customer can use this discount"
     )
     
+    max_redemptions = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        help_text="Maximum number of redemptions across all customers (no cap when empty)"
+    )
+    
+    redemption_count = models.PositiveIntegerField(
+        default=0,
+        help_text="Number of times this discount has been redeemed"
+    )
+    
     # Validity period
     start_date = models.DateTimeField(
         help_text="When this discount becomes active"
@@ -534,6 +581,17 @@ class BookDiscount(models.Model):
         if self.start_date and self.start_date <= timezone.now():
             raise ValidationError("Start date must be in the future.")
     
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        from ..services.discount_snapshot_services import DiscountSnapshot
+        DiscountSnapshot.invalidate()
+    
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        from ..services.discount_snapshot_services import DiscountSnapshot
+        DiscountSnapshot.invalidate()
+        return result
+    
     def is_expired(self):
         """Check if the discount has expired."""
         return timezone.now() > self.end_date
@@ -551,22 +609,46 @@ class BookDiscount(models.Model):
                 not self.is_expired() and 
                 not self.is_not_started())
     
+    def is_exhausted(self):
+        """Check if the discount has reached its global redemption cap."""
+        return self.max_redemptions is not None and self.redemption_count >= self.max_redemptions
+    
+    def get_usage_count_for_user(self, customer):
+        """Get the number of times a customer has redeemed this discount."""
+        return DiscountRedemptionCounter.get_uses(customer, book_discount=self)
+    
     def can_be_used_by(self, customer):
         """Check if a customer can use this discount."""
         if not self.is_valid():
             return False, "Discount is not currently active or has expired."
         
-        # Check usage limit
-        usage_count = DiscountUsage.objects.filter(
-            book_discount=self,
-            customer=customer
-        ).count()
+        if self.is_exhausted():
+            return False, "This discount has reached its maximum number of redemptions."
         
-        if usage_count >= self.usage_limit_per_customer:
+        # Check usage limit
+        if self.get_usage_count_for_user(customer) >= self.usage_limit_per_customer:
             return False, f"You have already used this discount the maximum number of times ({self.usage_limit_per_customer})."
         
         return True, "Discount can be used."
     
+    def redeem(self, customer):
+        """
+        Count one redemption of this discount by a customer (see DiscountCode.redeem).
+        
+        Raises:
+            ValidationError: If the discount is exhausted or the customer's limit is reached
+        """
+        with transaction.atomic():
+            redeemed = BookDiscount.objects.filter(pk=self.pk).filter(
+                Q(max_redemptions__isnull=True) | Q(redemption_count__lt=F('max_redemptions'))
+            ).update(redemption_count=F('redemption_count') + 1)
+            if not redeemed:
+                raise ValidationError("This discount has reached its maximum number of redemptions.")
+        
+            if not DiscountRedemptionCounter.increment(customer, self.usage_limit_per_customer, book_discount=self):
+                raise ValidationError(f"You have already used this discount the maximum number of times ({self.usage_limit_per_customer}).")
+        self.redemption_count += 1
+    
     def get_discount_amount(self, original_price):
         """Calculate the discount amount for a given original price."""
         return original_price - self.discounted_price
@@ -593,19 +675,37 @@ class BookDiscount(models.Model):
         discount_amount = self.get_discount_amount(original_price)
         final_price = self.get_final_price(original_price)
         
-        usage = DiscountUsage(
-            book_discount=self,
-            book=self.book,
-            customer=customer,
-            order=order,
-            original_price=original_price,
-            discount_amount=discount_amount,
-            final_price=final_price
-        )
-        usage.full_clean()  # Validate before saving
-        usage.save()
+        with transaction.atomic():
+            self.redeem(customer)
+            usage = DiscountUsage(
+                book_discount=self,
+                book=self.book,
+                customer=customer,
+                order=order,
+                original_price=original_price,
+                discount_amount=discount_amount,
+                final_price=final_price
+            )
+            usage.full_clean()  # Validate before saving
+            usage.save()
         
         return usage
+    
+    def use_for_order(self, customer, order):
+        """
+        Record usage of this discount by a customer's order at checkout.
+        A usage the customer already redeemed through the book discount apply
+        endpoint without an order is attached to the order instead of being
+        redeemed a second time.
+        """
+        pending = DiscountUsage.objects.filter(
+            book_discount=self, customer=customer, order__isnull=True
+        ).order_by('used_at').values_list('pk', flat=True)
+        for usage_id in pending:
+            # Conditional update, so two checkouts cannot attach the same usage
+            if DiscountUsage.objects.filter(pk=usage_id, order__isnull=True).update(order=order):
+                return DiscountUsage.objects.get(pk=usage_id)
+        return self.use_by_customer(customer, order)
 
 
 # NOTE: This model will be removed after migration 0011_merge_discount_usage_tables runs.
@@ -714,6 +814,192 @@ class BookDiscountUsage(models.Model):
         }
 
 
+class DiscountRedemptionCounter(models.Model):
+    """
+    Number of redemptions of a discount code or book discount by one customer.
+    Read by can_be_used_by instead of counting DiscountUsage rows, and
+    incremented with a conditional UPDATE by redeem(), so the per-customer
+    limit holds under concurrent checkouts.
+    """
+    discount_code = models.ForeignKey(
+        DiscountCode,
+        on_delete=models.CASCADE,
+        related_name='redemption_counters',
+        null=True,
+        blank=True,
+        help_text="Discount code redeemed (for general discounts)"
+    )
+    
+    book_discount = models.ForeignKey(
+        BookDiscount,
+        on_delete=models.CASCADE,
+        related_name='redemption_counters',
+        null=True,
+        blank=True,
+        help_text="Book discount redeemed (for book-specific discounts)"
+    )
+    
+    customer = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='discount_redemption_counters',
+        help_text="Customer who redeemed the discount"
+    )
+    
+    uses = models.PositiveIntegerField(
+        default=0,
+        help_text="Number of redemptions by the customer"
+    )
+    
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        db_table = 'discount_redemption_counter'
+        verbose_name = 'Discount Redemption Counter'
+        verbose_name_plural = 'Discount Redemption Counters'
+        # NULLs never collide in MySQL unique indexes, so each pair only
+        # constrains the rows of its own discount kind
+        unique_together = [
+            ['discount_code', 'customer'],
+            ['book_discount', 'customer'],
+        ]
+    
+    def __str__(self):
+        discount = self.discount_code or self.book_discount
+        return f"{self.customer_id} used {discount} {self.uses} time(s)"
+    
+    @classmethod
+    def _get_or_create(cls, customer, discount_code=None, book_discount=None):
+        """
+        Counter row of a customer and discount. A missing row is created with
+        the customer's existing DiscountUsage count.
+        """
+        lookup = {'customer': customer, 'discount_code': discount_code, 'book_discount': book_discount}
+        counter = cls.objects.filter(**lookup).first()
+        if counter is None:
+            uses = DiscountUsage.objects.filter(**lookup).count()
+            with transaction.atomic():
+                counter, _ = cls.objects.get_or_create(**lookup, defaults={'uses': uses})
+        return counter
+    
+    @classmethod
+    def get_uses(cls, customer, discount_code=None, book_discount=None):
+        """Number of redemptions of a discount by a customer."""
+        return cls._get_or_create(customer, discount_code, book_discount).uses
+    
+    @classmethod
+    def get_book_discount_uses(cls, customer_id, book_discount_ids):
+        """
+        Redemptions of several book discounts by a customer, in two queries at
+        most (discounts without a counter row are counted from DiscountUsage).
+    
+        Returns:
+            Dictionary of book_discount_id -> uses
+        """
+        uses = dict(
+            cls.objects.filter(customer_id=customer_id, book_discount_id__in=book_discount_ids).values_list(
+                'book_discount_id', 'uses'
+            )
+        )
+        missing = set(book_discount_ids) - set(uses)
+        if missing:
+            uses.update(
+                DiscountUsage.objects.filter(customer_id=customer_id, book_discount_id__in=missing).values_list(
+                    'book_discount_id'
+                ).annotate(uses=models.Count('id')).order_by()
+            )
+        return uses
+    
+    @staticmethod
+    def get_pending_book_discount_ids(customer_id, book_discount_ids):
+        """
+        Book discounts the customer redeemed through the apply endpoint that
+        no order has used yet. Checkout attaches those usages to the order
+        (BookDiscount.use_for_order), so they stay eligible for the customer.
+        """
+        return set(
+            DiscountUsage.objects.filter(
+                customer_id=customer_id, book_discount_id__in=book_discount_ids, order__isnull=True
+            ).values_list('book_discount_id', flat=True).distinct()
+        )
+    
+    @classmethod
+    def increment(cls, customer, limit, discount_code=None, book_discount=None):
+        """
+        Count one redemption unless the customer has reached the limit.
+        
+        Returns:
+            bool: Whether the redemption was counted
+        """
+        counter = cls._get_or_create(customer, discount_code, book_discount)
+        return bool(
+            cls.objects.filter(pk=counter.pk, uses__lt=limit).update(uses=F('uses') + 1)
+        )
+    
+    @classmethod
+    def rebuild(cls, dry_run=False):
+        """
+        Recount per-customer counters and the global redemption counts from
+        the DiscountUsage rows.
+        
+        Returns:
+            Dictionary with the number of drifted counters, codes and book discounts
+        """
+        expected = {
+            (row['discount_code_id'], row['book_discount_id'], row['customer_id']): row['uses']
+            for row in DiscountUsage.objects.values(
+                'discount_code_id', 'book_discount_id', 'customer_id'
+            ).annotate(uses=models.Count('id')).order_by()
+        }
+        existing = {
+            (counter.discount_code_id, counter.book_discount_id, counter.customer_id): counter
+            for counter in cls.objects.all()
+        }
+        
+        to_create = []
+        to_update = []
+        for key in set(expected) | set(existing):
+            uses = expected.get(key, 0)
+            counter = existing.get(key)
+            if counter is None:
+                discount_code_id, book_discount_id, customer_id = key
+                to_create.append(cls(
+                    discount_code_id=discount_code_id,
+                    book_discount_id=book_discount_id,
+                    customer_id=customer_id,
+                    uses=uses
+                ))
+            elif counter.uses != uses:
+                counter.uses = uses
+                to_update.append(counter)
+        
+        drifted_codes = []
+        for model, field in ((DiscountCode, 'discount_code'), (BookDiscount, 'book_discount')):
+            totals = dict(
+                DiscountUsage.objects.filter(**{f'{field}__isnull': False}).values_list(field).annotate(
+                    total=models.Count('id')
+                ).order_by()
+            )
+            for discount in model.objects.only('id', 'redemption_count'):
+                total = totals.get(discount.id, 0)
+                if discount.redemption_count != total:
+                    discount.redemption_count = total
+                    drifted_codes.append(discount)
+        
+        if not dry_run:
+            with transaction.atomic():
+                cls.objects.bulk_create(to_create, batch_size=500, ignore_conflicts=True)
+                cls.objects.bulk_update(to_update, ['uses'], batch_size=500)
+                for discount in drifted_codes:
+                    type(discount).objects.filter(pk=discount.pk).update(redemption_count=discount.redemption_count)
+        
+        return {
+            'counters': len(to_create) + len(to_update),
+            'discount_codes': sum(1 for discount in drifted_codes if isinstance(discount, DiscountCode)),
+            'book_discounts': sum(1 for discount in drifted_codes if isinstance(discount, BookDiscount)),
+        }
+
+
 class AppliedDiscountCode(models.Model):
     """
     Model to track discount codes applied during cart validation.
@@ -299,4 +299,123 @@ class Notification(models.Model):
             'unread': unread_count,
             'read': read_count,
             'archived': archived_count,
-        }
\ No newline at end of file
+        }
+
+
+class EmailOutbox(models.Model):
+    """
+    Transactional outbox for outgoing emails.
+    Rows are written in the same transaction as the business change and
+    delivered later by the `process_email_outbox` management command.
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('sending', 'Sending'),
+        ('sent', 'Sent'),
+        ('failed', 'Failed'),
+    ]
+    
+    # Message content
+    to_email = models.EmailField(
+        help_text="Recipient email address"
+    )
+    
+    from_email = models.CharField(
+        max_length=254,
+        blank=True,
+        null=True,
+        help_text="Sender address; falls back to DEFAULT_FROM_EMAIL when empty"
+    )
+    
+    subject = models.CharField(
+        max_length=255,
+        help_text="Email subject"
+    )
+    
+    body = models.TextField(
+        help_text="Plain text body"
+    )
+    
+    html_body = models.TextField(
+        blank=True,
+        null=True,
+        help_text="Optional HTML alternative body"
+    )
+    
+    # Delivery state
+    status = models.CharField(
+        max_length=10,
+        choices=STATUS_CHOICES,
+        default='pending',
+        help_text="Delivery status of the email"
+    )
+    
+    attempts = models.PositiveIntegerField(
+        default=0,
+        help_text="Number of delivery attempts made"
+    )
+    
+    max_attempts = models.PositiveIntegerField(
+        default=5,
+        help_text="Attempts allowed before the email is marked as failed"
+    )
+    
+    next_attempt_at = models.DateTimeField(
+        default=timezone.now,
+        help_text="Earliest time the next delivery attempt may run"
+    )
+    
+    last_error = models.TextField(
+        blank=True,
+        null=True,
+        help_text="Error message from the last failed attempt"
+    )
+    
+    # Timestamps
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        help_text="When the email was queued"
+    )
+    
+    sent_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        help_text="When the email was delivered"
+    )
+    
+    class Meta:
+        db_table = 'email_outbox'
+        verbose_name = 'Email Outbox Entry'
+        verbose_name_plural = 'Email Outbox'
+        ordering = ['next_attempt_at', 'id']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at']),
+            models.Index(fields=['created_at']),
+        ]
+    
+    def __str__(self):
+        return f"Email to {self.to_email}: {self.subject} ({self.status})"
+    
+    def mark_sent(self):
+        """Mark the email as delivered."""
+        self.status = 'sent'
+        self.sent_at = timezone.now()
+        self.last_error = None
+        self.save(update_fields=['status', 'sent_at', 'last_error'])
+    
+    def mark_attempt_failed(self, error, base_delay_seconds=60):
+        """
+        Record a failed delivery attempt and schedule the retry with
+        exponential backoff, or mark the email as failed when out of attempts.
+        The attempt itself was counted when the email was claimed.
+        """
+        from datetime import timedelta
+        
+        self.last_error = str(error)[:2000]
+        if self.attempts >= self.max_attempts:
+            self.status = 'failed'
+        else:
+            self.status = 'pending'
+            delay = base_delay_seconds * (2 ** max(self.attempts - 1, 0))
+            self.next_attempt_at = timezone.now() + timedelta(seconds=delay)
+        self.save(update_fields=['last_error', 'status', 'next_attempt_at'])
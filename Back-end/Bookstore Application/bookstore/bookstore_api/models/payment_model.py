@@ -1,5 +1,8 @@
 from django.db import models
-from django.core.validators import MinValueValidator
+from django.core.serializers.json import DjangoJSONEncoder
+from django.core.validators import MinValueValidator, MaxValueValidator
+from django.db import connections
+from django.utils import timezone
 from .user_model import User
 from .cart_model import Cart
 
@@ -24,6 +27,27 @@ class Payment(models.Model):
         ('digital_wallet', 'Digital Wallet'),
     ]
     
+    CARD_TYPE_CHOICES = [
+        ('visa', 'Visa'),
+        ('mastercard', 'Mastercard'),
+        ('amex', 'American Express'),
+        ('discover', 'Discover'),
+        ('other', 'Other'),
+    ]
+    
+    # Legacy multi-table inheritance tables and the columns copied from them
+    # by flatten_legacy_details
+    LEGACY_DETAIL_TABLES = {
+        'credit_card_payment': [
+            'card_number', 'card_type', 'expiry_month', 'expiry_year',
+            'cardholder_name', 'transaction_id', 'authorization_code',
+        ],
+        'cash_on_delivery_payment': [
+            'delivery_address', 'delivery_city', 'contact_phone', 'exact_change',
+            'preferred_delivery_time', 'delivery_notes',
+        ],
+    }
+    
     # Payment identification
     payment_id = models.CharField(
         max_length=50,
@@ -143,6 +167,99 @@ class Payment(models.Model):
         help_text="Reason for payment failure if applicable"
     )
     
+    # Method details are stored flat on the payment row (empty for other
+    # payment types), so listings read them without joining another table
+    
+    # Credit card details
+    card_number = models.CharField(
+        max_length=20,
+        blank=True,
+        null=True,
+        help_text="Last 4 digits of the credit card"
+    )
+    
+    card_type = models.CharField(
+        max_length=20,
+        choices=CARD_TYPE_CHOICES,
+        blank=True,
+        null=True,
+        help_text="Type of credit card"
+    )
+    
+    expiry_month = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        validators=[MinValueValidator(1), MaxValueValidator(12)],
+        help_text="Card expiry month (1-12)"
+    )
+    
+    expiry_year = models.PositiveIntegerField(
+        null=True,
+        blank=True,
+        validators=[MinValueValidator(2024)],
+        help_text="Card expiry year"
+    )
+    
+    cardholder_name = models.CharField(
+        max_length=100,
+        blank=True,
+        null=True,
+        help_text="Name on the credit card"
+    )
+    
+    transaction_id = models.CharField(
+        max_length=100,
+        blank=True,
+        null=True,
+        help_text="External transaction ID from payment processor"
+    )
+    
+    authorization_code = models.CharField(
+        max_length=50,
+        blank=True,
+        null=True,
+        help_text="Payment authorization code"
+    )
+    
+    # Cash on delivery details
+    delivery_address = models.TextField(
+        blank=True,
+        null=True,
+        help_text="Delivery address for cash collection"
+    )
+    
+    delivery_city = models.CharField(
+        max_length=100,
+        blank=True,
+        null=True,
+        help_text="City for delivery"
+    )
+    
+    contact_phone = models.CharField(
+        max_length=20,
+        blank=True,
+        null=True,
+        help_text="Contact phone for delivery"
+    )
+    
+    exact_change = models.BooleanField(
+        default=False,
+        help_text="Whether exact change is required"
+    )
+    
+    preferred_delivery_time = models.CharField(
+        max_length=50,
+        blank=True,
+        null=True,
+        help_text="Preferred delivery time (e.g., 'Morning', 'Afternoon')"
+    )
+    
+    delivery_notes = models.TextField(
+        blank=True,
+        null=True,
+        help_text="Additional delivery instructions"
+    )
+    
     class Meta:
         db_table = 'payment'
         verbose_name = 'Payment'
@@ -154,6 +271,9 @@ class Payment(models.Model):
             models.Index(fields=['status']),
             models.Index(fields=['payment_type']),
             models.Index(fields=['created_at']),
+            # Payment history of a customer, newest first
+            models.Index(fields=['customer', '-created_at']),
+            models.Index(fields=['transaction_id']),
         ]
     
     def __str__(self):
@@ -224,6 +344,84 @@ class Payment(models.Model):
             'created_at': self.created_at,
         }
     
+    def get_masked_card_number(self):
+        """Get a masked version of the card number for display."""
+        if self.card_number and len(self.card_number) >= 4:
+            return f"**** **** **** {self.card_number[-4:]}"
+        return "**** **** **** ****"
+    
+    def get_card_info(self):
+        """Get credit card information for display."""
+        return {
+            'card_type': self.get_card_type_display(),
+            'masked_number': self.get_masked_card_number(),
+            'expiry': f"{self.expiry_month:02d}/{self.expiry_year}" if self.expiry_month and self.expiry_year else None,
+            'cardholder_name': self.cardholder_name,
+        }
+    
+    def get_delivery_info(self):
+        """Get delivery information for the payment."""
+        return {
+            'delivery_address': self.delivery_address,
+            'delivery_city': self.delivery_city,
+            'contact_phone': self.contact_phone,
+            'exact_change': self.exact_change,
+            'preferred_delivery_time': self.preferred_delivery_time,
+            'delivery_notes': self.delivery_notes,
+        }
+    
+    def get_method_details(self):
+        """Method-specific details of the payment, or None for other payment types."""
+        if self.payment_type == 'credit_card':
+            return self.get_card_info()
+        if self.payment_type == 'cash_on_delivery':
+            return self.get_delivery_info()
+        return None
+    
+    @classmethod
+    def flatten_legacy_details(cls, dry_run=False, batch_size=1000, using='default'):
+        """
+        Copy method details from the legacy credit_card_payment and
+        cash_on_delivery_payment tables (multi-table inheritance) onto the
+        payment rows. Tables that no longer exist are skipped, and running it
+        again rewrites the same values.
+        
+        Returns:
+            Dictionary of legacy table -> number of payments copied
+        """
+        connection = connections[using]
+        existing_tables = set(connection.introspection.table_names())
+        copied = {}
+        
+        for table, columns in cls.LEGACY_DETAIL_TABLES.items():
+            copied[table] = 0
+            if table not in existing_tables:
+                continue
+            
+            quote = connection.ops.quote_name
+            sql = (
+                f"SELECT {quote('payment_ptr_id')}, {', '.join(quote(column) for column in columns)} "
+                f"FROM {quote(table)} WHERE {quote('payment_ptr_id')} > %s "
+                f"ORDER BY {quote('payment_ptr_id')} {connection.ops.limit_offset_sql(0, batch_size)}"
+            )
+            last_id = 0
+            while True:
+                with connection.cursor() as cursor:
+                    cursor.execute(sql, [last_id])
+                    rows = cursor.fetchall()
+                if not rows:
+                    break
+                last_id = rows[-1][0]
+                
+                payments = [cls(id=row[0], **dict(zip(columns, row[1:]))) for row in rows]
+                if not dry_run:
+                    cls.objects.using(using).bulk_update(payments, columns, batch_size=500)
+                copied[table] += len(payments)
+                if len(rows) < batch_size:
+                    break
+        
+        return copied
+    
     @classmethod
     def get_payment_stats(cls):
         """
@@ -247,148 +445,71 @@ class Payment(models.Model):
         }
 
 
-class CreditCardPayment(Payment):
+class CreditCardPaymentManager(models.Manager):
     """
-    Credit card payment model.
+    Manager for credit card payments (payments of type credit_card).
     """
-    # Credit card information
-    card_number = models.CharField(
-        max_length=20,
-        help_text="Last 4 digits of the credit card"
-    )
-    
-    card_type = models.CharField(
-        max_length=20,
-        choices=[
-            ('visa', 'Visa'),
-            ('mastercard', 'Mastercard'),
-            ('amex', 'American Express'),
-            ('discover', 'Discover'),
-            ('other', 'Other'),
-        ],
-        help_text="Type of credit card"
-    )
-    
-    expiry_month = models.PositiveIntegerField(
-        validators=[MinValueValidator(1)],
-        help_text="Card expiry month (1-12)"
-    )
     
-    expiry_year = models.PositiveIntegerField(
-        validators=[MinValueValidator(2024)],
-        help_text="Card expiry year"
-    )
-    
-    cardholder_name = models.CharField(
-        max_length=100,
-        help_text="Name on the credit card"
-    )
-    
-    # Transaction information
-    transaction_id = models.CharField(
-        max_length=100,
-        blank=True,
-        null=True,
-        help_text="External transaction ID from payment processor"
-    )
+    def get_queryset(self):
+        return super().get_queryset().filter(payment_type='credit_card')
     
-    authorization_code = models.CharField(
-        max_length=50,
-        blank=True,
-        null=True,
-        help_text="Payment authorization code"
-    )
+    def create(self, **kwargs):
+        kwargs.setdefault('payment_type', 'credit_card')
+        return super().create(**kwargs)
+
+
+class CreditCardPayment(Payment):
+    """
+    Credit card payment model.
+    The card details are stored on the payment row itself.
+    """
+    objects = CreditCardPaymentManager()
     
     class Meta:
-        db_table = 'credit_card_payment'
+        proxy = True
         verbose_name = 'Credit Card Payment'
         verbose_name_plural = 'Credit Card Payments'
     
     def __str__(self):
         return f"Credit Card Payment {self.payment_id} - {self.cardholder_name}"
     
-    def get_masked_card_number(self):
-        """Get a masked version of the card number for display."""
-        if len(self.card_number) >= 4:
-            return f"**** **** **** {self.card_number[-4:]}"
-        return "**** **** **** ****"
-    
     def is_expired(self):
         """Check if the credit card is expired."""
-        from django.utils import timezone
         current_date = timezone.now().date()
         return current_date.year > self.expiry_year or (
             current_date.year == self.expiry_year and 
             current_date.month > self.expiry_month
         )
+
+
+class CashOnDeliveryPaymentManager(models.Manager):
+    """
+    Manager for cash on delivery payments (payments of type cash_on_delivery).
+    """
     
-    def get_card_info(self):
-        """Get credit card information for display."""
-        return {
-            'card_type': self.get_card_type_display(),
-            'masked_number': self.get_masked_card_number(),
-            'expiry': f"{self.expiry_month:02d}/{self.expiry_year}",
-            'cardholder_name': self.cardholder_name,
-        }
+    def get_queryset(self):
+        return super().get_queryset().filter(payment_type='cash_on_delivery')
+    
+    def create(self, **kwargs):
+        kwargs.setdefault('payment_type', 'cash_on_delivery')
+        return super().create(**kwargs)
 
 
 class CashOnDeliveryPayment(Payment):
     """
     Cash on delivery payment model.
+    The delivery details are stored on the payment row itself.
     """
-    # Delivery information
-    delivery_address = models.TextField(
-        help_text="Delivery address for cash collection"
-    )
-    
-    delivery_city = models.CharField(
-        max_length=100,
-        help_text="City for delivery"
-    )
-    
-    contact_phone = models.CharField(
-        max_length=20,
-        help_text="Contact phone for delivery"
-    )
-    
-    # Cash collection details
-    exact_change = models.BooleanField(
-        default=False,
-        help_text="Whether exact change is required"
-    )
-    
-    preferred_delivery_time = models.CharField(
-        max_length=50,
-        blank=True,
-        null=True,
-        help_text="Preferred delivery time (e.g., 'Morning', 'Afternoon')"
-    )
-    
-    delivery_notes = models.TextField(
-        blank=True,
-        null=True,
-        help_text="Additional delivery instructions"        
-    )
+    objects = CashOnDeliveryPaymentManager()
     
     class Meta:
-        db_table = 'cash_on_delivery_payment'
+        proxy = True
         verbose_name = 'Cash on Delivery Payment'
         verbose_name_plural = 'Cash on Delivery Payments'
     
     def __str__(self):
         return f"Cash on Delivery Payment {self.payment_id} - {self.customer.get_full_name()}"
     
-    def get_delivery_info(self):
-        """Get delivery information for the payment."""
-        return {
-            'delivery_address': self.delivery_address,
-            'delivery_city': self.delivery_city,
-            'contact_phone': self.contact_phone,
-            'exact_change': self.exact_change,
-            'preferred_delivery_time': self.preferred_delivery_time,
-            'delivery_notes': self.delivery_notes,
-        }
-    
     def can_be_delivered(self):
         """Check if the payment can be delivered."""
         return self.status == 'completed'
@@ -396,3 +517,55 @@ class CashOnDeliveryPayment(Payment):
     def get_cash_collection_amount(self):
         """Get the amount to be collected in cash."""
         return self.amount
+
+
+class IdempotencyKey(models.Model):
+    """
+    Client-supplied Idempotency-Key of a checkout request and the response it
+    produced, so a retried request returns the stored response instead of
+    creating another payment or order.
+    """
+    STATUS_CHOICES = [
+        ('in_progress', 'In Progress'),
+        ('completed', 'Completed'),
+    ]
+    
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='idempotency_keys',
+        help_text="User who sent the request"
+    )
+    key = models.CharField(max_length=255, help_text="Idempotency-Key header value")
+    scope = models.CharField(max_length=100, help_text="Endpoint the key was used on")
+    request_fingerprint = models.CharField(
+        max_length=64,
+        help_text="SHA-256 of the request method, path and body"
+    )
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='in_progress')
+    response_status = models.PositiveSmallIntegerField(null=True, blank=True, help_text="Stored HTTP status")
+    response_body = models.JSONField(
+        null=True,
+        blank=True,
+        encoder=DjangoJSONEncoder,
+        help_text="Stored response body"
+    )
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField(help_text="When the key can be reused and the row cleaned up")
+    
+    class Meta:
+        db_table = 'idempotency_key'
+        verbose_name = 'Idempotency Key'
+        verbose_name_plural = 'Idempotency Keys'
+        unique_together = ['user', 'scope', 'key']
+        indexes = [
+            models.Index(fields=['expires_at']),
+        ]
+    
+    def __str__(self):
+        return f"Idempotency key {self.key} ({self.scope}) - {self.get_status_display()}"
+    
+    def is_expired(self):
+        """Check if the key has outlived its TTL."""
+        return self.expires_at <= timezone.now()
@@ -1,5 +1,7 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Count, Sum
 from django.utils import timezone
+from decimal import Decimal
 from .user_model import User
 
 
@@ -248,6 +250,20 @@ class ReturnFine(models.Model):
             elif self.lost:
                 self.fine_reason = FineReason.LOST
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        loaded = dict(zip(field_names, values))
+        instance._loaded_is_paid = loaded.get('is_paid')
+        instance._loaded_fine_amount = loaded.get('fine_amount')
+        return instance
+    
+    def get_customer_id(self):
+        """ID of the customer the fine is charged to."""
+        return ReturnRequest.objects.filter(id=self.return_request_id).values_list(
+            'borrowing__customer_id', flat=True
+        ).first()
+    
     def save(self, *args, **kwargs):
         """Override save to enforce business rules and auto-set fine_reason."""
         # Auto-set fine_reason from boolean flags (priority: late_return > damaged > lost)
@@ -259,7 +275,42 @@ class ReturnFine(models.Model):
             self.fine_reason = FineReason.LOST
         
         self.full_clean()
+        created = self._state.adding
         super().save(*args, **kwargs)
+        
+        # Keep the daily borrowing statistics current without recounting
+        from .borrowing_model import BorrowStatistics
+        if created:
+            BorrowStatistics.increment('fines_issued')
+        if self.is_paid and not getattr(self, '_loaded_is_paid', False):
+            BorrowStatistics.increment('fines_paid')
+        
+        # Move the customer's outstanding balance by the change in this fine
+        old_amount, old_count = (0, 0) if created else CustomerFineLedger.outstanding(
+            getattr(self, '_loaded_fine_amount', self.fine_amount),
+            getattr(self, '_loaded_is_paid', self.is_paid)
+        )
+        new_amount, new_count = CustomerFineLedger.outstanding(self.fine_amount, self.is_paid)
+        if new_amount != old_amount or new_count != old_count:
+            CustomerFineLedger.apply_delta(
+                self.get_customer_id(),
+                amount=new_amount - old_amount,
+                count=new_count - old_count
+            )
+        self._loaded_is_paid = self.is_paid
+        self._loaded_fine_amount = self.fine_amount
+    
+    def delete(self, *args, **kwargs):
+        """Delete the fine and take it off the customer's outstanding balance."""
+        customer_id = self.get_customer_id()
+        amount, count = CustomerFineLedger.outstanding(
+            getattr(self, '_loaded_fine_amount', self.fine_amount),
+            getattr(self, '_loaded_is_paid', self.is_paid)
+        )
+        result = super().delete(*args, **kwargs)
+        if count:
+            CustomerFineLedger.apply_delta(customer_id, amount=-amount, count=-count)
+        return result
     
     def mark_as_paid(self, paid_by, transaction_id=None):
         """Mark the fine as paid and update the associated BorrowRequest fine_status"""
@@ -277,3 +328,212 @@ class ReturnFine(models.Model):
         borrow_request.fine_status = FineStatusChoices.PAID
         borrow_request.fine_amount = self.fine_amount  # Sync the fine amount
         borrow_request.save(update_fields=['fine_status', 'fine_amount'])
+
+
+class CustomerFineLedger(models.Model):
+    """
+    Outstanding (unpaid) fine balance of a customer.
+    Moved by ReturnFine.save/delete and by the fine paths that write with raw
+    SQL or bulk_create (which call apply_delta or rebuild themselves), so
+    borrow eligibility checks and the fines badge read a single row. The
+    reconcile_fine_ledger command recounts it from the fines.
+    """
+    customer = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        related_name='fine_ledger',
+        help_text="Customer the balance belongs to"
+    )
+    outstanding_balance = models.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        default=Decimal('0.00'),
+        help_text="Sum of the customer's unpaid fines"
+    )
+    unpaid_fines = models.PositiveIntegerField(default=0, help_text="Number of unpaid fines")
+    
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        db_table = 'customer_fine_ledger'
+        verbose_name = 'Customer Fine Ledger'
+        verbose_name_plural = 'Customer Fine Ledgers'
+    
+    def __str__(self):
+        return f"Fine ledger of customer #{self.customer_id}: ${self.outstanding_balance}"
+    
+    @staticmethod
+    def outstanding(fine_amount, is_paid):
+        """(amount, count) a fine adds to the outstanding balance."""
+        if is_paid or not fine_amount:
+            return Decimal('0.00'), 0
+        return Decimal(str(fine_amount)), 1
+    
+    @classmethod
+    def apply_delta(cls, customer_id, amount=0, count=0):
+        """
+        Add deltas to a customer's balance under a row lock.
+        Callers apply the deltas of fines already written, so a customer
+        without a ledger row is seeded by recounting their fines (which
+        include the change) instead of starting from zero.
+        """
+        if not customer_id:
+            return
+        with transaction.atomic():
+            ledger = cls.objects.select_for_update().filter(customer_id=customer_id).first()
+            if ledger is None:
+                cls.rebuild(customer_ids=[customer_id])
+                return
+            ledger.outstanding_balance = max(ledger.outstanding_balance + Decimal(str(amount)), Decimal('0.00'))
+            ledger.unpaid_fines = max(ledger.unpaid_fines + count, 0)
+            ledger.save()
+    
+    @classmethod
+    def apply_deltas(cls, deltas):
+        """
+        Apply the balance deltas of fines written with bulk_create.
+        
+        Args:
+            deltas: Dictionary of customer_id -> (amount, count)
+        """
+        # Lock in customer order so concurrent writers cannot deadlock
+        for customer_id, (amount, count) in sorted(deltas.items()):
+            if amount or count:
+                cls.apply_delta(customer_id, amount=amount, count=count)
+    
+    @classmethod
+    def for_customer(cls, customer):
+        """
+        Ledger row of a customer. A missing row is built from the fines
+        (customers who have not had a fine since the ledger was added).
+        """
+        ledger = cls.objects.filter(customer=customer).first()
+        if ledger is None:
+            cls.rebuild(customer_ids=[customer.id])
+            ledger = cls.objects.filter(customer=customer).first() or cls(customer=customer)
+        return ledger
+    
+    @classmethod
+    def rebuild(cls, customer_ids=None, dry_run=False):
+        """
+        Recount balances from the unpaid fines with one grouped query and
+        write the rows that drifted.
+        
+        Args:
+            customer_ids: Optional customers to restrict the rebuild to
+            dry_run: Only report the drifted customers
+        
+        Returns:
+            List of customer IDs whose ledger was missing or wrong
+        """
+        fines = ReturnFine.objects.filter(is_paid=False, fine_amount__gt=0)
+        existing = cls.objects.all()
+        if customer_ids is not None:
+            fines = fines.filter(return_request__borrowing__customer_id__in=customer_ids)
+            existing = existing.filter(customer_id__in=customer_ids)
+        
+        expected = {
+            row['customer_id']: row
+            for row in fines.values(customer_id=models.F('return_request__borrowing__customer_id')).annotate(
+                balance=Sum('fine_amount'),
+                count=Count('id'),
+            ).order_by()
+        }
+        existing = {ledger.customer_id: ledger for ledger in existing}
+        
+        # Customers asked for explicitly get a row even with a zero balance
+        wanted = set(expected) | set(existing) | set(customer_ids or [])
+        to_create = []
+        to_update = []
+        for customer_id in sorted(wanted):
+            row = expected.get(customer_id, {})
+            balance = row.get('balance') or Decimal('0.00')
+            count = row.get('count', 0)
+            
+            ledger = existing.get(customer_id)
+            if ledger is None:
+                to_create.append(cls(customer_id=customer_id, outstanding_balance=balance, unpaid_fines=count))
+            elif ledger.outstanding_balance != balance or ledger.unpaid_fines != count:
+                ledger.outstanding_balance = balance
+                ledger.unpaid_fines = count
+                to_update.append(ledger)
+        
+        if not dry_run:
+            with transaction.atomic():
+                cls.objects.bulk_create(to_create, batch_size=500, ignore_conflicts=True)
+                cls.objects.bulk_update(to_update, ['outstanding_balance', 'unpaid_fines'], batch_size=500)
+        
+        return [ledger.customer_id for ledger in to_create + to_update]
+
+
+class FineRateTable(models.Model):
+    """
+    Versioned fine rates used by the fine pricing engine.
+    A new version is added instead of editing an old one, and the version
+    in effect is the latest one whose effective_from has passed.
+    """
+    version = models.PositiveIntegerField(
+        unique=True,
+        help_text="Rate table version, increasing"
+    )
+    late_fee_per_hour = models.DecimalField(
+        max_digits=6,
+        decimal_places=2,
+        default=Decimal('0.10'),
+        help_text="Fine per full hour late"
+    )
+    max_late_fee = models.DecimalField(
+        max_digits=8,
+        decimal_places=2,
+        null=True,
+        blank=True,
+        help_text="Cap on the late part of a fine (no cap when empty)"
+    )
+    damage_fee = models.DecimalField(
+        max_digits=8,
+        decimal_places=2,
+        default=Decimal('10.00'),
+        help_text="Flat fine for a damaged book"
+    )
+    lost_fee_uses_book_price = models.BooleanField(
+        default=True,
+        help_text="Charge the book price for a lost book"
+    )
+    lost_fee = models.DecimalField(
+        max_digits=8,
+        decimal_places=2,
+        default=Decimal('50.00'),
+        help_text="Fine for a lost book without a price (or always, if the book price is not used)"
+    )
+    deposit_late_fee_per_day = models.DecimalField(
+        max_digits=6,
+        decimal_places=2,
+        default=Decimal('4.00'),
+        help_text="Deducted from the borrow payment refund per day overdue"
+    )
+    effective_from = models.DateTimeField(
+        default=timezone.now,
+        help_text="When this version starts to apply"
+    )
+    notes = models.TextField(blank=True, null=True)
+    created_by = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='fine_rate_tables',
+        help_text="Admin who published this version"
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    
+    class Meta:
+        db_table = 'fine_rate_table'
+        verbose_name = 'Fine Rate Table'
+        verbose_name_plural = 'Fine Rate Tables'
+        ordering = ['-effective_from', '-version']
+        indexes = [
+            models.Index(fields=['effective_from']),
+        ]
+    
+    def __str__(self):
+        return f"Fine rates v{self.version} (from {self.effective_from:%Y-%m-%d})"
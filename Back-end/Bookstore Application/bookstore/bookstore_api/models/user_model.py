@@ -247,44 +247,20 @@ class User(AbstractUser):
         return LocationHistory.get_movement_summary(self, hours)
     
     def has_unpaid_fines(self):
-        """Check if user has any unpaid fines."""
+        """Check if user has any unpaid fines (reads the customer's fine ledger)."""
         if not self.is_customer():
             return False
         
-        from .borrowing_model import BorrowRequest, FineStatusChoices
-        from .return_model import ReturnRequest, ReturnFine
-        
-        # Check return fines (unpaid fines)
-        # Note: ReturnFine model doesn't have fine_type or payment_status fields
-        # Using is_paid=False to check for unpaid fines
-        has_return_fine = ReturnFine.objects.filter(
-            return_request__borrowing__customer=self,
-            is_paid=False,
-            fine_amount__gt=0
-        ).exists()
-        
-        # Also check BorrowRequest.fine_amount for legacy compatibility
-        has_legacy_fine = BorrowRequest.objects.filter(
-            customer=self,
-            fine_status=FineStatusChoices.UNPAID,
-            fine_amount__gt=0
-        ).exists()
-        
-        return has_return_fine or has_legacy_fine
+        from .return_model import CustomerFineLedger
+        return CustomerFineLedger.for_customer(self).outstanding_balance > 0
     
     def get_total_unpaid_fines(self):
         """Get total amount of unpaid fines."""
         if not self.is_customer():
             return 0
         
-        from .borrowing_model import BorrowRequest, FineStatusChoices
-        from django.db.models import Sum
-        result = BorrowRequest.objects.filter(
-            customer=self,
-            fine_status=FineStatusChoices.UNPAID,
-            fine_amount__gt=0
-        ).aggregate(total=Sum('fine_amount'))
-        return result['total'] or 0
+        from .return_model import CustomerFineLedger
+        return CustomerFineLedger.for_customer(self).outstanding_balance
     
     def can_submit_borrow_request(self):
         """Check if user can submit a new borrow request."""
@@ -367,11 +343,24 @@ class User(AbstractUser):
         
         return int((completed_fields / total_fields) * 100)
     
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_user_type = dict(zip(field_names, values)).get('user_type')
+        return instance
+    
     def save(self, *args, **kwargs):
         """Override save to handle email as username and sync profile names."""
         if not self.username:
             self.username = self.email
+        user_type_changed = getattr(self, '_loaded_user_type', None) != self.user_type
         super().save(*args, **kwargs)
+        self._loaded_user_type = self.user_type
+        
+        # Every delivery administrator has a delivery profile from the start
+        if user_type_changed and self.is_delivery_admin():
+            from .delivery_profile_model import DeliveryProfile
+            DeliveryProfile.create_for_user(self)
         
         # Sync name changes to profile if it exists
         try:
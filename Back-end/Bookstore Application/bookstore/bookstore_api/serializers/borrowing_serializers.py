@@ -3,7 +3,7 @@ from django.utils import timezone
 from datetime import timedelta
 from decimal import Decimal
 from ..models import (
-    BorrowRequest, BorrowExtension, BorrowStatistics,
+    BorrowRequest, BorrowExtension, BookBorrowStatistics,
     Book, User, BorrowStatusChoices, ExtensionStatusChoices, FineStatusChoices
 )
 
@@ -642,10 +642,9 @@ class BorrowStatisticsSerializer(serializers.ModelSerializer):
     book = BookBasicSerializer(read_only=True)
     
     class Meta:
-        model = BorrowStatistics
+        model = BookBorrowStatistics
         fields = [
-            'id', 'book', 'total_borrows', 'current_borrows',
-            'average_rating', 'total_ratings', 'last_borrowed'
+            'id', 'book', 'total_borrows', 'current_borrows', 'last_borrowed'
         ]
 
 
@@ -657,12 +656,7 @@ class MostBorrowedBookSerializer(serializers.ModelSerializer):
     borrow_count = serializers.IntegerField(source='borrow_stats.total_borrows', read_only=True)
     available_copies = serializers.SerializerMethodField()
     is_available = serializers.SerializerMethodField()
-    average_rating = serializers.DecimalField(
-        source='borrow_stats.average_rating',
-        max_digits=3,
-        decimal_places=2,
-        read_only=True
-    )
+    average_rating = serializers.SerializerMethodField()
     
     class Meta:
         model = Book
@@ -672,8 +666,17 @@ class MostBorrowedBookSerializer(serializers.ModelSerializer):
             'average_rating', 'description'
         ]
     
+    def get_average_rating(self, obj):
+        """Average rating, read from the annotation of get_most_borrowed_books when present"""
+        if hasattr(obj, 'average_rating_value'):
+            average = obj.average_rating_value
+            return str(round(Decimal(str(average)), 2)) if average else '0.00'
+        return str(round(Decimal(str(obj.get_average_rating())), 2))
+    
     def get_available_copies(self, obj):
         """Calculate available copies"""
+        if hasattr(obj, 'reserved_copies'):
+            return max(0, obj.quantity - obj.reserved_copies)
         current_borrows = BorrowRequest.objects.filter(
             book=obj,
             status__in=[
@@ -805,7 +808,7 @@ class DeliveryManagerSerializer(serializers.ModelSerializer):
                         logger.warning(f"User {obj.id}: Found legacy 'busy' status, mapping to 'Online'")
                         return 'Online'
                     result = status_map.get(status_lower, 'Offline')
-                    logger.info(f"User {obj.id}: Mapped status '{status}' -> '{result}'")
+                    logger.debug(f"User {obj.id}: Mapped status '{status}' -> '{result}'")
                     return result
                 else:
                     logger.warning(f"User {obj.id}: delivery_status is None or empty, returning 'Offline'")
@@ -26,10 +26,11 @@ class DeliveryProfileSerializer(serializers.ModelSerializer):
             'location_updated_at',
             'is_tracking_active',
             'last_tracking_update',
+            'active_task_count',
             'created_at',
             'updated_at',
         ]
-        read_only_fields = ['id', 'created_at', 'updated_at']
+        read_only_fields = ['id', 'active_task_count', 'created_at', 'updated_at']
     
     def validate_delivery_status(self, value):
         """Validate delivery status."""
@@ -93,13 +94,16 @@ class DeliveryProfileCreateSerializer(serializers.ModelSerializer):
             raise serializers.ValidationError("User does not exist")
     
     def create(self, validated_data):
-        """Create a new delivery profile."""
+        """
+        Create a delivery profile, or fill in the one User.save() already
+        created when the user became a delivery administrator.
+        """
         user_id = validated_data.pop('user_id')
         user = User.objects.get(id=user_id)
         
-        delivery_profile = DeliveryProfile.objects.create(
+        delivery_profile, _ = DeliveryProfile.objects.update_or_create(
             user=user,
-            **validated_data
+            defaults=validated_data
         )
         return delivery_profile
 
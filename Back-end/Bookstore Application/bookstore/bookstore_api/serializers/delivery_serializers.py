@@ -1,16 +1,18 @@
 from rest_framework import serializers
 from django.db import transaction
 from decimal import Decimal
-from ..models import DeliveryRequest, Order, OrderItem, User, Cart, CartItem, Book
+from ..models import DeliveryRequest, DeliveryRun, DeliveryRunStop, Order, OrderItem, User, Cart, CartItem, Book
 from ..models.borrowing_model import BorrowRequest
 from ..models.return_model import ReturnRequest
 from ..models.payment_model import Payment
+from .mixins import SparseFieldsetMixin
 
 
-class DeliveryRequestListSerializer(serializers.ModelSerializer):
+class DeliveryRequestListSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """
     Serializer for viewing delivery requests in list format.
     Includes all necessary information for display.
+    Supports ?fields= / ?exclude=.
     """
     delivery_type_display = serializers.CharField(source='get_delivery_type_display', read_only=True)
     status_display = serializers.CharField(source='get_status_display', read_only=True)
@@ -71,6 +73,16 @@ class DeliveryRequestListSerializer(serializers.ModelSerializer):
             'completed_at',
         ]
     
+    PROJECTION = {
+        'customer_phone': ['customer'],
+        'delivery_manager_name': ['delivery_manager'],
+        'delivery_manager_availability': ['delivery_manager'],
+        'delivery_manager_latitude': ['delivery_manager'],
+        'delivery_manager_longitude': ['delivery_manager'],
+        'order_number': ['delivery_type', 'order'],
+        'order': ['delivery_type', 'order'],
+    }
+    
     def get_customer_phone(self, obj):
         """Get customer phone number from profile if available."""
         if hasattr(obj.customer, 'userprofile'):
@@ -360,6 +372,132 @@ class UpdateLocationSerializer(serializers.Serializer):
         return value
 
 
+class LocationPointSerializer(UpdateLocationSerializer):
+    """
+    Serializer for a single buffered GPS point in a location batch.
+    """
+    recorded_at = serializers.DateTimeField(
+        required=False,
+        help_text="When the device recorded the point (defaults to server time)"
+    )
+    address = serializers.CharField(required=False, allow_blank=True, allow_null=True)
+    tracking_type = serializers.ChoiceField(
+        choices=['gps', 'network', 'manual'],
+        required=False,
+        default='gps'
+    )
+    accuracy = serializers.FloatField(required=False, allow_null=True, min_value=0)
+    speed = serializers.FloatField(required=False, allow_null=True, min_value=0)
+    heading = serializers.FloatField(required=False, allow_null=True, min_value=0, max_value=360)
+    battery_level = serializers.IntegerField(required=False, allow_null=True, min_value=0, max_value=100)
+    network_type = serializers.CharField(required=False, allow_blank=True, allow_null=True, max_length=20)
+
+
+class LocationBatchSerializer(serializers.Serializer):
+    """
+    Serializer for uploading many buffered GPS points in one request.
+    """
+    MAX_POINTS = 720  # One hour of points at a 5 second interval
+    
+    delivery_request_id = serializers.IntegerField(
+        required=False,
+        allow_null=True,
+        help_text="Delivery request in progress, if any"
+    )
+    points = LocationPointSerializer(many=True, allow_empty=False)
+    
+    def validate_points(self, value):
+        """Limit the batch size."""
+        if len(value) > self.MAX_POINTS:
+            raise serializers.ValidationError(f"A batch can contain at most {self.MAX_POINTS} points.")
+        return value
+
+
+class AutoAssignDeliverySerializer(serializers.Serializer):
+    """
+    Serializer for running the batch auto-assignment of pending deliveries.
+    """
+    dry_run = serializers.BooleanField(required=False, default=False)
+    max_load = serializers.IntegerField(required=False, allow_null=True, min_value=1)
+    max_distance_km = serializers.FloatField(required=False, allow_null=True, min_value=0)
+    limit = serializers.IntegerField(required=False, allow_null=True, min_value=1)
+
+
+class BulkDeliveryTransitionSerializer(serializers.Serializer):
+    """
+    Serializer for accepting, starting or completing many delivery requests at once.
+    """
+    delivery_request_ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=500,
+        help_text="Delivery requests to move to the next status"
+    )
+    notes = serializers.CharField(
+        required=False,
+        allow_blank=True,
+        help_text="Optional notes, stored as start notes when starting deliveries"
+    )
+
+
+class CreateDeliveryRunSerializer(serializers.Serializer):
+    """
+    Serializer for planning a multi-stop delivery run.
+    """
+    delivery_request_ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1),
+        allow_empty=False,
+        max_length=25,
+        help_text="Assigned or accepted delivery requests to deliver in one trip"
+    )
+
+
+class DeliveryRunStopSerializer(serializers.ModelSerializer):
+    """
+    Serializer for one stop of a delivery run.
+    """
+    status_display = serializers.CharField(source='get_status_display', read_only=True)
+    delivery_request = DeliveryRequestListSerializer(read_only=True)
+    
+    class Meta:
+        model = DeliveryRunStop
+        fields = [
+            'id',
+            'sequence',
+            'status',
+            'status_display',
+            'distance_from_previous_km',
+            'completed_at',
+            'delivery_request',
+        ]
+        read_only_fields = fields
+
+
+class DeliveryRunSerializer(serializers.ModelSerializer):
+    """
+    Serializer for a delivery run with its stops in route order.
+    """
+    status_display = serializers.CharField(source='get_status_display', read_only=True)
+    stops = DeliveryRunStopSerializer(many=True, read_only=True)
+    
+    class Meta:
+        model = DeliveryRun
+        fields = [
+            'id',
+            'delivery_manager',
+            'status',
+            'status_display',
+            'start_latitude',
+            'start_longitude',
+            'planned_distance_km',
+            'created_at',
+            'started_at',
+            'completed_at',
+            'stops',
+        ]
+        read_only_fields = fields
+
+
 class CustomerDeliveryRequestSerializer(serializers.ModelSerializer):
     """
     Customer-facing serializer for DeliveryRequest.
@@ -705,7 +843,7 @@ class OrderCreateSerializer(serializers.Serializer):
         decimal_places=2,
         required=False,
         allow_null=True,
-        help_text="Discount amount applied to the order"
+        help_text="Deprecated and ignored: discounts are priced server-side"
     )
     
     def validate_cart_items(self, value):
@@ -727,10 +865,14 @@ class OrderCreateSerializer(serializers.Serializer):
         return value
 
 
-class CustomerOrderSerializer(serializers.ModelSerializer):
+class CustomerOrderSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """
     Serializer for customer orders (both purchase and borrowing).
     Used by customers to view their orders.
+    
+    Method fields only read relations loaded by apply_prefetch_plan, so an
+    order listing runs a fixed number of queries, and ?fields= limits both
+    the payload and the relations that are loaded.
     """
     customer_name = serializers.CharField(source='customer.get_full_name', read_only=True)
     customer_email = serializers.CharField(source='customer.email', read_only=True)
@@ -786,6 +928,123 @@ class CustomerOrderSerializer(serializers.ModelSerializer):
             'updated_at',
         ]
     
+    PROJECTION = {
+        'customer_phone': ['customer'],
+        'payment_method': ['payment'],
+        'payment_info': ['payment'],
+        'payment': ['payment'],
+        'total_quantity': [],
+        'delivery_assignment': [],
+        'items': [],
+        'notes': ['notes', 'customer', 'created_at', 'updated_at'],
+        'discount_code': ['payment'],
+        'discount_amount': ['discount_amount', 'payment'],
+        'total_amount': ['discount_amount', 'payment', 'delivery_cost', 'tax_amount'],
+    }
+    
+    @staticmethod
+    def get_prefetch_plan():
+        """
+        Relations each field reads, as (select_related, prefetch_related)
+        lookups. Fields that are not listed only read order columns.
+        """
+        from django.db.models import Prefetch
+        from ..models import BookImage
+        from ..models.discount_model import DiscountUsage
+        
+        customer = (['customer'], [])
+        payment = (['payment'], [])
+        items = ([], [
+            Prefetch('items', queryset=OrderItem.objects.select_related('book__author')),
+            Prefetch(
+                'items__book__images',
+                queryset=BookImage.objects.filter(is_primary=True),
+                to_attr='primary_images'
+            ),
+        ])
+        discount_usages = ([], [
+            Prefetch('discount_usages', queryset=DiscountUsage.objects.select_related('discount_code')),
+        ])
+        
+        def combine(*parts):
+            return (
+                [lookup for select, _ in parts for lookup in select],
+                [lookup for _, prefetch in parts for lookup in prefetch],
+            )
+        
+        return {
+            'customer_name': customer,
+            'customer_email': customer,
+            'customer_phone': (['customer__profile'], []),
+            'notes': customer,
+            'payment': payment,
+            'payment_method': payment,
+            'payment_info': payment,
+            'discount_code': combine(payment, discount_usages),
+            'discount_amount': combine(payment, discount_usages, items),
+            'total_amount': combine(payment, discount_usages, items),
+            'total_quantity': items,
+            'items': items,
+            'delivery_assignment': ([], [
+                Prefetch(
+                    'delivery_requests',
+                    queryset=DeliveryRequest.objects.filter(delivery_type='purchase').select_related(
+                        'delivery_manager__profile'
+                    ),
+                    to_attr='purchase_delivery_requests'
+                ),
+            ]),
+        }
+    
+    @classmethod
+    def apply_prefetch_plan(cls, queryset, fields=None):
+        """
+        Load the relations read by the given fields (default: all fields).
+        """
+        plan = cls.get_prefetch_plan()
+        select_related = []
+        prefetch_related = {}
+        for name in fields or cls.Meta.fields:
+            select, prefetch = plan.get(name, ([], []))
+            select_related.extend(lookup for lookup in select if lookup not in select_related)
+            for lookup in prefetch:
+                prefetch_related.setdefault(lookup.prefetch_to, lookup)
+        if select_related:
+            queryset = queryset.select_related(*select_related)
+        if prefetch_related:
+            queryset = queryset.prefetch_related(*prefetch_related.values())
+        return queryset
+    
+    def _get_code_usage(self, obj):
+        """First discount code usage of the order (from the prefetched usages)."""
+        for usage in obj.discount_usages.all():
+            if usage.discount_code_id is not None:
+                return usage
+        return None
+    
+    def _get_subtotal(self, obj):
+        """Subtotal of the order items."""
+        from decimal import Decimal
+        subtotal = Decimal('0.00')
+        for item in obj.items.all():
+            if item.price and item.quantity:
+                subtotal += Decimal(str(item.price)) * Decimal(str(item.quantity))
+        return subtotal
+    
+    def _get_payment_summary(self, obj):
+        payment = obj.payment
+        if payment is None:
+            return None
+        return {
+            'id': payment.id,
+            'payment_id': payment.payment_id,
+            'payment_type': payment.payment_type,
+            'payment_method': payment.payment_type,  # Alias for frontend
+            'status': payment.status,
+            'amount': str(payment.amount),
+            'created_at': payment.created_at.isoformat() if payment.created_at else None,
+        }
+    
     def get_customer_phone(self, obj):
         """Get customer phone number from profile."""
         try:
@@ -797,55 +1056,15 @@ class CustomerOrderSerializer(serializers.ModelSerializer):
     
     def get_payment_method(self, obj):
         """Get payment method from payment."""
-        if obj.payment:
-            # Refresh payment from database to ensure we have the latest data
-            from ..models import Payment
-            try:
-                payment = Payment.objects.get(id=obj.payment.id)
-                return payment.payment_type
-            except Payment.DoesNotExist:
-                return None
-        return None
+        return obj.payment.payment_type if obj.payment else None
     
     def get_payment_info(self, obj):
         """Get payment information as a dict."""
-        if obj.payment:
-            # Refresh payment from database to ensure we have the latest status
-            from ..models import Payment
-            try:
-                payment = Payment.objects.get(id=obj.payment.id)
-                return {
-                    'id': payment.id,
-                    'payment_id': payment.payment_id,
-                    'payment_method': payment.payment_type,
-                    'payment_type': payment.payment_type,
-                    'status': payment.status,
-                    'amount': str(payment.amount),
-                    'created_at': payment.created_at.isoformat() if payment.created_at else None,
-                }
-            except Payment.DoesNotExist:
-                return None
-        return None
+        return self._get_payment_summary(obj)
     
     def get_payment(self, obj):
         """Get payment object (for compatibility with frontend)."""
-        if obj.payment:
-            # Refresh payment from database to ensure we have the latest status
-            from ..models import Payment
-            try:
-                payment = Payment.objects.get(id=obj.payment.id)
-                return {
-                    'id': payment.id,
-                    'payment_id': payment.payment_id,
-                    'payment_type': payment.payment_type,
-                    'payment_method': payment.payment_type,  # Alias for frontend
-                    'status': payment.status,
-                    'amount': str(payment.amount),
-                    'created_at': payment.created_at.isoformat() if payment.created_at else None,
-                }
-            except Payment.DoesNotExist:
-                return None
-        return None
+        return self._get_payment_summary(obj)
     
     def get_discount_code(self, obj):
         """Get discount code from payment if available, or from discount usage records."""
@@ -853,26 +1072,10 @@ class CustomerOrderSerializer(serializers.ModelSerializer):
         if obj.payment and obj.payment.discount_code_used:
             return obj.payment.discount_code_used
         
-        # Fallback: Always check DiscountUsage records (regardless of discount_amount)
-        # This handles cases where discount was applied but amount wasn't saved correctly
-        try:
-            from ..models.discount_model import DiscountUsage
-            # Use the related manager if available (more efficient)
-            if hasattr(obj, 'discount_usages'):
-                discount_usage = obj.discount_usages.filter(discount_code__isnull=False).first()
-            else:
-                discount_usage = DiscountUsage.objects.filter(
-                    order=obj,
-                    discount_code__isnull=False
-                ).select_related('discount_code').first()
-            
-            if discount_usage and discount_usage.discount_code:
-                return discount_usage.discount_code.code
-        except Exception as e:
-            import logging
-            logger = logging.getLogger(__name__)
-            logger.warning(f"Error getting discount code from DiscountUsage: {str(e)}")
-        
+        # Fallback: the discount usage records of the order
+        discount_usage = self._get_code_usage(obj)
+        if discount_usage:
+            return discount_usage.discount_code.code
         return None
     
     def get_discount_amount(self, obj):
@@ -883,81 +1086,23 @@ class CustomerOrderSerializer(serializers.ModelSerializer):
         
         # If order discount_amount is 0 or None, check DiscountUsage records
         # This handles cases where discount was applied but amount wasn't saved to order
-        try:
-            from ..models.discount_model import DiscountUsage, DiscountCode
-            from decimal import Decimal
-            
-            # Use the related manager if available (more efficient)
-            if hasattr(obj, 'discount_usages'):
-                discount_usage = obj.discount_usages.filter(discount_code__isnull=False).select_related('discount_code').first()
-            else:
-                discount_usage = DiscountUsage.objects.filter(
-                    order=obj,
-                    discount_code__isnull=False
-                ).select_related('discount_code').first()
-            
-            if discount_usage and discount_usage.discount_amount:
-                return float(discount_usage.discount_amount)
-            
-            # If DiscountUsage exists but amount is 0, try to calculate from discount code
-            if discount_usage and discount_usage.discount_code:
-                discount_code = discount_usage.discount_code
-                # Calculate subtotal from order items
-                subtotal = Decimal('0.00')
-                if hasattr(obj, 'items'):
-                    for item in obj.items.all():
-                        if item.price and item.quantity:
-                            subtotal += Decimal(str(item.price)) * Decimal(str(item.quantity))
-                
-                # If we have a subtotal, calculate discount
-                if subtotal > 0:
-                    discount_amount = discount_code.get_discount_amount(float(subtotal))
-                    return float(discount_amount)
-        except Exception as e:
-            import logging
-            logger = logging.getLogger(__name__)
-            logger.warning(f"Error getting discount amount from DiscountUsage: {str(e)}")
+        discount_usage = self._get_code_usage(obj)
+        if discount_usage and discount_usage.discount_amount:
+            return float(discount_usage.discount_amount)
         
-        # Final fallback: Try to get discount code from payment and calculate
-        try:
+        # Calculate from the discount code of the usage, or of the payment
+        discount_code = discount_usage.discount_code if discount_usage else None
+        if discount_code is None and obj.payment and obj.payment.discount_code_used:
             from ..models.discount_model import DiscountCode
-            from decimal import Decimal
-            
-            # Get discount code
-            discount_code_str = None
-            if obj.payment and obj.payment.discount_code_used:
-                discount_code_str = obj.payment.discount_code_used
-            elif hasattr(obj, 'discount_usages'):
-                discount_usage = obj.discount_usages.filter(discount_code__isnull=False).select_related('discount_code').first()
-                if discount_usage and discount_usage.discount_code:
-                    discount_code_str = discount_usage.discount_code.code
-            
-            if discount_code_str:
-                # Look up the discount code
-                discount_code = DiscountCode.objects.filter(
-                    code=discount_code_str,
-                    is_active=True
-                ).first()
-                
-                if discount_code:
-                    # Calculate subtotal from order items
-                    subtotal = Decimal('0.00')
-                    if hasattr(obj, 'items'):
-                        for item in obj.items.all():
-                            if item.price and item.quantity:
-                                subtotal += Decimal(str(item.price)) * Decimal(str(item.quantity))
-                    
-                    # Alternative: Calculate from total_amount + discount_amount (if we had it)
-                    # Since discount_amount is 0, we can approximate: subtotal ≈ total_amount + delivery_cost + tax_amount
-                    # But this might not be accurate if discount was already applied
-                    # Better: calculate from items
-                    if subtotal > 0:
-                        discount_amount = discount_code.get_discount_amount(float(subtotal))
-                        return float(discount_amount)
-        except Exception as e:
-            import logging
-            logger = logging.getLogger(__name__)
-            logger.warning(f"Error calculating discount amount from code: {str(e)}")
+            discount_code = DiscountCode.objects.filter(
+                code=obj.payment.discount_code_used,
+                is_active=True
+            ).first()
+        
+        if discount_code:
+            subtotal = self._get_subtotal(obj)
+            if subtotal > 0:
+                return float(discount_code.get_discount_amount(float(subtotal)))
         
         # Final fallback: return order's discount_amount (which may be 0.00)
         return float(obj.discount_amount) if obj.discount_amount else 0.00
@@ -966,12 +1111,7 @@ class CustomerOrderSerializer(serializers.ModelSerializer):
         """Calculate total amount dynamically: subtotal - discount + delivery + tax."""
         from decimal import Decimal
         
-        # Calculate subtotal from order items
-        subtotal = Decimal('0.00')
-        if hasattr(obj, 'items'):
-            for item in obj.items.all():
-                if item.price and item.quantity:
-                    subtotal += Decimal(str(item.price)) * Decimal(str(item.quantity))
+        subtotal = self._get_subtotal(obj)
         
         # Get discount amount (using the method we already have)
         discount_amount = Decimal(str(self.get_discount_amount(obj)))
@@ -991,54 +1131,50 @@ class CustomerOrderSerializer(serializers.ModelSerializer):
     
     def get_total_quantity(self, obj):
         """Calculate total quantity of items in the order."""
-        if hasattr(obj, 'items'):
-            return sum(item.quantity for item in obj.items.all())
-        return 0
+        return sum(item.quantity for item in obj.items.all())
     
     def get_delivery_assignment(self, obj):
         """Get delivery assignment information from delivery request."""
-        try:
-            from ..models import DeliveryRequest
-            # Get the delivery request associated with this order
-            delivery_request = DeliveryRequest.objects.filter(
-                order=obj,
-                delivery_type='purchase'
-            ).first()
+        # Purchase delivery requests, newest first (prefetched by the plan)
+        delivery_requests = getattr(obj, 'purchase_delivery_requests', None)
+        if delivery_requests is None:
+            delivery_requests = list(
+                DeliveryRequest.objects.filter(order=obj, delivery_type='purchase').select_related(
+                    'delivery_manager__profile'
+                )[:1]
+            )
+        delivery_request = delivery_requests[0] if delivery_requests else None
+        
+        if delivery_request and delivery_request.delivery_manager:
+            manager = delivery_request.delivery_manager
+            # Get phone from profile if available
+            phone = None
+            try:
+                if hasattr(manager, 'profile') and manager.profile:
+                    phone = manager.profile.phone_number
+            except Exception:
+                pass
             
-            if delivery_request and delivery_request.delivery_manager:
-                manager = delivery_request.delivery_manager
-                # Get phone from profile if available
-                phone = None
-                try:
-                    if hasattr(manager, 'profile') and manager.profile:
-                        phone = manager.profile.phone_number
-                except Exception:
-                    pass
-                
-                return {
-                    'id': str(delivery_request.id),  # Delivery request ID
-                    'order': str(obj.id),  # Order ID
-                    'delivery_manager': {
-                        'id': manager.id,
-                        'name': manager.get_full_name(),
-                        'full_name': manager.get_full_name(),
-                        'email': manager.email,
-                        'phone': phone,
-                    },
-                    'delivery_manager_id': str(manager.id),
-                    'delivery_manager_name': manager.get_full_name(),
-                    'delivery_manager_phone': phone,
-                    'delivery_manager_email': manager.email,
-                    'status': delivery_request.status,
-                    'assigned_at': delivery_request.assigned_at.isoformat() if delivery_request.assigned_at else None,
-                    'started_at': delivery_request.started_at.isoformat() if delivery_request.started_at else None,
-                    'completed_at': delivery_request.completed_at.isoformat() if delivery_request.completed_at else None,
-                    'assigned_by_name': None,  # Can be added if tracking who assigned is needed
-                }
-        except Exception as e:
-            import logging
-            logger = logging.getLogger(__name__)
-            logger.warning(f"Error getting delivery assignment: {str(e)}")
+            return {
+                'id': str(delivery_request.id),  # Delivery request ID
+                'order': str(obj.id),  # Order ID
+                'delivery_manager': {
+                    'id': manager.id,
+                    'name': manager.get_full_name(),
+                    'full_name': manager.get_full_name(),
+                    'email': manager.email,
+                    'phone': phone,
+                },
+                'delivery_manager_id': str(manager.id),
+                'delivery_manager_name': manager.get_full_name(),
+                'delivery_manager_phone': phone,
+                'delivery_manager_email': manager.email,
+                'status': delivery_request.status,
+                'assigned_at': delivery_request.assigned_at.isoformat() if delivery_request.assigned_at else None,
+                'started_at': delivery_request.started_at.isoformat() if delivery_request.started_at else None,
+                'completed_at': delivery_request.completed_at.isoformat() if delivery_request.completed_at else None,
+                'assigned_by_name': None,  # Can be added if tracking who assigned is needed
+            }
         return None
     
     def get_notes(self, obj):
@@ -1131,22 +1267,27 @@ class CustomerOrderSerializer(serializers.ModelSerializer):
         
         return notes_list
     
+    def _get_book_image(self, book):
+        """Primary image URL of a book (prefetched as primary_images by the plan)."""
+        primary_images = getattr(book, 'primary_images', None)
+        if primary_images is None:
+            return book.get_primary_image_url()
+        return primary_images[0].image.url if primary_images else None
+    
     def get_items(self, obj):
         """Get order items as a simple list."""
-        if hasattr(obj, 'items'):
-            return [
-                {
-                    'id': item.id,
-                    'book_id': item.book.id if item.book else None,
-                    'book_title': item.book.name if item.book else 'Unknown',
-                    'book_author': item.book.author.name if item.book and item.book.author else None,
-                    'book_image': item.book.get_primary_image_url() if item.book else None,
-                    'quantity': item.quantity,
-                    'price': str(item.price),
-                    'unit_price': str(item.price),  # Alias for frontend compatibility
-                    'total_price': str(item.total_price),
-                }
-                for item in obj.items.all()
-            ]
-        return []
+        return [
+            {
+                'id': item.id,
+                'book_id': item.book.id if item.book else None,
+                'book_title': item.book.name if item.book else 'Unknown',
+                'book_author': item.book.author.name if item.book and item.book.author else None,
+                'book_image': self._get_book_image(item.book) if item.book else None,
+                'quantity': item.quantity,
+                'price': str(item.price),
+                'unit_price': str(item.price),  # Alias for frontend compatibility
+                'total_price': str(item.total_price),
+            }
+            for item in obj.items.all()
+        ]
 
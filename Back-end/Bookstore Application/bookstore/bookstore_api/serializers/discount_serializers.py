@@ -13,9 +13,10 @@ class DiscountCodeSerializer(serializers.ModelSerializer):
         model = DiscountCode
         fields = [
             'id', 'code', 'discount_percentage', 'usage_limit_per_customer',
+            'max_redemptions', 'redemption_count',
             'expiration_date', 'is_active', 'created_at', 'updated_at'
         ]
-        read_only_fields = ['id', 'created_at', 'updated_at']
+        read_only_fields = ['id', 'redemption_count', 'created_at', 'updated_at']
         extra_kwargs = {
             'code': {
                 'required': True,
@@ -104,7 +105,7 @@ class DiscountCodeUpdateSerializer(serializers.ModelSerializer):
     class Meta:
         model = DiscountCode
         fields = [
-            'discount_percentage', 'usage_limit_per_customer', 'expiration_date', 'is_active'
+            'discount_percentage', 'usage_limit_per_customer', 'max_redemptions', 'expiration_date', 'is_active'
         ]
         extra_kwargs = {
             'discount_percentage': {
@@ -155,13 +156,13 @@ class DiscountCodeListSerializer(serializers.ModelSerializer):
         model = DiscountCode
         fields = [
             'id', 'code', 'discount_percentage', 'usage_limit_per_customer',
-            'expiration_date', 'is_active', 'created_at', 'updated_at',
+            'max_redemptions', 'expiration_date', 'is_active', 'created_at', 'updated_at',
             'usage_count', 'is_expired', 'status'
         ]
     
     def get_usage_count(self, obj):
         """Get total usage count for this discount code."""
-        return obj.usages.count()
+        return obj.redemption_count
     
     def get_is_expired(self, obj):
         """Check if the discount code is expired."""
@@ -413,10 +414,10 @@ class BookDiscountSerializer(serializers.ModelSerializer):
         model = BookDiscount
         fields = [
             'id', 'code', 'discount_type', 'book', 'book_name', 'book_price', 'book_thumbnail',
-            'discounted_price', 'usage_limit_per_customer',
+            'discounted_price', 'usage_limit_per_customer', 'max_redemptions', 'redemption_count',
             'start_date', 'end_date', 'is_active', 'created_at', 'updated_at'
         ]
-        read_only_fields = ['id', 'created_at', 'updated_at']
+        read_only_fields = ['id', 'redemption_count', 'created_at', 'updated_at']
         extra_kwargs = {
             'code': {
                 'required': True,
@@ -556,7 +557,7 @@ class BookDiscountUpdateSerializer(serializers.ModelSerializer):
     class Meta:
         model = BookDiscount
         fields = [
-            'discounted_price', 'usage_limit_per_customer',
+            'discounted_price', 'usage_limit_per_customer', 'max_redemptions',
             'start_date', 'end_date', 'is_active'
         ]
         extra_kwargs = {
@@ -632,7 +633,7 @@ class BookDiscountListSerializer(serializers.ModelSerializer):
         model = BookDiscount
         fields = [
             'id', 'code', 'discount_type', 'book', 'book_name', 'book_price', 'book_thumbnail',
-            'discounted_price', 'usage_limit_per_customer',
+            'discounted_price', 'usage_limit_per_customer', 'max_redemptions',
             'start_date', 'end_date', 'is_active', 'created_at', 'updated_at',
             'usage_count', 'is_expired', 'is_not_started', 'status', 'final_price'
         ]
@@ -652,7 +653,7 @@ class BookDiscountListSerializer(serializers.ModelSerializer):
     
     def get_usage_count(self, obj):
         """Get total usage count for this book discount."""
-        return obj.usages.count()
+        return obj.redemption_count
     
     def get_is_expired(self, obj):
         """Check if the discount has expired."""
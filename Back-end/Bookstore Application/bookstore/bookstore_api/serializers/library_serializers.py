@@ -1,6 +1,7 @@
 from rest_framework import serializers
 from django.core.exceptions import ValidationError
 from ..models import Library, User, Book, BookImage, Category, Author, BookEvaluation, Favorite, Like, ReviewReply
+from .mixins import SparseFieldsetMixin
 
 
 class BookSerializer(serializers.ModelSerializer):
@@ -736,9 +737,10 @@ class BookDetailSerializer(serializers.ModelSerializer):
         return None
 
 
-class BookListSerializer(serializers.ModelSerializer):
+class BookListSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """
     Simplified serializer for listing books with discount information.
+    Supports ?fields= / ?exclude= (e.g. ?fields=id,name,price,primary_image_url).
     """
     
     library_name = serializers.CharField(source='library.name', read_only=True)
@@ -773,6 +775,19 @@ class BookListSerializer(serializers.ModelSerializer):
             'created_at', 'updated_at'
         ]
     
+    PROJECTION = {
+        'primary_image_url': [],
+        'image_count': [],
+        'can_borrow': ['is_available', 'is_available_for_borrow', 'available_copies'],
+        'can_purchase': ['is_available', 'quantity'],
+        'availability_status': ['is_available', 'is_available_for_borrow', 'available_copies'],
+        'has_active_discount': [],
+        'original_price': ['price'],
+        'discounted_price': [],
+        'discount_amount': ['price'],
+        'discount_percentage': ['price'],
+    }
+    
     def get_has_active_discount(self, obj):
         """Check if the book has an active discount."""
         from ..models.discount_model import BookDiscount
@@ -1665,9 +1680,10 @@ class ReplyLikeSerializer(serializers.ModelSerializer):
         return attrs
 
 
-class EvaluationListSerializer(serializers.ModelSerializer):
+class EvaluationListSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """
     Simplified serializer for listing evaluations.
+    Supports ?fields= / ?exclude= (e.g. ?exclude=replies).
     """
     
     book_name = serializers.CharField(source='book.name', read_only=True)
@@ -1691,6 +1707,12 @@ class EvaluationListSerializer(serializers.ModelSerializer):
             'created_at', 'updated_at'
         ]
     
+    PROJECTION = {
+        'likes_count': [],
+        'replies_count': [],
+        'is_liked': [],
+    }
+    
     def get_likes_count(self, obj):
         """Get the number of likes for this review."""
         return obj.likes.filter(target_type='review').count()
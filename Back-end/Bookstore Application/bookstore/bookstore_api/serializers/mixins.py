@@ -0,0 +1,145 @@
+from django.core.exceptions import FieldDoesNotExist
+from django.db.models.query import ModelIterable, QuerySet
+
+
+class SparseFieldsetMixin:
+    """
+    Serializer mixin for response projection.
+
+    Clients pick the fields they need with ?fields=name,price,... and/or
+    drop fields with ?exclude=description,... Fields that are not selected
+    are removed when the serializer is created, so their method fields and
+    nested serializers never run. Unknown names are ignored, and the full
+    field set is sent when no known field is selected.
+
+    Only the top-level serializer of a request is projected; nested
+    serializers have no request in their context when they are created.
+    """
+
+    FIELDS_PARAM = 'fields'
+    EXCLUDE_PARAM = 'exclude'
+
+    # Model fields read by fields whose source is not a model field (method
+    # fields, properties, model methods). project_queryset leaves the
+    # queryset alone when a selected field is neither a model field nor
+    # listed here.
+    PROJECTION = {}
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        selected = self.select_field_names(self.fields, self.context.get('request'))
+        if selected is not None:
+            for name in list(self.fields):
+                if name not in selected:
+                    self.fields.pop(name)
+
+    @staticmethod
+    def _parse_param(request, param):
+        query_params = getattr(request, 'query_params', None)
+        if not query_params or not query_params.get(param):
+            return set()
+        return {name.strip() for name in query_params.get(param).split(',') if name.strip()}
+
+    @classmethod
+    def select_field_names(cls, field_names, request):
+        """
+        Field names to send for a request.
+
+        Returns:
+            Set of field names, or None when every field should be sent
+        """
+        fields = cls._parse_param(request, cls.FIELDS_PARAM)
+        exclude = cls._parse_param(request, cls.EXCLUDE_PARAM)
+        if not fields and not exclude:
+            return None
+
+        available = set(field_names)
+        selected = (fields & available) or available
+        selected = selected - exclude
+        if not selected or selected == available:
+            return None
+        return selected
+
+    @classmethod
+    def get_requested_fields(cls, request):
+        """Field names selected by a request, or None for every field."""
+        return cls.select_field_names(cls().fields, request)
+
+    @classmethod
+    def _model_lookup(cls, model, source):
+        """
+        Column of the model that a dotted field source reads, or None when
+        the source is not a model field. Related fields only need their
+        foreign key, and reverse relations only need the primary key.
+        """
+        name = source.split('.')[0]
+        if name.startswith('get_') and name.endswith('_display'):
+            # Choice labels (get_status_display) read the choice field
+            name = name[len('get_'):-len('_display')]
+        try:
+            model_field = model._meta.get_field(name)
+        except FieldDoesNotExist:
+            return None
+        if model_field.concrete:
+            return model_field.name
+        return model._meta.pk.name
+
+    @classmethod
+    def project_queryset(cls, queryset, request):
+        """
+        Narrow a queryset with only() to the columns the selected fields
+        read. Returns the queryset unchanged when every field is selected or
+        a selected field's columns are unknown.
+        """
+        if not isinstance(queryset, QuerySet) or queryset._iterable_class is not ModelIterable:
+            return queryset
+        serializer = cls()
+        selected = cls.select_field_names(serializer.fields, request)
+        if selected is None:
+            return queryset
+
+        model = queryset.model
+        columns = {model._meta.pk.name}
+        for name in selected:
+            if name in cls.PROJECTION:
+                columns.update(cls.PROJECTION[name])
+                continue
+            source = serializer.fields[name].source
+            column = cls._model_lookup(model, source) if source != '*' else None
+            if column is None:
+                return queryset
+            columns.add(column)
+
+        # Relations the queryset joins or prefetches through a foreign key
+        # cannot be deferred
+        select_related = queryset.query.select_related
+        related = list(select_related) if isinstance(select_related, dict) else []
+        related += [getattr(lookup, 'prefetch_through', lookup) for lookup in queryset._prefetch_related_lookups]
+        for lookup in related:
+            column = cls._model_lookup(model, lookup.split('__')[0])
+            if column is not None:
+                columns.add(column)
+
+        return queryset.only(*columns)
+
+
+class SparseFieldsetViewMixin:
+    """
+    List view mixin that projects the queryset of a SparseFieldsetMixin
+    serializer to the fields requested with ?fields= / ?exclude=, before it
+    is paginated or serialized.
+    """
+
+    def project_queryset(self, queryset):
+        serializer_class = self.get_serializer_class()
+        if self.request.method != 'GET' or not hasattr(serializer_class, 'project_queryset'):
+            return queryset
+        return serializer_class.project_queryset(queryset, self.request)
+
+    def paginate_queryset(self, queryset):
+        return super().paginate_queryset(self.project_queryset(queryset))
+
+    def get_serializer(self, *args, **kwargs):
+        if args and kwargs.get('many'):
+            args = (self.project_queryset(args[0]),) + args[1:]
+        return super().get_serializer(*args, **kwargs)
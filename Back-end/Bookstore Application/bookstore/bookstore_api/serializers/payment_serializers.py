@@ -16,53 +16,57 @@ class PaymentSerializer(serializers.ModelSerializer):
         source='get_status_display',
         read_only=True
     )
+    method_details = serializers.SerializerMethodField()
     
     class Meta:
         model = Payment
         fields = [
-            'id', 'user', 'amount', 'payment_type', 'payment_type_display',
+            'id', 'payment_id', 'customer', 'amount', 'payment_type', 'payment_type_display',
             'status', 'status_display', 'transaction_id', 'delivery_cost',
-            'created_at', 'updated_at'
+            'original_amount', 'discount_code_used', 'discount_amount',
+            'method_details', 'created_at', 'updated_at'
         ]
-        read_only_fields = ['id', 'user', 'transaction_id', 'created_at', 'updated_at', 'status']
+        read_only_fields = ['id', 'payment_id', 'customer', 'transaction_id', 'created_at', 'updated_at', 'status']
+    
+    def get_method_details(self, obj):
+        """Card or delivery details, read from the payment row itself."""
+        return obj.get_method_details()
 
 
 class CreditCardPaymentSerializer(serializers.ModelSerializer):
     """
     Serializer for credit card payment details.
     """
-    payment = PaymentSerializer(read_only=True)
-    # For write operations, we need the full card number
-    card_number = serializers.CharField(
-        write_only=True,
-        help_text="Full credit card number (will not be stored)"
+    masked_card_number = serializers.CharField(
+        source='get_masked_card_number',
+        read_only=True
     )
-    cvv = serializers.CharField(
-        write_only=True,
-        help_text="CVV code (will not be stored)"
+    card_type_display = serializers.CharField(
+        source='get_card_type_display',
+        read_only=True
     )
     
     class Meta:
         model = CreditCardPayment
         fields = [
-            'id', 'payment', 'card_holder_name', 'card_number_last_four',
-         'expiry_month', 'expiry_year', 'card_number', 'cvv'
+            'id', 'payment_id', 'amount', 'status', 'cardholder_name', 'masked_card_number',
+            'card_type', 'card_type_display', 'expiry_month', 'expiry_year', 'transaction_id'
         ]
-        read_only_fields = ['id', 'payment', 'card_number_last_four']
+        read_only_fields = fields
 
 
 class CashOnDeliveryPaymentSerializer(serializers.ModelSerializer):
     """
     Serializer for cash on delivery payment details.
     """
-    payment = PaymentSerializer(read_only=True)
     
     class Meta:
         model = CashOnDeliveryPayment
         fields = [
-            'id', 'payment', 'delivery_address', 'contact_phone', 'notes'
+            'id', 'payment_id', 'amount', 'status', 'delivery_address', 'delivery_city',
+            'contact_phone', 'exact_change', 'preferred_delivery_time', 'delivery_notes'
         ]
-        read_only_fields = ['id', 'payment']
+        read_only_fields = ['id', 'payment_id', 'amount', 'status']
 
 
 class PaymentStatusUpdateSerializer(serializers.ModelSerializer):
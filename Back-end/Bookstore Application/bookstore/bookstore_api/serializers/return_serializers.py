@@ -1,7 +1,9 @@
+from decimal import Decimal
+
 from rest_framework import serializers
 from django.db import transaction
 import logging
-from ..models.return_model import ReturnRequest, ReturnStatus, ReturnFine
+from ..models.return_model import ReturnRequest, ReturnStatus, ReturnFine, FineRateTable
 from ..models.borrowing_model import BorrowRequest
 from ..models.user_model import User
 from .borrowing_serializers import BorrowRequestDetailSerializer
@@ -411,3 +413,40 @@ class ReturnFineSerializer(serializers.ModelSerializer):
         """Return human-readable payment status"""
         return 'Paid' if obj.is_paid else 'Pending'
 
+
+class FineRateTableSerializer(serializers.ModelSerializer):
+    """
+    Serializer for FineRateTable versions.
+    Rates not given when publishing are carried over from the version in effect.
+    """
+    created_by_name = serializers.CharField(source='created_by.get_full_name', read_only=True, allow_null=True)
+    
+    class Meta:
+        model = FineRateTable
+        fields = [
+            'id', 'version', 'late_fee_per_hour', 'max_late_fee', 'damage_fee',
+            'lost_fee_uses_book_price', 'lost_fee', 'deposit_late_fee_per_day',
+            'effective_from', 'notes', 'created_by', 'created_by_name', 'created_at'
+        ]
+        read_only_fields = ['id', 'version', 'created_by', 'created_at']
+        extra_kwargs = {
+            'late_fee_per_hour': {'required': False, 'min_value': Decimal('0')},
+            'damage_fee': {'required': False, 'min_value': Decimal('0')},
+            'lost_fee': {'required': False, 'min_value': Decimal('0')},
+            'deposit_late_fee_per_day': {'required': False, 'min_value': Decimal('0')},
+            'max_late_fee': {'min_value': Decimal('0')},
+        }
+
+
+class FinePricingPreviewSerializer(serializers.Serializer):
+    """
+    Serializer for "what if" fine previews: the proposed rates to compare
+    against the rate table in effect.
+    """
+    late_fee_per_hour = serializers.DecimalField(max_digits=6, decimal_places=2, min_value=Decimal('0'), required=False)
+    max_late_fee = serializers.DecimalField(max_digits=8, decimal_places=2, min_value=Decimal('0'), required=False)
+    damage_fee = serializers.DecimalField(max_digits=8, decimal_places=2, min_value=Decimal('0'), required=False)
+    lost_fee_uses_book_price = serializers.BooleanField(required=False)
+    lost_fee = serializers.DecimalField(max_digits=8, decimal_places=2, min_value=Decimal('0'), required=False)
+    deposit_late_fee_per_day = serializers.DecimalField(max_digits=6, decimal_places=2, min_value=Decimal('0'), required=False)
+    sample_size = serializers.IntegerField(min_value=0, max_value=200, default=20)
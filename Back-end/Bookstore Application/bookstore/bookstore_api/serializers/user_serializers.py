@@ -149,9 +149,8 @@ class UnifiedRegistrationSerializer(BaseUserSerializer):
             # Always create delivery profile with explicit values to avoid database default issues
             try:
                 with transaction.atomic():
-                    # Check if profile already exists (shouldn't happen during registration, but safety check)
+                    # User.save() normally creates the profile already; this is a safety check
                     if DeliveryProfile.objects.filter(user=user).exists():
-                        logger.warning(f"Delivery profile already exists for user {user.id} during registration")
                         delivery_profile = DeliveryProfile.objects.get(user=user)
                     else:
                         # Create new profile with all required fields explicitly set
@@ -270,9 +269,8 @@ class DeliveryAdminRegistrationSerializer(BaseUserSerializer):
         # Always create delivery profile with explicit values to avoid database default issues
         try:
             with transaction.atomic():
-                # Check if profile already exists (shouldn't happen during registration, but safety check)
+                # User.save() normally creates the profile already; this is a safety check
                 if DeliveryProfile.objects.filter(user=user).exists():
-                    logger.warning(f"Delivery profile already exists for user {user.id} during registration")
                     delivery_profile = DeliveryProfile.objects.get(user=user)
                 else:
                     # Create new profile with all required fields explicitly set
@@ -18,7 +18,7 @@ from .library_services import (
     FavoriteAccessService,
 )
 
-from .notification_services import NotificationService
+from .notification_services import NotificationService, EmailOutboxService
 
 from .borrowing_services import (
     BorrowingService,
@@ -38,6 +38,7 @@ from .complaint_services import ComplaintManagementService
 from .report_services import ReportManagementService
 
 from .delivery_profile_services import DeliveryProfileService
+from .delivery_sync_services import DeliveryRequestSyncService
 
 
 __all__ = [
@@ -57,6 +58,7 @@ __all__ = [
     'FavoriteAccessService',
     # Notification services
     'NotificationService',
+    'EmailOutboxService',
     # Borrowing services
     'BorrowingService',
     'BorrowingNotificationService',
@@ -77,4 +79,5 @@ __all__ = [
     'AdvertisementSchedulingService',
     # Delivery profile services
     'DeliveryProfileService',
+    'DeliveryRequestSyncService',
 ] 
\ No newline at end of file
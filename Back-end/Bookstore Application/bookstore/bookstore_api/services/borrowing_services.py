@@ -1,4 +1,5 @@
-from django.db.models import Q, Count, Avg, Sum
+from django.db.models import Q, Count, Avg, Sum, Exists, OuterRef, Subquery
+from django.db.models.functions import Coalesce
 from django.db import transaction
 from django.utils import timezone
 from datetime import timedelta
@@ -10,14 +11,24 @@ if TYPE_CHECKING:
     pass
 
 from ..models import (
-    BorrowRequest, BorrowExtension, BorrowStatistics,
+    BorrowRequest, BorrowExtension, BookBorrowStatistics,
     Book, User, Payment, BorrowStatusChoices, ExtensionStatusChoices, FineStatusChoices,
     Notification, ReturnFine
 )
 from ..services.notification_services import NotificationService
+from ..services.borrowing_sweep_services import BorrowingSweepService
+from ..services.fine_pricing_services import FinePricingEngine
 
 logger = logging.getLogger(__name__)
 
+# Borrow statuses that hold a copy of the book (most borrowed books listing)
+MOST_BORROWED_RESERVED_STATUSES = [
+    BorrowStatusChoices.APPROVED,
+    BorrowStatusChoices.PENDING_DELIVERY,
+    BorrowStatusChoices.ACTIVE,
+    BorrowStatusChoices.EXTENDED,
+]
+
 
 class BorrowingService:
     """
@@ -563,9 +574,6 @@ class BorrowingService:
         borrow_request.book.borrow_count += 1
         borrow_request.book.save()
         
-        # Update book statistics
-        BorrowingService.update_book_statistics(borrow_request.book)
-        
         # Send notification to customer
         NotificationService.create_notification(
             user_id=borrow_request.customer.id,
@@ -680,9 +688,6 @@ class BorrowingService:
         # Release copy back to available pool
         borrow_request.book.return_copy()
         
-        # Update book statistics
-        BorrowingService.update_book_statistics(borrow_request.book)
-        
         # Send notification to customer
         NotificationService.create_notification(
             user_id=borrow_request.customer.id,
@@ -716,9 +721,6 @@ class BorrowingService:
         borrow_request.rating_date = timezone.now()
         borrow_request.save()
         
-        # Update book statistics
-        BorrowingService.update_book_statistics(borrow_request.book)
-        
         return borrow_request
     
     @staticmethod
@@ -835,10 +837,19 @@ class BorrowingService:
     def get_most_borrowed_books(limit: int = 20) -> List[Book]:
         """
         Get most borrowed books
+        Average rating and reserved copies are annotated for MostBorrowedBookSerializer,
+        so listing the books does not run queries per book.
         """
+        reserved_copies = BorrowRequest.objects.filter(
+            book_id=OuterRef('pk'),
+            status__in=MOST_BORROWED_RESERVED_STATUSES
+        ).order_by().values('book_id').annotate(total=Count('id')).values('total')
         return Book.objects.filter(
             borrow_stats__isnull=False
-        ).select_related('author', 'borrow_stats').order_by(
+        ).select_related('author', 'borrow_stats').annotate(
+            average_rating_value=Avg('evaluations__rating'),
+            reserved_copies=Coalesce(Subquery(reserved_copies), 0)
+        ).order_by(
             '-borrow_stats__total_borrows'
         )[:limit]
     
@@ -889,14 +900,13 @@ class BorrowingService:
         ]
         
         # Method 2: Exclude BorrowRequests that have ReturnRequests (most reliable)
-        # Get IDs of BorrowRequests that have ReturnRequests
-        borrow_ids_with_returns = ReturnRequest.objects.values_list('borrowing_id', flat=True).distinct()
+        # Correlated NOT EXISTS on the indexed borrowing FK, instead of a NOT IN over all return history
         
         # Use prefetch_related for delivery_requests to avoid N+1 queries
         queryset = BorrowRequest.objects.exclude(
             status__in=return_statuses
-        ).exclude(
-            id__in=borrow_ids_with_returns
+        ).filter(
+            ~Exists(ReturnRequest.objects.filter(borrowing_id=OuterRef('pk')))
         ).select_related('customer', 'book').prefetch_related('delivery_requests').order_by('-request_date')
         
         # Add status filter if provided
@@ -948,12 +958,10 @@ class BorrowingService:
         # CRITICAL: Exclude BorrowRequests that have ReturnRequests
         # Even if status is PENDING, if a ReturnRequest exists, it shouldn't appear here
         from ..models.return_model import ReturnRequest
-        borrow_ids_with_returns = ReturnRequest.objects.values_list('borrowing_id', flat=True).distinct()
-        
         queryset = BorrowRequest.objects.filter(
             status=BorrowStatusChoices.PENDING
-        ).exclude(
-            id__in=borrow_ids_with_returns
+        ).filter(
+            ~Exists(ReturnRequest.objects.filter(borrowing_id=OuterRef('pk')))
         ).select_related('customer', 'book').order_by('request_date')
         
         # Add search functionality
@@ -990,41 +998,11 @@ class BorrowingService:
     @staticmethod
     def update_book_statistics(book: Book):
         """
-        Update borrowing statistics for a book
+        Recount borrowing statistics for a book.
+        Status transitions keep the counters current through deltas in
+        BorrowRequest.save, so this is only needed to repair drift.
         """
-        stats, created = BorrowStatistics.objects.get_or_create(book=book)
-        
-        # Update borrow counts
-        stats.total_borrows = BorrowRequest.objects.filter(
-            book=book,
-            status__in=[BorrowStatusChoices.ACTIVE, BorrowStatusChoices.EXTENDED, BorrowStatusChoices.RETURNED]
-        ).count()
-        
-        stats.current_borrows = BorrowRequest.objects.filter(
-            book=book,
-            status__in=[BorrowStatusChoices.ACTIVE, BorrowStatusChoices.EXTENDED]
-        ).count()
-        
-        # Update ratings
-        ratings = BorrowRequest.objects.filter(
-            book=book,
-            rating__isnull=False
-        ).values_list('rating', flat=True)
-        
-        if ratings:
-            stats.average_rating = sum(ratings) / len(ratings)
-            stats.total_ratings = len(ratings)
-        
-        # Update last borrowed date
-        last_borrow = BorrowRequest.objects.filter(
-            book=book,
-            delivery_date__isnull=False
-        ).order_by('-delivery_date').first()
-        
-        if last_borrow:
-            stats.last_borrowed = last_borrow.delivery_date
-        
-        stats.save()
+        return BookBorrowStatistics.rebuild(book_ids=[book.id])
     
     @staticmethod
     def get_available_delivery_managers() -> List[User]:
@@ -1032,98 +1010,32 @@ class BorrowingService:
         Get ALL delivery managers (online, busy, offline) with their status for admin selection.
         This method returns all delivery managers regardless of their status.
         Only online managers are selectable in the UI, but all managers are displayed.
-        Ensures all delivery managers have delivery profiles.
+        Delivery profiles are created together with the user (backfill older
+        accounts with the backfill_delivery_profiles command).
         """
-        from ..models import DeliveryProfile
-        from ..services.delivery_profile_services import DeliveryProfileService
-        
-        # Get all active delivery managers - use prefetch_related to ensure we get all managers
-        # even if they don't have profiles yet (though we create them below)
-        delivery_managers = User.objects.filter(
+        return User.objects.filter(
             user_type='delivery_admin',
             is_active=True
         ).select_related('delivery_profile').order_by('first_name', 'last_name')
-        
-        # Ensure all delivery managers have profiles with valid status
-        managers_list = list(delivery_managers)  # Convert to list to allow modification
-        for manager in managers_list:
-            try:
-                # Get or create delivery profile
-                delivery_profile = DeliveryProfileService.get_or_create_delivery_profile(manager)
-                
-                # Ensure status is not None
-                if delivery_profile.delivery_status is None:
-                    delivery_profile.delivery_status = 'offline'
-                    delivery_profile.save(update_fields=['delivery_status'])
-                    logger.info(f"Set delivery_status to 'offline' for manager {manager.id}")
-                
-                # Reload the manager to get the updated profile relationship
-                manager = User.objects.select_related('delivery_profile').get(pk=manager.pk)
-                
-            except Exception as e:
-                logger.warning(f"Failed to create/update delivery profile for manager {manager.id}: {str(e)}")
-        
-        # Re-query to ensure all relationships are properly loaded
-        # Use select_related for OneToOne to ensure it's loaded
-        queryset = User.objects.filter(
-            user_type='delivery_admin',
-            is_active=True
-        ).select_related('delivery_profile').order_by('first_name', 'last_name')
-        
-        # Force evaluation and verify profiles exist
-        managers_list = list(queryset)
-        for manager in managers_list:
-            # Ensure profile exists and has status
-            try:
-                if not hasattr(manager, 'delivery_profile') or manager.delivery_profile is None:
-                    logger.warning(f"Manager {manager.id} has no delivery_profile, creating one...")
-                    delivery_profile = DeliveryProfileService.get_or_create_delivery_profile(manager)
-                    if delivery_profile.delivery_status is None:
-                        delivery_profile.delivery_status = 'offline'
-                        delivery_profile.save(update_fields=['delivery_status'])
-                elif manager.delivery_profile.delivery_status is None:
-                    logger.warning(f"Manager {manager.id} has null delivery_status, setting to offline...")
-                    manager.delivery_profile.delivery_status = 'offline'
-                    manager.delivery_profile.save(update_fields=['delivery_status'])
-            except Exception as e:
-                logger.error(f"Error ensuring profile for manager {manager.id}: {str(e)}")
-        
-        # After ensuring all profiles exist, re-query to get fresh data with all profiles loaded
-        # This ensures we get all managers with their updated profiles
-        # IMPORTANT: Return ALL managers regardless of status (online, offline)
-        # Use select_related to efficiently load profiles
-        # Note: select_related with OneToOneField uses LEFT OUTER JOIN, so it includes
-        # all managers even if they don't have profiles (though we create them above)
-        final_queryset = User.objects.filter(
+    
+    @staticmethod
+    def get_delivery_manager_status_counts() -> Dict[str, int]:
+        """
+        Count active delivery managers per delivery status with one grouped query.
+        Managers without a profile or status are counted as offline.
+        """
+        counts = {'online': 0, 'offline': 0}
+        rows = User.objects.filter(
             user_type='delivery_admin',
             is_active=True
-        ).select_related('delivery_profile').order_by('first_name', 'last_name')
-        
-        # Log the count for debugging
-        manager_count = final_queryset.count()
-        logger.info(f"BorrowingService.get_available_delivery_managers: Returning {manager_count} delivery managers (ALL statuses: online, offline)")
-        
-        # Log each manager's status for debugging
-        status_counts = {'online': 0, 'offline': 0, 'unknown': 0}
-        for manager in final_queryset:
-            try:
-                status = 'unknown'
-                if hasattr(manager, 'delivery_profile') and manager.delivery_profile:
-                    status = manager.delivery_profile.delivery_status or 'offline'
-                    # Handle legacy 'busy' status if it exists
-                    if status == 'busy':
-                        status = 'online'
-                status_counts[status] = status_counts.get(status, 0) + 1
-                logger.info(f"BorrowingService: Manager {manager.id} ({manager.get_full_name()}) - Status: {status}")
-            except Exception as e:
-                status_counts['unknown'] += 1
-                logger.warning(f"BorrowingService: Error logging manager {manager.id}: {str(e)}")
-        
-        logger.info(f"BorrowingService: Status breakdown - Online: {status_counts['online']}, Offline: {status_counts['offline']}, Unknown: {status_counts['unknown']}")
-        
-        # Return ALL delivery managers (online, offline) - NO FILTERING BY STATUS
-        # The frontend will display all managers but only allow selection of online ones
-        return final_queryset
+        ).values('delivery_profile__delivery_status').annotate(total=Count('id')).order_by()
+        for row in rows:
+            delivery_status = row['delivery_profile__delivery_status'] or 'offline'
+            # Legacy 'busy' status is displayed as online
+            if delivery_status == 'busy':
+                delivery_status = 'online'
+            counts[delivery_status] = counts.get(delivery_status, 0) + row['total']
+        return counts
 
 
 class BorrowingNotificationService:
@@ -1135,57 +1047,17 @@ class BorrowingNotificationService:
     def send_return_reminders():
         """
         Send return reminders 2 days before due date (Step 6: Two days before the return date)
+        Runs the reminder sweep, so each loan is reminded once per return date.
         """
-        reminder_date = timezone.now() + timedelta(days=2)
-        
-        borrowings_due_soon = BorrowRequest.objects.filter(
-            status__in=[BorrowStatusChoices.ACTIVE, BorrowStatusChoices.EXTENDED],
-            final_return_date__date=reminder_date.date()
-        )
-        
-        for borrowing in borrowings_due_soon:
-            NotificationService.create_notification(
-                user_id=borrowing.customer.id,
-                title="Return Reminder",
-                message=f"Reminder: The due date for return of '{borrowing.book.name}' is {borrowing.final_return_date.strftime('%m/%d/%Y')}.",
-                notification_type="return_reminder"
-            )
+        return BorrowingSweepService.send_due_soon_reminders()
     
     @staticmethod
     def process_overdue_borrowings():
         """
-        Process overdue borrowings and create fines as specified in requirements
+        Mark overdue borrowings as late and notify customers and library managers.
+        Runs the overdue sweep (see BorrowingSweepService).
         """
-        overdue_borrowings = BorrowingService.get_overdue_borrowings()
-        
-        for borrowing in overdue_borrowings:
-            # Update status to late
-            if borrowing.status != BorrowStatusChoices.LATE:
-                borrowing.status = BorrowStatusChoices.LATE
-                borrowing.save()
-                
-                # Note: Borrowing itself never generates a fine.
-                # Fines are only created when a return request is processed and the return is late/damaged/lost.
-                # Just update status and send notifications about overdue status.
-                
-                # Send notification to customer about overdue status
-                days_overdue = borrowing.get_days_overdue()
-                NotificationService.create_notification(
-                    user_id=borrowing.customer.id,
-                    title="Book Overdue",
-                    message=f"Your book '{borrowing.book.name}' is overdue by {days_overdue} days. Please return it as soon as possible.",
-                    notification_type="overdue_alert"
-                )
-                
-                # Send notification to library manager
-                library_admins = User.objects.filter(user_type='library_admin')
-                for admin in library_admins:
-                    NotificationService.create_notification(
-                        user_id=admin.id,
-                        title="Overdue Book Alert",
-                        message=f"Customer {borrowing.customer.get_full_name()} has been late returning book '{borrowing.book.name}' for {days_overdue} days.",
-                        notification_type="overdue_alert"
-                    )
+        return BorrowingSweepService.sweep_overdue()
 
 
 class LateReturnService:
@@ -1556,7 +1428,7 @@ class BorrowingPaymentService:
         if borrow_request.status == BorrowStatusChoices.LATE:
             # Calculate late fee
             days_overdue = borrow_request.days_overdue
-            late_fee = Decimal('4.00') * days_overdue  # $4 per day late fee
+            late_fee = FinePricingEngine.deposit_late_fee(days_overdue)
             
             # Refund half amount minus late fee
             refund_amount = (base_amount / 2) - late_fee
@@ -0,0 +1,220 @@
+from datetime import timedelta
+import logging
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from ..models import BookBorrowStatistics, BorrowRequest, BorrowStatusChoices, BorrowSweepCheckpoint, User
+from .notification_services import NotificationService
+
+logger = logging.getLogger(__name__)
+
+# Loans the sweeps look at
+SWEEP_STATUSES = [BorrowStatusChoices.ACTIVE, BorrowStatusChoices.EXTENDED]
+
+
+class BorrowingSweepService:
+    """
+    Service class for the scheduled overdue and return reminder sweeps.
+
+    Each sweep reads the loans in its window in (final_return_date, id)
+    order, one chunk per transaction. A chunk changes the loans so that they
+    leave the window (overdue loans are flipped to late, reminded loans get
+    reminded_return_date set to their return date) with a single UPDATE and
+    queues its notifications with one bulk insert. A loan that enters the
+    window late (delayed delivery, a short borrow period, a copied return
+    date) is still picked up by the next run, because nothing but the loan
+    itself decides whether it is due.
+
+    The sweep's BorrowSweepCheckpoint row is locked for each chunk, which
+    makes overlapping runs wait for each other instead of processing the
+    same loans twice.
+    """
+
+    @staticmethod
+    def _batch_size(batch_size=None):
+        return batch_size or getattr(settings, 'BORROW_SWEEP_BATCH_SIZE', 500)
+
+    @staticmethod
+    def _reminder_days():
+        """Days before the return date at which customers are reminded."""
+        return getattr(settings, 'BORROW_REMINDER_DAYS', 2)
+
+    @staticmethod
+    def _sweep(name, window, handle_chunk, batch_size=None):
+        """
+        Run one sweep until its window is exhausted.
+
+        Args:
+            name: BorrowSweepCheckpoint name
+            window: Callable taking the current time and returning a Q of the
+                loans still to process; handle_chunk must move every loan it
+                gets out of it
+            handle_chunk: Callable taking the chunk rows and the current time
+            batch_size: Loans per chunk
+
+        Returns:
+            int: Number of loans processed
+        """
+        batch_size = BorrowingSweepService._batch_size(batch_size)
+        processed = 0
+
+        while True:
+            with transaction.atomic():
+                BorrowSweepCheckpoint.objects.get_or_create(name=name)
+                checkpoint = BorrowSweepCheckpoint.objects.select_for_update().get(name=name)
+
+                now = timezone.now()
+                rows = list(
+                    BorrowRequest.objects.filter(
+                        window(now), status__in=SWEEP_STATUSES
+                    ).select_for_update(
+                        of=('self',)
+                    ).order_by('final_return_date', 'id').values_list(
+                        'id', 'final_return_date', 'customer_id',
+                        'customer__first_name', 'customer__last_name', 'book__name',
+                        'book_id', 'status'
+                    )[:batch_size]
+                )
+                if not rows:
+                    break
+
+                handle_chunk(rows, now)
+
+                checkpoint.processed_count += len(rows)
+                checkpoint.last_run_at = now
+                checkpoint.save()
+                processed += len(rows)
+
+            if len(rows) < batch_size:
+                break
+
+        if processed:
+            logger.info(f"Borrowing sweep '{name}' processed {processed} loans")
+        return processed
+
+    @staticmethod
+    def sweep_overdue(batch_size=None):
+        """
+        Mark loans past their return date as late and notify the customers
+        and library admins.
+
+        Note: Borrowing itself never generates a fine. Fines are only created
+        when a return request is processed and the return is late/damaged/lost.
+
+        Returns:
+            int: Number of loans marked as late
+        """
+        admin_ids = list(User.objects.filter(user_type='library_admin').values_list('id', flat=True))
+
+        def handle_chunk(rows, now):
+            BorrowRequest.objects.filter(id__in=[row[0] for row in rows]).update(
+                status=BorrowStatusChoices.LATE,
+                updated_at=now
+            )
+            # update() skips BorrowRequest.save, so apply the statistics deltas here
+            BookBorrowStatistics.apply_status_changes(
+                (book_id, old_status, BorrowStatusChoices.LATE)
+                for *_, book_id, old_status in rows
+            )
+
+            notifications = []
+            for borrow_id, final_return_date, customer_id, first_name, last_name, book_name, *_ in rows:
+                days_overdue = max((now - final_return_date).days, 0)
+                notifications.append({
+                    'user_id': customer_id,
+                    'title': "Book Overdue",
+                    'message': f"Your book '{book_name}' is overdue by {days_overdue} days. Please return it as soon as possible.",
+                    'notification_type': "overdue_alert",
+                    'related_object_type': 'borrow_request',
+                    'related_object_id': borrow_id,
+                })
+                customer_name = f"{first_name} {last_name}".strip()
+                for admin_id in admin_ids:
+                    notifications.append({
+                        'user_id': admin_id,
+                        'title': "Overdue Book Alert",
+                        'message': f"Customer {customer_name} has been late returning book '{book_name}' for {days_overdue} days.",
+                        'notification_type': "overdue_alert",
+                        'related_object_type': 'borrow_request',
+                        'related_object_id': borrow_id,
+                    })
+            NotificationService.create_bulk_notifications(notifications)
+
+        # Flipping a loan to late takes it out of the window, so no position is kept
+        return BorrowingSweepService._sweep(
+            'overdue',
+            lambda now: Q(final_return_date__lt=now),
+            handle_chunk,
+            batch_size=batch_size
+        )
+
+    @staticmethod
+    def send_due_soon_reminders(batch_size=None, full=False):
+        """
+        Remind customers whose loans are due within BORROW_REMINDER_DAYS.
+        Each loan is reminded once per return date: the reminded date is
+        stored on the loan, and an extension or any other change of
+        final_return_date makes it due for a reminder again.
+
+        Args:
+            batch_size: Loans per chunk
+            full: Remind every loan in the window again, even if it was
+                already reminded of its current return date
+
+        Returns:
+            int: Number of reminders sent
+        """
+        reminder_days = BorrowingSweepService._reminder_days()
+
+        def handle_chunk(rows, now):
+            NotificationService.create_bulk_notifications([
+                {
+                    'user_id': customer_id,
+                    'title': "Return Reminder",
+                    'message': f"Reminder: The due date for return of '{book_name}' is {final_return_date.strftime('%m/%d/%Y')}.",
+                    'notification_type': "return_reminder",
+                    'related_object_type': 'borrow_request',
+                    'related_object_id': borrow_id,
+                }
+                for borrow_id, final_return_date, customer_id, first_name, last_name, book_name, *_ in rows
+            ])
+            BorrowRequest.objects.filter(id__in=[row[0] for row in rows]).update(
+                reminded_return_date=F('final_return_date')
+            )
+
+        def window(now):
+            due_soon = Q(
+                final_return_date__gt=now,
+                final_return_date__lte=now + timedelta(days=reminder_days),
+            )
+            return due_soon & (
+                Q(reminded_return_date__isnull=True) |
+                ~Q(reminded_return_date=F('final_return_date'))
+            )
+
+        if full:
+            # Forget the reminders of the loans in the window, so each is reminded once more
+            now = timezone.now()
+            BorrowRequest.objects.filter(
+                status__in=SWEEP_STATUSES,
+                final_return_date__gt=now,
+                final_return_date__lte=now + timedelta(days=reminder_days),
+            ).update(reminded_return_date=None)
+
+        return BorrowingSweepService._sweep('due_soon', window, handle_chunk, batch_size=batch_size)
+
+    @staticmethod
+    def run_all(batch_size=None, full=False):
+        """
+        Run both sweeps.
+
+        Returns:
+            Dictionary with the number of loans processed per sweep
+        """
+        return {
+            'overdue': BorrowingSweepService.sweep_overdue(batch_size),
+            'reminders': BorrowingSweepService.send_due_soon_reminders(batch_size, full),
+        }
@@ -0,0 +1,263 @@
+from django.conf import settings
+import logging
+import math
+import threading
+import time
+
+from ..models import DeliveryProfile, User
+from ..utils import haversine_km
+
+logger = logging.getLogger(__name__)
+
+KM_PER_DEGREE = 111.195
+
+
+class CourierSpatialIndex:
+    """
+    In-memory grid index of courier positions.
+
+    Coordinates are bucketed into square cells of `cell_size_degrees`. A
+    nearest-N query scans rings of cells around the query point and stops as
+    soon as no unscanned cell can hold a courier closer than the N-th best one.
+    """
+
+    def __init__(self, cell_size_degrees=0.05):
+        self.cell_size = cell_size_degrees
+        self._cells = {}
+        self._positions = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._positions)
+
+    def _cell_for(self, latitude, longitude):
+        return (
+            int(math.floor(latitude / self.cell_size)),
+            int(math.floor(longitude / self.cell_size)),
+        )
+
+    def upsert(self, courier_id, latitude, longitude):
+        """Insert or move a courier."""
+        latitude = float(latitude)
+        longitude = float(longitude)
+        cell = self._cell_for(latitude, longitude)
+        with self._lock:
+            previous = self._positions.get(courier_id)
+            if previous is not None:
+                previous_cell = self._cell_for(previous[0], previous[1])
+                if previous_cell != cell:
+                    self._discard_from_cell(previous_cell, courier_id)
+            self._positions[courier_id] = (latitude, longitude)
+            self._cells.setdefault(cell, set()).add(courier_id)
+
+    def remove(self, courier_id):
+        """Remove a courier from the index."""
+        with self._lock:
+            previous = self._positions.pop(courier_id, None)
+            if previous is not None:
+                self._discard_from_cell(self._cell_for(previous[0], previous[1]), courier_id)
+
+    def _discard_from_cell(self, cell, courier_id):
+        members = self._cells.get(cell)
+        if members is not None:
+            members.discard(courier_id)
+            if not members:
+                del self._cells[cell]
+
+    def replace_all(self, positions):
+        """Rebuild the index from an iterable of (courier_id, latitude, longitude)."""
+        cells = {}
+        new_positions = {}
+        for courier_id, latitude, longitude in positions:
+            latitude = float(latitude)
+            longitude = float(longitude)
+            new_positions[courier_id] = (latitude, longitude)
+            cells.setdefault(self._cell_for(latitude, longitude), set()).add(courier_id)
+        with self._lock:
+            self._cells = cells
+            self._positions = new_positions
+
+    def nearest(self, latitude, longitude, limit=5, max_distance_km=None):
+        """
+        Find the couriers closest to a point.
+
+        Returns:
+            List of (courier_id, distance_km) tuples sorted by distance
+        """
+        latitude = float(latitude)
+        longitude = float(longitude)
+        origin_row, origin_col = self._cell_for(latitude, longitude)
+
+        with self._lock:
+            total = len(self._positions)
+            if total == 0 or limit <= 0:
+                return []
+
+            results = []
+            seen = 0
+            ring = 0
+            while seen < total:
+                if 8 * ring > len(self._cells):
+                    # Sparse far-away couriers: scanning rings costs more than a full pass
+                    results = [
+                        (courier_id, haversine_km(latitude, longitude, courier_lat, courier_lon))
+                        for courier_id, (courier_lat, courier_lon) in self._positions.items()
+                    ]
+                    break
+                for cell in self._ring_cells(origin_row, origin_col, ring):
+                    for courier_id in self._cells.get(cell, ()):
+                        courier_lat, courier_lon = self._positions[courier_id]
+                        results.append(
+                            (courier_id, haversine_km(latitude, longitude, courier_lat, courier_lon))
+                        )
+                        seen += 1
+
+                # Any courier outside the scanned rings is at least this far away
+                lower_bound = self._ring_lower_bound_km(latitude, ring)
+                if max_distance_km is not None and lower_bound > max_distance_km:
+                    break
+                if len(results) >= limit:
+                    results.sort(key=lambda item: item[1])
+                    if results[limit - 1][1] <= lower_bound:
+                        break
+                ring += 1
+
+        if max_distance_km is not None:
+            results = [item for item in results if item[1] <= max_distance_km]
+        results.sort(key=lambda item: item[1])
+        return results[:limit]
+
+    @staticmethod
+    def _ring_cells(row, col, ring):
+        if ring == 0:
+            yield (row, col)
+            return
+        for offset in range(-ring, ring + 1):
+            yield (row - ring, col + offset)
+            yield (row + ring, col + offset)
+        for offset in range(-ring + 1, ring):
+            yield (row + offset, col - ring)
+            yield (row + offset, col + ring)
+
+    def _ring_lower_bound_km(self, latitude, ring):
+        """Minimum distance from the query point to any cell outside `ring`."""
+        degrees = ring * self.cell_size
+        # Longitude degrees shrink towards the poles; use the widest latitude in reach
+        widest_latitude = min(abs(latitude) + degrees, 89.9)
+        return degrees * KM_PER_DEGREE * math.cos(math.radians(widest_latitude))
+
+
+class NearestCourierService:
+    """
+    Service class for ranking online couriers by distance.
+    Keeps a process-wide spatial index that is updated on every location
+    write and rebuilt from the database when it gets older than
+    COURIER_INDEX_REFRESH_SECONDS, so positions written by other workers
+    are picked up.
+    """
+
+    _index = None
+    _built_at = None
+    _build_lock = threading.Lock()
+
+    @staticmethod
+    def _refresh_seconds():
+        return getattr(settings, 'COURIER_INDEX_REFRESH_SECONDS', 30)
+
+    @classmethod
+    def get_index(cls):
+        """Get the spatial index, rebuilding it when missing or stale."""
+        now = time.monotonic()
+        if cls._index is None or now - cls._built_at > cls._refresh_seconds():
+            with cls._build_lock:
+                if cls._index is None or now - cls._built_at > cls._refresh_seconds():
+                    cls.rebuild_index()
+        return cls._index
+
+    @classmethod
+    def rebuild_index(cls):
+        """Load the positions of all online couriers with one query."""
+        index = cls._index or CourierSpatialIndex(
+            getattr(settings, 'COURIER_INDEX_CELL_DEGREES', 0.05)
+        )
+        index.replace_all(
+            DeliveryProfile.objects.filter(
+                delivery_status='online',
+                user__is_active=True,
+                latitude__isnull=False,
+                longitude__isnull=False,
+            ).values_list('user_id', 'latitude', 'longitude')
+        )
+        cls._index = index
+        cls._built_at = time.monotonic()
+        logger.debug(f"Rebuilt courier index with {len(index)} couriers")
+        return index
+
+    @classmethod
+    def update_position(cls, manager_id, latitude, longitude, delivery_status):
+        """
+        Move a courier in the index after a location update. Couriers that
+        are not online are dropped instead, so they are never ranked.
+        """
+        if cls._index is None or latitude is None or longitude is None:
+            return
+        if delivery_status != 'online':
+            cls._index.remove(manager_id)
+            return
+        cls._index.upsert(manager_id, latitude, longitude)
+
+    @classmethod
+    def remove_courier(cls, manager_id):
+        """Drop a courier from the index, e.g. when they go offline."""
+        if cls._index is not None:
+            cls._index.remove(manager_id)
+
+    @classmethod
+    def sync_profile(cls, delivery_profile):
+        """Add or drop a courier after an availability change."""
+        if delivery_profile.is_location_set():
+            cls.update_position(
+                delivery_profile.user_id,
+                delivery_profile.latitude,
+                delivery_profile.longitude,
+                delivery_profile.delivery_status
+            )
+        else:
+            cls.remove_courier(delivery_profile.user_id)
+
+    @classmethod
+    def find_nearest_delivery_managers(cls, latitude, longitude, limit=5, max_distance_km=None):
+        """
+        Rank online delivery managers by distance to a point.
+
+        Args:
+            latitude: Latitude of the delivery address
+            longitude: Longitude of the delivery address
+            limit: Number of managers to return
+            max_distance_km: Optional search radius
+
+        Returns:
+            List of User instances with `distance_km` set, closest first
+        """
+        # Over-fetch a little so managers who went offline since the last
+        # rebuild can be dropped without a second index query
+        candidates = cls.get_index().nearest(
+            latitude, longitude, limit=limit * 2, max_distance_km=max_distance_km
+        )
+        if not candidates:
+            return []
+
+        distances = dict(candidates)
+        managers = User.objects.filter(
+            id__in=distances.keys(),
+            user_type='delivery_admin',
+            is_active=True,
+            delivery_profile__delivery_status='online',
+        ).select_related('delivery_profile')
+
+        ranked = []
+        for manager in managers:
+            manager.distance_km = round(distances[manager.id], 3)
+            ranked.append(manager)
+        ranked.sort(key=lambda manager: manager.distance_km)
+        return ranked[:limit]
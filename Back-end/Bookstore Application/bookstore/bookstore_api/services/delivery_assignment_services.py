@@ -0,0 +1,286 @@
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+import heapq
+import logging
+
+from ..models import DeliveryRequest, DeliveryProfile
+from ..models.borrowing_model import BorrowRequest, BorrowStatusChoices
+from ..models.return_model import ReturnRequest, ReturnStatus
+from ..utils import haversine_km
+from .notification_services import NotificationService
+from .delivery_metrics_services import DeliveryMetricsService
+from .geocoding_services import GeocodingService
+
+logger = logging.getLogger(__name__)
+
+# Delivery request statuses that count towards a courier's current load
+LOAD_STATUSES = ['assigned', 'accepted', 'in_delivery']
+
+
+class DeliveryAssignmentService:
+    """
+    Service class for assigning pending delivery requests in bulk.
+
+    Loads every pending request and every online courier once, solves the
+    matching in memory by distance and current load, and applies the result
+    in one transaction. Distances run from the courier's position to the
+    request's destination (its geocoded delivery address); requests that
+    cannot be geocoded are matched on load alone.
+    """
+
+    @staticmethod
+    def _settings():
+        return {
+            'max_load': getattr(settings, 'DELIVERY_AUTO_ASSIGN_MAX_LOAD', 3),
+            'load_penalty_km': getattr(settings, 'DELIVERY_AUTO_ASSIGN_LOAD_PENALTY_KM', 2.0),
+            'max_distance_km': getattr(settings, 'DELIVERY_AUTO_ASSIGN_MAX_DISTANCE_KM', None),
+        }
+
+    @staticmethod
+    def get_assignable_requests():
+        """
+        Pending delivery requests whose source entity is ready for a courier:
+        purchases as they are, borrows once approved and returns once approved.
+        """
+        return DeliveryRequest.objects.filter(
+            status='pending',
+            delivery_manager__isnull=True,
+        ).filter(
+            Q(delivery_type='purchase') |
+            Q(delivery_type='borrow', borrow_request__status=BorrowStatusChoices.APPROVED) |
+            Q(delivery_type='return', return_request__status=ReturnStatus.APPROVED)
+        ).order_by('created_at', 'id')
+
+    @staticmethod
+    def get_courier_loads(courier_ids):
+        """Current open task count per courier with one grouped query."""
+        return dict(
+            DeliveryRequest.objects.filter(
+                delivery_manager_id__in=courier_ids,
+                status__in=LOAD_STATUSES,
+            ).values('delivery_manager_id').annotate(
+                load=Count('id')
+            ).values_list('delivery_manager_id', 'load')
+        )
+
+    @staticmethod
+    def solve(requests, couriers, loads, max_load, load_penalty_km, max_distance_km=None):
+        """
+        Match requests to couriers.
+
+        Cost of a pair is the haversine distance plus `load_penalty_km` for
+        every task the courier already holds. Pairs are taken cheapest first;
+        a courier's cost is re-evaluated lazily when their load changes, and no
+        courier goes above `max_load`. Requests without coordinates are matched
+        on load alone.
+
+        Args:
+            requests: List of (request_id, latitude, longitude)
+            couriers: List of (courier_id, latitude, longitude)
+            loads: Dict of courier_id -> current load
+            max_load: Maximum open tasks per courier
+            load_penalty_km: Cost added per open task
+            max_distance_km: Optional maximum pickup distance
+
+        Returns:
+            Dict of request_id -> (courier_id, distance_km or None)
+        """
+        loads = {courier_id: loads.get(courier_id, 0) for courier_id, _, _ in couriers}
+        positions = {courier_id: (latitude, longitude) for courier_id, latitude, longitude in couriers}
+
+        def distance_for(request_lat, request_lon, courier_id):
+            courier_lat, courier_lon = positions[courier_id]
+            if request_lat is None or request_lon is None:
+                return None
+            if courier_lat is None or courier_lon is None:
+                return False
+            return haversine_km(request_lat, request_lon, courier_lat, courier_lon)
+
+        heap = []
+        for request_id, request_lat, request_lon in requests:
+            for courier_id in positions:
+                if loads[courier_id] >= max_load:
+                    continue
+                distance = distance_for(request_lat, request_lon, courier_id)
+                if distance is False:
+                    continue
+                if distance is not None and max_distance_km is not None and distance > max_distance_km:
+                    continue
+                cost = (distance or 0.0) + loads[courier_id] * load_penalty_km
+                heap.append((cost, request_id, courier_id, loads[courier_id], distance))
+        heapq.heapify(heap)
+
+        assignments = {}
+        while heap:
+            cost, request_id, courier_id, load_at_push, distance = heapq.heappop(heap)
+            if request_id in assignments or loads[courier_id] >= max_load:
+                continue
+            if loads[courier_id] != load_at_push:
+                # Courier picked up work since this pair was priced; re-price it
+                cost = (distance or 0.0) + loads[courier_id] * load_penalty_km
+                heapq.heappush(heap, (cost, request_id, courier_id, loads[courier_id], distance))
+                continue
+            assignments[request_id] = (courier_id, distance)
+            loads[courier_id] += 1
+
+        return assignments
+
+    @staticmethod
+    def auto_assign_pending(dry_run=False, max_load=None, load_penalty_km=None, max_distance_km=None, limit=None):
+        """
+        Assign all assignable pending delivery requests to online couriers.
+
+        Pending rows are locked with SKIP LOCKED, so concurrent runs and manual
+        assignments never fight over the same request. Courier profiles are
+        locked too, so nobody can go offline halfway through the batch.
+
+        Returns:
+            Dictionary with pending, assigned and unassigned counts and the
+            list of assignments
+        """
+        config = DeliveryAssignmentService._settings()
+        max_load = config['max_load'] if max_load is None else max_load
+        load_penalty_km = config['load_penalty_km'] if load_penalty_km is None else load_penalty_km
+        max_distance_km = config['max_distance_km'] if max_distance_km is None else max_distance_km
+
+        # Geocode the destinations before the pending rows are locked
+        to_locate = DeliveryAssignmentService.get_assignable_requests()
+        if limit:
+            to_locate = DeliveryRequest.objects.filter(id__in=list(to_locate.values_list('id', flat=True)[:limit]))
+        GeocodingService.locate_missing(to_locate)
+
+        with transaction.atomic():
+            pending_query = DeliveryAssignmentService.get_assignable_requests().select_for_update(
+                skip_locked=True, of=('self',)
+            ).values_list(
+                'id', 'destination_latitude', 'destination_longitude', 'delivery_type', 'customer_id',
+                'borrow_request_id', 'return_request_id', 'created_at'
+            )
+            if limit:
+                pending_query = pending_query[:limit]
+            pending = list(pending_query)
+
+            couriers = list(
+                DeliveryProfile.objects.select_for_update(of=('self',)).filter(
+                    delivery_status='online',
+                    user__user_type='delivery_admin',
+                    user__is_active=True,
+                ).order_by('id').values_list('user_id', 'latitude', 'longitude')
+            )
+
+            result = {
+                'pending': len(pending),
+                'couriers': len(couriers),
+                'assigned': 0,
+                'unassigned': len(pending),
+                'dry_run': dry_run,
+                'assignments': [],
+            }
+            if not pending or not couriers:
+                return result
+
+            loads = DeliveryAssignmentService.get_courier_loads([courier[0] for courier in couriers])
+            assignments = DeliveryAssignmentService.solve(
+                [(row[0], row[1], row[2]) for row in pending],
+                couriers,
+                loads,
+                max_load=max_load,
+                load_penalty_km=load_penalty_km,
+                max_distance_km=max_distance_km,
+            )
+
+            result['assigned'] = len(assignments)
+            result['unassigned'] = len(pending) - len(assignments)
+            result['assignments'] = [
+                {
+                    'delivery_request_id': request_id,
+                    'delivery_manager_id': courier_id,
+                    'distance_km': round(distance, 3) if distance is not None else None,
+                }
+                for request_id, (courier_id, distance) in assignments.items()
+            ]
+            if dry_run or not assignments:
+                return result
+
+            DeliveryAssignmentService._apply(pending, assignments)
+
+        logger.info(
+            f"Auto-assigned {result['assigned']} of {result['pending']} pending delivery requests "
+            f"to {result['couriers']} couriers"
+        )
+        return result
+
+    @staticmethod
+    def _apply(pending, assignments):
+        """Write the assignments with one UPDATE per courier and table."""
+        now = timezone.now()
+        rows = {row[0]: row for row in pending}
+
+        by_courier = {}
+        for request_id, (courier_id, _) in assignments.items():
+            by_courier.setdefault(courier_id, []).append(request_id)
+
+        notifications = []
+        events = []
+        for courier_id, request_ids in by_courier.items():
+            DeliveryRequest.objects.filter(id__in=request_ids, status='pending').update(
+                delivery_manager_id=courier_id,
+                status='assigned',
+                assigned_at=now,
+                updated_at=now,
+            )
+
+            borrow_ids = [rows[request_id][5] for request_id in request_ids if rows[request_id][3] == 'borrow']
+            if borrow_ids:
+                BorrowRequest.objects.filter(
+                    id__in=borrow_ids, status=BorrowStatusChoices.APPROVED
+                ).update(delivery_person_id=courier_id, status=BorrowStatusChoices.ASSIGNED_TO_DELIVERY)
+
+            return_ids = [rows[request_id][6] for request_id in request_ids if rows[request_id][3] == 'return']
+            if return_ids:
+                ReturnRequest.objects.filter(
+                    id__in=return_ids, status=ReturnStatus.APPROVED
+                ).update(delivery_manager_id=courier_id, status=ReturnStatus.ASSIGNED)
+                BorrowRequest.objects.filter(return_requests__id__in=return_ids).update(
+                    status=BorrowStatusChoices.RETURN_ASSIGNED
+                )
+
+            events.extend(
+                DeliveryMetricsService.build_event(
+                    DeliveryRequest(
+                        id=request_id,
+                        delivery_manager_id=courier_id,
+                        delivery_type=rows[request_id][3],
+                        created_at=rows[request_id][7],
+                    ),
+                    'assigned',
+                    now
+                )
+                for request_id in request_ids
+            )
+
+            notifications.append({
+                'user_id': courier_id,
+                'title': "New Delivery Assignments",
+                'message': f"You have been assigned {len(request_ids)} new delivery request(s).",
+                'notification_type': "delivery_assignment",
+            })
+            for request_id in request_ids:
+                notifications.append({
+                    'user_id': rows[request_id][4],
+                    'title': "Delivery Manager Assigned",
+                    'message': "A delivery manager has been assigned to handle your request.",
+                    'notification_type': "delivery_assigned",
+                    'related_object_type': 'delivery_request',
+                    'related_object_id': request_id,
+                })
+
+        DeliveryMetricsService.record_events(events)
+
+        try:
+            with transaction.atomic():
+                NotificationService.create_bulk_notifications(notifications)
+        except Exception as e:
+            logger.error(f"Error sending auto-assignment notifications: {str(e)}")
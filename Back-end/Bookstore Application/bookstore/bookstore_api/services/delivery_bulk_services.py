@@ -0,0 +1,206 @@
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils import timezone
+import logging
+
+from ..models import DeliveryRequest, DeliveryProfile, User
+from .delivery_metrics_services import DeliveryMetricsService
+from .delivery_profile_services import DeliveryProfileService
+from .delivery_run_services import DeliveryRunService
+from .delivery_services import DeliveryService
+from .live_location_services import LiveLocationService
+from .notification_services import NotificationService
+
+logger = logging.getLogger(__name__)
+
+# Maximum number of delivery requests per bulk call
+MAX_BULK_SIZE = 500
+
+# Actions that make a delivery active; a delivery manager has one active delivery at a time
+SINGLE_ACTIVE_ACTIONS = ('accept', 'start')
+
+# action -> (required current status, new status, timestamp field, metrics event)
+TRANSITIONS = {
+    'accept': ('assigned', 'accepted', 'accepted_at', 'accepted'),
+    'start': ('accepted', 'in_delivery', 'started_at', 'started'),
+    'complete': ('in_delivery', 'completed', 'completed_at', 'completed'),
+}
+
+CUSTOMER_NOTIFICATIONS = {
+    'accept': ("Delivery Accepted", "Your {delivery_type} request has been accepted by {manager}. Delivery will start soon.", "delivery_accepted"),
+    'start': ("Delivery Started", "Your {delivery_type} is now on the way. Delivery manager {manager} has started the delivery.", "delivery_started"),
+    'complete': ("Delivery Completed", "Your {delivery_type} has been completed successfully by {manager}.", "delivery_completed"),
+}
+
+
+class DeliveryBulkService:
+    """
+    Service class for moving many delivery requests of one delivery manager
+    to the next status in a single transaction.
+
+    All requests are locked and validated first; if any of them cannot make
+    the transition, nothing is changed. Status updates, notifications and
+    the courier's active task counter are then written once per batch.
+    Accepting and starting keep the one-active-delivery rule of the single
+    endpoints, so those batches hold one request; completion takes many.
+    """
+
+    @staticmethod
+    @transaction.atomic
+    def bulk_transition(delivery_manager, delivery_request_ids, action, notes=None):
+        """
+        Accept, start or complete several delivery requests at once.
+
+        Args:
+            delivery_manager: User instance (delivery_admin)
+            delivery_request_ids: IDs of the delivery requests
+            action: 'accept', 'start' or 'complete'
+            notes: Optional start notes stored on every request when starting
+
+        Returns:
+            Dictionary with the action, the updated count and the request IDs
+        """
+        if action not in TRANSITIONS:
+            raise ValidationError(f"Invalid action '{action}'. Must be one of: {list(TRANSITIONS)}")
+
+        delivery_request_ids = list(dict.fromkeys(delivery_request_ids))
+        if not delivery_request_ids:
+            raise ValidationError("At least one delivery request is required.")
+        if len(delivery_request_ids) > MAX_BULK_SIZE:
+            raise ValidationError(f"At most {MAX_BULK_SIZE} delivery requests can be updated at once.")
+
+        from_status, to_status, timestamp_field, event_type = TRANSITIONS[action]
+
+        delivery_requests = list(
+            DeliveryRequest.objects.select_for_update(of=('self',)).select_related(
+                'order', 'borrow_request__book', 'return_request__borrowing__book'
+            ).filter(id__in=delivery_request_ids).order_by('id')
+        )
+
+        errors = {}
+        found = {delivery_request.id for delivery_request in delivery_requests}
+        for request_id in delivery_request_ids:
+            if request_id not in found:
+                errors[request_id] = "Delivery request not found."
+        for delivery_request in delivery_requests:
+            if delivery_request.delivery_manager_id != delivery_manager.id:
+                errors[delivery_request.id] = "Only the assigned delivery manager can update this request."
+            elif delivery_request.status != from_status:
+                errors[delivery_request.id] = (
+                    f"Status is '{delivery_request.status}', expected '{from_status}'."
+                )
+        if errors:
+            raise ValidationError({str(request_id): [message] for request_id, message in errors.items()})
+
+        if action in SINGLE_ACTIVE_ACTIONS:
+            # Same one-active-delivery rule as accept_delivery_request and
+            # start_delivery; a delivery run is the way to carry several at once
+            if len(delivery_requests) > 1:
+                raise ValidationError(
+                    f"Deliveries can only be {'accepted' if action == 'accept' else 'started'} one at a time. "
+                    "Plan a delivery run to carry several deliveries at once."
+                )
+            delivery_request = delivery_requests[0]
+            if DeliveryProfileService.has_active_deliveries(
+                delivery_manager,
+                exclude_order_id=delivery_request.order_id if action == 'start' else None,
+                exclude_delivery_request_id=delivery_request.id
+            ):
+                raise ValidationError(
+                    "You cannot take on this delivery while you have another active delivery in progress. "
+                    "Please complete your current delivery first."
+                )
+
+        now = timezone.now()
+        events = [
+            DeliveryMetricsService.build_event(delivery_request, event_type, now)
+            for delivery_request in delivery_requests
+        ]
+
+        updates = {'status': to_status, timestamp_field: now, 'updated_at': now}
+        if action == 'start' and notes:
+            updates['start_notes'] = notes
+        DeliveryRequest.objects.filter(id__in=delivery_request_ids).update(**updates)
+        for delivery_request in delivery_requests:
+            delivery_request.status = to_status
+            setattr(delivery_request, timestamp_field, now)
+
+        DeliveryBulkService._update_related_entities(delivery_requests, action, now)
+        if action == 'complete':
+            DeliveryRunService.complete_stops(delivery_request_ids, now)
+
+        # Courier status is recomputed once for the whole batch
+        DeliveryProfile.refresh_active_task_count(delivery_manager.id)
+        DeliveryMetricsService.record_events(events)
+
+        if action == 'start':
+            transaction.on_commit(lambda: [
+                LiveLocationService.set_tracking_session(delivery_request)
+                for delivery_request in delivery_requests
+            ])
+        elif action == 'complete':
+            transaction.on_commit(lambda: [
+                LiveLocationService.clear_tracking_session(delivery_request)
+                for delivery_request in delivery_requests
+            ])
+
+        DeliveryBulkService._notify(delivery_requests, delivery_manager, action)
+
+        logger.info(
+            f"Delivery manager {delivery_manager.id} bulk-{action}ed {len(delivery_requests)} delivery requests"
+        )
+        return {
+            'action': action,
+            'updated': len(delivery_requests),
+            'delivery_request_ids': [delivery_request.id for delivery_request in delivery_requests],
+        }
+
+    @staticmethod
+    def _update_related_entities(delivery_requests, action, now):
+        """Update the entities of the deliveries the same way the single transitions do."""
+        for delivery_request in delivery_requests:
+            if action == 'accept':
+                DeliveryService.apply_acceptance_to_entity(delivery_request, now)
+            elif action == 'start':
+                DeliveryService.apply_start_to_entity(delivery_request, now)
+            else:
+                # Completion touches orders, payments, stock and borrow state per entity
+                DeliveryService.apply_completion_to_entity(delivery_request)
+
+    @staticmethod
+    def _notify(delivery_requests, delivery_manager, action):
+        """One bulk insert for the customer notifications and an admin summary."""
+        title, template, notification_type = CUSTOMER_NOTIFICATIONS[action]
+        manager_name = delivery_manager.get_full_name()
+
+        notifications = [
+            {
+                'user_id': delivery_request.customer_id,
+                'title': title,
+                'message': template.format(
+                    delivery_type=delivery_request.get_delivery_type_display(),
+                    manager=manager_name
+                ),
+                'notification_type': notification_type,
+                'related_object_type': 'delivery_request',
+                'related_object_id': delivery_request.id,
+            }
+            for delivery_request in delivery_requests
+        ]
+
+        if action in ('accept', 'complete'):
+            request_list = ', '.join(f"#{delivery_request.id}" for delivery_request in delivery_requests)
+            verb = 'accepted' if action == 'accept' else 'completed'
+            for admin_id in User.objects.filter(user_type='library_admin').values_list('id', flat=True):
+                notifications.append({
+                    'user_id': admin_id,
+                    'title': f"Deliveries {verb.capitalize()}",
+                    'message': f"Delivery manager {manager_name} {verb} {len(delivery_requests)} delivery request(s): {request_list}.",
+                    'notification_type': notification_type,
+                })
+
+        try:
+            with transaction.atomic():
+                NotificationService.create_bulk_notifications(notifications)
+        except Exception as e:
+            logger.error(f"Error sending bulk {action} notifications: {str(e)}")
@@ -0,0 +1,243 @@
+from django.db import transaction
+from django.utils import timezone
+import logging
+
+from ..models import DeliveryEvent, DeliveryDailyRollup, User
+from ..models.delivery_metrics_model import DURATION_BUCKETS
+
+logger = logging.getLogger(__name__)
+
+# Timestamp field on DeliveryRequest that marks the start of the measured state
+METRIC_START_FIELDS = {
+    'assigned': 'created_at',
+    'accepted': 'assigned_at',
+    'started': 'accepted_at',
+    'completed': 'started_at',
+}
+
+METRICS = ['assignment', 'acceptance', 'pickup', 'transit']
+
+
+class DeliveryMetricsService:
+    """
+    Service class for the delivery SLA pipeline.
+
+    Transitions are appended to the DeliveryEvent log and folded into
+    DeliveryDailyRollup rows in the same transaction, so dashboards read a
+    handful of rollup rows instead of scanning delivery history.
+    """
+
+    @staticmethod
+    def build_event(delivery_request, event_type, occurred_at=None):
+        """
+        Build (without saving) the event for a transition of a delivery request.
+        The duration is measured from the timestamp that opened the previous state.
+        """
+        occurred_at = occurred_at or timezone.now()
+        duration_seconds = None
+        start_field = METRIC_START_FIELDS.get(event_type)
+        started_at = getattr(delivery_request, start_field, None) if start_field else None
+        if started_at and occurred_at >= started_at:
+            duration_seconds = int((occurred_at - started_at).total_seconds())
+
+        return DeliveryEvent(
+            delivery_request_id=delivery_request.id,
+            delivery_manager_id=delivery_request.delivery_manager_id,
+            event_type=event_type,
+            delivery_type=delivery_request.delivery_type,
+            duration_seconds=duration_seconds,
+            occurred_at=occurred_at,
+        )
+
+    @staticmethod
+    def record_event(delivery_request, event_type, occurred_at=None):
+        """
+        Record one delivery transition. Call from inside the transition's
+        transaction so the event commits or rolls back with it.
+        """
+        DeliveryMetricsService.record_events([
+            DeliveryMetricsService.build_event(delivery_request, event_type, occurred_at)
+        ])
+
+    @staticmethod
+    def record_events(events):
+        """
+        Append delivery events and fold them into the daily rollups.
+        Each affected rollup row is locked once, so concurrent writers for the
+        same courier and day serialize instead of losing updates.
+        Failures are logged and rolled back to a savepoint, so they never
+        break the transition itself.
+
+        Args:
+            events: List of unsaved DeliveryEvent instances
+        """
+        if not events:
+            return
+
+        try:
+            with transaction.atomic():
+                DeliveryEvent.objects.bulk_create(events)
+                DeliveryMetricsService._apply_to_rollups(events)
+        except Exception as e:
+            logger.error(f"Error recording {len(events)} delivery events: {str(e)}")
+
+    @staticmethod
+    def _apply_to_rollups(events):
+        grouped = {}
+        for event in events:
+            if event.delivery_manager_id is None:
+                continue
+            day = timezone.localdate(event.occurred_at)
+            grouped.setdefault((day, event.delivery_manager_id), []).append(event)
+
+        for (day, manager_id), day_events in sorted(grouped.items()):
+            DeliveryDailyRollup.objects.get_or_create(day=day, delivery_manager_id=manager_id)
+            rollup = DeliveryDailyRollup.objects.select_for_update().get(day=day, delivery_manager_id=manager_id)
+            for event in day_events:
+                rollup.add_event(event.event_type, event.duration_seconds, event.metric)
+            rollup.save()
+
+    @staticmethod
+    def rebuild_rollups(start_date, end_date):
+        """
+        Recompute the rollups of a date range from the event log.
+
+        Returns:
+            int: Number of rollup rows written
+        """
+        with transaction.atomic():
+            DeliveryDailyRollup.objects.filter(day__range=[start_date, end_date]).delete()
+
+            rollups = {}
+            events = DeliveryEvent.objects.filter(
+                occurred_at__date__range=[start_date, end_date],
+                delivery_manager__isnull=False,
+            ).order_by().only(
+                'event_type', 'delivery_manager_id', 'duration_seconds', 'occurred_at'
+            ).iterator(chunk_size=2000)
+            for event in events:
+                key = (timezone.localdate(event.occurred_at), event.delivery_manager_id)
+                rollup = rollups.get(key)
+                if rollup is None:
+                    rollup = rollups[key] = DeliveryDailyRollup(day=key[0], delivery_manager_id=key[1])
+                rollup.add_event(event.event_type, event.duration_seconds, event.metric)
+
+            DeliveryDailyRollup.objects.bulk_create(rollups.values(), batch_size=500)
+
+        logger.info(f"Rebuilt {len(rollups)} delivery rollups for {start_date} - {end_date}")
+        return len(rollups)
+
+    @staticmethod
+    def percentile(histogram, fraction):
+        """
+        Estimate a percentile from a DURATION_BUCKETS histogram by linear
+        interpolation inside the bucket that holds it (durations are assumed
+        to be spread evenly within a bucket). The open-ended last bucket has
+        no upper bound, so a percentile landing there is reported as the last
+        bound, i.e. a lower bound of the true value.
+        """
+        total = sum(histogram)
+        if not total:
+            return None
+        target = fraction * total
+        cumulative = 0
+        for index, count in enumerate(histogram):
+            if not count:
+                continue
+            if cumulative + count >= target:
+                if index >= len(DURATION_BUCKETS):
+                    return DURATION_BUCKETS[-1]
+                lower = DURATION_BUCKETS[index - 1] if index else 0
+                upper = DURATION_BUCKETS[index]
+                return round(lower + (upper - lower) * (target - cumulative) / count)
+            cumulative += count
+        return DURATION_BUCKETS[-1]
+
+    @staticmethod
+    def _summarize(rollups):
+        """Merge rollup rows into counts and per-metric duration statistics."""
+        summary = {
+            'assigned_count': 0,
+            'accepted_count': 0,
+            'started_count': 0,
+            'completed_count': 0,
+            'rejected_count': 0,
+        }
+        totals = {metric: {'count': 0, 'sum': 0} for metric in METRICS}
+        histograms = {metric: [0] * (len(DURATION_BUCKETS) + 1) for metric in METRICS}
+
+        for rollup in rollups:
+            for field in summary:
+                summary[field] += getattr(rollup, field)
+            for metric, values in rollup.duration_totals.items():
+                if metric in totals:
+                    totals[metric]['count'] += values['count']
+                    totals[metric]['sum'] += values['sum']
+            for metric, counts in rollup.duration_histograms.items():
+                if metric in histograms:
+                    histograms[metric] = [a + b for a, b in zip(histograms[metric], counts)]
+
+        summary['completion_rate'] = round(
+            summary['completed_count'] / summary['assigned_count'] * 100, 2
+        ) if summary['assigned_count'] else 0
+        summary['durations'] = {
+            metric: {
+                'count': totals[metric]['count'],
+                'avg_seconds': round(totals[metric]['sum'] / totals[metric]['count']) if totals[metric]['count'] else None,
+                'p50_seconds': DeliveryMetricsService.percentile(histograms[metric], 0.5),
+                'p95_seconds': DeliveryMetricsService.percentile(histograms[metric], 0.95),
+            }
+            for metric in METRICS
+        }
+        return summary
+
+    @staticmethod
+    def get_performance_summary(start_date, end_date, delivery_manager_id=None):
+        """
+        Get delivery SLA metrics for a date range from the rollups.
+
+        Args:
+            start_date: First day (inclusive)
+            end_date: Last day (inclusive)
+            delivery_manager_id: Optional courier to restrict the summary to
+
+        Returns:
+            Dictionary with overall, per-courier and per-day summaries
+        """
+        rollups = DeliveryDailyRollup.objects.filter(day__range=[start_date, end_date])
+        if delivery_manager_id:
+            rollups = rollups.filter(delivery_manager_id=delivery_manager_id)
+        rollups = list(rollups.order_by('day', 'delivery_manager_id'))
+
+        by_courier = {}
+        by_day = {}
+        for rollup in rollups:
+            by_courier.setdefault(rollup.delivery_manager_id, []).append(rollup)
+            by_day.setdefault(rollup.day, []).append(rollup)
+
+        names = {
+            user['id']: f"{user['first_name']} {user['last_name']}".strip()
+            for user in User.objects.filter(id__in=by_courier.keys()).values('id', 'first_name', 'last_name')
+        }
+
+        couriers = []
+        for manager_id, courier_rollups in by_courier.items():
+            courier_summary = DeliveryMetricsService._summarize(courier_rollups)
+            courier_summary['agent_id'] = manager_id
+            courier_summary['agent_name'] = names.get(manager_id) or 'Unknown Agent'
+            couriers.append(courier_summary)
+        couriers.sort(key=lambda item: item['completed_count'], reverse=True)
+
+        days = []
+        for day, day_rollups in sorted(by_day.items()):
+            day_summary = DeliveryMetricsService._summarize(day_rollups)
+            day_summary['day'] = day.isoformat()
+            days.append(day_summary)
+
+        return {
+            'overall': DeliveryMetricsService._summarize(rollups),
+            'couriers': couriers,
+            'days': days,
+            'start_date': start_date.isoformat(),
+            'end_date': end_date.isoformat(),
+        }
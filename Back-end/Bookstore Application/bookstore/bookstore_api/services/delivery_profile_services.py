@@ -1,5 +1,7 @@
 from django.contrib.auth import get_user_model
 from django.db import transaction
+from django.db.models import Count, Exists, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 from datetime import timedelta
 import logging
@@ -7,6 +9,8 @@ import threading
 
 from ..models import DeliveryProfile, Notification, NotificationType
 from ..utils import format_error_message
+from .live_location_services import LiveLocationService
+from .courier_index_services import NearestCourierService
 
 User = get_user_model()
 logger = logging.getLogger(__name__)
@@ -165,6 +169,17 @@ class DeliveryProfileService:
             delivery_profile = DeliveryProfileService.get_or_create_delivery_profile(user)
             delivery_profile.update_location(latitude, longitude, address)
             
+            if latitude is not None and longitude is not None:
+                LiveLocationService.set_position(
+                    user.id,
+                    latitude,
+                    longitude,
+                    address=delivery_profile.address,
+                    recorded_at=delivery_profile.location_updated_at,
+                    is_tracking_active=delivery_profile.is_tracking_active
+                )
+                NearestCourierService.update_position(user.id, latitude, longitude, delivery_profile.delivery_status)
+            
             if latitude is not None and longitude is not None:
                 logger.info(f"Updated location for user {user.id}: {latitude}, {longitude}")
             if address:
@@ -199,6 +214,7 @@ class DeliveryProfileService:
             old_status = delivery_profile.delivery_status
             delivery_profile.delivery_status = status
             delivery_profile.save(update_fields=['delivery_status'])
+            NearestCourierService.sync_profile(delivery_profile)
             
             # Send notification about status change
             DeliveryProfileService.notify_status_change(delivery_profile, old_status, status)
@@ -476,6 +492,11 @@ class DeliveryProfileService:
                 user_id__in=user_ids
             ).update(delivery_status=status)
             
+            # Online couriers are added back by their next location update or index rebuild
+            if status != 'online':
+                for user_id in user_ids:
+                    NearestCourierService.remove_courier(user_id)
+            
             logger.info(f"Bulk updated {count} delivery profiles to status: {status}")
             return count
             
@@ -556,6 +577,13 @@ class DeliveryProfileService:
         UNIFIED FUNCTION: Check if a delivery manager has any active deliveries.
         This is the SINGLE SOURCE OF TRUTH for determining active delivery status.
         
+        Answered with a single query: the stored active_task_count of the
+        delivery profile (recounted on every DeliveryRequest status
+        transition) plus EXISTS checks for the sources the counter does not
+        cover: borrow requests out for delivery, return requests in progress
+        and delivery requests in operation. Orders are delivered through
+        DeliveryRequest rows, so the counter covers them.
+        
         Args:
             user: User instance (must be a delivery administrator)
             exclude_order_id: Optional order ID to exclude from check
@@ -569,96 +597,86 @@ class DeliveryProfileService:
             return False
         
         try:
-            from ..models import Order, DeliveryRequest
+            from ..models import DeliveryRequest
             from ..models.borrowing_model import BorrowRequest, BorrowStatusChoices
             from ..models.return_model import ReturnRequest, ReturnStatus
             
-            # Check for active delivery requests
-            # Availability Rule: Manager is unavailable if exists DeliveryRequest with status IN ('accepted', 'in_delivery')
-            active_requests_query = DeliveryRequest.objects.filter(
-                delivery_manager=user,
-                status__in=['accepted', 'in_delivery']
+            active_borrows = BorrowRequest.objects.filter(
+                delivery_person=OuterRef('pk'),
+                status=BorrowStatusChoices.OUT_FOR_DELIVERY
             )
-            
-            if exclude_order_id:
-                active_requests_query = active_requests_query.exclude(order_id=exclude_order_id)
-            
-            if exclude_delivery_request_id:
-                active_requests_query = active_requests_query.exclude(id=exclude_delivery_request_id)
-            
-            if active_requests_query.exists():
-                logger.info(f"Found active DeliveryRequest for user {user.id}")
-                return True
-            
-            # Check for active orders in delivery
-            # Availability Rule: Manager is unavailable if exists DeliveryRequest with status IN ('accepted', 'in_delivery')
-            active_orders_query = Order.objects.filter(
-                delivery_requests__delivery_manager=user,
-                delivery_requests__status__in=['accepted', 'in_delivery']
+            active_returns = ReturnRequest.objects.filter(
+                delivery_manager=OuterRef('pk'),
+                status=ReturnStatus.IN_PROGRESS
             )
-            
-            # For 'delivered' orders, only count them as active if they're borrow orders
-            # with borrow_request status OUT_FOR_DELIVERY (not ACTIVE)
-            active_orders_query = active_orders_query.exclude(
-                status='delivered',
-                order_type='borrowing',
-                borrow_request__status=BorrowStatusChoices.ACTIVE
+            in_operation = DeliveryRequest.objects.filter(
+                delivery_manager=OuterRef('pk'),
+                status='in_operation'
             )
+            if exclude_return_id:
+                active_returns = active_returns.exclude(id=exclude_return_id)
+            if exclude_delivery_request_id:
+                in_operation = in_operation.exclude(id=exclude_delivery_request_id)
             
+            exclusions = Q()
             if exclude_order_id:
-                active_orders_query = active_orders_query.exclude(id=exclude_order_id)
-            
-            if active_orders_query.exists():
-                active_order_list = list(active_orders_query.values('id', 'order_number', 'status', 'order_type'))
-                logger.info(f"Found active Order for user {user.id}: {active_order_list}")
-                return True
-            
-            # Check for active borrow requests (OUT_FOR_DELIVERY means delivery started but not completed)
-            active_borrows = BorrowRequest.objects.filter(
-                delivery_person=user,
-                status__in=[
-                    BorrowStatusChoices.OUT_FOR_DELIVERY,
-                    'out_for_delivery'  # String version for compatibility
-                ]
-            ).exclude(status__in=[BorrowStatusChoices.ACTIVE, BorrowStatusChoices.DELIVERED])
-            
-            if active_borrows.exists():
-                active_borrow_list = list(active_borrows.values('id', 'status'))
-                logger.info(f"Found active BorrowRequest for user {user.id}: {active_borrow_list}")
-                return True
-            
-            # Check for active return requests (IN_PROGRESS means delivery started but not completed)
-            active_returns_query = ReturnRequest.objects.filter(
-                delivery_manager=user,
-                status=ReturnStatus.IN_PROGRESS
-            )
-            
+                exclusions |= Q(order_id=exclude_order_id)
             if exclude_return_id:
-                active_returns_query = active_returns_query.exclude(id=exclude_return_id)
-            
-            if active_returns_query.exists():
-                active_return_list = list(active_returns_query.values('id', 'status'))
-                logger.info(f"Found active ReturnRequest for user {user.id}: {active_return_list}")
-                return True
-            
-            # Check for active delivery requests with 'in_operation' status
-            in_operation_query = DeliveryRequest.objects.filter(
-                delivery_manager=user,
-                status='in_operation'
-            )
+                exclusions |= Q(return_request_id=exclude_return_id)
             if exclude_delivery_request_id:
-                in_operation_query = in_operation_query.exclude(id=exclude_delivery_request_id)
-            if in_operation_query.exists():
-                logger.info(f"Found DeliveryRequest with 'in_operation' status for user {user.id}")
-                return True
+                exclusions |= Q(id=exclude_delivery_request_id)
+            
+            excluded_count = Value(0)
+            if exclusions:
+                excluded_requests = DeliveryRequest.objects.filter(
+                    exclusions,
+                    delivery_manager=OuterRef('pk'),
+                    status__in=DeliveryProfile.ACTIVE_TASK_STATUSES
+                ).order_by().values('delivery_manager_id').annotate(
+                    total=Count('id')
+                ).values('total')
+                excluded_count = Coalesce(Subquery(excluded_requests), 0)
+            
+            row = User.objects.filter(pk=user.pk).annotate(
+                task_count=Coalesce('delivery_profile__active_task_count', 0),
+                excluded_count=excluded_count,
+                has_active_borrow=Exists(active_borrows),
+                has_active_return=Exists(active_returns),
+                has_in_operation=Exists(in_operation),
+            ).values(
+                'task_count', 'excluded_count', 'has_active_borrow', 'has_active_return', 'has_in_operation'
+            ).first()
+            if row is None:
+                return False
             
-            return False
+            return (
+                row['task_count'] > row['excluded_count'] or
+                row['has_active_borrow'] or
+                row['has_active_return'] or
+                row['has_in_operation']
+            )
             
         except Exception as e:
             logger.error(f"Error checking active deliveries for user {user.id}: {str(e)}")
             # On error, assume there are active deliveries to be safe
             return True
     
+    @staticmethod
+    def refresh_active_task_count(user):
+        """
+        Recount the stored active task counter of a delivery manager.
+        
+        Args:
+            user: User instance
+            
+        Returns:
+            int: The refreshed counter value
+        """
+        DeliveryProfile.refresh_active_task_count(user.id)
+        return DeliveryProfile.objects.filter(user=user).values_list(
+            'active_task_count', flat=True
+        ).first() or 0
+    
     @staticmethod
     def start_delivery_task(user):
         """
@@ -676,6 +694,7 @@ class DeliveryProfileService:
         
         try:
             delivery_profile = DeliveryProfileService.get_or_create_delivery_profile(user)
+            DeliveryProfile.refresh_active_task_count(user.id)
             old_status = delivery_profile.delivery_status
             success = delivery_profile.set_busy_for_delivery()
             
@@ -733,6 +752,7 @@ class DeliveryProfileService:
         
         try:
             delivery_profile = DeliveryProfileService.get_or_create_delivery_profile(user)
+            DeliveryProfile.refresh_active_task_count(user.id)
             
             # Refresh from database to ensure we have the latest status
             delivery_profile.refresh_from_db()
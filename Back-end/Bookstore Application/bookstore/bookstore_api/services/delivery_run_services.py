@@ -0,0 +1,414 @@
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.utils import timezone
+import logging
+
+from ..models import DeliveryRequest, DeliveryRun, DeliveryRunStop, DeliveryProfile
+from ..utils import haversine_km
+from .delivery_metrics_services import DeliveryMetricsService
+from .geocoding_services import GeocodingService
+from .live_location_services import LiveLocationService
+from .notification_services import NotificationService
+
+logger = logging.getLogger(__name__)
+
+# Maximum number of stops in one run
+MAX_RUN_STOPS = 25
+
+# Delivery request statuses that can be added to a run
+RUN_ELIGIBLE_STATUSES = ['assigned', 'accepted']
+
+
+class RoutePlanner:
+    """
+    Orders delivery stops into a short route.
+    Builds a nearest-neighbour tour from the start point and improves it with
+    2-opt moves. The route is open: it ends at the last stop.
+    """
+
+    @staticmethod
+    def plan(start, stops, max_passes=50):
+        """
+        Order stops by route.
+
+        Args:
+            start: (latitude, longitude) of the start point, or None
+            stops: List of (key, latitude, longitude); stops without coordinates
+                are kept in their given order after the routed ones
+            max_passes: Maximum number of 2-opt improvement passes
+
+        Returns:
+            List of (key, distance_from_previous_km or None) in route order
+        """
+        located = [(key, float(lat), float(lon)) for key, lat, lon in stops if lat is not None and lon is not None]
+        unlocated = [key for key, lat, lon in stops if lat is None or lon is None]
+
+        points = [(float(start[0]), float(start[1]))] if start else []
+        points.extend((lat, lon) for _, lat, lon in located)
+        offset = 1 if start else 0
+
+        size = len(points)
+        distance = [[0.0] * size for _ in range(size)]
+        for i in range(size):
+            for j in range(i + 1, size):
+                distance[i][j] = distance[j][i] = haversine_km(
+                    points[i][0], points[i][1], points[j][0], points[j][1]
+                )
+
+        route = RoutePlanner._nearest_neighbour(distance, size)
+        route = RoutePlanner._two_opt(distance, route, fixed_start=bool(start), max_passes=max_passes)
+
+        ordered = []
+        previous = 0 if start else None
+        for node in route:
+            if node < offset:
+                continue
+            ordered.append((
+                located[node - offset][0],
+                round(distance[previous][node], 3) if previous is not None else None
+            ))
+            previous = node
+        ordered.extend((key, None) for key in unlocated)
+        return ordered
+
+    @staticmethod
+    def _nearest_neighbour(distance, size):
+        """Greedy tour from node 0 (the start point, or the first stop without one)."""
+        if size == 0:
+            return []
+        current = 0
+        route = [0]
+        remaining = set(range(1, size))
+        while remaining:
+            current = min(remaining, key=lambda node: distance[current][node])
+            route.append(current)
+            remaining.discard(current)
+        return route
+
+    @staticmethod
+    def _two_opt(distance, route, fixed_start=True, max_passes=50):
+        """Reverse route segments while that shortens the open route."""
+        first = 1 if fixed_start else 0
+        size = len(route)
+        for _ in range(max_passes):
+            improved = False
+            for i in range(first, size - 1):
+                for j in range(i + 1, size):
+                    before = distance[route[i - 1]][route[i]] if i > 0 else 0.0
+                    after = distance[route[j]][route[j + 1]] if j + 1 < size else 0.0
+                    new_before = distance[route[i - 1]][route[j]] if i > 0 else 0.0
+                    new_after = distance[route[i]][route[j + 1]] if j + 1 < size else 0.0
+                    if new_before + new_after < before + after - 1e-9:
+                        route[i:j + 1] = reversed(route[i:j + 1])
+                        improved = True
+            if not improved:
+                break
+        return route
+
+    @staticmethod
+    def route_length(ordered):
+        """Total planned distance of an ordered route."""
+        return round(sum(distance for _, distance in ordered if distance is not None), 3)
+
+
+class DeliveryRunService:
+    """
+    Service class for multi-stop delivery runs.
+    A run lets one delivery manager carry several delivery requests at once:
+    the stops are started together and completed one by one in route order.
+    """
+
+    @staticmethod
+    def get_open_run(delivery_manager):
+        """Get the planned or in-progress run of a delivery manager, if any."""
+        return DeliveryRun.objects.filter(
+            delivery_manager=delivery_manager,
+            status__in=['planned', 'in_progress']
+        ).prefetch_related('stops__delivery_request').first()
+
+    @staticmethod
+    def create_run(delivery_manager, delivery_request_ids):
+        """
+        Plan a run over delivery requests assigned to a delivery manager.
+        Stops are routed by their destination (the geocoded delivery address)
+        from the delivery manager's current position.
+
+        Args:
+            delivery_manager: User instance (delivery_admin)
+            delivery_request_ids: IDs of assigned or accepted delivery requests
+
+        Returns:
+            DeliveryRun instance
+        """
+        delivery_request_ids = list(dict.fromkeys(delivery_request_ids))
+        if not delivery_request_ids:
+            raise ValidationError("At least one delivery request is required.")
+        if len(delivery_request_ids) > MAX_RUN_STOPS:
+            raise ValidationError(f"A run can have at most {MAX_RUN_STOPS} stops.")
+
+        # Geocode the stops before their rows are locked
+        GeocodingService.locate_missing(DeliveryRequest.objects.filter(id__in=delivery_request_ids))
+        return DeliveryRunService._plan_run(delivery_manager, delivery_request_ids)
+
+    @staticmethod
+    @transaction.atomic
+    def _plan_run(delivery_manager, delivery_request_ids):
+        if DeliveryRun.objects.filter(
+            delivery_manager=delivery_manager, status__in=['planned', 'in_progress']
+        ).exists():
+            raise ValidationError("You already have an open delivery run. Complete or cancel it first.")
+
+        requests = list(
+            DeliveryRequest.objects.select_for_update().filter(
+                id__in=delivery_request_ids
+            ).values_list('id', 'delivery_manager_id', 'status', 'destination_latitude', 'destination_longitude')
+        )
+        found = {row[0] for row in requests}
+        missing = [request_id for request_id in delivery_request_ids if request_id not in found]
+        if missing:
+            raise ValidationError(f"Delivery requests not found: {missing}")
+
+        invalid = [
+            row[0] for row in requests
+            if row[1] != delivery_manager.id or row[2] not in RUN_ELIGIBLE_STATUSES
+        ]
+        if invalid:
+            raise ValidationError(
+                f"Only assigned or accepted requests of the delivery manager can be added to a run: {invalid}"
+            )
+
+        in_other_run = list(
+            DeliveryRunStop.objects.filter(
+                delivery_request_id__in=delivery_request_ids,
+                status='pending',
+                run__status__in=['planned', 'in_progress']
+            ).values_list('delivery_request_id', flat=True)
+        )
+        if in_other_run:
+            raise ValidationError(f"Delivery requests already in another run: {in_other_run}")
+
+        profile = DeliveryProfile.objects.filter(user=delivery_manager).only('latitude', 'longitude').first()
+        start = profile.get_location() if profile else None
+
+        ordered = RoutePlanner.plan(start, [(row[0], row[3], row[4]) for row in requests])
+
+        run = DeliveryRun.objects.create(
+            delivery_manager=delivery_manager,
+            start_latitude=start[0] if start else None,
+            start_longitude=start[1] if start else None,
+            planned_distance_km=RoutePlanner.route_length(ordered),
+        )
+        DeliveryRunStop.objects.bulk_create([
+            DeliveryRunStop(
+                run=run,
+                delivery_request_id=request_id,
+                sequence=sequence,
+                distance_from_previous_km=distance,
+            )
+            for sequence, (request_id, distance) in enumerate(ordered, start=1)
+        ])
+
+        logger.info(
+            f"Planned delivery run {run.id} with {len(ordered)} stops "
+            f"({run.planned_distance_km} km) for delivery manager {delivery_manager.id}"
+        )
+        return run
+
+    @staticmethod
+    def _get_run_for_update(run_id, delivery_manager):
+        run = DeliveryRun.objects.select_for_update().filter(id=run_id).first()
+        if run is None:
+            raise DeliveryRun.DoesNotExist(f"Delivery run {run_id} not found.")
+        if run.delivery_manager_id != delivery_manager.id:
+            raise ValidationError("Only the delivery manager of this run can change it.")
+        return run
+
+    @staticmethod
+    @transaction.atomic
+    def start_run(run_id, delivery_manager):
+        """
+        Start every stop of a planned run at once.
+        Assigned requests are accepted first; all requests move to in_delivery.
+
+        Returns:
+            DeliveryRun instance
+        """
+        from .delivery_services import DeliveryService
+
+        run = DeliveryRunService._get_run_for_update(run_id, delivery_manager)
+        if run.status != 'planned':
+            raise ValidationError(f"Only planned runs can be started. Current status: '{run.status}'.")
+
+        stop_request_ids = list(
+            run.stops.filter(status='pending').values_list('delivery_request_id', flat=True)
+        )
+        if not stop_request_ids:
+            raise ValidationError("The run has no stops left to deliver.")
+
+        other_active = DeliveryRequest.objects.filter(
+            delivery_manager=delivery_manager,
+            status__in=DeliveryProfile.ACTIVE_TASK_STATUSES
+        ).exclude(id__in=stop_request_ids).exists()
+        if other_active:
+            raise ValidationError(
+                "You cannot start a run while you have another active delivery in progress. "
+                "Please complete your current delivery first."
+            )
+
+        now = timezone.now()
+        events = []
+        delivery_requests = list(
+            DeliveryRequest.objects.select_for_update(of=('self',)).select_related(
+                'return_request__borrowing'
+            ).filter(id__in=stop_request_ids)
+        )
+        for delivery_request in delivery_requests:
+            if delivery_request.status not in RUN_ELIGIBLE_STATUSES or delivery_request.delivery_manager_id != delivery_manager.id:
+                raise ValidationError(
+                    f"Delivery request {delivery_request.id} can no longer be started "
+                    f"(status: '{delivery_request.status}')."
+                )
+            if delivery_request.status == 'assigned':
+                delivery_request.accepted_at = now
+                events.append(DeliveryMetricsService.build_event(delivery_request, 'accepted', now))
+                DeliveryService.apply_acceptance_to_entity(delivery_request, now)
+            delivery_request.status = 'in_delivery'
+            delivery_request.started_at = now
+            delivery_request.save()
+            events.append(DeliveryMetricsService.build_event(delivery_request, 'started', now))
+            DeliveryService.apply_start_to_entity(delivery_request, now)
+
+        run.status = 'in_progress'
+        run.started_at = now
+        run.save(update_fields=['status', 'started_at'])
+
+        DeliveryMetricsService.record_events(events)
+        transaction.on_commit(lambda: [
+            LiveLocationService.set_tracking_session(delivery_request)
+            for delivery_request in delivery_requests
+        ])
+
+        try:
+            with transaction.atomic():
+                NotificationService.create_bulk_notifications([
+                    {
+                        'user_id': delivery_request.customer_id,
+                        'title': "Delivery Started",
+                        'message': (
+                            f"Your {delivery_request.get_delivery_type_display()} is now on the way. "
+                            f"Delivery manager {delivery_manager.get_full_name()} has started the delivery."
+                        ),
+                        'notification_type': "delivery_started",
+                        'related_object_type': 'delivery_request',
+                        'related_object_id': delivery_request.id,
+                    }
+                    for delivery_request in delivery_requests
+                ])
+        except Exception as e:
+            logger.error(f"Error sending run start notifications: {str(e)}")
+
+        logger.info(f"Delivery manager {delivery_manager.id} started run {run.id} with {len(delivery_requests)} stops")
+        return run
+
+    @staticmethod
+    @transaction.atomic
+    def complete_stop(run_id, stop_id, delivery_manager, notes=None):
+        """
+        Complete the delivery of one stop; completes the run after the last stop.
+
+        Returns:
+            DeliveryRunStop instance
+        """
+        from .delivery_services import DeliveryService
+
+        run = DeliveryRunService._get_run_for_update(run_id, delivery_manager)
+        if run.status != 'in_progress':
+            raise ValidationError("Stops can only be completed on a run in progress.")
+
+        stop = run.stops.filter(id=stop_id).first()
+        if stop is None:
+            raise DeliveryRunStop.DoesNotExist(f"Stop {stop_id} not found in run {run_id}.")
+        if stop.status != 'pending':
+            raise ValidationError(f"Stop {stop_id} is already {stop.status}.")
+
+        # Completing the delivery also completes this stop and closes the run when it was the last one
+        DeliveryService.complete_delivery(stop.delivery_request_id, delivery_manager, notes=notes)
+
+        stop.refresh_from_db(fields=['status', 'completed_at'])
+        return stop
+
+    @staticmethod
+    def complete_stops(delivery_request_ids, completed_at=None):
+        """
+        Mark the pending stops of completed delivery requests as completed and
+        close the runs that have no pending stop left. Called from
+        DeliveryService.complete_delivery and the bulk complete transition,
+        inside their transaction, so runs stay in sync whichever endpoint
+        completed the delivery.
+
+        Returns:
+            int: Number of stops completed
+        """
+        stops = DeliveryRunStop.objects.filter(
+            delivery_request_id__in=delivery_request_ids,
+            status='pending',
+            run__status__in=['planned', 'in_progress']
+        )
+        run_ids = sorted(set(stops.values_list('run_id', flat=True)))
+        if not run_ids:
+            return 0
+
+        runs = list(DeliveryRun.objects.select_for_update().filter(id__in=run_ids).order_by('id'))
+        completed = stops.update(status='completed', completed_at=completed_at or timezone.now())
+        for run in runs:
+            DeliveryRunService._close_if_done(run)
+        return completed
+
+    @staticmethod
+    @transaction.atomic
+    def remove_stop(run_id, stop_id, delivery_manager):
+        """
+        Take a pending stop out of a run, e.g. when the customer cannot be reached.
+        The delivery request keeps its status and is handled on its own.
+
+        Returns:
+            DeliveryRunStop instance
+        """
+        run = DeliveryRunService._get_run_for_update(run_id, delivery_manager)
+        if not run.is_open():
+            raise ValidationError("Stops can only be removed from planned or in-progress runs.")
+
+        stop = run.stops.filter(id=stop_id, status='pending').first()
+        if stop is None:
+            raise DeliveryRunStop.DoesNotExist(f"Pending stop {stop_id} not found in run {run_id}.")
+
+        stop.status = 'removed'
+        stop.save(update_fields=['status'])
+
+        DeliveryRunService._close_if_done(run)
+        return stop
+
+    @staticmethod
+    @transaction.atomic
+    def cancel_run(run_id, delivery_manager):
+        """Cancel a planned run; its delivery requests are left unchanged."""
+        run = DeliveryRunService._get_run_for_update(run_id, delivery_manager)
+        if run.status != 'planned':
+            raise ValidationError("Only planned runs can be cancelled.")
+        run.status = 'cancelled'
+        run.save(update_fields=['status'])
+        run.stops.filter(status='pending').update(status='removed')
+        return run
+
+    @staticmethod
+    def _close_if_done(run):
+        if run.stops.filter(status='pending').exists():
+            return
+        if run.status == 'in_progress':
+            run.status = 'completed'
+            run.completed_at = timezone.now()
+            run.save(update_fields=['status', 'completed_at'])
+            logger.info(f"Delivery run {run.id} completed")
+        elif run.status == 'planned':
+            run.status = 'cancelled'
+            run.save(update_fields=['status'])
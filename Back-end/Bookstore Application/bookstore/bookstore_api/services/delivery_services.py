@@ -1,11 +1,15 @@
 from django.db import transaction
 from django.utils import timezone
 from django.core.exceptions import ValidationError
-from ..models import DeliveryRequest, Order, User
+from ..models import DeliveryRequest, Order, User, LocationHistory
 from ..models.borrowing_model import BorrowRequest, BorrowStatusChoices
 from ..models.return_model import ReturnRequest, ReturnStatus
 from ..models.delivery_profile_model import DeliveryProfile
 from ..services.notification_services import NotificationService
+from ..services.live_location_services import LiveLocationService
+from ..services.courier_index_services import NearestCourierService
+from ..services.delivery_metrics_services import DeliveryMetricsService
+from ..services.delivery_run_services import DeliveryRunService
 import logging
 
 logger = logging.getLogger(__name__)
@@ -100,6 +104,7 @@ class DeliveryService:
         delivery_request.status = 'assigned'
         delivery_request.assigned_at = timezone.now()
         delivery_request.save()
+        DeliveryMetricsService.record_event(delivery_request, 'assigned', delivery_request.assigned_at)
         
         # Send notification to delivery manager
         try:
@@ -288,6 +293,8 @@ class DeliveryService:
         delivery_request.status = 'accepted'
         delivery_request.accepted_at = timezone.now()
         delivery_request.save()
+        DeliveryMetricsService.record_event(delivery_request, 'accepted', delivery_request.accepted_at)
+        DeliveryService.apply_acceptance_to_entity(delivery_request, delivery_request.accepted_at)
         
         # Note: Delivery manager availability remains unchanged when accepting
         # Only 'online' (available) managers can accept orders, and they stay 'online'
@@ -350,9 +357,14 @@ class DeliveryService:
         delivery_request.status = 'rejected'
         delivery_request.rejection_reason = rejection_reason.strip()
         delivery_request.rejected_at = timezone.now()
+        # Build the event before the assignment is cleared so it is credited to this manager
+        rejection_event = DeliveryMetricsService.build_event(
+            delivery_request, 'rejected', delivery_request.rejected_at
+        )
         delivery_request.delivery_manager = None  # Clear assignment
         delivery_request.assigned_at = None
         delivery_request.save()
+        DeliveryMetricsService.record_events([rejection_event])
         
         # Note: Delivery manager availability remains unchanged when rejecting
         # Availability only changes when manager manually sets to 'offline' or 'online'
@@ -435,6 +447,9 @@ class DeliveryService:
         if notes:
             delivery_request.start_notes = notes
         delivery_request.save()
+        DeliveryMetricsService.record_event(delivery_request, 'started', delivery_request.started_at)
+        DeliveryService.apply_start_to_entity(delivery_request, delivery_request.started_at)
+        transaction.on_commit(lambda: LiveLocationService.set_tracking_session(delivery_request))
         
         # Note: Delivery manager availability remains unchanged when starting delivery
         # Only 'online' (available) managers can start deliveries, and they stay 'online'
@@ -484,9 +499,98 @@ class DeliveryService:
         # Also update delivery manager profile location
         DeliveryService.update_delivery_manager_location(delivery_manager, latitude, longitude)
         
+        # Append the point to the location history
+        LocationHistory.record_batch(
+            delivery_manager,
+            [{'latitude': latitude, 'longitude': longitude}],
+            delivery_assignment=delivery_request
+        )
+        
         logger.info(f"Updated location for delivery {delivery_request_id}: ({latitude}, {longitude})")
         return delivery_request
     
+    @staticmethod
+    @transaction.atomic
+    def record_location_batch(delivery_manager, points, delivery_request_id=None):
+        """
+        Store a batch of buffered GPS points for a delivery manager.
+        All points are written with a single bulk INSERT; the profile and the
+        active delivery request are updated once with the newest point.
+        
+        Args:
+            delivery_manager: User instance (delivery_admin)
+            points: List of validated point dicts (see LocationHistory.record_batch)
+            delivery_request_id: Optional ID of the delivery in progress
+        
+        Returns:
+            dict with the number of stored points and the latest point
+        """
+        if not delivery_manager.is_delivery_admin():
+            raise ValidationError("User must be a delivery manager.")
+        
+        if not points:
+            raise ValidationError("At least one location point is required.")
+        
+        delivery_request = None
+        if delivery_request_id is not None:
+            delivery_request = DeliveryRequest.objects.filter(id=delivery_request_id).first()
+            if delivery_request is None:
+                raise ValidationError("Delivery request not found.")
+            if delivery_request.delivery_manager_id != delivery_manager.id:
+                raise ValidationError("Only the assigned delivery manager can update location.")
+            if delivery_request.status != 'in_delivery':
+                raise ValidationError("Location can only be updated when delivery is in progress.")
+        
+        now = timezone.now()
+        for point in points:
+            point.setdefault('recorded_at', now)
+        
+        created = LocationHistory.record_batch(
+            delivery_manager,
+            points,
+            delivery_assignment=delivery_request
+        )
+        
+        latest = max(points, key=lambda point: point['recorded_at'])
+        
+        # One UPDATE per table for the whole batch instead of one per point
+        profile_updates = {
+            'latitude': latest['latitude'],
+            'longitude': latest['longitude'],
+            'location_updated_at': now,
+            'last_tracking_update': now,
+        }
+        if latest.get('address'):
+            profile_updates['address'] = latest['address']
+        if not DeliveryProfile.objects.filter(user=delivery_manager).update(**profile_updates):
+            delivery_status = DeliveryProfile.objects.create(user=delivery_manager, **profile_updates).delivery_status
+        else:
+            delivery_status = DeliveryProfile.objects.filter(user=delivery_manager).values_list(
+                'delivery_status', flat=True
+            ).first()
+        
+        if delivery_request is not None:
+            DeliveryRequest.objects.filter(id=delivery_request.id).update(
+                latitude=latest['latitude'],
+                longitude=latest['longitude'],
+                updated_at=now
+            )
+        
+        transaction.on_commit(lambda: LiveLocationService.set_position(
+            delivery_manager.id,
+            latest['latitude'],
+            latest['longitude'],
+            address=latest.get('address'),
+            recorded_at=latest['recorded_at']
+        ))
+        NearestCourierService.update_position(delivery_manager.id, latest['latitude'], latest['longitude'], delivery_status)
+        
+        logger.debug(f"Stored {len(created)} location points for delivery manager {delivery_manager.id}")
+        return {
+            'stored_points': len(created),
+            'latest': latest,
+        }
+    
     @staticmethod
     @transaction.atomic
     def complete_delivery(delivery_request_id, delivery_manager, notes=None):
@@ -513,7 +617,101 @@ class DeliveryService:
         delivery_request.status = 'completed'
         delivery_request.completed_at = timezone.now()
         delivery_request.save()
+        DeliveryMetricsService.record_event(delivery_request, 'completed', delivery_request.completed_at)
+        DeliveryRunService.complete_stops([delivery_request.id], delivery_request.completed_at)
+        transaction.on_commit(lambda: LiveLocationService.clear_tracking_session(delivery_request))
+        
+        DeliveryService.apply_completion_to_entity(delivery_request)
+        
+        # Note: Delivery manager availability remains unchanged when completing delivery
+        # Availability only changes when manager manually sets to 'offline' or 'online'
+        
+        # Send notification to customer
+        try:
+            NotificationService.create_notification(
+                user_id=delivery_request.customer.id,
+                title="Delivery Completed",
+                message=f"Your {delivery_request.get_delivery_type_display()} has been completed successfully by {delivery_manager.get_full_name()}.",
+                notification_type="delivery_completed"
+            )
+        except Exception as e:
+            logger.error(f"Error sending completion notification: {str(e)}")
+        
+        # Send notification to admins
+        try:
+            from ..models import User
+            admins = User.objects.filter(user_type__in=['library_admin'])
+            for admin in admins:
+                NotificationService.create_notification(
+                    user_id=admin.id,
+                    title="Delivery Completed",
+                    message=f"Delivery request #{delivery_request_id} has been completed by {delivery_manager.get_full_name()}.",
+                    notification_type="delivery_completed"
+                )
+        except Exception as e:
+            logger.error(f"Error sending admin notification: {str(e)}")
         
+        logger.info(f"Delivery manager {delivery_manager.id} completed delivery {delivery_request_id}")
+        return delivery_request
+    
+    @staticmethod
+    def apply_acceptance_to_entity(delivery_request, accepted_at=None):
+        """
+        Update the return request of an accepted return pickup. Orders and
+        borrow requests keep their status until the delivery completes.
+        
+        Args:
+            delivery_request: DeliveryRequest instance that was just accepted
+            accepted_at: When it was accepted (defaults to now)
+        """
+        if delivery_request.delivery_type != 'return' or not delivery_request.return_request:
+            return
+        
+        return_request = delivery_request.return_request
+        if return_request.status == ReturnStatus.ASSIGNED:
+            return_request.status = ReturnStatus.ACCEPTED
+            return_request.accepted_at = accepted_at or timezone.now()
+            return_request.save()
+        
+        # The borrowing stays RETURN_ASSIGNED until the pickup starts
+        borrowing = return_request.borrowing
+        if borrowing.status != BorrowStatusChoices.RETURN_ASSIGNED:
+            borrowing.status = BorrowStatusChoices.RETURN_ASSIGNED
+            borrowing.save()
+    
+    @staticmethod
+    def apply_start_to_entity(delivery_request, started_at=None):
+        """
+        Update the return request of a started return pickup and mark its
+        borrowing as out for pickup. Orders and borrow requests keep their
+        status until the delivery completes.
+        
+        Args:
+            delivery_request: DeliveryRequest instance that was just started
+            started_at: When it was started (defaults to now)
+        """
+        if delivery_request.delivery_type != 'return' or not delivery_request.return_request:
+            return
+        
+        return_request = delivery_request.return_request
+        if return_request.status in [ReturnStatus.APPROVED, ReturnStatus.ASSIGNED, ReturnStatus.ACCEPTED]:
+            return_request.status = ReturnStatus.IN_PROGRESS
+            return_request.picked_up_at = started_at or timezone.now()
+            return_request.save()
+        
+        borrowing = return_request.borrowing
+        if borrowing.status != BorrowStatusChoices.OUT_FOR_RETURN_PICKUP:
+            borrowing.status = BorrowStatusChoices.OUT_FOR_RETURN_PICKUP
+            borrowing.save()
+    
+    @staticmethod
+    def apply_completion_to_entity(delivery_request):
+        """
+        Update the order, borrow request or return request of a completed delivery.
+        
+        Args:
+            delivery_request: DeliveryRequest instance that was just completed
+        """
         # Update associated entity based on delivery type (same pattern as purchase orders)
         if delivery_request.delivery_type == 'purchase' and delivery_request.order:
             delivery_request.order.status = 'delivered'
@@ -576,7 +774,7 @@ class DeliveryService:
             if associated_order:
                 associated_order.status = 'delivered'
                 associated_order.save()
-                logger.info(f"Updated associated order {associated_order.id} to 'delivered' status for borrow delivery {delivery_request_id}")
+                logger.info(f"Updated associated order {associated_order.id} to 'delivered' status for borrow delivery {delivery_request.id}")
             
             # Increment borrow count when book is successfully delivered
             delivery_request.borrow_request.book.borrow_count += 1
@@ -607,42 +805,11 @@ class DeliveryService:
                 # This follows the same pattern as purchase orders
                 associated_order.status = 'delivered'
                 associated_order.save()
-                logger.info(f"Updated associated order {associated_order.id} to 'delivered' status for return delivery {delivery_request_id}")
+                logger.info(f"Updated associated order {associated_order.id} to 'delivered' status for return delivery {delivery_request.id}")
             
             # Increment available copies when book is returned
             borrowing.book.available_copies += 1
             borrowing.book.save()
-        
-        # Note: Delivery manager availability remains unchanged when completing delivery
-        # Availability only changes when manager manually sets to 'offline' or 'online'
-        
-        # Send notification to customer
-        try:
-            NotificationService.create_notification(
-                user_id=delivery_request.customer.id,
-                title="Delivery Completed",
-                message=f"Your {delivery_request.get_delivery_type_display()} has been completed successfully by {delivery_manager.get_full_name()}.",
-                notification_type="delivery_completed"
-            )
-        except Exception as e:
-            logger.error(f"Error sending completion notification: {str(e)}")
-        
-        # Send notification to admins
-        try:
-            from ..models import User
-            admins = User.objects.filter(user_type__in=['library_admin'])
-            for admin in admins:
-                NotificationService.create_notification(
-                    user_id=admin.id,
-                    title="Delivery Completed",
-                    message=f"Delivery request #{delivery_request_id} has been completed by {delivery_manager.get_full_name()}.",
-                    notification_type="delivery_completed"
-                )
-        except Exception as e:
-            logger.error(f"Error sending admin notification: {str(e)}")
-        
-        logger.info(f"Delivery manager {delivery_manager.id} completed delivery {delivery_request_id}")
-        return delivery_request
     
     @staticmethod
     def set_availability_status(delivery_manager, status):
@@ -676,6 +843,8 @@ class DeliveryService:
                 delivery_profile.delivery_status = internal_status
                 delivery_profile.save()
             
+            NearestCourierService.sync_profile(delivery_profile)
+            
             logger.info(f"Delivery manager {delivery_manager.id} manually set availability to {status} (internal: {internal_status})")
             
             return {
@@ -711,6 +880,8 @@ class DeliveryService:
                 delivery_profile.delivery_status = availability_status
                 delivery_profile.save()
             
+            NearestCourierService.sync_profile(delivery_profile)
+            
             # Force refresh from database to ensure the change is persisted
             delivery_profile.refresh_from_db()
             
@@ -752,6 +923,16 @@ class DeliveryService:
             delivery_profile.location_updated_at = timezone.now()
             delivery_profile.save()
         
+        transaction.on_commit(lambda: LiveLocationService.set_position(
+            delivery_manager.id,
+            latitude,
+            longitude,
+            address=delivery_profile.address,
+            recorded_at=delivery_profile.location_updated_at,
+            is_tracking_active=delivery_profile.is_tracking_active
+        ))
+        NearestCourierService.update_position(delivery_manager.id, latitude, longitude, delivery_profile.delivery_status)
+        
         logger.info(f"Updated delivery manager {delivery_manager.id} location: ({latitude}, {longitude})")
     
     @staticmethod
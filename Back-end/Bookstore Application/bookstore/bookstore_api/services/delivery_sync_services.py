@@ -0,0 +1,254 @@
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q, Subquery
+from django.utils import timezone
+import logging
+
+from ..models import DeliveryRequest, DeliveryProfile
+from ..models.borrowing_model import BorrowRequest, BorrowStatusChoices
+from ..models.return_model import ReturnRequest, ReturnStatus
+
+logger = logging.getLogger(__name__)
+
+# ReturnRequest status -> DeliveryRequest status when a delivery manager is set
+RETURN_STATUS_MAPPING = {
+    ReturnStatus.ASSIGNED: 'assigned',
+    ReturnStatus.ACCEPTED: 'accepted',
+    ReturnStatus.IN_PROGRESS: 'in_delivery',
+}
+
+# BorrowRequest status -> DeliveryRequest status when a delivery manager is set
+BORROW_STATUS_MAPPING = {
+    BorrowStatusChoices.ASSIGNED_TO_DELIVERY: 'assigned',
+    BorrowStatusChoices.PENDING_DELIVERY: 'assigned',
+    BorrowStatusChoices.AWAITING_PICKUP: 'assigned',
+    BorrowStatusChoices.OUT_FOR_DELIVERY: 'in_delivery',
+}
+
+
+class DeliveryRequestSyncService:
+    """
+    Service class for creating the DeliveryRequest rows that are missing for
+    return and borrow requests.
+
+    Missing rows are found with a NOT EXISTS anti-join and created with
+    bulk_create in chunks. The sync is idempotent: source rows are locked
+    while their delivery requests are created, so concurrent runs skip them.
+
+    bulk_create skips save(), so rows are validated before the insert (rows
+    without a delivery address are skipped, as save() would reject them) and
+    get the source row's created_at afterwards, keeping the -created_at
+    ordering of the lists.
+    """
+
+    # Foreign keys are set from the source rows; validating them would cost a query each
+    SKIP_VALIDATION_FIELDS = ['customer', 'delivery_manager', 'order', 'borrow_request', 'return_request']
+
+    DEFAULT_BATCH_SIZE = 500
+
+    @staticmethod
+    def get_returns_missing_delivery():
+        """Return requests that need a delivery request but have none."""
+        return ReturnRequest.objects.filter(
+            Q(delivery_manager__isnull=False) |
+            Q(delivery_manager__isnull=True, status__in=[
+                ReturnStatus.PENDING,
+                ReturnStatus.APPROVED,
+                ReturnStatus.ASSIGNED,
+            ])
+        ).exclude(
+            status=ReturnStatus.COMPLETED
+        ).filter(
+            ~Exists(DeliveryRequest.objects.filter(return_request_id=OuterRef('pk')))
+        )
+
+    @staticmethod
+    def get_borrows_missing_delivery():
+        """Borrow requests that need a delivery request but have none."""
+        return BorrowRequest.objects.filter(
+            Q(delivery_person__isnull=False) |
+            Q(delivery_person__isnull=True, status__in=[
+                BorrowStatusChoices.APPROVED,
+                BorrowStatusChoices.ASSIGNED_TO_DELIVERY,
+                BorrowStatusChoices.PENDING_DELIVERY,
+                BorrowStatusChoices.AWAITING_PICKUP,
+            ])
+        ).exclude(
+            status__in=[BorrowStatusChoices.DELIVERED, BorrowStatusChoices.RETURNED, BorrowStatusChoices.CANCELLED]
+        ).filter(
+            ~Exists(DeliveryRequest.objects.filter(borrow_request_id=OuterRef('pk')))
+        )
+
+    @staticmethod
+    def sync_return_delivery_requests(batch_size=None):
+        """
+        Create the missing delivery requests of return requests.
+
+        Returns:
+            int: Number of delivery requests created
+        """
+        batch_size = batch_size or DeliveryRequestSyncService.DEFAULT_BATCH_SIZE
+        created = 0
+        last_id = 0
+
+        while True:
+            with transaction.atomic():
+                rows = list(
+                    DeliveryRequestSyncService.get_returns_missing_delivery().filter(
+                        id__gt=last_id
+                    ).select_for_update(skip_locked=True, of=('self',)).order_by('id').values_list(
+                        'id', 'status', 'delivery_manager_id', 'accepted_at',
+                        'borrowing__customer_id', 'borrowing__delivery_address'
+                    )[:batch_size]
+                )
+                if not rows:
+                    break
+                last_id = rows[-1][0]
+
+                now = timezone.now()
+                delivery_requests = []
+                for return_id, return_status, manager_id, accepted_at, customer_id, address in rows:
+                    # A request with a delivery manager is never 'pending'
+                    if manager_id:
+                        delivery_status = RETURN_STATUS_MAPPING.get(return_status, 'assigned')
+                    else:
+                        delivery_status = 'pending'
+
+                    assigned_at = None
+                    if manager_id and return_status in [ReturnStatus.ASSIGNED, ReturnStatus.ACCEPTED]:
+                        assigned_at = accepted_at or now
+
+                    delivery_requests.append(DeliveryRequest(
+                        delivery_type='return',
+                        customer_id=customer_id,
+                        delivery_address=address,
+                        return_request_id=return_id,
+                        delivery_manager_id=manager_id,
+                        status=delivery_status,
+                        assigned_at=assigned_at,
+                    ))
+
+                delivery_requests = DeliveryRequestSyncService._validate(delivery_requests, 'return_request_id')
+                DeliveryRequest.objects.bulk_create(delivery_requests)
+                DeliveryRequestSyncService._copy_created_at(
+                    delivery_requests, 'return_request_id', ReturnRequest
+                )
+                DeliveryRequestSyncService._refresh_task_counts(delivery_requests)
+                created += len(delivery_requests)
+
+        if created:
+            logger.info(f"Created {created} missing DeliveryRequest rows for return requests")
+        return created
+
+    @staticmethod
+    def sync_borrow_delivery_requests(batch_size=None):
+        """
+        Create the missing delivery requests of borrow requests.
+
+        Returns:
+            int: Number of delivery requests created
+        """
+        batch_size = batch_size or DeliveryRequestSyncService.DEFAULT_BATCH_SIZE
+        created = 0
+        last_id = 0
+
+        while True:
+            with transaction.atomic():
+                rows = list(
+                    DeliveryRequestSyncService.get_borrows_missing_delivery().filter(
+                        id__gt=last_id
+                    ).select_for_update(skip_locked=True, of=('self',)).order_by('id').values_list(
+                        'id', 'status', 'delivery_person_id', 'approved_date',
+                        'customer_id', 'delivery_address'
+                    )[:batch_size]
+                )
+                if not rows:
+                    break
+                last_id = rows[-1][0]
+
+                delivery_requests = []
+                for borrow_id, borrow_status, manager_id, approved_date, customer_id, address in rows:
+                    # A request with a delivery manager is never 'pending'
+                    if manager_id:
+                        delivery_status = BORROW_STATUS_MAPPING.get(borrow_status, 'assigned')
+                    else:
+                        delivery_status = 'pending'
+
+                    delivery_requests.append(DeliveryRequest(
+                        delivery_type='borrow',
+                        customer_id=customer_id,
+                        delivery_address=address,
+                        borrow_request_id=borrow_id,
+                        delivery_manager_id=manager_id,
+                        status=delivery_status,
+                        assigned_at=approved_date if manager_id else None,
+                    ))
+
+                delivery_requests = DeliveryRequestSyncService._validate(delivery_requests, 'borrow_request_id')
+                DeliveryRequest.objects.bulk_create(delivery_requests)
+                DeliveryRequestSyncService._copy_created_at(
+                    delivery_requests, 'borrow_request_id', BorrowRequest
+                )
+                DeliveryRequestSyncService._refresh_task_counts(delivery_requests)
+                created += len(delivery_requests)
+
+        if created:
+            logger.info(f"Created {created} missing DeliveryRequest rows for borrow requests")
+        return created
+
+    @staticmethod
+    def _validate(delivery_requests, source_field):
+        """
+        Drop the delivery requests that save() would reject, logging each one.
+        Skipped source rows are picked up again once they are fixed.
+        """
+        valid = []
+        for delivery_request in delivery_requests:
+            source_id = getattr(delivery_request, source_field)
+            if not (delivery_request.delivery_address or '').strip():
+                logger.warning(f"Skipped DeliveryRequest for {source_field} {source_id}: no delivery address")
+                continue
+            try:
+                delivery_request.clean_fields(exclude=DeliveryRequestSyncService.SKIP_VALIDATION_FIELDS)
+            except ValidationError as e:
+                logger.warning(f"Skipped DeliveryRequest for {source_field} {source_id}: {e.messages}")
+                continue
+            valid.append(delivery_request)
+        return valid
+
+    @staticmethod
+    def _copy_created_at(delivery_requests, source_field, source_model):
+        """Give the new rows their source row's created_at with one UPDATE (auto_now_add sets the sync time)."""
+        source_ids = [getattr(delivery_request, source_field) for delivery_request in delivery_requests]
+        if not source_ids:
+            return
+        DeliveryRequest.objects.filter(**{f'{source_field}__in': source_ids}).update(
+            created_at=Subquery(
+                source_model.objects.filter(pk=OuterRef(source_field)).values('created_at')[:1]
+            )
+        )
+
+    @staticmethod
+    def _refresh_task_counts(delivery_requests):
+        """bulk_create skips save(), so recount the managers that got active rows."""
+        manager_ids = {
+            delivery_request.delivery_manager_id
+            for delivery_request in delivery_requests
+            if delivery_request.delivery_manager_id and
+            delivery_request.status in DeliveryProfile.ACTIVE_TASK_STATUSES
+        }
+        for manager_id in manager_ids:
+            DeliveryProfile.refresh_active_task_count(manager_id)
+
+    @staticmethod
+    def sync_all(batch_size=None):
+        """
+        Create every missing delivery request.
+
+        Returns:
+            Dictionary with the number of rows created per delivery type
+        """
+        return {
+            'return': DeliveryRequestSyncService.sync_return_delivery_requests(batch_size),
+            'borrow': DeliveryRequestSyncService.sync_borrow_delivery_requests(batch_size),
+        }
@@ -297,14 +297,17 @@ class DiscountValidationService:
                     'message': 'Cart total must be greater than 0 to apply discount.'
                 }
             
-            # Find the discount code
-            try:
-                discount_code = DiscountCode.objects.get(code=code)
-            except DiscountCode.DoesNotExist:
-                return False, {
-                    'error': 'code_not_found',
-                    'message': 'Invalid discount code.'
-                }
+            # Find the discount code (valid codes come from the snapshot; the
+            # database is only read to explain why a code is not valid)
+            discount_code = DiscountCode.objects.get_valid_code(code)
+            if discount_code is None:
+                try:
+                    discount_code = DiscountCode.objects.get(code=code)
+                except DiscountCode.DoesNotExist:
+                    return False, {
+                        'error': 'code_not_found',
+                        'message': 'Invalid discount code.'
+                    }
             
             # Check if code is valid
             if not discount_code.is_valid():
@@ -867,6 +870,14 @@ class BookDiscountValidationService:
             serializer = DiscountUsageCreateSerializer(data=usage_data)
             if serializer.is_valid():
                 with transaction.atomic():
+                    try:
+                        # Counts against the customer limit and the global cap atomically
+                        book_discount.redeem(user)
+                    except ValidationError as e:
+                        return False, {
+                            'error': 'usage_limit_exceeded',
+                            'message': e.messages[0]
+                        }
                     usage_record = serializer.save()
                     logger.info(f"Book discount applied: {code} by {user.email} for book {book.name} - ${discount_amount} off")
                     
@@ -0,0 +1,149 @@
+from datetime import datetime, time, timedelta
+import logging
+import threading
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+
+class DiscountSnapshot:
+    """
+    In-process snapshot of the currently valid book discounts (by book ID)
+    and discount codes (by code), so catalog listings, cart and checkout
+    price books without querying the discount tables.
+
+    The snapshot is rebuilt when:
+    - a discount is saved or deleted (invalidate() bumps a version stamp in
+      the cache, which the other worker processes check every
+      DISCOUNT_SNAPSHOT_CHECK_SECONDS);
+    - the next start or end boundary of a discount passes (expired entries
+      are also deactivated in the database at that point);
+    - it is older than DISCOUNT_SNAPSHOT_MAX_AGE_SECONDS, as a safety net for
+      writes that bypass save().
+
+    Entries are shared model instances and must be treated as read-only.
+    Redemption limits are not part of the snapshot; redeem() enforces them
+    against the database.
+    """
+
+    VERSION_KEY = 'discount_snapshot:version'
+
+    _lock = threading.Lock()
+    _state = None
+
+    @staticmethod
+    def _cache():
+        return caches[getattr(settings, 'DISCOUNT_SNAPSHOT_CACHE_ALIAS', 'default')]
+
+    @staticmethod
+    def _check_interval():
+        """Seconds between checks of the shared version stamp."""
+        return getattr(settings, 'DISCOUNT_SNAPSHOT_CHECK_SECONDS', 5)
+
+    @staticmethod
+    def _max_age():
+        return getattr(settings, 'DISCOUNT_SNAPSHOT_MAX_AGE_SECONDS', 300)
+
+    @staticmethod
+    def _shared_version():
+        try:
+            return DiscountSnapshot._cache().get(DiscountSnapshot.VERSION_KEY, 0)
+        except Exception as e:
+            logger.warning(f"Failed to read discount snapshot version: {str(e)}")
+            return None
+
+    @staticmethod
+    def _start_of_day(value):
+        """Start of the local day of a datetime (book discounts start by date)."""
+        return timezone.make_aware(datetime.combine(timezone.localtime(value).date(), time.min))
+
+    @staticmethod
+    def _build(version, deactivate_expired=False):
+        """Load the valid discounts and the next boundary at which they change."""
+        from ..models.discount_model import BookDiscount, DiscountCode
+
+        now = timezone.now()
+        if deactivate_expired:
+            DiscountCode.objects.cleanup_expired_codes()
+            BookDiscount.objects.cleanup_expired_discounts()
+
+        boundaries = [now + timedelta(seconds=DiscountSnapshot._max_age())]
+
+        codes = {}
+        for discount_code in DiscountCode.objects.filter(is_active=True, expiration_date__gt=now):
+            codes[discount_code.code] = discount_code
+            boundaries.append(discount_code.expiration_date)
+
+        book_discounts = {}
+        today = timezone.localdate(now)
+        # Newest first, so a book with overlapping discounts gets the latest one
+        for book_discount in BookDiscount.objects.filter(is_active=True, end_date__gt=now).order_by('-created_at'):
+            boundaries.append(book_discount.end_date)
+            if timezone.localdate(book_discount.start_date) > today:
+                boundaries.append(DiscountSnapshot._start_of_day(book_discount.start_date))
+                continue
+            book_discounts.setdefault(book_discount.book_id, book_discount)
+
+        return {
+            'version': version,
+            'codes': codes,
+            'book_discounts': book_discounts,
+            'valid_until': min(boundaries),
+            'checked_at': now,
+        }
+
+    @staticmethod
+    def _get():
+        """Current snapshot, rebuilt when it is stale."""
+        now = timezone.now()
+        state = DiscountSnapshot._state
+
+        if state is not None and now < state['valid_until']:
+            if now - state['checked_at'] < timedelta(seconds=DiscountSnapshot._check_interval()):
+                return state
+            version = DiscountSnapshot._shared_version()
+            if version == state['version']:
+                state['checked_at'] = now
+                return state
+        else:
+            version = DiscountSnapshot._shared_version()
+
+        with DiscountSnapshot._lock:
+            # Another thread may have rebuilt it while this one waited
+            current = DiscountSnapshot._state
+            if current is not None and current is not state and now < current['valid_until']:
+                return current
+            boundary_passed = state is not None and now >= state['valid_until']
+            DiscountSnapshot._state = DiscountSnapshot._build(version, deactivate_expired=boundary_passed)
+            return DiscountSnapshot._state
+
+    @staticmethod
+    def get_book_discount(book_id):
+        """Valid BookDiscount of a book, or None."""
+        return DiscountSnapshot._get()['book_discounts'].get(book_id)
+
+    @staticmethod
+    def get_discount_code(code):
+        """Valid DiscountCode with this code, or None."""
+        return DiscountSnapshot._get()['codes'].get(code)
+
+    @staticmethod
+    def invalidate():
+        """
+        Rebuild the snapshot in every process after the current transaction
+        commits.
+        """
+        def bump():
+            DiscountSnapshot._state = None
+            try:
+                cache = DiscountSnapshot._cache()
+                cache.add(DiscountSnapshot.VERSION_KEY, 0, None)
+                cache.incr(DiscountSnapshot.VERSION_KEY)
+            except Exception as e:
+                logger.warning(f"Failed to bump discount snapshot version: {str(e)}")
+
+        transaction.on_commit(bump)
@@ -0,0 +1,134 @@
+from django.conf import settings
+from django.core.cache import cache
+import hashlib
+import logging
+
+import requests
+
+from ..models import DeliveryRequest
+
+logger = logging.getLogger(__name__)
+
+
+class GeocodingService:
+    """
+    Resolves delivery addresses to destination coordinates.
+
+    A delivery request only carries the customer's address. Its coordinates
+    are looked up the first time route planning, auto-assignment or the
+    nearest courier lookup needs them, and stored on the request
+    (destination_latitude/destination_longitude), so each request is
+    geocoded once. Lookups go to a Nominatim-compatible search endpoint
+    (GEOCODING_URL) and are cached by address.
+
+    Geocoding is off while GEOCODING_URL is not set; requests without stored
+    coordinates are then planned and matched without distances.
+    """
+
+    CACHE_KEY = 'geocode:{digest}'
+    # Cached for addresses the geocoder has no result for
+    NOT_FOUND = 'not_found'
+
+    @staticmethod
+    def _url():
+        return getattr(settings, 'GEOCODING_URL', None)
+
+    @staticmethod
+    def _timeout():
+        """Seconds to wait for the geocoder."""
+        return getattr(settings, 'GEOCODING_TIMEOUT_SECONDS', 3)
+
+    @staticmethod
+    def _cache_ttl():
+        """Seconds a geocoded address stays cached."""
+        return getattr(settings, 'GEOCODING_CACHE_SECONDS', 30 * 24 * 3600)
+
+    @staticmethod
+    def is_enabled():
+        return bool(GeocodingService._url())
+
+    @staticmethod
+    def build_query(address, city=None):
+        """Search string of an address, with the city appended when it is not already in it."""
+        address = ' '.join((address or '').split())
+        if city and city.strip().lower() not in address.lower():
+            address = f"{address}, {city.strip()}" if address else city.strip()
+        return address
+
+    @staticmethod
+    def geocode(address, city=None):
+        """
+        Coordinates of an address.
+
+        Returns:
+            (latitude, longitude) as floats, or None when the address is blank,
+            unknown to the geocoder, the lookup failed or geocoding is off
+        """
+        url = GeocodingService._url()
+        query = GeocodingService.build_query(address, city)
+        if not url or not query:
+            return None
+
+        key = GeocodingService.CACHE_KEY.format(digest=hashlib.sha1(query.lower().encode('utf-8')).hexdigest())
+        cached = cache.get(key)
+        if cached == GeocodingService.NOT_FOUND:
+            return None
+        if cached:
+            return tuple(cached)
+
+        try:
+            response = requests.get(
+                url,
+                params={'q': query, 'format': 'json', 'limit': 1},
+                headers={'User-Agent': getattr(settings, 'GEOCODING_USER_AGENT', 'bookstore-delivery')},
+                timeout=GeocodingService._timeout()
+            )
+            response.raise_for_status()
+            results = response.json()
+            location = (float(results[0]['lat']), float(results[0]['lon'])) if results else None
+        except (requests.RequestException, ValueError, KeyError, IndexError, TypeError) as e:
+            # Not cached, so the address is retried on the next lookup
+            logger.warning(f"Failed to geocode delivery address: {str(e)}")
+            return None
+
+        cache.set(key, location or GeocodingService.NOT_FOUND, GeocodingService._cache_ttl())
+        return location
+
+    @staticmethod
+    def locate_missing(delivery_requests):
+        """
+        Geocode and store the destination of the delivery requests that have
+        an address but no destination coordinates yet. Requests sharing an
+        address are geocoded once and written with one UPDATE.
+
+        Call it outside the transaction that locks the requests, so row locks
+        are not held while the geocoder answers.
+
+        Args:
+            delivery_requests: DeliveryRequest queryset to fill in
+
+        Returns:
+            int: Number of delivery requests located
+        """
+        if not GeocodingService.is_enabled():
+            return 0
+
+        rows = delivery_requests.filter(
+            destination_latitude__isnull=True
+        ).exclude(delivery_address='').values_list('id', 'delivery_address', 'delivery_city')
+
+        by_query = {}
+        for request_id, address, city in rows:
+            query = GeocodingService.build_query(address, city)
+            if query:
+                by_query.setdefault(query, []).append(request_id)
+
+        located = 0
+        for query, request_ids in by_query.items():
+            location = GeocodingService.geocode(query)
+            if location is None:
+                continue
+            located += DeliveryRequest.objects.filter(
+                id__in=request_ids, destination_latitude__isnull=True
+            ).update(destination_latitude=round(location[0], 7), destination_longitude=round(location[1], 7))
+        return located
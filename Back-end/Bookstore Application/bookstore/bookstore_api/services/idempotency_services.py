@@ -0,0 +1,181 @@
+from datetime import timedelta
+from functools import wraps
+import hashlib
+import json
+import logging
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.response import Response
+
+from ..models import IdempotencyKey
+
+logger = logging.getLogger(__name__)
+
+# Request header carrying the client-supplied key (Idempotency-Key)
+IDEMPOTENCY_HEADER = 'HTTP_IDEMPOTENCY_KEY'
+
+
+class IdempotencyService:
+    """
+    Service class for idempotent checkout endpoints.
+
+    The first request with a key stores an in-progress IdempotencyKey row,
+    runs the view and stores its response. A retry with the same key and
+    body gets the stored response back without running the view again; a
+    retry while the first request is still running gets 409, and reusing a
+    key with a different body gets 422. Server errors are not stored, so
+    those requests can be retried. Rows expire after IDEMPOTENCY_KEY_TTL_HOURS.
+    """
+
+    @staticmethod
+    def _ttl():
+        return timedelta(hours=getattr(settings, 'IDEMPOTENCY_KEY_TTL_HOURS', 24))
+
+    @staticmethod
+    def _lock_timeout():
+        """Seconds after which an in-progress key is considered abandoned."""
+        return timedelta(seconds=getattr(settings, 'IDEMPOTENCY_LOCK_SECONDS', 60))
+
+    @staticmethod
+    def fingerprint(request):
+        """SHA-256 of the request method, path and body."""
+        data = request.data
+        if hasattr(data, 'lists'):
+            data = dict(data.lists())
+        payload = json.dumps(
+            [request.method, request.path, data],
+            sort_keys=True,
+            default=str
+        )
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def begin(user, scope, key, fingerprint):
+        """
+        Claim a key for a request.
+
+        Returns:
+            Tuple (record, response): the claimed IdempotencyKey and None when
+            the view should run, or None and the response to return instead
+        """
+        now = timezone.now()
+        with transaction.atomic():
+            record = IdempotencyKey.objects.select_for_update().filter(user=user, scope=scope, key=key).first()
+
+            if record is not None and (
+                record.is_expired() or
+                (record.status == 'in_progress' and record.created_at <= now - IdempotencyService._lock_timeout())
+            ):
+                # Expired or abandoned by a request that never finished
+                record.delete()
+                record = None
+
+            if record is not None:
+                if record.request_fingerprint != fingerprint:
+                    return None, Response({
+                        'success': False,
+                        'message': 'This Idempotency-Key was already used with a different request'
+                    }, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+                if record.status == 'in_progress':
+                    return None, Response({
+                        'success': False,
+                        'message': 'A request with this Idempotency-Key is still being processed'
+                    }, status=status.HTTP_409_CONFLICT)
+                response = Response(record.response_body, status=record.response_status)
+                response['Idempotent-Replayed'] = 'true'
+                return None, response
+
+            try:
+                with transaction.atomic():
+                    record = IdempotencyKey.objects.create(
+                        user=user,
+                        scope=scope,
+                        key=key,
+                        request_fingerprint=fingerprint,
+                        expires_at=now + IdempotencyService._ttl()
+                    )
+            except IntegrityError:
+                # A concurrent request claimed the key first
+                return None, Response({
+                    'success': False,
+                    'message': 'A request with this Idempotency-Key is still being processed'
+                }, status=status.HTTP_409_CONFLICT)
+        return record, None
+
+    @staticmethod
+    def complete(record, response):
+        """Store the response of a claimed key (server errors release it instead)."""
+        if response.status_code >= 500:
+            IdempotencyService.release(record)
+            return
+        record.status = 'completed'
+        record.response_status = response.status_code
+        record.response_body = response.data
+        record.save(update_fields=['status', 'response_status', 'response_body'])
+
+    @staticmethod
+    def release(record):
+        """Drop a claimed key so the request can be retried."""
+        IdempotencyKey.objects.filter(pk=record.pk).delete()
+
+    @staticmethod
+    def cleanup_expired(batch_size=1000):
+        """
+        Delete expired keys in batches.
+
+        Returns:
+            int: Number of keys deleted
+        """
+        deleted = 0
+        while True:
+            ids = list(
+                IdempotencyKey.objects.filter(expires_at__lte=timezone.now()).values_list('id', flat=True)[:batch_size]
+            )
+            if not ids:
+                break
+            deleted += IdempotencyKey.objects.filter(id__in=ids).delete()[0]
+        if deleted:
+            logger.info(f"Deleted {deleted} expired idempotency keys")
+        return deleted
+
+
+def idempotent(scope):
+    """
+    Make an APIView handler idempotent when the client sends an
+    Idempotency-Key header. Requests without the header run as before.
+
+    Args:
+        scope: Endpoint name the keys are scoped to
+    """
+    def decorator(handler):
+        @wraps(handler)
+        def wrapper(view, request, *args, **kwargs):
+            key = request.META.get(IDEMPOTENCY_HEADER)
+            if not key or not request.user.is_authenticated:
+                return handler(view, request, *args, **kwargs)
+            if len(key) > 255:
+                return Response({
+                    'success': False,
+                    'message': 'Idempotency-Key must be at most 255 characters'
+                }, status=status.HTTP_400_BAD_REQUEST)
+
+            # URL arguments (e.g. the borrow request ID) are part of the scope
+            key_scope = ':'.join([scope] + [str(value) for value in kwargs.values()])
+            record, response = IdempotencyService.begin(
+                request.user, key_scope, key, IdempotencyService.fingerprint(request)
+            )
+            if response is not None:
+                return response
+
+            try:
+                response = handler(view, request, *args, **kwargs)
+            except Exception:
+                IdempotencyService.release(record)
+                raise
+            IdempotencyService.complete(record, response)
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,291 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class LiveLocationService:
+    """
+    Cache of the latest delivery manager positions for tracking reads.
+
+    Positions are written on every location update and read by the customer
+    tracking endpoints, so a poll does not have to load the order, delivery
+    request, manager and profile from the database.
+
+    The cache alias is configurable with LIVE_LOCATION_CACHE_ALIAS. Use a shared
+    backend (Redis or Memcached) when running more than one worker process;
+    the default local-memory cache is per process.
+    """
+
+    POSITION_KEY = 'live_location:manager:{manager_id}'
+    SESSION_KEY = 'live_location:session:{delivery_type}:{entity_id}'
+
+    @staticmethod
+    def _cache():
+        return caches[getattr(settings, 'LIVE_LOCATION_CACHE_ALIAS', 'default')]
+
+    @staticmethod
+    def _position_ttl():
+        """Seconds a position stays in the cache after the last update."""
+        return getattr(settings, 'LIVE_LOCATION_TTL_SECONDS', 300)
+
+    @staticmethod
+    def _stale_after():
+        """Seconds after which a cached position is reported as stale."""
+        return getattr(settings, 'LIVE_LOCATION_STALE_SECONDS', 30)
+
+    @staticmethod
+    def _session_ttl():
+        """Seconds a tracking session stays cached before it is re-read from the database."""
+        return getattr(settings, 'LIVE_LOCATION_SESSION_TTL_SECONDS', 120)
+
+    @staticmethod
+    def set_position(manager_id, latitude, longitude, address=None, recorded_at=None, is_tracking_active=True):
+        """
+        Store the latest position of a delivery manager.
+        Cache failures are logged and never break the location update.
+        """
+        if latitude is None or longitude is None:
+            return
+
+        recorded_at = recorded_at or timezone.now()
+        entry = {
+            'latitude': float(latitude),
+            'longitude': float(longitude),
+            'address': address,
+            'recorded_at': recorded_at.isoformat(),
+            'is_tracking_active': is_tracking_active,
+        }
+        try:
+            LiveLocationService._cache().set(
+                LiveLocationService.POSITION_KEY.format(manager_id=manager_id),
+                entry,
+                LiveLocationService._position_ttl()
+            )
+        except Exception as e:
+            logger.warning(f"Failed to cache live location for manager {manager_id}: {str(e)}")
+
+    @staticmethod
+    def get_position(manager_id):
+        """
+        Get the cached position of a delivery manager.
+
+        Returns:
+            dict with latitude, longitude, address, recorded_at, is_tracking_active,
+            age_seconds and is_stale, or None when nothing is cached
+        """
+        try:
+            entry = LiveLocationService._cache().get(
+                LiveLocationService.POSITION_KEY.format(manager_id=manager_id)
+            )
+        except Exception as e:
+            logger.warning(f"Failed to read live location for manager {manager_id}: {str(e)}")
+            return None
+
+        if not entry:
+            return None
+        return LiveLocationService._with_staleness(entry)
+
+    @staticmethod
+    def _with_staleness(entry):
+        entry = dict(entry)
+        recorded_at = parse_datetime(entry['recorded_at']) if entry.get('recorded_at') else None
+        age_seconds = (timezone.now() - recorded_at).total_seconds() if recorded_at else None
+        entry['age_seconds'] = int(age_seconds) if age_seconds is not None else None
+        entry['is_stale'] = age_seconds is None or age_seconds > LiveLocationService._stale_after()
+        return entry
+
+    @staticmethod
+    def clear_position(manager_id):
+        """Remove the cached position of a delivery manager."""
+        try:
+            LiveLocationService._cache().delete(
+                LiveLocationService.POSITION_KEY.format(manager_id=manager_id)
+            )
+        except Exception as e:
+            logger.warning(f"Failed to clear live location for manager {manager_id}: {str(e)}")
+
+    @staticmethod
+    def _session_key(delivery_type, entity_id):
+        return LiveLocationService.SESSION_KEY.format(delivery_type=delivery_type, entity_id=entity_id)
+
+    @staticmethod
+    def set_tracking_session(delivery_request):
+        """
+        Cache what a tracking poll needs to authorize and answer the request:
+        the customer, the delivery manager and the delivery status.
+        Only deliveries in progress are cached.
+        """
+        if delivery_request.status != 'in_delivery' or not delivery_request.delivery_manager_id:
+            LiveLocationService.clear_tracking_session(delivery_request)
+            return None
+
+        entity = delivery_request.get_related_entity()
+        if entity is None:
+            return None
+
+        session = LiveLocationService.build_session(entity, delivery_request.delivery_manager, delivery_request)
+
+        try:
+            LiveLocationService._cache().set(
+                LiveLocationService._session_key(delivery_request.delivery_type, entity.id),
+                session,
+                LiveLocationService._session_ttl()
+            )
+        except Exception as e:
+            logger.warning(f"Failed to cache tracking session for delivery {delivery_request.id}: {str(e)}")
+        return session
+
+    @staticmethod
+    def build_session(entity, delivery_manager, delivery_request=None):
+        """
+        Tracking session of an order, borrow or return request: the customer,
+        the delivery manager and the delivery status. Used for the cached
+        session and for answering a poll from the database.
+        """
+        customer_id = delivery_request.customer_id if delivery_request else getattr(entity, 'customer_id', None)
+        session = {
+            'delivery_request_id': delivery_request.id if delivery_request else None,
+            'customer_id': customer_id,
+            'status': delivery_request.status if delivery_request else None,
+            'entity_status': getattr(entity, 'status', None),
+            'delivery_manager': {
+                'id': delivery_manager.id,
+                'name': delivery_manager.get_full_name(),
+                'phone': getattr(delivery_manager, 'phone_number', None),
+                'email': delivery_manager.email,
+            },
+        }
+        if hasattr(entity, 'order_number'):
+            session['order_number'] = entity.order_number
+        return session
+
+    @staticmethod
+    def clear_tracking_session(delivery_request):
+        """Remove the cached tracking session of a delivery request."""
+        entity_id = {
+            'purchase': delivery_request.order_id,
+            'borrow': delivery_request.borrow_request_id,
+            'return': delivery_request.return_request_id,
+        }.get(delivery_request.delivery_type)
+        if entity_id is None:
+            return
+        try:
+            LiveLocationService._cache().delete(
+                LiveLocationService._session_key(delivery_request.delivery_type, entity_id)
+            )
+        except Exception as e:
+            logger.warning(f"Failed to clear tracking session for delivery {delivery_request.id}: {str(e)}")
+
+    @staticmethod
+    def get_tracking_session(delivery_type, entity_id):
+        """Get the cached tracking session for an order, borrow or return request."""
+        try:
+            return LiveLocationService._cache().get(
+                LiveLocationService._session_key(delivery_type, entity_id)
+            )
+        except Exception as e:
+            logger.warning(f"Failed to read tracking session {delivery_type}:{entity_id}: {str(e)}")
+            return None
+
+    @staticmethod
+    def build_location_data(position):
+        """Format a cached position the way the tracking endpoints return it."""
+        return {
+            'latitude': position['latitude'],
+            'longitude': position['longitude'],
+            'address': position.get('address'),
+            'last_updated': position['recorded_at'],
+            'is_tracking_active': position.get('is_tracking_active', True),
+            'is_stale': position['is_stale'],
+            'age_seconds': position['age_seconds'],
+        }
+
+    @staticmethod
+    def build_location_from_record(latitude, longitude, address=None, recorded_at=None, is_tracking_active=True):
+        """Format a position read from the database like a cached one."""
+        entry = {
+            'latitude': float(latitude),
+            'longitude': float(longitude),
+            'address': address,
+            'recorded_at': recorded_at.isoformat() if recorded_at else None,
+            'is_tracking_active': is_tracking_active,
+        }
+        return LiveLocationService.build_location_data(LiveLocationService._with_staleness(entry))
+
+    @staticmethod
+    def build_tracking_data(delivery_type, entity_id, session, location_data):
+        """
+        Response data of a tracking poll. Both the cached and the database
+        path answer with this, so a poll returns the same shape either way.
+        """
+        if delivery_type == 'purchase':
+            data = {
+                'order_id': entity_id,
+                'order_number': session.get('order_number'),
+                'delivery_status': session['status'],
+            }
+        else:
+            id_key = 'borrow_request_id' if delivery_type == 'borrow' else 'return_request_id'
+            data = {
+                id_key: entity_id,
+                'status': session['entity_status'],
+            }
+        data.update({
+            'delivery_manager': session['delivery_manager'],
+            'location': location_data,
+            'tracking_enabled': True,
+            'tracking_interval_seconds': 5,
+        })
+        return data
+
+    @staticmethod
+    def get_cached_tracking(delivery_type, entity_id, user):
+        """
+        Answer a tracking poll from the cache.
+
+        Returns:
+            (session, location_data) when both the tracking session and the
+            manager position are cached and the user may see them, else None
+        """
+        session = LiveLocationService.get_tracking_session(delivery_type, entity_id)
+        if not session:
+            return None
+
+        if (session['customer_id'] != user.id and
+                not user.is_library_admin() and
+                not user.is_delivery_admin()):
+            return None
+
+        position = LiveLocationService.get_position(session['delivery_manager']['id'])
+        if not position:
+            return None
+
+        return session, LiveLocationService.build_location_data(position)
+
+    @staticmethod
+    def warm_tracking_cache(delivery_request, location_data):
+        """
+        Populate the cache after a tracking poll was answered from the database,
+        so the following polls are served from the cache.
+        The position keeps the time it was recorded at, so its age and
+        staleness stay correct; a position without one is not cached (the
+        next location update caches it), since set_position would stamp it
+        as recorded now.
+        """
+        LiveLocationService.set_tracking_session(delivery_request)
+        if location_data and delivery_request.delivery_manager_id:
+            last_updated = parse_datetime(location_data['last_updated']) if location_data.get('last_updated') else None
+            if last_updated is None:
+                return
+            LiveLocationService.set_position(
+                delivery_request.delivery_manager_id,
+                location_data['latitude'],
+                location_data['longitude'],
+                address=location_data.get('address'),
+                recorded_at=last_updated,
+                is_tracking_active=location_data.get('is_tracking_active', True)
+            )
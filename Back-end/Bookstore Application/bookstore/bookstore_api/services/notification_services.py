@@ -1,11 +1,17 @@
+from datetime import timedelta
+import logging
+
 from django.conf import settings
-from django.core.mail import send_mail
+from django.core.mail import EmailMultiAlternatives, get_connection
 from django.template.loader import render_to_string
 from django.utils.html import strip_tags
-from django.db.models import Q
+from django.db import transaction
+from django.db.models import F, Q
 from django.utils import timezone
 
-from ..models import Notification, NotificationType, User, Order
+from ..models import Notification, NotificationType, User, Order, EmailOutbox
+
+logger = logging.getLogger(__name__)
 
 
 class NotificationService:
@@ -71,6 +77,51 @@ class NotificationService:
         except Order.DoesNotExist:
             raise ValueError(f"Order with ID {related_order_id} does not exist")
     
+    @staticmethod
+    def create_bulk_notifications(notifications):
+        """
+        Create many notifications with one INSERT.
+        Skips the per-row lookups and duplicate checks of create_notification,
+        so callers are expected to pass one entry per recipient and event.
+        
+        Args:
+            notifications: Iterable of dicts with user_id, title, message and
+                notification_type (name), plus optional related_object_type
+                and related_object_id
+        
+        Returns:
+            List of created Notification instances
+        """
+        notifications = list(notifications)
+        if not notifications:
+            return []
+        
+        type_names = {entry['notification_type'] for entry in notifications}
+        notification_types = {
+            notification_type.name: notification_type
+            for notification_type in NotificationType.objects.filter(name__in=type_names)
+        }
+        for name in type_names - set(notification_types):
+            notification_types[name], _ = NotificationType.objects.get_or_create(
+                name=name,
+                defaults={
+                    'description': f"Notification type for {name}",
+                    'template': "{title}: {message}",
+                }
+            )
+        
+        return Notification.objects.bulk_create([
+            Notification(
+                recipient_id=entry['user_id'],
+                title=entry['title'],
+                message=entry['message'],
+                notification_type=notification_types[entry['notification_type']],
+                related_object_type=entry.get('related_object_type'),
+                related_object_id=entry.get('related_object_id'),
+            )
+            for entry in notifications
+        ], batch_size=500)
+    
     @staticmethod
     def get_user_notifications(user_id, is_read=None, notification_type=None, search=None):
         """
@@ -169,7 +220,9 @@ class NotificationService:
     @staticmethod
     def send_email_notification(user_email, subject, message):
         """
-        Send email notification to user
+        Queue an email notification to a user.
+        The email is written to the outbox in the caller's transaction and
+        delivered by the `process_email_outbox` worker.
         """
         if not settings.EMAIL_HOST_USER:
             # Email settings not configured, log this or handle accordingly
@@ -181,20 +234,14 @@ class NotificationService:
         )
         plain_message = strip_tags(html_message)
         
-        try:
-            send_mail(
-                subject,
-                plain_message,
-                settings.EMAIL_HOST_USER,
-                [user_email],
-                html_message=html_message,
-                fail_silently=False
-            )
-            return True
-        except Exception as e:
-            # Log the error or handle accordingly
-            print(f"Failed to send email: {str(e)}")
-            return False
+        EmailOutboxService.enqueue_email(
+            to_email=user_email,
+            subject=subject,
+            body=plain_message,
+            html_body=html_message,
+            from_email=settings.EMAIL_HOST_USER,
+        )
+        return True
     
     @staticmethod
     def notify_order_delivered(order_id):
@@ -297,4 +344,138 @@ class NotificationService:
             
             return notification
         except Order.DoesNotExist:
-            raise ValueError(f"Order with ID {order_id} does not exist")
\ No newline at end of file
+            raise ValueError(f"Order with ID {order_id} does not exist")
+
+
+class EmailOutboxService:
+    """
+    Service class for the transactional email outbox.
+    Request handlers enqueue emails; a worker drains the outbox in batches
+    over a single reused mail connection.
+    """
+    
+    # How long a claimed batch stays reserved before another worker may retry it
+    CLAIM_LEASE_SECONDS = 600
+    
+    @staticmethod
+    def enqueue_email(to_email, subject, body, html_body=None, from_email=None, max_attempts=None):
+        """
+        Write an email to the outbox.
+        Runs inside the caller's transaction, so the email is only queued
+        if the surrounding business change commits.
+        """
+        if max_attempts is None:
+            max_attempts = getattr(settings, 'EMAIL_OUTBOX_MAX_ATTEMPTS', 5)
+        
+        return EmailOutbox.objects.create(
+            to_email=to_email,
+            subject=subject[:255],
+            body=body,
+            html_body=html_body,
+            from_email=from_email,
+            max_attempts=max_attempts,
+        )
+    
+    @staticmethod
+    def claim_batch(batch_size=50):
+        """
+        Reserve a batch of due emails for this worker.
+        Uses SKIP LOCKED so concurrent workers never claim the same rows.
+        Every claim counts as an attempt, so an email whose worker crashed
+        before recording the outcome is dead-lettered after max_attempts
+        claims instead of being retried forever.
+        Returns the list of claimed EmailOutbox instances.
+        """
+        now = timezone.now()
+        lease_until = now + timedelta(seconds=EmailOutboxService.CLAIM_LEASE_SECONDS)
+        
+        with transaction.atomic():
+            # Expired leases that already used all their attempts
+            EmailOutbox.objects.filter(
+                status='sending',
+                next_attempt_at__lte=now,
+                attempts__gte=F('max_attempts')
+            ).update(status='failed', last_error='Delivery lease expired on the last attempt')
+            
+            ids = list(
+                EmailOutbox.objects.select_for_update(skip_locked=True)
+                .filter(status__in=['pending', 'sending'], next_attempt_at__lte=now)
+                .order_by('next_attempt_at', 'id')
+                .values_list('id', flat=True)[:batch_size]
+            )
+            if not ids:
+                return []
+            EmailOutbox.objects.filter(id__in=ids).update(
+                status='sending',
+                attempts=F('attempts') + 1,
+                next_attempt_at=lease_until
+            )
+        
+        return list(EmailOutbox.objects.filter(id__in=ids).order_by('id'))
+    
+    @staticmethod
+    def process_outbox(batch_size=None, base_delay_seconds=None):
+        """
+        Deliver one batch of queued emails over a single mail connection.
+        Failed emails are rescheduled with exponential backoff until they
+        run out of attempts.
+        
+        Returns:
+            Dictionary with claimed, sent and failed counts
+        """
+        if batch_size is None:
+            batch_size = getattr(settings, 'EMAIL_OUTBOX_BATCH_SIZE', 50)
+        if base_delay_seconds is None:
+            base_delay_seconds = getattr(settings, 'EMAIL_OUTBOX_RETRY_DELAY_SECONDS', 60)
+        
+        entries = EmailOutboxService.claim_batch(batch_size)
+        result = {'claimed': len(entries), 'sent': 0, 'failed': 0}
+        if not entries:
+            return result
+        
+        connection = get_connection(fail_silently=False)
+        try:
+            connection.open()
+        except Exception as e:
+            logger.error(f"Failed to open email connection: {str(e)}")
+            for entry in entries:
+                entry.mark_attempt_failed(e, base_delay_seconds)
+            result['failed'] = len(entries)
+            return result
+        
+        try:
+            for entry in entries:
+                message = EmailMultiAlternatives(
+                    subject=entry.subject,
+                    body=entry.body,
+                    from_email=entry.from_email or settings.DEFAULT_FROM_EMAIL,
+                    to=[entry.to_email],
+                    connection=connection,
+                )
+                if entry.html_body:
+                    message.attach_alternative(entry.html_body, 'text/html')
+                
+                try:
+                    message.send(fail_silently=False)
+                    entry.mark_sent()
+                    result['sent'] += 1
+                except Exception as e:
+                    logger.warning(f"Failed to send outbox email {entry.id} to {entry.to_email}: {str(e)}")
+                    entry.mark_attempt_failed(e, base_delay_seconds)
+                    result['failed'] += 1
+        finally:
+            connection.close()
+        
+        return result
+    
+    @staticmethod
+    def cleanup_sent_emails(days=30):
+        """
+        Delete delivered emails older than the given number of days.
+        """
+        cutoff_date = timezone.now() - timedelta(days=days)
+        deleted, _ = EmailOutbox.objects.filter(
+            status='sent',
+            sent_at__lt=cutoff_date
+        ).delete()
+        return deleted
@@ -3,7 +3,8 @@ from typing import Dict, Any, Optional, List
 import logging
 import uuid
 
-from ..models import Payment, CreditCardPayment, CashOnDeliveryPayment, Cart, User, DiscountCode, DiscountUsage
+from ..models import Payment, Cart, User, DiscountCode, DiscountUsage
+from .pricing_services import OrderPricingEngine
 
 logger = logging.getLogger(__name__)
 
@@ -13,14 +14,14 @@ class PaymentService:
     """
     
     @staticmethod
-    def get_cart_total(user: User) -> Dict[str, Any]:
+    def get_cart_total(user: User, discount_code: str = None) -> Dict[str, Any]:
         """
-        Get the total amount from the user's cart.
+        Get the total amount from the user's cart, priced by the OrderPricingEngine.
         """
         try:
             # Get user's cart
             try:
-                cart = Cart.objects.get(user=user)
+                cart = Cart.objects.select_related('customer').get(customer=user)
             except Cart.DoesNotExist:
                 return {
                     'success': False,
@@ -28,13 +29,13 @@ class PaymentService:
                     'error_code': 'CART_NOT_FOUND'
                 }
             
-            # Calculate total amount
-            total_amount = cart.get_total_price()
+            quote = OrderPricingEngine.quote_cart(cart, discount_code)
             
             return {
                 'success': True,
                 'message': 'Cart total retrieved successfully',
-                'total_amount': total_amount,
+                'total_amount': quote['total'],
+                'quote': quote,
                 'cart': cart
             }
             
@@ -53,68 +54,63 @@ class PaymentService:
         Initialize a payment based on the user's cart total with optional discount code.
         """
         try:
-            # Get cart total
-            cart_result = PaymentService.get_cart_total(user)
+            # Price the cart and the discount code in one quote
+            cart_result = PaymentService.get_cart_total(user, discount_code)
             if not cart_result['success']:
                 return cart_result
             
-            original_amount = cart_result['total_amount']
+            quote = cart_result['quote']
             cart = cart_result['cart']
             
             # Check if cart is empty
-            if cart.get_item_count() == 0:
+            if quote['item_count'] == 0:
                 return {
                     'success': False,
                     'message': 'Cannot create payment for an empty cart',
                     'error_code': 'EMPTY_CART'
                 }
             
-            # Initialize payment data
+            if quote['errors']:
+                return {
+                    'success': False,
+                    'message': quote['errors'][0],
+                    'error_code': 'CART_PRICING_ERROR'
+                }
+            
+            if quote['discount_error']:
+                return {
+                    'success': False,
+                    'message': quote['discount_error'].get('message', 'Invalid discount code'),
+                    'error_code': quote['discount_error'].get('error', 'INVALID_DISCOUNT_CODE')
+                }
+            
+            discount_applied = quote['discount_code'] is not None
             payment_data = {
-                'original_amount': original_amount,
-                'final_amount': original_amount,
-                'discount_applied': False,
-                'discount_code_used': None,
-                'discount_amount': 0,
-                'discount_percentage': 0
+                'original_amount': quote['subtotal'],
+                'final_amount': quote['total'],
+                'discount_applied': discount_applied,
+                'discount_code_used': quote['discount_code'].code if discount_applied else None,
+                'discount_amount': quote['code_discount'],
+                'discount_percentage': quote['discount_percentage'] if discount_applied else 0,
+                'delivery_cost': quote['delivery_cost'],
+                'tax_amount': quote['tax_amount'],
             }
             
-            # Apply discount code if provided
-            if discount_code:
-                from .discount_services import DiscountValidationService
-                
-                is_valid, discount_result = DiscountValidationService.validate_discount_code(
-                    discount_code, user, original_amount
-                )
-                
-                if is_valid:
-                    payment_data.update({
-                        'final_amount': discount_result['final_amount'],
-                        'discount_applied': True,
-                        'discount_code_used': discount_code,
-                        'discount_amount': discount_result['discount_amount'],
-                        'discount_percentage': discount_result['discount_percentage']
-                    })
-                else:
-                    return {
-                        'success': False,
-                        'message': discount_result.get('message', 'Invalid discount code'),
-                        'error_code': discount_result.get('error', 'INVALID_DISCOUNT_CODE')
-                    }
-            
             # Create payment
             payment = Payment.objects.create(
-                user=user,
+                customer=user,
                 amount=payment_data['final_amount'],
-                payment_method=payment_method,
+                payment_type=payment_method,
+                cart=cart,
                 status='pending',
                 original_amount=payment_data['original_amount'],
-                discount_code_used=payment_data.get('discount_code_used'),
-                discount_amount=payment_data.get('discount_amount', 0),
-                discount_percentage=payment_data.get('discount_percentage'),
+                discount_code_used=payment_data['discount_code_used'],
+                discount_amount=payment_data['discount_amount'],
+                discount_percentage=payment_data['discount_percentage'] if discount_applied else None,
+                delivery_cost=payment_data['delivery_cost'],
             )
             
-            result_message = f'Payment initialized successfully with {payment.get_payment_method_display()}'
+            result_message = f'Payment initialized successfully with {payment.get_payment_type_display()}'
             if payment_data['discount_applied']:
                 result_message += f" (Discount: {payment_data['discount_code_used']} - ${payment_data['discount_amount']:.2f} off)"
             
@@ -150,11 +146,11 @@ class PaymentService:
                 from .discount_services import DiscountValidationService
                 
                 discount_code = payment_summary['discount_code_used']
-                original_amount = payment_summary['original_amount']
+                original_amount = float(payment_summary['original_amount'])
                 payment_reference = f"payment_{payment.id}"
                 
                 success, usage_result = DiscountValidationService.apply_discount_code(
-                    discount_code, payment.user, original_amount, payment_reference
+                    discount_code, payment.customer, original_amount, payment_reference
                 )
                 
                 if not success:
@@ -191,7 +187,7 @@ class PaymentService:
         """
         try:
             # Check if payment method is credit card
-            if payment.payment_method != 'credit_card':
+            if payment.payment_type != 'credit_card':
                 return {
                     'success': False,
                     'message': 'Payment method is not credit card',
@@ -212,24 +208,18 @@ class PaymentService:
             # Generate a fake transaction ID
             transaction_id = str(uuid.uuid4())
             
-            # Update payment status
+            # Update payment status and save the card details on the payment
+            # row (last 4 digits only)
+            card_number = card_data['card_number'].replace(' ', '').replace('-', '')
             payment.status = 'completed'
             payment.transaction_id = transaction_id
+            payment.card_number = card_number[-4:]
+            payment.card_type = PaymentService._detect_card_type(card_number)
+            payment.cardholder_name = card_data['card_holder_name']
+            payment.expiry_month = card_data['expiry_month']
+            payment.expiry_year = card_data['expiry_year']
             payment.save()
             
-            # Save credit card details (last 4 digits only)
-            card_number = card_data['card_number'].replace(' ', '').replace('-', '')
-            card_type = PaymentService._detect_card_type(card_number)
-            
-            CreditCardPayment.objects.create(
-                payment=payment,
-                card_holder_name=card_data['card_holder_name'],
-                card_number_last_four=card_number[-4:],
-                card_type=card_type,
-                expiry_month=card_data['expiry_month'],
-                expiry_year=card_data['expiry_year']
-            )
-            
             return {
                 'success': True,
                 'message': 'Credit card payment processed successfully',
@@ -257,7 +247,7 @@ class PaymentService:
         """
         try:
             # Check if payment method is cash on delivery
-            if payment.payment_method != 'cash_on_delivery':
+            if payment.payment_type != 'cash_on_delivery':
                 return {
                     'success': False,
                     'message': 'Payment method is not cash on delivery',
@@ -272,18 +262,13 @@ class PaymentService:
                     'error_code': 'PAYMENT_ALREADY_PROCESSED'
                 }
             
-            # Update payment status
+            # Update payment status and save the delivery details on the payment row
             payment.status = 'processing'  # For COD, payment is only completed after delivery
+            payment.delivery_address = delivery_data['delivery_address']
+            payment.contact_phone = delivery_data['contact_phone']
+            payment.delivery_notes = delivery_data.get('notes', '')
             payment.save()
             
-            # Save cash on delivery details
-            CashOnDeliveryPayment.objects.create(
-                payment=payment,
-                delivery_address=delivery_data['delivery_address'],
-                contact_phone=delivery_data['contact_phone'],
-                notes=delivery_data.get('notes', '')
-            )
-            
             return {
                 'success': True,
                 'message': 'Cash on delivery payment processed successfully',
@@ -344,7 +329,7 @@ class PaymentService:
             # Get payment
             try:
                 if user:
-                    payment = Payment.objects.get(id=payment_id, user=user)
+                    payment = Payment.objects.get(id=payment_id, customer=user)
                 else:
                     payment = Payment.objects.get(id=payment_id)
             except Payment.DoesNotExist:
@@ -371,11 +356,12 @@ class PaymentService:
     @staticmethod
     def get_user_payments(user: User) -> Dict[str, Any]:
         """
-        Get all payments for a user.
+        Get all payments for a user, newest first. Method details are columns
+        of the payment row, so this is one query on the (customer, created_at) index.
         """
         try:
             # Get payments
-            payments = Payment.objects.filter(user=user).order_by('-created_at')
+            payments = Payment.objects.filter(customer=user).order_by('-created_at')
             
             return {
                 'success': True,
@@ -401,24 +387,24 @@ class PaymentService:
         
         # Visa: Starts with 4
         if card_number.startswith('4'):
-            return 'Visa'
+            return 'visa'
         
         # Mastercard: Starts with 51-55 or 2221-2720
         if card_number.startswith(('51', '52', '53', '54', '55')) or \
            (2221 <= int(card_number[:4]) <= 2720):
-            return 'MasterCard'
+            return 'mastercard'
         
         # American Express: Starts with 34 or 37
         if card_number.startswith(('34', '37')):
-            return 'American Express'
+            return 'amex'
         
         # Discover: Starts with 6011, 622126-622925, 644-649, or 65
         if card_number.startswith('6011') or \
            (622126 <= int(card_number[:6]) <= 622925) or \
            card_number.startswith(('644', '645', '646', '647', '648', '649', '65')):
-            return 'Discover'
+            return 'discover'
         
         # Default
-        return 'Unknown'
+        return 'other'
 
 
@@ -0,0 +1,168 @@
+from decimal import Decimal, ROUND_HALF_UP
+import logging
+
+from django.conf import settings
+
+from ..models import Book
+from ..models.discount_model import DiscountRedemptionCounter
+from .discount_snapshot_services import DiscountSnapshot
+
+logger = logging.getLogger(__name__)
+
+CENT = Decimal('0.01')
+
+
+def _money(amount):
+    return Decimal(amount).quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+class OrderPricingEngine:
+    """
+    Single pricing engine for purchase baskets (cart, payment and checkout).
+
+    A quote is computed in one pass over the basket: book prices are loaded
+    with one query, book discounts come from the DiscountSnapshot (plus
+    queries for the customer's redemptions of them), the discount code is
+    validated once, and delivery cost and tax are derived from the discounted
+    subtotal. All amounts are Decimals rounded to cents.
+
+    Pricing order:
+    - each line is priced at its valid book discount (if the customer may
+      still use it), otherwise at the book price;
+    - the discount code percentage applies to the sum of the lines;
+    - delivery cost (ORDER_DELIVERY_COST_PERCENTAGE) and tax (ORDER_TAX_RATE),
+      both percentages, apply to the subtotal after the code discount.
+    """
+
+    @staticmethod
+    def _delivery_percentage():
+        return Decimal(str(getattr(settings, 'ORDER_DELIVERY_COST_PERCENTAGE', '0')))
+
+    @staticmethod
+    def _tax_rate():
+        return Decimal(str(getattr(settings, 'ORDER_TAX_RATE', '0')))
+
+    @staticmethod
+    def _eligible_book_discounts(customer, book_ids):
+        """
+        Valid book discounts of the books that the customer may still use, by
+        book ID. A discount the customer already redeemed through the apply
+        endpoint for a basket not yet checked out stays eligible.
+        """
+        discounts = {}
+        for book_id in book_ids:
+            book_discount = DiscountSnapshot.get_book_discount(book_id)
+            if book_discount is not None and not book_discount.is_exhausted():
+                discounts[book_id] = book_discount
+        if not discounts or customer is None:
+            return discounts
+
+        book_discount_ids = [book_discount.pk for book_discount in discounts.values()]
+        uses = DiscountRedemptionCounter.get_book_discount_uses(customer.pk, book_discount_ids)
+        pending = DiscountRedemptionCounter.get_pending_book_discount_ids(customer.pk, book_discount_ids)
+        return {
+            book_id: book_discount
+            for book_id, book_discount in discounts.items()
+            if book_discount.pk in pending or uses.get(book_discount.pk, 0) < book_discount.usage_limit_per_customer
+        }
+
+    @staticmethod
+    def quote(customer, basket, discount_code=None):
+        """
+        Price a basket.
+
+        Args:
+            customer: Customer buying the basket (None prices without
+                per-customer discount limits or discount codes)
+            basket: Iterable of (book_id, quantity) pairs
+            discount_code: Optional discount code string
+
+        Returns:
+            Dictionary with the itemized lines, subtotal, discounts, delivery
+            cost, tax and total, plus any pricing errors (unknown books or
+            books without a price) and the discount code error, if any
+        """
+        quantities = {}
+        for book_id, quantity in basket:
+            quantities[book_id] = quantities.get(book_id, 0) + quantity
+
+        books = Book.objects.only('id', 'name', 'price').in_bulk(list(quantities))
+        book_discounts = OrderPricingEngine._eligible_book_discounts(customer, list(books))
+
+        errors = []
+        missing_ids = [book_id for book_id in quantities if book_id not in books]
+        if missing_ids:
+            errors.append(f'Books not found: {missing_ids}')
+
+        items = []
+        original_subtotal = Decimal('0.00')
+        subtotal = Decimal('0.00')
+        for book_id, quantity in quantities.items():
+            book = books.get(book_id)
+            if book is None:
+                continue
+            if not book.price:
+                errors.append(f'Book {book.name} (ID: {book.id}) has no price')
+                continue
+
+            original_unit_price = _money(book.price)
+            book_discount = book_discounts.get(book_id)
+            if book_discount is not None and book_discount.discounted_price < original_unit_price:
+                unit_price = _money(book_discount.discounted_price)
+            else:
+                book_discount = None
+                unit_price = original_unit_price
+
+            line_total = unit_price * quantity
+            original_subtotal += original_unit_price * quantity
+            subtotal += line_total
+            items.append({
+                'book': book,
+                'book_id': book_id,
+                'quantity': quantity,
+                'original_unit_price': original_unit_price,
+                'unit_price': unit_price,
+                'book_discount': book_discount,
+                'line_total': line_total,
+            })
+
+        code = None
+        discount_percentage = Decimal('0.00')
+        discount_error = None
+        if discount_code and customer is not None and not errors:
+            from .discount_services import DiscountValidationService
+            is_valid, discount_result = DiscountValidationService.validate_discount_code(
+                discount_code, customer, float(subtotal)
+            )
+            if is_valid:
+                code = discount_result['discount_code']
+                discount_percentage = code.discount_percentage
+            else:
+                discount_error = discount_result
+
+        code_discount = _money(subtotal * discount_percentage / 100)
+        discounted_subtotal = subtotal - code_discount
+        delivery_cost = _money(discounted_subtotal * OrderPricingEngine._delivery_percentage() / 100)
+        tax_amount = _money(discounted_subtotal * OrderPricingEngine._tax_rate() / 100)
+
+        return {
+            'items': items,
+            'item_count': sum(item['quantity'] for item in items),
+            'original_subtotal': original_subtotal,
+            'book_discount_total': original_subtotal - subtotal,
+            'subtotal': subtotal,
+            'discount_code': code,
+            'discount_percentage': discount_percentage,
+            'code_discount': code_discount,
+            'delivery_cost': delivery_cost,
+            'tax_amount': tax_amount,
+            'total': discounted_subtotal + delivery_cost + tax_amount,
+            'errors': errors,
+            'discount_error': discount_error,
+        }
+
+    @staticmethod
+    def quote_cart(cart, discount_code=None):
+        """Price the purchase items of a cart (borrow items are priced separately)."""
+        basket = cart.items.filter(item_type='purchase').values_list('book_id', 'quantity')
+        return OrderPricingEngine.quote(cart.customer, basket, discount_code)
@@ -13,6 +13,7 @@ from ..models.borrowing_model import BorrowRequest, BorrowStatusChoices, FineSta
 from ..models.return_model import ReturnFine
 from ..models import DeliveryRequest
 from ..models.payment_model import Payment
+from .delivery_metrics_services import DeliveryMetricsService
 
 logger = logging.getLogger(__name__)
 
@@ -825,6 +826,11 @@ class ReportManagementService:
                 'delivery_trend': delivery_trend,
                 'delivery_trend_value': round(delivery_trend_value, 2),
                 
+                # SLA timings (time to assignment, pickup, transit) from the daily rollups
+                'sla_metrics': DeliveryMetricsService.get_performance_summary(
+                    start_date, end_date
+                )['overall'] if start_date and end_date else None,
+                
                 # Period information
                 'period': period,
                 'start_date': start_date.isoformat() if start_date else None,
@@ -0,0 +1,152 @@
+from datetime import timedelta
+from decimal import Decimal
+import logging
+
+from django.db import transaction
+from django.db.models import Count, DurationField, Exists, ExpressionWrapper, F, OuterRef
+
+from ..models import BorrowRequest, BorrowStatistics
+from ..models.return_model import ReturnRequest, ReturnStatus, ReturnFine, FineReason, CustomerFineLedger
+from .fine_pricing_services import FinePricingEngine
+from .notification_services import NotificationService
+
+logger = logging.getLogger(__name__)
+
+
+class ReturnFineBatchService:
+    """
+    Service class for applying late return fines to completed returns in bulk.
+
+    Lateness is computed in the query (actual minus expected return date),
+    returns that already have a fine are skipped with a NOT EXISTS anti-join,
+    and each chunk is written with one bulk insert for the fines, one bulk
+    update for the borrow requests and one bulk insert for the notifications.
+    """
+
+    DEFAULT_BATCH_SIZE = 1000
+
+    # Number of rows listed in the dry-run preview
+    PREVIEW_LIMIT = 50
+
+    @staticmethod
+    def get_late_returns_missing_fine():
+        """
+        Completed returns that were at least one full hour late and have no fine,
+        annotated with late_by (actual - expected return date).
+        """
+        return ReturnRequest.objects.filter(
+            status=ReturnStatus.COMPLETED,
+            borrowing__actual_return_date__isnull=False,
+            borrowing__expected_return_date__isnull=False,
+            borrowing__actual_return_date__gte=F('borrowing__expected_return_date') + timedelta(hours=1),
+        ).filter(
+            ~Exists(ReturnFine.objects.filter(return_request_id=OuterRef('pk')))
+        ).annotate(
+            late_by=ExpressionWrapper(
+                F('borrowing__actual_return_date') - F('borrowing__expected_return_date'),
+                output_field=DurationField()
+            )
+        )
+
+    @staticmethod
+    def apply_fines(batch_size=None, dry_run=False):
+        """
+        Create the missing late return fines of completed returns.
+
+        Args:
+            batch_size: Returns per chunk
+            dry_run: Compute the fines without writing anything
+
+        Returns:
+            Dictionary with the number of completed returns checked, the number
+            that already had a fine (left untouched), the number of fines
+            created, their total amount and a preview
+        """
+        checked = ReturnRequest.objects.filter(status=ReturnStatus.COMPLETED).aggregate(
+            returns_checked=Count('id'),
+            returns_with_fine=Count('fine'),
+        )
+        batch_size = batch_size or ReturnFineBatchService.DEFAULT_BATCH_SIZE
+        fines_created = 0
+        total_amount = Decimal('0.00')
+        preview = []
+        last_id = 0
+        rates = FinePricingEngine.get_rates()
+
+        while True:
+            with transaction.atomic():
+                queryset = ReturnFineBatchService.get_late_returns_missing_fine().filter(id__gt=last_id)
+                if not dry_run:
+                    queryset = queryset.select_for_update(skip_locked=True, of=('self',))
+                rows = list(
+                    queryset.order_by('id').values_list(
+                        'id', 'late_by', 'borrowing_id', 'borrowing__customer_id', 'borrowing__book__name'
+                    )[:batch_size]
+                )
+                if not rows:
+                    break
+                last_id = rows[-1][0]
+
+                hours_column = [int(row[1].total_seconds() // 3600) for row in rows]
+                prices = FinePricingEngine.price_batch(hours_column, rates=rates)
+                total_amount += prices['sum_total']
+
+                fines = []
+                borrow_updates = []
+                notifications = []
+                ledger_deltas = {}
+                for (return_id, _, borrow_id, customer_id, book_name), hours_late, fine_amount in zip(
+                    rows, hours_column, prices['total']
+                ):
+                    if len(preview) < ReturnFineBatchService.PREVIEW_LIMIT:
+                        preview.append({
+                            'return_request_id': return_id,
+                            'borrow_request_id': borrow_id,
+                            'customer_id': customer_id,
+                            'hours_late': hours_late,
+                            'fine_amount': str(fine_amount),
+                        })
+
+                    fines.append(ReturnFine(
+                        return_request_id=return_id,
+                        fine_amount=fine_amount,
+                        fine_reason=FineReason.LATE_RETURN,
+                        late_return=True,
+                        days_late=hours_late,
+                        is_paid=False,
+                    ))
+                    borrow_updates.append(BorrowRequest(id=borrow_id, fine_amount=fine_amount))
+                    balance, count = ledger_deltas.get(customer_id, (Decimal('0.00'), 0))
+                    ledger_deltas[customer_id] = (balance + fine_amount, count + 1)
+                    notifications.append({
+                        'user_id': customer_id,
+                        'title': "Late Return Fine Applied",
+                        'message': f"A fine of ${fine_amount} has been applied for late return of '{book_name}'. Please pay the fine.",
+                        'notification_type': "return_fine_applied",
+                        'related_object_type': 'return_request',
+                        'related_object_id': return_id,
+                    })
+                fines_created += len(fines)
+
+                if not dry_run:
+                    # bulk_create skips ReturnFine.save, so the daily counter and
+                    # the customers' fine ledgers are moved here
+                    ReturnFine.objects.bulk_create(fines, batch_size=500)
+                    BorrowRequest.objects.bulk_update(borrow_updates, ['fine_amount'], batch_size=500)
+                    BorrowStatistics.increment('fines_issued', len(fines))
+                    CustomerFineLedger.apply_deltas(ledger_deltas)
+                    NotificationService.create_bulk_notifications(notifications)
+
+            if len(rows) < batch_size:
+                break
+
+        if fines_created and not dry_run:
+            logger.info(f"Applied {fines_created} retroactive late return fines totalling ${total_amount}")
+        return {
+            'dry_run': dry_run,
+            'returns_checked': checked['returns_checked'],
+            'returns_with_fine': checked['returns_with_fine'],
+            'fines_created': fines_created,
+            'total_amount': str(total_amount),
+            'preview': preview,
+        }
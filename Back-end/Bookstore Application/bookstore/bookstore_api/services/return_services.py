@@ -4,11 +4,12 @@ from typing import Optional, Dict, Any
 from decimal import Decimal
 import logging
 
-from ..models.return_model import ReturnRequest, ReturnStatus, ReturnFine
+from ..models.return_model import ReturnRequest, ReturnStatus, ReturnFine, CustomerFineLedger
 from ..models.user_model import User
 from ..models.borrowing_model import BorrowRequest, BorrowStatusChoices, FineStatusChoices
 from ..models.return_model import ReturnFine
 from ..services.notification_services import NotificationService
+from ..services.fine_pricing_services import FinePricingEngine
 
 logger = logging.getLogger(__name__)
 
@@ -702,36 +703,19 @@ class ReturnService:
                 if current_datetime > expected_datetime:
                     late_return = True  # Auto-set late_return flag
         
+        # Price the fine with the rate table in effect (late hours, damage, loss)
+        hours_late = 0
         if late_return and borrow_request.expected_return_date:
-            # Calculate hours late (fine imposed after 1 hour)
-            current_datetime = timezone.now()
-            expected_datetime = borrow_request.expected_return_date
-            
-            if current_datetime > expected_datetime:
-                delta = current_datetime - expected_datetime
-                total_seconds = delta.total_seconds()
-                hours_late = int(total_seconds / 3600)  # Convert to hours
-                
-                # Only impose fine if more than 1 hour late
-                if hours_late > 0:
-                    # Fine rate: $0.10 per hour
-                    hour_rate = Decimal('0.10')
-                    fine_amount = hour_rate * hours_late
-                    # Round to 2 decimal places
-                    fine_amount = fine_amount.quantize(Decimal('0.01'))
-                    # Store hours_late for display purposes (convert to days for days_late field)
-                    days_late = hours_late
-        
-        # Add damage/loss penalties if applicable
-        if damaged:
-            # Add damage penalty (e.g., $10 or percentage of book value)
-            damage_penalty = Decimal('10.00')  # Default damage penalty
-            fine_amount += damage_penalty
-        
-        if lost:
-            # Add loss penalty (e.g., full book price)
-            book_price = borrow_request.book.price if borrow_request.book.price else Decimal('50.00')
-            fine_amount += book_price
+            hours_late = FinePricingEngine.hours_late(borrow_request.expected_return_date)
+            # Store hours_late for display purposes (days_late field holds hours)
+            days_late = hours_late
+        quote = FinePricingEngine.quote(
+            hours_late=hours_late,
+            damaged=damaged,
+            lost=lost,
+            book_price=borrow_request.book.price if lost else None
+        )
+        fine_amount = quote['total']
         
         # Business Rule: No fine record if fine_amount = 0
         if fine_amount <= 0:
@@ -739,6 +723,7 @@ class ReturnService:
             if return_fine and return_fine.id:
                 with connection.cursor() as cursor:
                     cursor.execute("DELETE FROM return_fine WHERE id = %s", [return_fine.id])
+                CustomerFineLedger.rebuild(customer_ids=[borrow_request.customer_id])
             return None
         
         # Create or update fine
@@ -796,6 +781,8 @@ class ReturnService:
                             SET fine_amount = %s, fine_reason = %s, days_late = %s
                             WHERE id = %s
                         """, [str(fine_amount), fine_reason, days_late_val, return_fine.id])
+                    # Raw SQL skips ReturnFine.save, so recount the customer's balance
+                    CustomerFineLedger.rebuild(customer_ids=[borrow_request.customer_id])
                     # Update the minimal object with new values
                     return_fine.fine_amount = fine_amount
                     return_fine.fine_reason = fine_reason
@@ -812,6 +799,7 @@ class ReturnService:
                         VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, NOW(), NOW())
                     """, [return_request.id, str(fine_amount), fine_reason, fine_type, days_late_val, days_late_val, False, False, '1.00'])
                     fine_id = cursor.lastrowid
+                CustomerFineLedger.apply_delta(borrow_request.customer_id, amount=fine_amount, count=1)
                 
                 # Create a minimal object with the data we just inserted
                 # Don't use ORM as it tries to access columns that don't exist
@@ -900,79 +888,29 @@ class ReturnService:
         return fine
     
     @staticmethod
-    def check_and_apply_fines_for_completed_returns() -> Dict[str, Any]:
+    def check_and_apply_fines_for_completed_returns(dry_run: bool = False) -> Dict[str, Any]:
         """
         Check all completed returns and apply fines retroactively if they were late.
         This is useful for applying fines to returns that were completed before the fine system was implemented.
+        Runs the set-based ReturnFineBatchService; existing fines are left untouched.
         """
-        from ..models.return_model import ReturnFine
-        
-        # Get all completed return requests
-        completed_returns = ReturnRequest.objects.filter(
-            status=ReturnStatus.COMPLETED
-        ).select_related('borrowing', 'borrowing__book', 'borrowing__customer')
+        from .return_fine_services import ReturnFineBatchService
         
-        fines_created = 0
-        fines_updated = 0
-        returns_checked = 0
-        
-        for return_request in completed_returns:
-            returns_checked += 1
-            borrow_request = return_request.borrowing
-            
-            # Check if fine already exists (defer fields that may not exist in DB)
-            try:
-                existing_fine = ReturnFine.objects.defer(
-                    'late_return', 'damaged', 'lost'
-                ).get(return_request=return_request)
-                has_fine = True
-            except ReturnFine.DoesNotExist:
-                has_fine = False
-            except Exception:
-                # If there's any other error, assume no fine exists
-                has_fine = False
-            
-            # Check if the return was late by comparing actual return date with expected return date
-            if borrow_request.actual_return_date and borrow_request.expected_return_date:
-                is_late = borrow_request.actual_return_date > borrow_request.expected_return_date
-                
-                if is_late:
-                    # Calculate hours late
-                    delta = borrow_request.actual_return_date - borrow_request.expected_return_date
-                    total_seconds = delta.total_seconds()
-                    hours_late = int(total_seconds / 3600)  # Convert to hours
-                    
-                    if hours_late > 0:
-                        # Create or update fine
-                        fine = ReturnService.get_or_create_return_fine(
-                            return_request=return_request,
-                            late_return=True,
-                            damaged=False,
-                            lost=False
-                        )
-                        
-                        if fine:
-                            if has_fine:
-                                fines_updated += 1
-                                logger.info(f"Updated fine for return request {return_request.id}: ${fine.fine_amount} ({hours_late} hours late)")
-                            else:
-                                fines_created += 1
-                                logger.info(f"Created fine for return request {return_request.id}: ${fine.fine_amount} ({hours_late} hours late)")
-                                
-                                # Send notification to customer
-                                NotificationService.create_notification(
-                                    user_id=borrow_request.customer.id,
-                                    title="Late Return Fine Applied",
-                                    message=f"A fine of ${fine.fine_amount} has been applied for late return of '{borrow_request.book.name}'. Please pay the fine.",
-                                    notification_type="return_fine_applied"
-                                )
+        result = ReturnFineBatchService.apply_fines(dry_run=dry_run)
+        returns_checked = result['returns_checked']
+        fines_created = result['fines_created']
+        fines_skipped = result['returns_with_fine']
         
         return {
             'success': True,
             'returns_checked': returns_checked,
             'fines_created': fines_created,
-            'fines_updated': fines_updated,
-            'message': f'Checked {returns_checked} completed returns. Created {fines_created} new fines, updated {fines_updated} existing fines.'
+            'fines_skipped': fines_skipped,
+            'total_amount': result['total_amount'],
+            'preview': result['preview'],
+            'message': f'Checked {returns_checked} completed returns. '
+                       f'{"Would create" if dry_run else "Created"} {fines_created} new fines, '
+                       f'left {fines_skipped} existing fines unchanged.'
         }
     
     @staticmethod
@@ -1,5 +1,4 @@
 from django.contrib.auth import authenticate
-from django.core.mail import send_mail
 from django.template.loader import render_to_string
 from django.utils.html import strip_tags
 from django.conf import settings
@@ -15,6 +14,7 @@ from ..serializers import (
     DeliveryAdminRegistrationSerializer,
 )
 from ..utils import format_error_message
+from .notification_services import EmailOutboxService
 
 logger = logging.getLogger(__name__)
 
@@ -101,7 +101,6 @@ class UserRegistrationService:
         }
     
     @staticmethod
-    @transaction.atomic
     def create_user_account(user_type: str, registration_data: Dict[str, Any]) -> Dict[str, Any]:
         """
         Create a new user account with the specified type and data.
@@ -114,50 +113,53 @@ class UserRegistrationService:
             Dictionary containing success status and user data or error message
         """
         try:
-            # Check if library admin registration is allowed
-            if user_type == 'library_admin':
-                if UserRegistrationService.library_admin_exists():
+            # Errors are caught outside the atomic block so a failed
+            # registration is rolled back instead of partially committed
+            with transaction.atomic():
+                # Check if library admin registration is allowed
+                if user_type == 'library_admin':
+                    if UserRegistrationService.library_admin_exists():
+                        return {
+                            'success': False,
+                            'message': 'A library administrator already exists in the system. Only one library administrator is allowed.',
+                            'error_code': 'LIBRARY_ADMIN_EXISTS'
+                        }
+                # Backward compatibility check for system_admin
+                elif user_type == 'system_admin':
+                    if UserRegistrationService.library_admin_exists():
+                        return {
+                            'success': False,
+                            'message': 'A library administrator already exists in the system. Only one library administrator is allowed.',
+                            'error_code': 'LIBRARY_ADMIN_EXISTS'
+                        }
+                
+                # Get the appropriate serializer
+                serializer_class = UserRegistrationService.get_registration_serializer(user_type)
+                serializer = serializer_class(data=registration_data)
+                
+                if serializer.is_valid():
+                    # Create the user
+                    user = serializer.save()
+                
+                    # Send welcome email
+                    UserRegistrationService.send_welcome_email(user)
+                
+                    # Log successful registration
+                    logger.info(f"New {user_type} account created: {user.email}")
+                
                     return {
-                        'success': False,
-                        'message': 'A library administrator already exists in the system. Only one library administrator is allowed.',
-                        'error_code': 'LIBRARY_ADMIN_EXISTS'
+                        'success': True,
+                        'message': f'{user.get_user_type_display()} account created successfully',
+                        'user_id': user.id,
+                        'email': user.email,
+                        'user_type': user.user_type,
                     }
-            # Backward compatibility check for system_admin
-            elif user_type == 'system_admin':
-                if UserRegistrationService.library_admin_exists():
+                else:
                     return {
                         'success': False,
-                        'message': 'A library administrator already exists in the system. Only one library administrator is allowed.',
-                        'error_code': 'LIBRARY_ADMIN_EXISTS'
+                        'message': 'Invalid registration data',
+                        'errors': serializer.errors
                     }
-            
-            # Get the appropriate serializer
-            serializer_class = UserRegistrationService.get_registration_serializer(user_type)
-            serializer = serializer_class(data=registration_data)
-            
-            if serializer.is_valid():
-                # Create the user
-                user = serializer.save()
-                
-                # Send welcome email
-                UserRegistrationService.send_welcome_email(user)
-                
-                # Log successful registration
-                logger.info(f"New {user_type} account created: {user.email}")
-                
-                return {
-                    'success': True,
-                    'message': f'{user.get_user_type_display()} account created successfully',
-                    'user_id': user.id,
-                    'email': user.email,
-                    'user_type': user.user_type,
-                }
-            else:
-                return {
-                    'success': False,
-                    'message': 'Invalid registration data',
-                    'errors': serializer.errors
-                }
                 
         except ValidationError as e:
             return {
@@ -176,13 +178,13 @@ class UserRegistrationService:
     @staticmethod
     def send_welcome_email(user: User) -> bool:
         """
-        Send welcome email to newly registered user.
+        Queue a welcome email for a newly registered user.
         
         Args:
             user: User instance
             
         Returns:
-            Boolean indicating if email was sent successfully
+            Boolean indicating if email was queued successfully
         """
         try:
             subject = f'Welcome to Bookstore - {user.get_user_type_display()} Account Created'
@@ -252,20 +254,21 @@ class UserRegistrationService:
                 The Bookstore Team
                 """
             
-            # Send email
-            send_mail(
-                subject=subject,
-                message=message,
-                from_email=settings.EMAIL_HOST_USER,
-                recipient_list=[user.email],
-                fail_silently=False,
-            )
+            # Queue email in the outbox (same transaction as the account creation).
+            # The savepoint keeps a failed insert from breaking the caller's transaction.
+            with transaction.atomic():
+                EmailOutboxService.enqueue_email(
+                    to_email=user.email,
+                    subject=subject,
+                    body=message,
+                    from_email=settings.EMAIL_HOST_USER,
+                )
             
-            logger.info(f"Welcome email sent to {user.email}")
+            logger.info(f"Welcome email queued for {user.email}")
             return True
             
         except Exception as e:
-            logger.error(f"Failed to send welcome email to {user.email}: {str(e)}")
+            logger.error(f"Failed to queue welcome email for {user.email}: {str(e)}")
             return False
     
     @staticmethod
@@ -0,0 +1,63 @@
+from django.test import SimpleTestCase
+
+from ..services.delivery_assignment_services import DeliveryAssignmentService
+
+
+class AssignmentSolverTests(SimpleTestCase):
+    """Matching of DeliveryAssignmentService.solve."""
+
+    def solve(self, requests, couriers, loads=None, max_load=3, load_penalty_km=2.0, max_distance_km=None):
+        return DeliveryAssignmentService.solve(
+            requests, couriers, loads or {}, max_load=max_load,
+            load_penalty_km=load_penalty_km, max_distance_km=max_distance_km
+        )
+
+    def test_request_goes_to_the_nearest_courier(self):
+        couriers = [('far', 0.1, 0), ('near', 0.01, 0)]
+
+        assignments = self.solve([(1, 0, 0)], couriers)
+
+        self.assertEqual(assignments[1][0], 'near')
+        self.assertAlmostEqual(assignments[1][1], 1.112, places=3)
+
+    def test_load_penalty_outweighs_a_small_detour(self):
+        # 'busy' is about 1.1 km closer but already holds a task worth 2 km
+        couriers = [('busy', 0, 0), ('free', 0.01, 0)]
+
+        assignments = self.solve([(1, 0, 0)], couriers, loads={'busy': 1})
+
+        self.assertEqual(assignments[1][0], 'free')
+
+    def test_couriers_are_not_loaded_above_max_load(self):
+        couriers = [('a', 0, 0), ('b', 1, 0)]
+        requests = [(1, 0, 0), (2, 0, 0), (3, 0, 0)]
+
+        assignments = self.solve(requests, couriers, loads={'a': 1}, max_load=2)
+
+        by_courier = [courier for courier, _ in assignments.values()]
+        self.assertEqual(by_courier.count('a'), 1)
+        self.assertEqual(by_courier.count('b'), 2)
+
+    def test_requests_beyond_capacity_stay_unassigned(self):
+        assignments = self.solve([(1, 0, 0), (2, 0, 0)], [('a', 0, 0)], max_load=1)
+
+        self.assertEqual(len(assignments), 1)
+
+    def test_max_distance_excludes_far_couriers(self):
+        assignments = self.solve([(1, 0, 0)], [('far', 1, 0)], max_distance_km=50)
+
+        self.assertEqual(assignments, {})
+
+    def test_requests_without_destination_are_matched_on_load(self):
+        couriers = [('a', 0, 0), ('b', 1, 0)]
+
+        assignments = self.solve([(1, None, None)], couriers, loads={'a': 2})
+
+        self.assertEqual(assignments[1], ('b', None))
+
+    def test_couriers_without_position_only_take_requests_without_destination(self):
+        couriers = [('unknown', None, None)]
+
+        assignments = self.solve([(1, 0, 0), (2, None, None)], couriers)
+
+        self.assertEqual(assignments, {2: ('unknown', None)})
@@ -0,0 +1,173 @@
+from decimal import Decimal
+
+from django.core.exceptions import ValidationError
+from django.test import TestCase
+from django.utils import timezone
+
+from ..models import (
+    Author, Book, BorrowRequest, Category, DeliveryRequest, DeliveryRun, DeliveryRunStop, Library, Order, User,
+)
+from ..models.borrowing_model import BorrowStatusChoices
+from ..models.return_model import ReturnRequest, ReturnStatus
+from ..services.delivery_bulk_services import DeliveryBulkService
+from ..services.delivery_services import DeliveryService
+
+
+class DeliveryBulkTransitionTests(TestCase):
+    """State machine of DeliveryBulkService.bulk_transition."""
+
+    def setUp(self):
+        self.customer = User.objects.create_user(
+            email='customer@example.com', password='pass', first_name='Cus', last_name='Tomer', user_type='customer'
+        )
+        self.courier = User.objects.create_user(
+            email='courier@example.com', password='pass', first_name='Cou', last_name='Rier', user_type='delivery_admin'
+        )
+        admin = User.objects.create_user(
+            email='admin@example.com', password='pass', first_name='Lib', last_name='Admin', user_type='library_admin'
+        )
+        library = Library.objects.create(name='Library', details='Details', created_by=admin, last_updated_by=admin)
+        category = Category.objects.create(name='Category', created_by=admin, last_updated_by=admin)
+        author = Author.objects.create(name='Author', created_by=admin, last_updated_by=admin)
+        self.book = Book.objects.create(
+            name='Book', description='Description', library=library, category=category, author=author,
+            created_by=admin, last_updated_by=admin
+        )
+
+    def _purchase_request(self, status):
+        order = Order.objects.create(customer=self.customer, total_amount=Decimal('10.00'))
+        return DeliveryRequest.objects.create(
+            delivery_type='purchase',
+            customer=self.customer,
+            order=order,
+            delivery_manager=self.courier,
+            status=status,
+            delivery_address='Somewhere',
+        )
+
+    def _return_request(self, status, return_status):
+        borrowing = BorrowRequest.objects.create(
+            customer=self.customer,
+            book=self.book,
+            borrow_period_days=7,
+            expected_return_date=timezone.now(),
+            delivery_address='Somewhere',
+            status=BorrowStatusChoices.RETURN_ASSIGNED,
+        )
+        return_request = ReturnRequest.objects.create(
+            borrowing=borrowing, status=return_status, delivery_manager=self.courier
+        )
+        return DeliveryRequest.objects.create(
+            delivery_type='return',
+            customer=self.customer,
+            return_request=return_request,
+            delivery_manager=self.courier,
+            status=status,
+            delivery_address='Somewhere',
+        )
+
+    def test_complete_moves_every_request_and_its_order(self):
+        requests = [self._purchase_request('in_delivery') for _ in range(3)]
+
+        result = DeliveryBulkService.bulk_transition(self.courier, [r.id for r in requests], 'complete')
+
+        self.assertEqual(result['updated'], 3)
+        for delivery_request in requests:
+            delivery_request.refresh_from_db()
+            self.assertEqual(delivery_request.status, 'completed')
+            self.assertEqual(delivery_request.order.status, 'delivered')
+
+    def test_complete_closes_the_run_of_the_requests(self):
+        requests = [self._purchase_request('in_delivery') for _ in range(2)]
+        run = DeliveryRun.objects.create(delivery_manager=self.courier, status='in_progress')
+        for sequence, delivery_request in enumerate(requests, start=1):
+            DeliveryRunStop.objects.create(run=run, delivery_request=delivery_request, sequence=sequence)
+
+        DeliveryBulkService.bulk_transition(self.courier, [r.id for r in requests], 'complete')
+
+        run.refresh_from_db()
+        self.assertEqual(run.status, 'completed')
+        self.assertFalse(run.stops.filter(status='pending').exists())
+
+    def test_any_invalid_request_leaves_the_batch_unchanged(self):
+        ready = self._purchase_request('in_delivery')
+        not_started = self._purchase_request('accepted')
+
+        with self.assertRaises(ValidationError) as raised:
+            DeliveryBulkService.bulk_transition(self.courier, [ready.id, not_started.id], 'complete')
+
+        self.assertIn(str(not_started.id), raised.exception.message_dict)
+        ready.refresh_from_db()
+        self.assertEqual(ready.status, 'in_delivery')
+
+    def test_accept_takes_one_request_at_a_time(self):
+        requests = [self._purchase_request('assigned') for _ in range(2)]
+
+        with self.assertRaises(ValidationError):
+            DeliveryBulkService.bulk_transition(self.courier, [r.id for r in requests], 'accept')
+
+        self.assertEqual(
+            DeliveryRequest.objects.filter(id__in=[r.id for r in requests], status='assigned').count(), 2
+        )
+
+    def test_accept_is_refused_while_another_delivery_is_active(self):
+        self._purchase_request('in_delivery')
+        assigned = self._purchase_request('assigned')
+
+        with self.assertRaises(ValidationError):
+            DeliveryBulkService.bulk_transition(self.courier, [assigned.id], 'accept')
+
+        assigned.refresh_from_db()
+        self.assertEqual(assigned.status, 'assigned')
+
+    def test_accept_of_a_single_request(self):
+        assigned = self._purchase_request('assigned')
+
+        DeliveryBulkService.bulk_transition(self.courier, [assigned.id], 'accept')
+
+        assigned.refresh_from_db()
+        self.assertEqual(assigned.status, 'accepted')
+        self.assertIsNotNone(assigned.accepted_at)
+
+    def _state(self, delivery_request):
+        delivery_request.refresh_from_db()
+        return_request = ReturnRequest.objects.select_related('borrowing').get(id=delivery_request.return_request_id)
+        return (
+            delivery_request.status,
+            return_request.status,
+            return_request.borrowing.status,
+            return_request.picked_up_at is not None,
+        )
+
+    def test_bulk_and_single_start_leave_the_same_state(self):
+        bulk = self._return_request('accepted', ReturnStatus.ACCEPTED)
+        single = self._return_request('accepted', ReturnStatus.ACCEPTED)
+
+        DeliveryBulkService.bulk_transition(self.courier, [bulk.id], 'start')
+        bulk_state = self._state(bulk)
+        # One active delivery at a time: finish the first before starting the second
+        DeliveryService.complete_delivery(bulk.id, self.courier)
+        DeliveryService.start_delivery(single.id, self.courier)
+
+        self.assertEqual(bulk_state, self._state(single))
+
+    def test_bulk_start_of_a_return_pickup(self):
+        delivery_request = self._return_request('accepted', ReturnStatus.ACCEPTED)
+
+        DeliveryBulkService.bulk_transition(self.courier, [delivery_request.id], 'start')
+
+        delivery_request.refresh_from_db()
+        return_request = ReturnRequest.objects.select_related('borrowing').get(id=delivery_request.return_request_id)
+        self.assertEqual(delivery_request.status, 'in_delivery')
+        self.assertEqual(return_request.status, ReturnStatus.IN_PROGRESS)
+        self.assertEqual(return_request.borrowing.status, BorrowStatusChoices.OUT_FOR_RETURN_PICKUP)
+        self.assertIsNotNone(return_request.picked_up_at)
+
+    def test_accept_of_a_return_pickup_accepts_the_return_request(self):
+        delivery_request = self._return_request('assigned', ReturnStatus.ASSIGNED)
+
+        DeliveryBulkService.bulk_transition(self.courier, [delivery_request.id], 'accept')
+
+        return_request = ReturnRequest.objects.get(id=delivery_request.return_request_id)
+        self.assertEqual(return_request.status, ReturnStatus.ACCEPTED)
+        self.assertIsNotNone(return_request.accepted_at)
@@ -0,0 +1,94 @@
+from decimal import Decimal
+
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from ..models import DeliveryProfile, DeliveryRequest, Order, User
+from ..services.delivery_run_services import DeliveryRunService, RoutePlanner
+
+
+class RoutePlannerTests(SimpleTestCase):
+    """Stop ordering of RoutePlanner.plan."""
+
+    def test_orders_stops_by_nearest_neighbour_from_start(self):
+        ordered = RoutePlanner.plan((0, 0), [('c', 0.03, 0), ('a', 0.01, 0), ('b', 0.02, 0)])
+
+        self.assertEqual([key for key, _ in ordered], ['a', 'b', 'c'])
+        for _, distance in ordered:
+            self.assertAlmostEqual(distance, 1.112, places=3)
+        self.assertAlmostEqual(RoutePlanner.route_length(ordered), 3.336, places=3)
+
+    def test_stops_without_coordinates_follow_in_given_order(self):
+        ordered = RoutePlanner.plan((0, 0), [('x', None, None), ('a', 0.01, 0), ('y', None, 5)])
+
+        self.assertEqual(ordered[0][0], 'a')
+        self.assertEqual(ordered[1:], [('x', None), ('y', None)])
+
+    def test_without_start_the_first_stop_has_no_distance(self):
+        ordered = RoutePlanner.plan(None, [('a', 0.01, 0), ('b', 0.02, 0)])
+
+        self.assertEqual(len(ordered), 2)
+        self.assertIsNone(ordered[0][1])
+        self.assertAlmostEqual(ordered[1][1], 1.112, places=3)
+
+    def test_no_stops(self):
+        self.assertEqual(RoutePlanner.plan((0, 0), []), [])
+
+    def test_two_opt_uncrosses_a_route(self):
+        # Nodes lie on a line at positions 0, 2, 1 and 3; visiting them in
+        # node order doubles back, reversing the middle segment does not
+        positions = [0, 2, 1, 3]
+        distance = [[abs(a - b) for b in positions] for a in positions]
+
+        route = RoutePlanner._two_opt(distance, [0, 1, 2, 3], fixed_start=True)
+
+        self.assertEqual(route, [0, 2, 1, 3])
+
+
+@override_settings(GEOCODING_URL=None)
+class DeliveryRunPlanningTests(TestCase):
+    """create_run routes stops by their destination, not the courier's GPS."""
+
+    def setUp(self):
+        self.customer = User.objects.create_user(
+            email='customer@example.com', password='pass', first_name='Cus', last_name='Tomer', user_type='customer'
+        )
+        self.courier = User.objects.create_user(
+            email='courier@example.com', password='pass', first_name='Cou', last_name='Rier', user_type='delivery_admin'
+        )
+        DeliveryProfile.objects.filter(user=self.courier).update(latitude=0, longitude=0)
+
+    def _request(self, destination, gps=(None, None)):
+        order = Order.objects.create(customer=self.customer, total_amount=Decimal('10.00'))
+        return DeliveryRequest.objects.create(
+            delivery_type='purchase',
+            customer=self.customer,
+            order=order,
+            delivery_manager=self.courier,
+            status='assigned',
+            delivery_address='Somewhere',
+            destination_latitude=destination[0],
+            destination_longitude=destination[1],
+            latitude=gps[0],
+            longitude=gps[1],
+        )
+
+    def test_stops_are_routed_by_destination(self):
+        far = self._request((Decimal('0.03'), Decimal('0')), gps=(Decimal('0.01'), Decimal('0')))
+        near = self._request((Decimal('0.01'), Decimal('0')))
+        middle = self._request((Decimal('0.02'), Decimal('0')))
+
+        run = DeliveryRunService.create_run(self.courier, [far.id, near.id, middle.id])
+
+        stops = list(run.stops.order_by('sequence').values_list('delivery_request_id', flat=True))
+        self.assertEqual(stops, [near.id, middle.id, far.id])
+        self.assertAlmostEqual(float(run.planned_distance_km), 3.336, places=2)
+
+    def test_requests_without_destination_keep_their_order_last(self):
+        first = self._request((None, None))
+        located = self._request((Decimal('0.01'), Decimal('0')))
+        second = self._request((None, None))
+
+        run = DeliveryRunService.create_run(self.courier, [first.id, located.id, second.id])
+
+        stops = list(run.stops.order_by('sequence').values_list('delivery_request_id', flat=True))
+        self.assertEqual(stops, [located.id, first.id, second.id])
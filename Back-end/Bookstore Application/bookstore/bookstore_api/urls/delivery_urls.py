@@ -5,14 +5,21 @@ from ..views.delivery_views import (
     CustomerOrdersView,
     OrderDetailView,
     AvailableDeliveryManagersView,
+    NearestDeliveryManagersView,
     approve_order,
     reject_order,
     assign_delivery_manager,
+    auto_assign_delivery_requests,
+    bulk_transition_delivery_requests,
     accept_delivery_request,
     reject_delivery_request,
     start_delivery,
     update_location,
+    upload_location_batch,
     complete_delivery,
+    delivery_runs,
+    delivery_run_action,
+    delivery_run_stop_action,
     update_payment_status,
     manage_delivery_notes,
     log_order_note,
@@ -56,6 +63,10 @@ urlpatterns = [
     # GET /orders/available_delivery_managers/
     path('orders/available_delivery_managers/', AvailableDeliveryManagersView.as_view(), name='available-delivery-managers'),
     
+    # Online delivery managers ranked by distance to the delivery coordinates
+    # GET /orders/nearest_delivery_managers/?latitude=..&longitude=..&limit=5
+    path('orders/nearest_delivery_managers/', NearestDeliveryManagersView.as_view(), name='nearest-delivery-managers'),
+    
     # List delivery requests (with query parameters for filtering)
     # GET /delivery-requests/?type=purchase|borrow|return&status=pending|assigned|accepted|in_delivery|completed|rejected
     path('delivery-requests/', DeliveryRequestListView.as_view(), name='delivery-request-list'),
@@ -64,6 +75,20 @@ urlpatterns = [
     # GET /delivery-requests/{id}/
     path('delivery-requests/<int:pk>/', DeliveryRequestDetailView.as_view(), name='delivery-request-detail'),
     
+    # Assign all pending delivery requests by distance and load (Admin only)
+    # POST /delivery-requests/auto-assign/
+    path('delivery-requests/auto-assign/', auto_assign_delivery_requests, name='auto-assign-delivery-requests'),
+
+    # Bulk accept, start or complete delivery requests (Delivery Admin only)
+    # POST /delivery-requests/bulk/accept/
+    path('delivery-requests/bulk/accept/', bulk_transition_delivery_requests, {'action': 'accept'}, name='bulk-accept-delivery-requests'),
+
+    # POST /delivery-requests/bulk/start/
+    path('delivery-requests/bulk/start/', bulk_transition_delivery_requests, {'action': 'start'}, name='bulk-start-delivery-requests'),
+
+    # POST /delivery-requests/bulk/complete/
+    path('delivery-requests/bulk/complete/', bulk_transition_delivery_requests, {'action': 'complete'}, name='bulk-complete-delivery-requests'),
+
     # Get DeliveryRequest ID by ReturnRequest ID (helper endpoint)
     # GET /delivery-requests/by-return/{return_request_id}/
     path('delivery-requests/by-return/<int:return_request_id>/', get_delivery_request_by_return_id, name='delivery-request-by-return-id'),
@@ -92,10 +117,35 @@ urlpatterns = [
     # POST /delivery-requests/{id}/update-location/
     path('delivery-requests/<int:delivery_request_id>/update-location/', update_location, name='update-location'),
     
+    # Upload buffered GPS points in one request
+    # POST /location-history/batch/
+    path('location-history/batch/', upload_location_batch, name='upload-location-batch'),
+    
     # Complete delivery
     # POST /delivery-requests/{id}/complete/
     path('delivery-requests/<int:delivery_request_id>/complete/', complete_delivery, name='complete-delivery'),
     
+    # Multi-stop delivery runs
+    # GET /delivery-runs/ - Get the open run of the current delivery manager
+    # POST /delivery-runs/ - Plan a run over several assigned requests
+    path('delivery-runs/', delivery_runs, name='delivery-runs'),
+    
+    # Start all stops of a planned run
+    # POST /delivery-runs/{id}/start/
+    path('delivery-runs/<int:run_id>/start/', delivery_run_action, {'action': 'start'}, name='start-delivery-run'),
+    
+    # Cancel a planned run
+    # POST /delivery-runs/{id}/cancel/
+    path('delivery-runs/<int:run_id>/cancel/', delivery_run_action, {'action': 'cancel'}, name='cancel-delivery-run'),
+    
+    # Complete one stop of a run in progress
+    # POST /delivery-runs/{id}/stops/{stop_id}/complete/
+    path('delivery-runs/<int:run_id>/stops/<int:stop_id>/complete/', delivery_run_stop_action, {'action': 'complete'}, name='complete-delivery-run-stop'),
+    
+    # Take a pending stop out of a run
+    # POST /delivery-runs/{id}/stops/{stop_id}/remove/
+    path('delivery-runs/<int:run_id>/stops/<int:stop_id>/remove/', delivery_run_stop_action, {'action': 'remove'}, name='remove-delivery-run-stop'),
+    
     # Update payment status for completed deliveries
     # PATCH /delivery-requests/{id}/update-payment-status/
     path('delivery-requests/<int:delivery_request_id>/update-payment-status/', update_payment_status, name='update-payment-status'),
@@ -1,12 +1,14 @@
 from django.urls import path
 from bookstore_api.views.payment_views import (
-    PaymentInitView, CreditCardPaymentView, CashOnDeliveryPaymentView
+    PaymentInitView, CreditCardPaymentView, CashOnDeliveryPaymentView, PaymentHistoryView
 )
 
 # Payment URLs configuration
 payment_urls = [
     # Initialize payment
     path('init/', PaymentInitView.as_view(), name='payment_init'),
+    # Payment history of the current user
+    path('history/', PaymentHistoryView.as_view(), name='payment_history'),
     # Process credit card payment
     path('<int:payment_id>/credit-card/', CreditCardPaymentView.as_view(), name='credit_card_payment'),
     # Process cash on delivery payment
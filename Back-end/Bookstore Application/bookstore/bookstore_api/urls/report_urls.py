@@ -5,7 +5,7 @@ from ..views.report_views import (
     DashboardStatsView, SalesReportView, UserReportView,
     BookReportView, OrderReportView, AuthorReportView,
     CategoryReportView, RatingReportView, FinesReportView, 
-    BorrowingReportView, DeliveryReportView
+    BorrowingReportView, DeliveryReportView, DeliveryPerformanceReportView
 )
 
 report_urls = [
@@ -21,4 +21,5 @@ report_urls = [
     path('fines/', FinesReportView.as_view(), name='fines-report'),
     path('borrowing/', BorrowingReportView.as_view(), name='borrowing-report'),
     path('delivery/', DeliveryReportView.as_view(), name='delivery-report'),
+    path('delivery/performance/', DeliveryPerformanceReportView.as_view(), name='delivery-performance-report'),
 ]
@@ -12,8 +12,11 @@ from bookstore_api.views.return_view import (
     BookReturnWithFineView,
     FinePaymentView,
     CustomerFinesView,
+    CustomerFineBalanceView,
     MarkFineAsPaidView,
     AllFinesView,
+    FineRateTableView,
+    FinePricingPreviewView,
     GetReturnDeliveryLocationView,
     SelectReturnFinePaymentMethodView,
     CustomerConfirmReturnPickupView,
@@ -47,8 +50,11 @@ return_urls = [
     path('requests/<int:pk>/return-with-fine/', BookReturnWithFineView.as_view(), name='book_return_with_fine'),
     path('requests/<int:pk>/pay-fine/', FinePaymentView.as_view(), name='fine_payment'),
     path('fines/my-fines/', CustomerFinesView.as_view(), name='customer_fines'),
+    path('fines/my-fines/balance/', CustomerFineBalanceView.as_view(), name='customer_fine_balance'),
     path('fines/mark-paid/', MarkFineAsPaidView.as_view(), name='mark_fine_paid'),
     path('fines/all/', AllFinesView.as_view(), name='all_fines'),
+    path('fines/rates/', FineRateTableView.as_view(), name='fine_rate_tables'),
+    path('fines/pricing-preview/', FinePricingPreviewView.as_view(), name='fine_pricing_preview'),
     
     # Return Fine Payment Method endpoints
     path('fines/<int:fine_id>/select-payment-method/', SelectReturnFinePaymentMethodView.as_view(), name='select_return_fine_payment_method'),
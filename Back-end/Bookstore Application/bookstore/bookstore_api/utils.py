@@ -284,4 +284,22 @@ def get_file_size_display(size_bytes):
     p = math.pow(1024, i)
     s = round(size_bytes / p, 2)
     
-    return f"{s} {size_names[i]}"
\ No newline at end of file
+    return f"{s} {size_names[i]}"
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    """
+    Great-circle distance between two coordinates in kilometres.
+    
+    Args:
+        lat1, lon1: First point in decimal degrees
+        lat2, lon2: Second point in decimal degrees
+    
+    Returns:
+        Distance in kilometres as a float
+    """
+    import math
+    lat1, lon1, lat2, lon2 = (math.radians(float(v)) for v in (lat1, lon1, lat2, lon2))
+    dlat = lat2 - lat1
+    dlon = lon2 - lon1
+    a = math.sin(dlat / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin(dlon / 2) ** 2
+    return 2 * 6371.0088 * math.asin(math.sqrt(min(1.0, a)))
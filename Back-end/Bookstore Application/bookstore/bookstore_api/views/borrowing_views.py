@@ -27,6 +27,8 @@ from ..services.borrowing_services import (
     BorrowingService, BorrowingNotificationService, BorrowingReportService, LateReturnService
 )
 from ..services.notification_services import NotificationService
+from ..services.idempotency_services import idempotent
+from ..services.live_location_services import LiveLocationService
 from ..permissions import IsCustomer, IsLibraryAdmin, IsDeliveryAdmin, IsAnyAdmin, CustomerOrAdmin, IsDeliveryAdminOrLibraryAdmin
 from ..utils import format_error_message
 import logging
@@ -136,6 +138,7 @@ class ConfirmPaymentView(APIView):
     """
     permission_classes = [permissions.IsAuthenticated, IsCustomer]
     
+    @idempotent('borrow_confirm_payment')
     def post(self, request, pk):
         try:
             # Get the borrow request
@@ -546,59 +549,15 @@ class DeliveryManagerSelectionView(generics.ListAPIView):
     
     def list(self, request, *args, **kwargs):
         try:
-            queryset = self.get_queryset()
-            
-            # Force evaluation of queryset to ensure we get all managers
-            managers_list = list(queryset)
-            logger.info(f"DeliveryManagerSelectionView: Total managers in queryset: {len(managers_list)}")
-            logger.info(f"DeliveryManagerSelectionView: Queryset count (before list): {queryset.count()}")
+            serializer = self.get_serializer(self.get_queryset(), many=True)
             
-            # Log each manager BEFORE serialization
-            for manager in managers_list:
-                try:
-                    has_profile = hasattr(manager, 'delivery_profile')
-                    profile = manager.delivery_profile if has_profile else None
-                    delivery_status_value = profile.delivery_status if profile else None
-                    status_display = profile.get_delivery_status_display() if profile and delivery_status_value else None
-                    
-                    logger.info(
-                        f"Manager {manager.id} ({manager.get_full_name()}): "
-                        f"has_profile={has_profile}, delivery_status={delivery_status_value}, status_display={status_display}, "
-                        f"is_active={manager.is_active}, user_type={manager.user_type}"
-                    )
-                except Exception as e:
-                    logger.warning(f"Error logging manager {manager.id}: {str(e)}")
-            
-            # Serialize the managers
-            serializer = self.get_serializer(managers_list, many=True)
-            
-            # Also log the serialized data for debugging
-            logger.info(f"DeliveryManagerSelectionView: Serialized data count: {len(serializer.data)}")
-            if serializer.data:
-                logger.info(f"Serialized data sample (first item): {serializer.data[0]}")
-                # Log all delivery_status values with ALL possible fields
-                for idx, item in enumerate(serializer.data):
-                    logger.info(f"Item {idx}: id={item.get('id')}, name={item.get('name')}, full_name={item.get('full_name')}, "
-                              f"delivery_status={item.get('delivery_status')}, status={item.get('status')}, "
-                              f"delivery_status_lower={item.get('delivery_status_lower')}, "
-                              f"status_display={item.get('status_display')}, status_text={item.get('status_text')}, "
-                              f"is_available={item.get('is_available')}, status_color={item.get('status_color')}")
-                    # Log full item structure for debugging
-                    logger.debug(f"Full item {idx} structure: {item}")
-            else:
-                logger.warning("No delivery managers found in serialized data")
-            
-            # Return response with both nested and flat structure for compatibility
             response_data = {
                 'success': True,
                 'message': 'Delivery managers retrieved successfully',
-                'data': serializer.data
+                'data': serializer.data,
+                'status_counts': BorrowingService.get_delivery_manager_status_counts()
             }
             
-            # Log the full response structure
-            logger.info(f"Response structure keys: {list(response_data.keys())}")
-            logger.info(f"Response data count: {len(serializer.data)}")
-            
             return Response(response_data, status=status.HTTP_200_OK)
             
         except Exception as e:
@@ -1219,6 +1178,16 @@ class GetDeliveryLocationView(APIView):
     
     def get(self, request, borrow_id):
         try:
+            # Serve polls from the live location cache while the delivery is in progress
+            cached = LiveLocationService.get_cached_tracking('borrow', borrow_id, request.user)
+            if cached:
+                session, location_data = cached
+                return Response({
+                    'success': True,
+                    'message': 'Delivery location retrieved successfully',
+                    'data': LiveLocationService.build_tracking_data('borrow', int(borrow_id), session, location_data)
+                }, status=status.HTTP_200_OK)
+            
             borrow_request = get_object_or_404(BorrowRequest, id=borrow_id)
             
             # Check permissions - customer can see their own, admin can see all
@@ -1275,13 +1244,13 @@ class GetDeliveryLocationView(APIView):
             if hasattr(delivery_manager, 'delivery_profile') and delivery_manager.delivery_profile:
                 profile = delivery_manager.delivery_profile
                 if profile.latitude is not None and profile.longitude is not None:
-                    location_data = {
-                        'latitude': float(profile.latitude),
-                        'longitude': float(profile.longitude),
-                        'address': profile.address,
-                        'last_updated': profile.location_updated_at.isoformat() if profile.location_updated_at else None,
-                        'is_tracking_active': profile.is_tracking_active
-                    }
+                    location_data = LiveLocationService.build_location_from_record(
+                        profile.latitude,
+                        profile.longitude,
+                        address=profile.address,
+                        recorded_at=profile.location_updated_at,
+                        is_tracking_active=profile.is_tracking_active
+                    )
             
             # Get latest location from history if profile doesn't have it
             if not location_data:
@@ -1291,13 +1260,12 @@ class GetDeliveryLocationView(APIView):
                 ).order_by('-recorded_at').first()
                 
                 if latest_location:
-                    location_data = {
-                        'latitude': float(latest_location.latitude),
-                        'longitude': float(latest_location.longitude),
-                        'address': latest_location.address,
-                        'last_updated': latest_location.recorded_at.isoformat(),
-                        'is_tracking_active': True
-                    }
+                    location_data = LiveLocationService.build_location_from_record(
+                        latest_location.latitude,
+                        latest_location.longitude,
+                        address=latest_location.address,
+                        recorded_at=latest_location.recorded_at
+                    )
             
             if not location_data:
                 return Response({
@@ -1306,25 +1274,16 @@ class GetDeliveryLocationView(APIView):
                     'errors': {'location': ['Delivery manager location is not available']}
                 }, status=status.HTTP_404_NOT_FOUND)
             
-            # Get delivery manager details (Step 2.3: DM Details Display)
-            delivery_manager_info = {
-                'id': delivery_manager.id,
-                'name': delivery_manager.get_full_name(),
-                'phone': delivery_manager.phone_number if hasattr(delivery_manager, 'phone_number') else None,
-                'email': delivery_manager.email
-            }
+            if delivery_request:
+                LiveLocationService.warm_tracking_cache(delivery_request, location_data)
+            
+            # Delivery manager details (Step 2.3: DM Details Display)
+            session = LiveLocationService.build_session(borrow_request, delivery_manager, delivery_request)
             
             return Response({
                 'success': True,
                 'message': 'Delivery location retrieved successfully',
-                'data': {
-                    'borrow_request_id': borrow_request.id,
-                    'status': borrow_request.status,
-                    'delivery_manager': delivery_manager_info,
-                    'location': location_data,
-                    'tracking_enabled': True,
-                    'tracking_interval_seconds': 5  # Step 3.3: Every 5 seconds
-                }
+                'data': LiveLocationService.build_tracking_data('borrow', borrow_request.id, session, location_data)
             }, status=status.HTTP_200_OK)
             
         except Exception as e:
@@ -2085,15 +2044,19 @@ class ProcessOverdueBorrowingsView(APIView):
     
     def post(self, request):
         try:
-            # Process overdue borrowings and create fines
-            BorrowingNotificationService.process_overdue_borrowings()
+            # Mark overdue borrowings as late
+            overdue_count = BorrowingNotificationService.process_overdue_borrowings()
             
             # Send return reminders
-            BorrowingNotificationService.send_return_reminders()
+            reminder_count = BorrowingNotificationService.send_return_reminders()
             
             return Response({
                 'success': True,
-                'message': 'Overdue borrowings processed successfully'
+                'message': 'Overdue borrowings processed successfully',
+                'data': {
+                    'overdue': overdue_count,
+                    'reminders': reminder_count
+                }
             }, status=status.HTTP_200_OK)
             
         except Exception as e:
@@ -7,9 +7,8 @@ from django.shortcuts import get_object_or_404
 from django.db.models import Q
 from django.utils import timezone
 
-from ..models import DeliveryRequest, User, Order, Notification
-from ..models.borrowing_model import BorrowRequest, BorrowStatusChoices
-from ..models.return_model import ReturnRequest, ReturnStatus
+from ..models import DeliveryRequest, DeliveryRun, DeliveryRunStop, User, Order, Notification
+from ..models.borrowing_model import BorrowRequest
 from ..serializers.delivery_serializers import (
     DeliveryRequestListSerializer,
     DeliveryRequestDetailSerializer,
@@ -18,12 +17,26 @@ from ..serializers.delivery_serializers import (
     RejectDeliveryRequestSerializer,
     StartDeliverySerializer,
     UpdateLocationSerializer,
+    LocationBatchSerializer,
+    AutoAssignDeliverySerializer,
+    BulkDeliveryTransitionSerializer,
+    CreateDeliveryRunSerializer,
+    DeliveryRunSerializer,
+    DeliveryRunStopSerializer,
     CompleteDeliverySerializer,
     DeliveryNotesSerializer,
     BorrowingOrderSerializer,
     CustomerOrderSerializer,
 )
+from ..serializers.mixins import SparseFieldsetViewMixin
 from ..services.delivery_services import DeliveryService
+from ..services.live_location_services import LiveLocationService
+from ..services.courier_index_services import NearestCourierService
+from ..services.delivery_assignment_services import DeliveryAssignmentService
+from ..services.delivery_bulk_services import DeliveryBulkService
+from ..services.delivery_run_services import DeliveryRunService
+from ..services.geocoding_services import GeocodingService
+from ..services.idempotency_services import idempotent
 from ..permissions import IsDeliveryAdmin, IsAnyAdmin, IsLibraryAdmin, CustomerOrAdmin, CanManageDeliveryNotes
 from ..authentication import CustomJWTAuthentication
 from ..utils import format_error_message
@@ -32,7 +45,7 @@ import logging
 logger = logging.getLogger(__name__)
 
 
-class DeliveryRequestListView(generics.ListAPIView):
+class DeliveryRequestListView(SparseFieldsetViewMixin, generics.ListAPIView):
     """
     View for listing delivery requests.
     Supports filtering by type, status, and delivery manager.
@@ -60,14 +73,9 @@ class DeliveryRequestListView(generics.ListAPIView):
         if delivery_type:
             if delivery_type not in ['purchase', 'borrow', 'return']:
                 raise DRFValidationError("Invalid delivery type. Must be 'purchase', 'borrow', or 'return'.")
+            # Missing DeliveryRequest rows for ReturnRequest/BorrowRequest objects are
+            # created by the sync_delivery_requests command, not during this read
             queryset = queryset.filter(delivery_type=delivery_type)
-            
-            # Ensure DeliveryRequest objects exist for ReturnRequest and BorrowRequest objects
-            # This handles cases where ReturnRequest/BorrowRequest exist but DeliveryRequest doesn't
-            if delivery_type == 'return':
-                self._ensure_return_delivery_requests(user)
-            elif delivery_type == 'borrow':
-                self._ensure_borrow_delivery_requests(user)
         
         # Filter by status (query parameter: ?status=pending|assigned|accepted|in_delivery|completed|rejected)
         status_filter = self.request.query_params.get('status', None)
@@ -83,139 +91,6 @@ class DeliveryRequestListView(generics.ListAPIView):
         
         return queryset.order_by('-created_at')
     
-    def _ensure_return_delivery_requests(self, user):
-        """Ensure DeliveryRequest objects exist for ReturnRequest objects that need them."""
-        from django.db import transaction
-        
-        # Get ReturnRequest objects that should have DeliveryRequest objects
-        # ReturnRequest objects that are assigned to a delivery manager or are pending/approved/assigned
-        return_requests = ReturnRequest.objects.filter(
-            Q(delivery_manager=user) | 
-            Q(delivery_manager__isnull=True, status__in=[
-                ReturnStatus.PENDING,
-                ReturnStatus.APPROVED,
-                ReturnStatus.ASSIGNED,
-            ])
-        ).exclude(
-            status=ReturnStatus.COMPLETED
-        )
-        
-        for return_request in return_requests:
-            # Check if DeliveryRequest already exists for this ReturnRequest
-            if not DeliveryRequest.objects.filter(return_request=return_request).exists():
-                try:
-                    with transaction.atomic():
-                        # CRITICAL: Design rule - if delivery_manager is set, status MUST be 'assigned' or higher
-                        # Never create with status='pending' + delivery_manager (invalid design)
-                        delivery_manager = return_request.delivery_manager
-                        
-                        # Determine status based on return_request status and delivery_manager
-                        if delivery_manager:
-                            # If delivery_manager is assigned, status must be 'assigned' or higher
-                            status_mapping = {
-                                ReturnStatus.ASSIGNED: 'assigned',
-                                ReturnStatus.ACCEPTED: 'accepted',
-                                ReturnStatus.IN_PROGRESS: 'in_delivery',
-                            }
-                            delivery_status = status_mapping.get(return_request.status, 'assigned')
-                        else:
-                            # No delivery_manager - can be 'pending'
-                            status_mapping = {
-                                ReturnStatus.PENDING: 'pending',
-                                ReturnStatus.APPROVED: 'pending',
-                            }
-                            delivery_status = status_mapping.get(return_request.status, 'pending')
-                        
-                        # Get customer from the borrowing request
-                        customer = return_request.borrowing.customer
-                        
-                        # Get delivery address from borrowing request
-                        delivery_address = return_request.borrowing.delivery_address
-                        
-                        # Set assigned_at if delivery_manager is assigned
-                        assigned_at = None
-                        if delivery_manager and return_request.status in [ReturnStatus.ASSIGNED, ReturnStatus.ACCEPTED]:
-                            assigned_at = return_request.accepted_at if return_request.accepted_at else timezone.now()
-                        
-                        # Create DeliveryRequest for this ReturnRequest
-                        DeliveryRequest.objects.create(
-                            delivery_type='return',
-                            customer=customer,
-                            delivery_address=delivery_address,
-                            return_request=return_request,
-                            delivery_manager=delivery_manager,
-                            status=delivery_status,
-                            created_at=return_request.created_at,
-                            assigned_at=assigned_at,
-                        )
-                        logger.info(f"Created DeliveryRequest for ReturnRequest {return_request.id}")
-                except Exception as e:
-                    logger.error(f"Error creating DeliveryRequest for ReturnRequest {return_request.id}: {str(e)}")
-    
-    def _ensure_borrow_delivery_requests(self, user):
-        """Ensure DeliveryRequest objects exist for BorrowRequest objects that need them."""
-        from django.db import transaction
-        
-        # Get BorrowRequest objects that should have DeliveryRequest objects
-        # BorrowRequest objects that are assigned to a delivery manager or are approved/pending delivery
-        borrow_requests = BorrowRequest.objects.filter(
-            Q(delivery_person=user) | 
-            Q(delivery_person__isnull=True, status__in=[
-                BorrowStatusChoices.APPROVED,
-                BorrowStatusChoices.ASSIGNED_TO_DELIVERY,
-                BorrowStatusChoices.PENDING_DELIVERY,
-                BorrowStatusChoices.AWAITING_PICKUP,
-            ])
-        ).exclude(
-            status__in=[BorrowStatusChoices.DELIVERED, BorrowStatusChoices.RETURNED, BorrowStatusChoices.CANCELLED]
-        )
-        
-        for borrow_request in borrow_requests:
-            # Check if DeliveryRequest already exists for this BorrowRequest
-            if not DeliveryRequest.objects.filter(borrow_request=borrow_request).exists():
-                try:
-                    with transaction.atomic():
-                        # CRITICAL: Design rule - if delivery_manager is set, status MUST be 'assigned' or higher
-                        # Never create with status='pending' + delivery_manager (invalid design)
-                        delivery_manager = borrow_request.delivery_person
-                        
-                        # Determine status based on borrow_request status and delivery_manager
-                        if delivery_manager:
-                            # If delivery_manager is assigned, status must be 'assigned' or higher
-                            status_mapping = {
-                                BorrowStatusChoices.ASSIGNED_TO_DELIVERY: 'assigned',
-                                BorrowStatusChoices.PENDING_DELIVERY: 'assigned',
-                                BorrowStatusChoices.AWAITING_PICKUP: 'assigned',
-                                BorrowStatusChoices.OUT_FOR_DELIVERY: 'in_delivery',
-                            }
-                            delivery_status = status_mapping.get(borrow_request.status, 'assigned')
-                        else:
-                            # No delivery_manager - can be 'pending'
-                            status_mapping = {
-                                BorrowStatusChoices.APPROVED: 'pending',
-                            }
-                            delivery_status = status_mapping.get(borrow_request.status, 'pending')
-                        
-                        # Set assigned_at if delivery manager is assigned
-                        assigned_at = None
-                        if delivery_manager and borrow_request.approved_date:
-                            assigned_at = borrow_request.approved_date
-                        
-                        # Create DeliveryRequest for this BorrowRequest
-                        DeliveryRequest.objects.create(
-                            delivery_type='borrow',
-                            customer=borrow_request.customer,
-                            delivery_address=borrow_request.delivery_address,
-                            borrow_request=borrow_request,
-                            delivery_manager=delivery_manager,
-                            status=delivery_status,
-                            created_at=borrow_request.created_at,
-                            assigned_at=assigned_at,
-                        )
-                        logger.info(f"Created DeliveryRequest for BorrowRequest {borrow_request.id}")
-                except Exception as e:
-                    logger.error(f"Error creating DeliveryRequest for BorrowRequest {borrow_request.id}: {str(e)}")
-    
     def list(self, request, *args, **kwargs):
         """Override list to add custom response format."""
         response = super().list(request, *args, **kwargs)
@@ -365,6 +240,216 @@ def assign_delivery_manager(request, delivery_request_id):
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+@api_view(['POST'])
+@permission_classes([IsLibraryAdmin])
+def auto_assign_delivery_requests(request):
+    """
+    Endpoint for assigning all pending delivery requests in one pass (Admin only).
+    POST /delivery-requests/auto-assign/
+    Body: {"dry_run": false, "max_load": 3, "max_distance_km": null, "limit": null}
+    """
+    try:
+        serializer = AutoAssignDeliverySerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        
+        result = DeliveryAssignmentService.auto_assign_pending(**serializer.validated_data)
+        
+        return Response({
+            'success': True,
+            'message': f"Assigned {result['assigned']} of {result['pending']} pending delivery requests",
+            'data': result
+        }, status=status.HTTP_200_OK)
+    
+    except (DRFValidationError, DjangoValidationError) as e:
+        return Response({
+            'success': False,
+            'error': str(e)
+        }, status=status.HTTP_400_BAD_REQUEST)
+    except Exception as e:
+        logger.error(f"Error auto-assigning delivery requests: {str(e)}")
+        return Response({
+            'success': False,
+            'error': 'Failed to auto-assign delivery requests'
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@api_view(['POST'])
+@permission_classes([IsDeliveryAdmin])
+def bulk_transition_delivery_requests(request, action):
+    """
+    Endpoint for accepting, starting or completing several delivery requests at once.
+    POST /delivery-requests/bulk/accept/
+    POST /delivery-requests/bulk/start/
+    POST /delivery-requests/bulk/complete/
+    Body: {"delivery_request_ids": [1, 2, 3], "notes": "optional"}
+    All requests are updated or none is.
+    """
+    try:
+        serializer = BulkDeliveryTransitionSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        
+        result = DeliveryBulkService.bulk_transition(
+            delivery_manager=request.user,
+            delivery_request_ids=serializer.validated_data['delivery_request_ids'],
+            action=action,
+            notes=serializer.validated_data.get('notes')
+        )
+        
+        return Response({
+            'success': True,
+            'message': f"Updated {result['updated']} delivery requests",
+            'data': result
+        }, status=status.HTTP_200_OK)
+    
+    except DjangoValidationError as e:
+        return Response({
+            'success': False,
+            'error': e.message_dict if hasattr(e, 'error_dict') else str(e)
+        }, status=status.HTTP_400_BAD_REQUEST)
+    except DRFValidationError as e:
+        return Response({
+            'success': False,
+            'error': str(e)
+        }, status=status.HTTP_400_BAD_REQUEST)
+    except Exception as e:
+        logger.error(f"Error in bulk {action} of delivery requests: {str(e)}")
+        return Response({
+            'success': False,
+            'error': f'Failed to {action} delivery requests'
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+def _run_response(run, message, response_status=status.HTTP_200_OK):
+    """Serialize a delivery run with its stops."""
+    run = DeliveryRun.objects.prefetch_related(
+        'stops__delivery_request__customer',
+        'stops__delivery_request__delivery_manager__delivery_profile',
+    ).get(id=run.id)
+    return Response({
+        'success': True,
+        'message': message,
+        'data': DeliveryRunSerializer(run).data
+    }, status=response_status)
+
+
+@api_view(['GET', 'POST'])
+@permission_classes([IsDeliveryAdmin])
+def delivery_runs(request):
+    """
+    Endpoint for the current delivery manager's multi-stop run.
+    GET /delivery-runs/ - Get the open (planned or in-progress) run
+    POST /delivery-runs/ - Plan a run over assigned or accepted requests
+    Body: {"delivery_request_ids": [1, 2, 3]}
+    """
+    try:
+        if request.method == 'GET':
+            run = DeliveryRunService.get_open_run(request.user)
+            if run is None:
+                return Response({
+                    'success': True,
+                    'message': 'No open delivery run',
+                    'data': None
+                }, status=status.HTTP_200_OK)
+            return _run_response(run, 'Delivery run retrieved successfully')
+        
+        serializer = CreateDeliveryRunSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        
+        run = DeliveryRunService.create_run(
+            delivery_manager=request.user,
+            delivery_request_ids=serializer.validated_data['delivery_request_ids']
+        )
+        return _run_response(run, 'Delivery run planned successfully', status.HTTP_201_CREATED)
+    
+    except (DRFValidationError, DjangoValidationError) as e:
+        return Response({
+            'success': False,
+            'error': str(e)
+        }, status=status.HTTP_400_BAD_REQUEST)
+    except Exception as e:
+        logger.error(f"Error handling delivery run: {str(e)}")
+        return Response({
+            'success': False,
+            'error': 'Failed to process delivery run'
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@api_view(['POST'])
+@permission_classes([IsDeliveryAdmin])
+def delivery_run_action(request, run_id, action):
+    """
+    Endpoint for starting or cancelling a delivery run.
+    POST /delivery-runs/{id}/start/
+    POST /delivery-runs/{id}/cancel/
+    """
+    try:
+        if action == 'start':
+            run = DeliveryRunService.start_run(run_id, request.user)
+            return _run_response(run, 'Delivery run started successfully')
+        run = DeliveryRunService.cancel_run(run_id, request.user)
+        return _run_response(run, 'Delivery run cancelled successfully')
+    
+    except DeliveryRun.DoesNotExist as e:
+        return Response({
+            'success': False,
+            'error': str(e)
+        }, status=status.HTTP_404_NOT_FOUND)
+    except (DRFValidationError, DjangoValidationError) as e:
+        return Response({
+            'success': False,
+            'error': str(e)
+        }, status=status.HTTP_400_BAD_REQUEST)
+    except Exception as e:
+        logger.error(f"Error updating delivery run {run_id}: {str(e)}")
+        return Response({
+            'success': False,
+            'error': 'Failed to update delivery run'
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@api_view(['POST'])
+@permission_classes([IsDeliveryAdmin])
+def delivery_run_stop_action(request, run_id, stop_id, action):
+    """
+    Endpoint for completing or removing one stop of a delivery run.
+    POST /delivery-runs/{id}/stops/{stop_id}/complete/
+    Body: {"notes": "..."}
+    POST /delivery-runs/{id}/stops/{stop_id}/remove/
+    """
+    try:
+        if action == 'complete':
+            stop = DeliveryRunService.complete_stop(
+                run_id, stop_id, request.user, notes=request.data.get('notes')
+            )
+            message = 'Stop completed successfully'
+        else:
+            stop = DeliveryRunService.remove_stop(run_id, stop_id, request.user)
+            message = 'Stop removed from the run'
+        
+        return Response({
+            'success': True,
+            'message': message,
+            'data': DeliveryRunStopSerializer(stop).data
+        }, status=status.HTTP_200_OK)
+    
+    except (DeliveryRun.DoesNotExist, DeliveryRunStop.DoesNotExist) as e:
+        return Response({
+            'success': False,
+            'error': str(e)
+        }, status=status.HTTP_404_NOT_FOUND)
+    except (DRFValidationError, DjangoValidationError) as e:
+        return Response({
+            'success': False,
+            'error': str(e)
+        }, status=status.HTTP_400_BAD_REQUEST)
+    except Exception as e:
+        logger.error(f"Error updating stop {stop_id} of delivery run {run_id}: {str(e)}")
+        return Response({
+            'success': False,
+            'error': 'Failed to update delivery run stop'
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
 @api_view(['POST'])
 @permission_classes([IsDeliveryAdmin])
 def accept_delivery_request(request, delivery_request_id):
@@ -533,6 +618,50 @@ def update_location(request, delivery_request_id):
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+@api_view(['POST'])
+@permission_classes([IsDeliveryAdmin])
+def upload_location_batch(request):
+    """
+    Endpoint for uploading buffered GPS points in one request.
+    POST /location-history/batch/
+    """
+    try:
+        serializer = LocationBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        
+        result = DeliveryService.record_location_batch(
+            delivery_manager=request.user,
+            points=serializer.validated_data['points'],
+            delivery_request_id=serializer.validated_data.get('delivery_request_id')
+        )
+        
+        latest = result['latest']
+        return Response({
+            'success': True,
+            'message': 'Location points stored successfully',
+            'data': {
+                'stored_points': result['stored_points'],
+                'latest_location': {
+                    'latitude': float(latest['latitude']),
+                    'longitude': float(latest['longitude']),
+                    'recorded_at': latest['recorded_at'].isoformat(),
+                }
+            }
+        }, status=status.HTTP_201_CREATED)
+    
+    except (DRFValidationError, DjangoValidationError) as e:
+        return Response({
+            'success': False,
+            'error': str(e)
+        }, status=status.HTTP_400_BAD_REQUEST)
+    except Exception as e:
+        logger.error(f"Error storing location batch: {str(e)}")
+        return Response({
+            'success': False,
+            'error': 'Failed to store location points'
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
 @api_view(['POST'])
 @permission_classes([IsDeliveryAdmin])
 def complete_delivery(request, delivery_request_id):
@@ -820,10 +949,11 @@ def log_order_note(request):
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
-class CustomerOrdersView(generics.ListCreateAPIView):
+class CustomerOrdersView(SparseFieldsetViewMixin, generics.ListCreateAPIView):
     """
     View for customers to view and create their orders.
     GET /delivery/orders/?order_type=purchase|borrowing&status=pending|confirmed|processing|delivered|cancelled
+    GET /delivery/orders/?fields=id,order_number,status,total_amount - Only the listed fields
     POST /delivery/orders/ - Create order from cart checkout
     """
     serializer_class = CustomerOrderSerializer
@@ -835,9 +965,9 @@ class CustomerOrdersView(generics.ListCreateAPIView):
         user = self.request.user
         # Admins can see all orders, customers see only their own
         if user.is_staff or user.is_superuser or user.user_type in ['library_admin', 'delivery_admin']:
-            queryset = Order.objects.select_related('payment', 'customer')
+            queryset = Order.objects.all()
         else:
-            queryset = Order.objects.filter(customer=user).select_related('payment', 'customer')
+            queryset = Order.objects.filter(customer=user)
         
         # Filter by order type (query parameter: ?order_type=purchase|borrowing)
         order_type = self.request.query_params.get('order_type', None)
@@ -860,8 +990,12 @@ class CustomerOrdersView(generics.ListCreateAPIView):
                 Q(items__book__name__icontains=search)
             ).distinct()
         
-        # Prefetch discount_usages to avoid N+1 queries when serializer accesses discount_code
-        return queryset.prefetch_related('discount_usages__discount_code').order_by('-created_at')
+        # Load the relations the requested fields read (?fields=), so the
+        # listing runs a fixed number of queries
+        queryset = CustomerOrderSerializer.apply_prefetch_plan(
+            queryset, CustomerOrderSerializer.get_requested_fields(self.request)
+        )
+        return queryset.order_by('-created_at')
     
     def get_serializer_class(self):
         """Return appropriate serializer based on request method."""
@@ -895,14 +1029,15 @@ class CustomerOrdersView(generics.ListCreateAPIView):
             'results': response.data if isinstance(response.data, list) else [response.data]
         }, status=status.HTTP_200_OK)
     
+    @idempotent('order_create')
     def create(self, request, *args, **kwargs):
         """Create order from cart checkout.
-        Calculates total_price server-side from book prices for security.
+        Calculates the total server-side with the OrderPricingEngine for security.
         """
         from ..serializers.delivery_serializers import OrderCreateSerializer
-        from ..models import Book, Payment, OrderItem, CartItem
+        from ..models import Payment, OrderItem, CartItem
         from django.db import transaction
-        from decimal import Decimal, ROUND_HALF_UP
+        from decimal import Decimal
         
         serializer = OrderCreateSerializer(data=request.data)
         serializer.is_valid(raise_exception=True)
@@ -916,75 +1051,28 @@ class CustomerOrdersView(generics.ListCreateAPIView):
                 delivery_notes = serializer.validated_data.get('delivery_notes', '')
                 card_details = serializer.validated_data.get('card_details')
                 discount_code = serializer.validated_data.get('discount_code')
-                discount_amount = serializer.validated_data.get('discount_amount')
                 
-                # Extract book IDs and quantities
+                # Price the basket server-side (book prices, book discounts,
+                # discount code, delivery cost and tax) in one quote
+                from ..services.pricing_services import OrderPricingEngine
                 book_ids = [item['book_id'] for item in cart_items_data]
-                book_quantities = {item['book_id']: item['quantity'] for item in cart_items_data}
-                
-                # Get books from database
-                books = Book.objects.filter(id__in=book_ids)
+                quote = OrderPricingEngine.quote(
+                    user,
+                    [(item['book_id'], item['quantity']) for item in cart_items_data],
+                    discount_code
+                )
                 
-                if books.count() != len(book_ids):
-                    missing_ids = set(book_ids) - set(books.values_list('id', flat=True))
+                if quote['errors']:
                     return Response({
                         'success': False,
-                        'message': f'Books not found: {list(missing_ids)}'
+                        'message': quote['errors'][0]
                     }, status=status.HTTP_400_BAD_REQUEST)
                 
-                # Calculate total price server-side using Decimal for precision
-                total = Decimal('0.00')
-                order_items_data = []
+                if quote['discount_error']:
+                    logger.warning(f"Invalid discount code {discount_code}: {quote['discount_error'].get('message', 'Unknown error')}")
                 
-                for book in books:
-                    quantity = book_quantities[book.id]
-                    if not book.price:
-                        return Response({
-                            'success': False,
-                            'message': f'Book {book.name} (ID: {book.id}) has no price'
-                        }, status=status.HTTP_400_BAD_REQUEST)
-                    
-                    item_price = Decimal(str(book.price))
-                    item_total = item_price * quantity
-                    total += item_total
-                    
-                    order_items_data.append({
-                        'book': book,
-                        'quantity': quantity,
-                        'price': item_price
-                    })
-                
-                # Round total to 2 decimal places
-                subtotal = total.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
-                
-                # Handle discount if provided
-                final_discount_amount = Decimal('0.00')
-                if discount_code:
-                    # Validate discount code if provided
-                    from ..services.discount_services import DiscountValidationService
-                    is_valid, discount_result = DiscountValidationService.validate_discount_code(
-                        discount_code, user, float(subtotal)
-                    )
-                    if is_valid:
-                        final_discount_amount = Decimal(str(discount_result['discount_amount']))
-                        # Record discount usage
-                        from ..models.discount_model import DiscountCode
-                        try:
-                            discount_code_obj = DiscountCode.objects.get(code=discount_code, is_active=True)
-                            # Usage will be recorded when order is saved
-                        except DiscountCode.DoesNotExist:
-                            logger.warning(f"Discount code {discount_code} not found or inactive")
-                    else:
-                        logger.warning(f"Invalid discount code {discount_code}: {discount_result.get('message', 'Unknown error')}")
-                elif discount_amount is not None:
-                    # Use provided discount amount if no code validation needed
-                    final_discount_amount = Decimal(str(discount_amount))
-                
-                # Calculate final total after discount
-                final_total = subtotal - final_discount_amount
-                if final_total < Decimal('0.00'):
-                    final_total = Decimal('0.00')
-                final_total = final_total.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+                final_discount_amount = quote['code_discount']
+                final_total = max(quote['total'], Decimal('0.00'))
                 
                 # Get or create user's cart for payment reference
                 from ..models import Cart
@@ -1005,8 +1093,11 @@ class CustomerOrdersView(generics.ListCreateAPIView):
                     payment_type=payment_type,  # Use 'payment_type' not 'payment_method'
                     cart=cart,  # Required field
                     status='pending' if payment_method == 'cash_on_delivery' or payment_method == 'cash' else 'completed',
-                    discount_code_used=discount_code if discount_code else None,
+                    original_amount=quote['subtotal'],
+                    discount_code_used=quote['discount_code'].code if quote['discount_code'] else None,
                     discount_amount=final_discount_amount,
+                    discount_percentage=quote['discount_percentage'] if quote['discount_code'] else None,
+                    delivery_cost=quote['delivery_cost'],
                 )
                 
                 # Create order
@@ -1015,32 +1106,51 @@ class CustomerOrdersView(generics.ListCreateAPIView):
                     order_type='purchase',
                     status='pending',
                     total_amount=final_total,  # Final total after discount
-                    delivery_cost=Decimal('0.00'),
-                    tax_amount=Decimal('0.00'),
-                    discount_amount=final_discount_amount,  # Save actual discount amount
+                    delivery_cost=quote['delivery_cost'],
+                    tax_amount=quote['tax_amount'],
+                    discount_amount=final_discount_amount,  # Discount code amount (book discounts are in the item prices)
                     delivery_address=delivery_address,
                     notes=delivery_notes,
                     payment=payment
                 )
                 
                 # Record discount usage if discount code was used
-                if discount_code and final_discount_amount > Decimal('0.00'):
+                if quote['discount_code'] is not None and final_discount_amount > Decimal('0.00'):
                     try:
                         from ..models.discount_model import DiscountCode
-                        discount_code_obj = DiscountCode.objects.get(code=discount_code, is_active=True)
+                        discount_code_obj = DiscountCode.objects.get(pk=quote['discount_code'].pk, is_active=True)
                         discount_code_obj.use_by_customer(user, order)
-                        logger.info(f"Recorded discount code usage: {discount_code} for order {order.id}")
+                        logger.info(f"Recorded discount code usage: {discount_code_obj.code} for order {order.id}")
+                    except DjangoValidationError as e:
+                        # A concurrent checkout used up the limit: roll the order back
+                        raise DRFValidationError({'discount_code': e.messages})
                     except Exception as e:
                         logger.warning(f"Failed to record discount usage: {str(e)}")
                         # Don't fail order creation if discount recording fails
                 
+                # Record the book discounts the quote priced in; quote entries are
+                # shared snapshot instances, so fresh rows are redeemed (or the
+                # usage already redeemed through the apply endpoint is attached)
+                applied_book_discount_ids = [
+                    item['book_discount'].pk for item in quote['items'] if item['book_discount'] is not None
+                ]
+                if applied_book_discount_ids:
+                    from ..models.discount_model import BookDiscount
+                    book_discounts = BookDiscount.objects.select_related('book').in_bulk(applied_book_discount_ids)
+                    for book_discount in book_discounts.values():
+                        try:
+                            book_discount.use_for_order(user, order)
+                        except DjangoValidationError as e:
+                            # The discount ran out since the quote: roll the order back
+                            raise DRFValidationError({'book_discount': e.messages})
+                
                 # Create order items using Django ORM (recommended approach)
-                for item_data in order_items_data:
+                for item in quote['items']:
                     OrderItem.objects.create(
                         order=order,
-                        book=item_data['book'],
-                        quantity=item_data['quantity'],
-                        price=item_data['price'],  # Price per unit at time of order
+                        book=item['book'],
+                        quantity=item['quantity'],
+                        price=item['unit_price'],  # Price per unit at time of order
                     )
                 
                 # Optionally clear cart items (if using CartItem model)
@@ -1106,8 +1216,12 @@ class OrderDetailView(generics.RetrieveAPIView):
         """Filter orders - admins see all, customers see only their own."""
         user = self.request.user
         if user.is_staff or user.is_superuser or user.user_type in ['library_admin', 'delivery_admin']:
-            return Order.objects.select_related('payment', 'customer').prefetch_related('discount_usages__discount_code')
-        return Order.objects.filter(customer=user).select_related('payment', 'customer').prefetch_related('discount_usages__discount_code')
+            queryset = Order.objects.all()
+        else:
+            queryset = Order.objects.filter(customer=user)
+        return CustomerOrderSerializer.apply_prefetch_plan(
+            queryset, CustomerOrderSerializer.get_requested_fields(self.request)
+        )
     
     def retrieve(self, request, *args, **kwargs):
         """Override retrieve to return order data directly (frontend expects direct order data)."""
@@ -1368,7 +1482,8 @@ class AvailableDeliveryManagersView(generics.ListAPIView):
             return Response({
                 'success': True,
                 'message': 'Delivery managers retrieved successfully',
-                'delivery_managers': serializer.data  # Frontend expects 'delivery_managers' key
+                'delivery_managers': serializer.data,  # Frontend expects 'delivery_managers' key
+                'status_counts': BorrowingService.get_delivery_manager_status_counts()
             }, status=status.HTTP_200_OK)
         except Exception as e:
             logger.error(f"Error retrieving delivery managers: {str(e)}")
@@ -1379,6 +1494,100 @@ class AvailableDeliveryManagersView(generics.ListAPIView):
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+class NearestDeliveryManagersView(generics.ListAPIView):
+    """
+    API view to rank online delivery managers by distance for assignment.
+    GET /delivery/orders/nearest_delivery_managers/?latitude=..&longitude=..&limit=5
+    GET /delivery/orders/nearest_delivery_managers/?delivery_request_id=..
+    """
+    authentication_classes = [CustomJWTAuthentication]
+    permission_classes = [IsAnyAdmin]
+    
+    def list(self, request, *args, **kwargs):
+        """Get the closest online delivery managers with their distance in km."""
+        try:
+            from ..serializers.borrowing_serializers import DeliveryManagerSerializer
+            
+            params = request.query_params
+            latitude = params.get('latitude')
+            longitude = params.get('longitude')
+            
+            delivery_request_id = params.get('delivery_request_id')
+            if delivery_request_id and (latitude is None or longitude is None):
+                try:
+                    delivery_request_id = int(delivery_request_id)
+                except (TypeError, ValueError):
+                    return Response({
+                        'success': False,
+                        'message': 'Invalid delivery_request_id',
+                        'errors': {'delivery_request_id': ['Must be an integer']}
+                    }, status=status.HTTP_400_BAD_REQUEST)
+                
+                delivery_requests = DeliveryRequest.objects.filter(id=delivery_request_id)
+                if not delivery_requests.exists():
+                    return Response({
+                        'success': False,
+                        'message': 'Delivery request not found'
+                    }, status=status.HTTP_404_NOT_FOUND)
+                
+                # Rank by the destination (the geocoded delivery address), not
+                # the GPS columns, which only track the courier during delivery
+                GeocodingService.locate_missing(delivery_requests)
+                destination = delivery_requests.only(
+                    'destination_latitude', 'destination_longitude'
+                ).first().get_destination()
+                if destination is not None:
+                    latitude, longitude = destination
+            
+            if latitude is None or longitude is None:
+                return Response({
+                    'success': False,
+                    'message': 'Delivery coordinates are required',
+                    'errors': {'location': [
+                        'Provide latitude and longitude, or a delivery request whose address can be located'
+                    ]}
+                }, status=status.HTTP_400_BAD_REQUEST)
+            
+            try:
+                latitude = float(latitude)
+                longitude = float(longitude)
+                limit = min(max(int(params.get('limit', 5)), 1), 50)
+                max_distance_km = float(params['max_distance_km']) if params.get('max_distance_km') else None
+            except (TypeError, ValueError):
+                return Response({
+                    'success': False,
+                    'message': 'Invalid query parameters',
+                    'errors': {'params': ['latitude, longitude, limit and max_distance_km must be numeric']}
+                }, status=status.HTTP_400_BAD_REQUEST)
+            
+            if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+                return Response({
+                    'success': False,
+                    'message': 'Invalid coordinates',
+                    'errors': {'location': ['Latitude must be between -90 and 90, longitude between -180 and 180']}
+                }, status=status.HTTP_400_BAD_REQUEST)
+            
+            managers = NearestCourierService.find_nearest_delivery_managers(
+                latitude, longitude, limit=limit, max_distance_km=max_distance_km
+            )
+            data = DeliveryManagerSerializer(managers, many=True).data
+            for item, manager in zip(data, managers):
+                item['distance_km'] = manager.distance_km
+            
+            return Response({
+                'success': True,
+                'message': 'Nearest delivery managers retrieved successfully',
+                'delivery_managers': data
+            }, status=status.HTTP_200_OK)
+        except Exception as e:
+            logger.error(f"Error retrieving nearest delivery managers: {str(e)}")
+            return Response({
+                'success': False,
+                'message': 'Failed to retrieve nearest delivery managers',
+                'errors': format_error_message(str(e))
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
 @api_view(['GET'])
 @permission_classes([IsDeliveryAdmin])
 def my_assignments(request):
@@ -1800,6 +2009,16 @@ def get_order_delivery_location(request, order_id):
     Only available when delivery status is 'in_delivery'.
     """
     try:
+        # Serve polls from the live location cache while the delivery is in progress
+        cached = LiveLocationService.get_cached_tracking('purchase', order_id, request.user)
+        if cached:
+            session, location_data = cached
+            return Response({
+                'success': True,
+                'message': 'Delivery location retrieved successfully',
+                'data': LiveLocationService.build_tracking_data('purchase', int(order_id), session, location_data)
+            }, status=status.HTTP_200_OK)
+        
         order = get_object_or_404(Order, id=order_id)
         
         # Check permissions - customer can only view their own orders
@@ -1850,13 +2069,13 @@ def get_order_delivery_location(request, order_id):
         if hasattr(delivery_manager, 'delivery_profile') and delivery_manager.delivery_profile:
             profile = delivery_manager.delivery_profile
             if profile.latitude is not None and profile.longitude is not None:
-                location_data = {
-                    'latitude': float(profile.latitude),
-                    'longitude': float(profile.longitude),
-                    'address': profile.address,
-                    'last_updated': profile.location_updated_at.isoformat() if profile.location_updated_at else None,
-                    'is_tracking_active': profile.is_tracking_active
-                }
+                location_data = LiveLocationService.build_location_from_record(
+                    profile.latitude,
+                    profile.longitude,
+                    address=profile.address,
+                    recorded_at=profile.location_updated_at,
+                    is_tracking_active=profile.is_tracking_active
+                )
         
         # Get latest location from history if profile doesn't have it
         if not location_data:
@@ -1866,13 +2085,12 @@ def get_order_delivery_location(request, order_id):
             ).order_by('-recorded_at').first()
             
             if latest_location:
-                location_data = {
-                    'latitude': float(latest_location.latitude),
-                    'longitude': float(latest_location.longitude),
-                    'address': latest_location.address,
-                    'last_updated': latest_location.recorded_at.isoformat(),
-                    'is_tracking_active': True
-                }
+                location_data = LiveLocationService.build_location_from_record(
+                    latest_location.latitude,
+                    latest_location.longitude,
+                    address=latest_location.address,
+                    recorded_at=latest_location.recorded_at
+                )
         
         if not location_data:
             return Response({
@@ -1881,26 +2099,14 @@ def get_order_delivery_location(request, order_id):
                 'errors': {'location': ['Delivery manager location is not available']}
             }, status=status.HTTP_404_NOT_FOUND)
         
-        # Get delivery manager details
-        delivery_manager_info = {
-            'id': delivery_manager.id,
-            'name': delivery_manager.get_full_name(),
-            'phone': delivery_manager.phone_number if hasattr(delivery_manager, 'phone_number') else None,
-            'email': delivery_manager.email
-        }
+        LiveLocationService.warm_tracking_cache(delivery_request, location_data)
+        
+        session = LiveLocationService.build_session(order, delivery_manager, delivery_request)
         
         return Response({
             'success': True,
             'message': 'Delivery location retrieved successfully',
-            'data': {
-                'order_id': order.id,
-                'order_number': order.order_number,
-                'delivery_status': delivery_request.status,
-                'delivery_manager': delivery_manager_info,
-                'location': location_data,
-                'tracking_enabled': True,
-                'tracking_interval_seconds': 5
-            }
+            'data': LiveLocationService.build_tracking_data('purchase', order.id, session, location_data)
         }, status=status.HTTP_200_OK)
         
     except Exception as e:
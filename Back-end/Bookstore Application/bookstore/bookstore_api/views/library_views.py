@@ -53,6 +53,7 @@ from ..serializers import (
     ReviewReplySerializer,
     ReviewReplyCreateSerializer,
 )
+from ..serializers.mixins import SparseFieldsetViewMixin
 from ..services import LibraryManagementService, LibraryAccessService, BookManagementService, BookAccessService, EvaluationManagementService, EvaluationAccessService, FavoriteManagementService, FavoriteAccessService
 from ..utils import format_error_message
 from ..permissions import IsSystemAdmin, IsCustomer
@@ -662,7 +663,7 @@ class BookCreateView(generics.CreateAPIView):
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
-class BookListView(generics.ListAPIView):
+class BookListView(SparseFieldsetViewMixin, generics.ListAPIView):
     """
     List all books in the current library.
     Available to all authenticated users.
@@ -1059,7 +1060,7 @@ class BookManagementView(APIView):
 # ADVANCED BOOK FILTERING VIEWS
 # =====================================
 
-class NewBooksView(generics.ListAPIView):
+class NewBooksView(SparseFieldsetViewMixin, generics.ListAPIView):
     """
     Get only new books (marked as new or created within specified days).
     Available to all authenticated users.
@@ -1148,7 +1149,7 @@ class NewBooksView(generics.ListAPIView):
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
-class BooksByCategoryView(generics.ListAPIView):
+class BooksByCategoryView(SparseFieldsetViewMixin, generics.ListAPIView):
     """
     Get books by specific category.
     Available to all authenticated users.
@@ -1258,7 +1259,7 @@ class BooksByCategoryView(generics.ListAPIView):
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
-class BooksByAuthorView(generics.ListAPIView):
+class BooksByAuthorView(SparseFieldsetViewMixin, generics.ListAPIView):
     """
     Get books by specific author.
     Available to all authenticated users.
@@ -1317,7 +1318,7 @@ class BooksByAuthorView(generics.ListAPIView):
     
 
 
-class BooksByPriceRangeView(generics.ListAPIView):
+class BooksByPriceRangeView(SparseFieldsetViewMixin, generics.ListAPIView):
     """
     Get books within a specific price range.
     Available to all authenticated users.
@@ -1449,7 +1450,7 @@ class BooksByPriceRangeView(generics.ListAPIView):
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
-class BooksByRatingView(generics.ListAPIView):  
+class BooksByRatingView(SparseFieldsetViewMixin, generics.ListAPIView):  
     """
     Get books sorted by customer ratings/evaluations.
     Available to all authenticated users.
@@ -1578,7 +1579,7 @@ class BooksByRatingView(generics.ListAPIView):
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
-class TopRatedBooksView(generics.ListAPIView):
+class TopRatedBooksView(SparseFieldsetViewMixin, generics.ListAPIView):
     """
     Get top-rated books with minimum number of reviews.
     Available to all authenticated users.
@@ -1671,7 +1672,7 @@ class TopRatedBooksView(generics.ListAPIView):
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
-class PurchasingBooksView(generics.ListAPIView):
+class PurchasingBooksView(SparseFieldsetViewMixin, generics.ListAPIView):
     """
     Get books available for purchase only (not borrowing).
     Available to all authenticated users.
@@ -2467,7 +2468,7 @@ class EvaluationCreateView(generics.CreateAPIView):
             }, status=status.HTTP_400_BAD_REQUEST)
 
 
-class EvaluationListView(generics.ListAPIView):
+class EvaluationListView(SparseFieldsetViewMixin, generics.ListAPIView):
     """
     List evaluations.
     Library administrators can see all evaluations.
@@ -2677,7 +2678,7 @@ class EvaluationDeleteView(generics.DestroyAPIView):
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
-class BookEvaluationsView(generics.ListAPIView):
+class BookEvaluationsView(SparseFieldsetViewMixin, generics.ListAPIView):
     """
     Get all evaluations for a specific book.
     Available to all authenticated users.
@@ -1,4 +1,4 @@
-from rest_framework import status, permissions
+from rest_framework import generics, status, permissions
 from rest_framework.views import APIView
 from rest_framework.response import Response
 import logging
@@ -9,6 +9,7 @@ from ..serializers import (
     CashOnDeliveryPaymentCreateSerializer, PaymentStatusUpdateSerializer
 )
 from ..services.payment_services import PaymentService
+from ..services.idempotency_services import idempotent
 from ..utils import format_error_message
 
 logger = logging.getLogger(__name__)
@@ -19,6 +20,7 @@ class PaymentInitView(APIView):
     """
     permission_classes = [permissions.IsAuthenticated]
     
+    @idempotent('payment_init')
     def post(self, request):
         try:
             # Validate request data
@@ -26,7 +28,7 @@ class PaymentInitView(APIView):
             serializer.is_valid(raise_exception=True)
             
             # Get payment method and optional discount code
-            payment_method = serializer.validated_data['payment_method']
+            payment_method = serializer.validated_data['payment_type']
             discount_code = serializer.validated_data.get('discount_code')
             
             # Initialize payment
@@ -178,3 +180,48 @@ class CashOnDeliveryPaymentView(APIView):
                 'message': 'Failed to process cash on delivery payment' ,
                 'errors': format_error_message(str(e))
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+class PaymentHistoryView(generics.ListAPIView):
+    """
+    List the current user's payments, newest first, with their method details.
+    GET /api/payment/history/
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    serializer_class = PaymentSerializer
+    
+    def get_queryset(self):
+        result = PaymentService.get_user_payments(self.request.user)
+        if not result['success']:
+            raise Exception(result['message'])
+        return result['payments']
+    
+    def list(self, request, *args, **kwargs):
+        try:
+            queryset = self.get_queryset()
+            
+            # Pagination
+            page = self.paginate_queryset(queryset)
+            if page is not None:
+                serializer = self.get_serializer(page, many=True)
+                return self.get_paginated_response({
+                    'success': True,
+                    'message': 'Payment history retrieved successfully',
+                    'data': serializer.data
+                })
+            
+            serializer = self.get_serializer(queryset, many=True)
+            return Response({
+                'success': True,
+                'message': 'Payment history retrieved successfully',
+                'data': serializer.data,
+                'count': len(serializer.data)
+            }, status=status.HTTP_200_OK)
+            
+        except Exception as e:
+            logger.error(f"Error retrieving payment history: {str(e)}")
+            return Response({
+                'success': False,
+                'message': 'Failed to retrieve payment history',
+                'errors': format_error_message(str(e))
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
@@ -18,6 +18,7 @@ from ..serializers.report_serializers import (
     BookReportSerializer, OrderReportSerializer
 )
 from ..services.report_services import ReportManagementService
+from ..services.delivery_metrics_services import DeliveryMetricsService
 from ..permissions import IsLibraryAdmin
 from ..utils import format_error_message
 import logging
@@ -391,4 +392,59 @@ class DeliveryReportView(APIView):
                 'success': False,
                 'message': 'Failed to get delivery report',
                 'errors': format_error_message(str(e))
-            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
\ No newline at end of file
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+class DeliveryPerformanceReportView(APIView):
+    """Get delivery SLA and courier performance metrics from the daily rollups"""
+    permission_classes = [permissions.IsAuthenticated, IsLibraryAdmin]
+    
+    def get(self, request):
+        try:
+            start_date = request.GET.get('start_date')
+            end_date = request.GET.get('end_date')
+            delivery_manager_id = request.GET.get('delivery_manager_id')
+            
+            if delivery_manager_id:
+                try:
+                    delivery_manager_id = int(delivery_manager_id)
+                except (TypeError, ValueError):
+                    return Response({
+                        'success': False,
+                        'message': 'Invalid delivery manager',
+                        'errors': {'delivery_manager_id': ['A valid integer is required.']}
+                    }, status=status.HTTP_400_BAD_REQUEST)
+                if not User.objects.filter(id=delivery_manager_id, user_type='delivery_admin').exists():
+                    return Response({
+                        'success': False,
+                        'message': 'Delivery manager not found',
+                        'errors': {'delivery_manager_id': [f'No delivery manager with ID {delivery_manager_id}.']}
+                    }, status=status.HTTP_404_NOT_FOUND)
+            
+            end_date = datetime.fromisoformat(end_date.replace('Z', '+00:00')).date() if end_date else timezone.now().date()
+            start_date = datetime.fromisoformat(start_date.replace('Z', '+00:00')).date() if start_date else end_date - timedelta(days=30)
+            if start_date > end_date:
+                raise ValueError('start_date must not be after end_date')
+            
+            report_data = DeliveryMetricsService.get_performance_summary(
+                start_date, end_date, delivery_manager_id=delivery_manager_id
+            )
+            
+            return Response({
+                'success': True,
+                'data': report_data
+            }, status=status.HTTP_200_OK)
+            
+        except ValueError as e:
+            return Response({
+                'success': False,
+                'message': 'Invalid date range',
+                'errors': format_error_message(str(e))
+            }, status=status.HTTP_400_BAD_REQUEST)
+        except Exception as e:
+            logger.error(f"Error getting delivery performance report: {str(e)}")
+            return Response({
+                'success': False,
+                'message': 'Failed to get delivery performance report',
+                'errors': format_error_message(str(e))
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
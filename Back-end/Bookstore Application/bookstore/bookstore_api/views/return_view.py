@@ -5,7 +5,7 @@ from django.shortcuts import get_object_or_404
 from django.db.models import Q
 from django.utils import timezone
 
-from ..models.return_model import ReturnRequest, ReturnStatus, ReturnFine, ReturnFinePaymentMethod
+from ..models.return_model import ReturnRequest, ReturnStatus, ReturnFine, ReturnFinePaymentMethod, FineRateTable, CustomerFineLedger
 from ..models.borrowing_model import BorrowRequest, FineStatusChoices
 from ..models.user_model import User
 from ..serializers.return_serializers import (
@@ -13,10 +13,14 @@ from ..serializers.return_serializers import (
     ReturnRequestCreateSerializer,
     ReturnRequestApprovalSerializer,
     ReturnRequestAssignSerializer,
-    ReturnFineSerializer
+    ReturnFineSerializer,
+    FineRateTableSerializer,
+    FinePricingPreviewSerializer
 )
 from ..services.return_services import ReturnService
+from ..services.fine_pricing_services import FinePricingEngine
 from ..services.notification_services import NotificationService
+from ..services.live_location_services import LiveLocationService
 from ..permissions import IsCustomer, IsLibraryAdmin, IsDeliveryAdmin, IsAnyAdmin
 from ..utils import format_error_message
 import logging
@@ -744,10 +748,8 @@ class CustomerFinesView(generics.ListAPIView):
             # Sort by created_date (most recent first)
             all_fines_data.sort(key=lambda x: x.get('created_date', ''), reverse=True)
             
-            # Calculate total unpaid fines
-            total_unpaid = sum(
-                float(fine.fine_amount) for fine in all_fines.filter(is_paid=False)
-            )
+            # Total unpaid fines from the customer's fine ledger
+            total_unpaid = user.get_total_unpaid_fines()
             
             return Response({
                 'success': True,
@@ -769,6 +771,35 @@ class CustomerFinesView(generics.ListAPIView):
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+class CustomerFineBalanceView(APIView):
+    """
+    API view for customers to get their outstanding fine balance (fines badge)
+    GET /api/returns/fines/my-fines/balance/
+    """
+    permission_classes = [permissions.IsAuthenticated, IsCustomer]
+    
+    def get(self, request):
+        try:
+            ledger = CustomerFineLedger.for_customer(request.user)
+            return Response({
+                'success': True,
+                'message': 'Fine balance retrieved successfully',
+                'data': {
+                    'total_unpaid': float(ledger.outstanding_balance),
+                    'unpaid_fines': ledger.unpaid_fines,
+                    'has_unpaid_fines': ledger.outstanding_balance > 0
+                }
+            }, status=status.HTTP_200_OK)
+            
+        except Exception as e:
+            logger.error(f"Error retrieving fine balance: {str(e)}")
+            return Response({
+                'success': False,
+                'message': 'Failed to retrieve fine balance',
+                'errors': format_error_message(str(e))
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
 class MarkFineAsPaidView(APIView):
     """
     API view for delivery managers to mark fine as paid/not paid for return requests
@@ -896,6 +927,104 @@ class AllFinesView(generics.ListAPIView):
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+class FineRateTableView(APIView):
+    """
+    API view for admins to list and publish fine rate table versions
+    GET /api/returns/fines/rates/
+    POST /api/returns/fines/rates/
+    """
+    permission_classes = [permissions.IsAuthenticated, IsLibraryAdmin]
+    
+    def get(self, request):
+        """
+        List all rate table versions and the one currently in effect
+        """
+        try:
+            current = FinePricingEngine.get_rates()
+            serializer = FineRateTableSerializer(FineRateTable.objects.select_related('created_by'), many=True)
+            return Response({
+                'success': True,
+                'message': 'Fine rates retrieved successfully',
+                'data': {
+                    'current_version': current.version,
+                    'current': FineRateTableSerializer(current).data,
+                    'versions': serializer.data
+                }
+            }, status=status.HTTP_200_OK)
+            
+        except Exception as e:
+            logger.error(f"Error retrieving fine rates: {str(e)}")
+            return Response({
+                'success': False,
+                'message': 'Failed to retrieve fine rates',
+                'errors': format_error_message(str(e))
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+    
+    def post(self, request):
+        """
+        Publish a new rate table version
+        """
+        serializer = FineRateTableSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response({
+                'success': False,
+                'message': 'Invalid fine rates',
+                'errors': serializer.errors
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        try:
+            table = FinePricingEngine.publish_rates(created_by=request.user, **serializer.validated_data)
+            return Response({
+                'success': True,
+                'message': f'Fine rates version {table.version} published',
+                'data': FineRateTableSerializer(table).data
+            }, status=status.HTTP_201_CREATED)
+            
+        except Exception as e:
+            logger.error(f"Error publishing fine rates: {str(e)}")
+            return Response({
+                'success': False,
+                'message': 'Failed to publish fine rates',
+                'errors': format_error_message(str(e))
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+class FinePricingPreviewView(APIView):
+    """
+    API view for admins to preview the late fines of outstanding loans under
+    proposed rates, compared with the rates in effect
+    POST /api/returns/fines/pricing-preview/
+    """
+    permission_classes = [permissions.IsAuthenticated, IsLibraryAdmin]
+    
+    def post(self, request):
+        serializer = FinePricingPreviewSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response({
+                'success': False,
+                'message': 'Invalid preview rates',
+                'errors': serializer.errors
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        try:
+            overrides = dict(serializer.validated_data)
+            sample_size = overrides.pop('sample_size')
+            preview = FinePricingEngine.preview_overdue(overrides, sample_size=sample_size)
+            return Response({
+                'success': True,
+                'message': 'Fine preview computed successfully',
+                'data': preview
+            }, status=status.HTTP_200_OK)
+            
+        except Exception as e:
+            logger.error(f"Error computing fine preview: {str(e)}")
+            return Response({
+                'success': False,
+                'message': 'Failed to compute fine preview',
+                'errors': format_error_message(str(e))
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
 class GetReturnDeliveryLocationView(APIView):
     """
     API view to get current delivery manager location for return request tracking
@@ -906,6 +1035,16 @@ class GetReturnDeliveryLocationView(APIView):
     
     def get(self, request, pk):
         try:
+            # Serve polls from the live location cache while the pickup is in progress
+            cached = LiveLocationService.get_cached_tracking('return', pk, request.user)
+            if cached:
+                session, location_data = cached
+                return Response({
+                    'success': True,
+                    'message': 'Delivery location retrieved successfully',
+                    'data': LiveLocationService.build_tracking_data('return', int(pk), session, location_data)
+                }, status=status.HTTP_200_OK)
+            
             return_request = get_object_or_404(ReturnRequest, id=pk)
             
             # Check permissions - customer can see their own, admin can see all
@@ -964,13 +1103,13 @@ class GetReturnDeliveryLocationView(APIView):
             if hasattr(delivery_manager, 'delivery_profile') and delivery_manager.delivery_profile:
                 profile = delivery_manager.delivery_profile
                 if profile.latitude is not None and profile.longitude is not None:
-                    location_data = {
-                        'latitude': float(profile.latitude),
-                        'longitude': float(profile.longitude),
-                        'address': profile.address,
-                        'last_updated': profile.location_updated_at.isoformat() if profile.location_updated_at else None,
-                        'is_tracking_active': profile.is_tracking_active
-                    }
+                    location_data = LiveLocationService.build_location_from_record(
+                        profile.latitude,
+                        profile.longitude,
+                        address=profile.address,
+                        recorded_at=profile.location_updated_at,
+                        is_tracking_active=profile.is_tracking_active
+                    )
             
             # Get latest location from history if profile doesn't have it
             if not location_data:
@@ -980,13 +1119,12 @@ class GetReturnDeliveryLocationView(APIView):
                 ).order_by('-recorded_at').first()
                 
                 if latest_location:
-                    location_data = {
-                        'latitude': float(latest_location.latitude),
-                        'longitude': float(latest_location.longitude),
-                        'address': latest_location.address,
-                        'last_updated': latest_location.recorded_at.isoformat(),
-                        'is_tracking_active': True
-                    }
+                    location_data = LiveLocationService.build_location_from_record(
+                        latest_location.latitude,
+                        latest_location.longitude,
+                        address=latest_location.address,
+                        recorded_at=latest_location.recorded_at
+                    )
             
             if not location_data:
                 return Response({
@@ -995,25 +1133,14 @@ class GetReturnDeliveryLocationView(APIView):
                     'errors': {'location': ['Delivery manager location is not available']}
                 }, status=status.HTTP_404_NOT_FOUND)
             
-            # Get delivery manager details
-            delivery_manager_info = {
-                'id': delivery_manager.id,
-                'name': delivery_manager.get_full_name(),
-                'phone': delivery_manager.phone_number if hasattr(delivery_manager, 'phone_number') else None,
-                'email': delivery_manager.email
-            }
+            LiveLocationService.warm_tracking_cache(delivery_request, location_data)
+            
+            session = LiveLocationService.build_session(return_request, delivery_manager, delivery_request)
             
             return Response({
                 'success': True,
                 'message': 'Delivery location retrieved successfully',
-                'data': {
-                    'return_request_id': return_request.id,
-                    'status': return_request.status,
-                    'delivery_manager': delivery_manager_info,
-                    'location': location_data,
-                    'tracking_enabled': True,
-                    'tracking_interval_seconds': 5
-                }
+                'data': LiveLocationService.build_tracking_data('return', return_request.id, session, location_data)
             }, status=status.HTTP_200_OK)
             
         except Exception as e:
@@ -1346,6 +1473,9 @@ class ConfirmReturnFineView(APIView):
                     WHERE id = %s
                 """, [str(return_fine.fine_amount), return_request.borrowing.id])
             
+            # Raw SQL skips ReturnFine.save, so recount the customer's balance
+            CustomerFineLedger.rebuild(customer_ids=[return_request.borrowing.customer_id])
+            
             # Send notification to customer
             borrow_request = return_request.borrowing
             NotificationService.create_notification(
@@ -1442,6 +1572,9 @@ class IncreaseReturnFineView(APIView):
                     WHERE id = %s
                 """, [str(new_amount), return_request.borrowing.id])
             
+            # Raw SQL skips ReturnFine.save, so recount the customer's balance
+            CustomerFineLedger.rebuild(customer_ids=[return_request.borrowing.customer_id])
+            
             # Send notification to customer
             borrow_request = return_request.borrowing
             NotificationService.create_notification(